@@ -86,7 +86,15 @@ from prompts.agent_prompt_astock import (STOP_SIGNAL,
                                          get_agent_system_prompt_astock)
 from tools.general_tools import (extract_conversation, extract_tool_messages,
                                  get_config_value, write_config_value)
+from tools.llm_rate_limiter import build_rate_limit_middleware, get_rate_limiter
+from tools.llm_streaming import astream_agent
+from tools.portfolio_series import start_portfolio_series
 from tools.price_tools import add_no_trade_record
+from tools.session_checkpoint import SessionCheckpoint
+from tools.scripted_chat_model import ScriptedChatModel
+from tools.session_logger import SessionLogger
+from tools.tool_output_budget import ToolOutputBudget
+from tools.tracing import build_tracing_middleware, set_trace_context, traced
 
 # Load environment variables
 load_dotenv()
@@ -174,6 +182,11 @@ class BaseAgentAStock:
         initial_cash: float = 100000.0,  # 默认10万人民币
         init_date: str = "2025-10-09",
         market: str = "cn",  # 接受但忽略此参数，始终使用"cn"
+        log_config: Optional[Dict[str, Any]] = None,
+        rate_limit_config: Optional[Dict[str, Any]] = None,
+        streaming: bool = False,
+        tool_output_budget: Optional[Dict[str, Dict[str, Any]]] = None,
+        mock_llm: Optional[Dict[str, Any]] = None,
     ):
         """
         Initialize BaseAgentAStock
@@ -192,6 +205,11 @@ class BaseAgentAStock:
             initial_cash: Initial cash amount (default: 100000.0 RMB)
             init_date: Initialization date
             market: Market type (accepted for compatibility, but always uses "cn")
+            log_config: Session logger options (batching, fsync, consolidated store)
+            rate_limit_config: LLM rate limiter options (token bucket, concurrency cap, circuit breaker)
+            streaming: Stream model output via astream_events and stop as soon as the stop signal appears
+            tool_output_budget: Per-tool output budgets (char cap, field projection, dedup, tabular prices)
+            mock_llm: Use the offline ScriptedChatModel instead of a real LLM (policy, seed, ...)
         """
         self.signature = signature
         self.basemodel = basemodel
@@ -204,6 +222,8 @@ class BaseAgentAStock:
             self.stock_symbols = stock_symbols
 
         self.max_steps = max_steps
+        self.streaming = streaming
+        self.mock_llm = mock_llm
         self.max_retries = max_retries
         self.base_delay = base_delay
         self.initial_cash = initial_cash
@@ -214,6 +234,13 @@ class BaseAgentAStock:
 
         # Set log path - A股专用路径
         self.base_log_path = log_path or "./data/agent_data_astock"
+        self.session_logger = SessionLogger.from_config(self.signature, self.base_log_path, log_config)
+
+        # Log file of the running session, for tool-budget and stream-metric events
+        self._current_log_file: Optional[str] = None
+
+        # Compaction of tool results before they are fed back to the model
+        self.tool_budget = ToolOutputBudget(tool_output_budget)
 
         # Set OpenAI configuration
         if openai_base_url == None:
@@ -225,6 +252,11 @@ class BaseAgentAStock:
         else:
             self.openai_api_key = openai_api_key
 
+        # Shared rate limiter for this provider/model; model calls are guarded by middleware when available
+        self.rate_limiter = get_rate_limiter(self.openai_base_url, self.basemodel, rate_limit_config)
+        # The scripted mock model makes no API calls, so it is never throttled
+        self._rate_limit_middleware = [] if mock_llm is not None else build_rate_limit_middleware(self.rate_limiter)
+
         # Initialize components
         self.client: Optional[MultiServerMCPClient] = None
         self.tools: Optional[List] = None
@@ -260,12 +292,12 @@ class BaseAgentAStock:
         """Initialize MCP client and AI model"""
         print(f"🚀 Initializing A-shares agent: {self.signature}")
 
-        # Validate OpenAI configuration
-        if not self.openai_api_key:
+        # Validate OpenAI configuration (not needed for the offline mock model)
+        if not self.openai_api_key and self.mock_llm is None:
             raise ValueError(
                 "❌ OpenAI API key not set. Please configure OPENAI_API_KEY in environment or config file."
             )
-        if not self.openai_base_url:
+        if not self.openai_base_url and self.mock_llm is None:
             print("⚠️  OpenAI base URL not set, using default")
 
         try:
@@ -289,7 +321,10 @@ class BaseAgentAStock:
         try:
             # Create AI model - use custom DeepSeekChatOpenAI for DeepSeek models
             # to handle tool_calls.args format differences (JSON string vs dict)
-            if "deepseek" in self.basemodel.lower():
+            if self.mock_llm is not None:
+                self.model = ScriptedChatModel.from_config(self.mock_llm)
+                print(f"🧪 Using scripted mock model (policy: {self.model.policy})")
+            elif "deepseek" in self.basemodel.lower():
                 self.model = DeepSeekChatOpenAI(
                     model=self.basemodel,
                     base_url=self.openai_base_url,
@@ -315,28 +350,50 @@ class BaseAgentAStock:
 
     def _setup_logging(self, today_date: str) -> str:
         """Set up log file path"""
-        log_path = os.path.join(self.base_log_path, self.signature, "log", today_date)
-        if not os.path.exists(log_path):
-            os.makedirs(log_path)
-        return os.path.join(log_path, "log.jsonl")
+        self._current_log_file = self.session_logger.setup(today_date)
+        return self._current_log_file
 
+    @traced("_log_message")
     def _log_message(self, log_file: str, new_messages: List[Dict[str, str]]) -> None:
-        """Log messages to log file"""
-        log_entry = {"timestamp": datetime.now().isoformat(), "signature": self.signature, "new_messages": new_messages}
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        """Queue messages for the buffered session logger"""
+        self.session_logger.log(log_file, new_messages)
 
+    def _format_tool_results(self, tool_msgs: List[Any]) -> str:
+        """Join a step's tool outputs under the tool output budget and log the compression ratio"""
+        tool_response, stats = self.tool_budget.compact_messages(tool_msgs)
+        if self.tool_budget.enabled and self._current_log_file and stats["raw_chars"]:
+            self.session_logger.log_event(self._current_log_file, "tool_output_budget", stats)
+        return tool_response
+
+    @traced("_ainvoke_with_retry")
     async def _ainvoke_with_retry(self, message: List[Dict[str, str]]) -> Any:
-        """Agent invocation with retry"""
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                return await self.agent.ainvoke({"messages": message}, {"recursion_limit": 100})
-            except Exception as e:
-                if attempt == self.max_retries:
-                    raise e
-                print(f"⚠️ Attempt {attempt} failed, retrying after {self.base_delay * attempt} seconds...")
-                print(f"Error details: {e}")
-                await asyncio.sleep(self.base_delay * attempt)
+        """Agent invocation with rate limiting, jittered exponential backoff and circuit breaking"""
+        if not self.streaming:
+            return await self.rate_limiter.call(
+                lambda: self.agent.ainvoke({"messages": message}, {"recursion_limit": 100}),
+                max_retries=self.max_retries,
+                base_delay=self.base_delay,
+                guarded=not self._rate_limit_middleware and self.mock_llm is None,
+            )
+
+        response, stats = await self.rate_limiter.call(
+            lambda: astream_agent(
+                self.agent,
+                {"messages": message},
+                {"recursion_limit": 100},
+                STOP_SIGNAL,
+                on_token=None,
+            ),
+            max_retries=self.max_retries,
+            base_delay=self.base_delay,
+            guarded=not self._rate_limit_middleware and self.mock_llm is None,
+        )
+        # Record time-to-first-token and throughput per model call
+        if self._current_log_file and stats:
+            self.session_logger.log_event(
+                self._current_log_file, "llm_stream_metrics", {"model": self.basemodel, "calls": stats}
+            )
+        return response
 
     async def run_trading_session(self, today_date: str) -> None:
         """
@@ -350,24 +407,38 @@ class BaseAgentAStock:
         # Set up logging
         log_file = self._setup_logging(today_date)
 
+        # Attribute this session's spans to the model and market
+        set_trace_context(model=self.basemodel, signature=self.signature, market=self.market, session=today_date)
+
         # Update system prompt - 使用A股专用提示词
         self.agent = create_agent(
             self.model,
             tools=self.tools,
+            middleware=self._rate_limit_middleware + build_tracing_middleware(),
             system_prompt=get_agent_system_prompt_astock(today_date, self.signature, self.stock_symbols),
         )
 
         # Initial user query
         user_query = [{"role": "user", "content": f"请分析并更新今日（{today_date}）的持仓。"}]
         message = user_query.copy()
+        current_step = 0
 
-        # Log initial message
-        self._log_message(log_file, user_query)
+        # Resume from the last completed step if a previous attempt failed mid-session
+        checkpoint = SessionCheckpoint(self.base_log_path, self.signature, today_date)
+        self.tool_budget.reset()
+        state = checkpoint.restore(self.position_file)
+        if state is not None:
+            message = state["messages"]
+            current_step = state["step"]
+        else:
+            # Log initial message
+            self._log_message(log_file, user_query)
+            checkpoint.commit(0, message, self.position_file)
 
         # Trading loop
-        current_step = 0
         while current_step < self.max_steps:
             current_step += 1
+            checkpoint.begin_step(current_step)
             print(f"🔄 Step {current_step}/{self.max_steps}")
 
             try:
@@ -386,7 +457,7 @@ class BaseAgentAStock:
 
                 # Extract tool messages
                 tool_msgs = extract_tool_messages(response)
-                tool_response = "\n".join([msg.content for msg in tool_msgs])
+                tool_response = self._format_tool_results(tool_msgs)
 
                 # Prepare new messages
                 new_messages = [
@@ -401,13 +472,22 @@ class BaseAgentAStock:
                 self._log_message(log_file, new_messages[0])
                 self._log_message(log_file, new_messages[1])
 
+                # Checkpoint the completed step
+                checkpoint.commit(current_step, message, self.position_file)
+
             except Exception as e:
                 print(f"❌ Trading session error: {str(e)}")
                 print(f"Error details: {e}")
+                await asyncio.to_thread(self.session_logger.end_session, log_file)
                 raise
 
+        # Flush session log
+        await asyncio.to_thread(self.session_logger.end_session, log_file)
+        self.rate_limiter.export_metrics(os.path.join(self.data_path, "metrics", "llm_calls.jsonl"), session=today_date)
+
         # Handle trading results
         await self._handle_trading_result(today_date)
+        checkpoint.clear()
 
     async def _handle_trading_result(self, today_date: str) -> None:
         """Handle trading results"""
@@ -455,8 +535,10 @@ class BaseAgentAStock:
                     # Fallback: keep original if unexpected
                     pass
 
+        init_record = {"date": init_date_str, "id": 0, "positions": init_position}
         with open(self.position_file, "w") as f:  # Use "w" mode to ensure creating new file
-            f.write(json.dumps({"date": init_date_str, "id": 0, "positions": init_position}) + "\n")
+            f.write(json.dumps(init_record) + "\n")
+        start_portfolio_series(self.position_file, init_record)
 
         print(f"✅ A-shares agent {self.signature} registration completed")
         print(f"📁 Position file: {self.position_file}")
@@ -517,7 +599,7 @@ class BaseAgentAStock:
         return trading_dates
 
     async def run_with_retry(self, today_date: str) -> None:
-        """Run method with retry"""
+        """Run method with retry, resuming from the session's last checkpointed step"""
         for attempt in range(1, self.max_retries + 1):
             try:
                 print(f"🔄 Attempting to run {self.signature} - {today_date} (Attempt {attempt})")
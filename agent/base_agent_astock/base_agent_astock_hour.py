@@ -34,6 +34,8 @@ from prompts.agent_prompt_astock import STOP_SIGNAL, get_agent_system_prompt_ast
 from tools.general_tools import (extract_conversation, extract_tool_messages,
                                  get_config_value, write_config_value)
 from tools.price_tools import add_no_trade_record
+from tools.session_checkpoint import SessionCheckpoint
+from tools.tracing import build_tracing_middleware, set_trace_context
 
 # Load environment variables
 load_dotenv()
@@ -267,24 +269,38 @@ class BaseAgentAStock_Hour(BaseAgentAStock):
         log_file = self._setup_logging(today_date)
         write_config_value("LOG_FILE", log_file)
 
+        # Attribute this session's spans to the model and market
+        set_trace_context(model=self.basemodel, signature=self.signature, market=self.market, session=today_date)
+
         # Update system prompt - use A-shares specific prompt
         self.agent = create_agent(
             self.model,
             tools=self.tools,
+            middleware=self._rate_limit_middleware + build_tracing_middleware(),
             system_prompt=get_agent_system_prompt_astock(today_date, self.signature, self.stock_symbols),
         )
 
         # Initial user query in Chinese
         user_query = [{"role": "user", "content": f"请分析并更新今日（{today_date}）的持仓。"}]
         message = user_query.copy()
+        current_step = 0
 
-        # Log initial message
-        self._log_message(log_file, user_query)
+        # Resume from the last completed step if a previous attempt failed mid-session
+        checkpoint = SessionCheckpoint(self.base_log_path, self.signature, today_date)
+        self.tool_budget.reset()
+        state = checkpoint.restore(self.position_file)
+        if state is not None:
+            message = state["messages"]
+            current_step = state["step"]
+        else:
+            # Log initial message
+            self._log_message(log_file, user_query)
+            checkpoint.commit(0, message, self.position_file)
 
         # Trading loop
-        current_step = 0
         while current_step < self.max_steps:
             current_step += 1
+            checkpoint.begin_step(current_step)
             print(f"🔄 Step {current_step}/{self.max_steps}")
 
             try:
@@ -303,7 +319,7 @@ class BaseAgentAStock_Hour(BaseAgentAStock):
 
                 # Extract tool messages with None check (enhanced error handling)
                 tool_msgs = extract_tool_messages(response)
-                tool_response = "\n".join([msg.content for msg in tool_msgs if msg.content is not None])
+                tool_response = self._format_tool_results(tool_msgs)
 
                 # Prepare new messages
                 new_messages = [
@@ -318,13 +334,22 @@ class BaseAgentAStock_Hour(BaseAgentAStock):
                 self._log_message(log_file, new_messages[0])
                 self._log_message(log_file, new_messages[1])
 
+                # Checkpoint the completed step
+                checkpoint.commit(current_step, message, self.position_file)
+
             except Exception as e:
                 print(f"❌ Trading session error: {str(e)}")
                 print(f"Error details: {e}")
+                await asyncio.to_thread(self.session_logger.end_session, log_file)
                 raise
 
+        # Flush session log
+        await asyncio.to_thread(self.session_logger.end_session, log_file)
+        self.rate_limiter.export_metrics(os.path.join(self.data_path, "metrics", "llm_calls.jsonl"), session=today_date)
+
         # Handle trading results
         await self._handle_trading_result(today_date)
+        checkpoint.clear()
 
     def _is_valid_astock_trading_time(self, timestamp: str) -> bool:
         """
@@ -13,6 +13,7 @@ from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -220,6 +221,7 @@ mcp = FastMCP("Search")
 
 
 @mcp.tool()
+@traced("mcp.server.get_market_news")
 def get_market_news(
     query: str,
     tickers: Optional[str] = None,
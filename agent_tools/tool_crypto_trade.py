@@ -13,10 +13,13 @@ sys.path.insert(0, project_root)
 import json
 
 from tools.general_tools import get_config_value, write_config_value
+from tools.tracing import traced
+from tools.portfolio_series import safe_append_portfolio_value
 from tools.price_tools import (get_latest_position, get_open_prices,
-                               get_yesterday_date,
+                               get_position_file_path, get_yesterday_date,
                                get_yesterday_open_and_close_price,
                                get_yesterday_profit)
+from tools.session_checkpoint import find_trade_by_key, trade_idempotency_key
 
 mcp = FastMCP("CryptoTradeTools")
 
@@ -42,6 +45,7 @@ def _position_lock(signature: str):
 
 
 @mcp.tool()
+@traced("mcp.server.buy_crypto")
 def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     """
     Buy cryptocurrency function
@@ -104,6 +108,12 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     # This ID is used to ensure each operation has a unique identifier
     # Acquire lock for atomic read-modify-write on positions
     with _position_lock(signature):
+        # Idempotency: the same order retried within a session step returns the recorded trade
+        position_file_path = get_position_file_path(signature)
+        idempotency_key = trade_idempotency_key("buy_crypto", symbol, amount)
+        previous = find_trade_by_key(position_file_path, idempotency_key)
+        if previous is not None:
+            return previous.get("positions", {})
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
@@ -155,10 +165,6 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
             # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
             # Use append mode ("a") to write new transaction record
             # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-            log_path = get_config_value("LOG_PATH", "./data/agent_data")
-            if log_path.startswith("./data/"):
-                log_path = log_path[7:]  # Remove "./data/" prefix
-            position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
             with open(position_file_path, "a") as f:
                 # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
                 print(
@@ -170,11 +176,14 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
                             "date": today_date,
                             "id": current_action_id + 1,
                             "this_action": {"action": "buy_crypto", "symbol": symbol, "amount": amount},
+                            **({"idempotency_key": idempotency_key} if idempotency_key else {}),
                             "positions": new_position,
                         }
                     )
                     + "\n"
                 )
+            # Mark the new position to market in the agent's portfolio-value series
+            safe_append_portfolio_value(position_file_path, {"date": today_date, "positions": new_position}, market)
             # Step 7: Return updated position
             write_config_value("IF_TRADE", True)
             print("IF_TRADE", get_config_value("IF_TRADE"))
@@ -183,6 +192,7 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
 
 
 @mcp.tool()
+@traced("mcp.server.sell_crypto")
 def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     """
     Sell cryptocurrency function
@@ -244,6 +254,12 @@ def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     # get_latest_position returns two values: position dictionary and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
     with _position_lock(signature):
+        # Idempotency: the same order retried within a session step returns the recorded trade
+        position_file_path = get_position_file_path(signature)
+        idempotency_key = trade_idempotency_key("sell_crypto", symbol, amount)
+        previous = find_trade_by_key(position_file_path, idempotency_key)
+        if previous is not None:
+            return previous.get("positions", {})
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
@@ -299,10 +315,6 @@ def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
         # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
         # Use append mode ("a") to write new transaction record
         # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-        log_path = get_config_value("LOG_PATH", "./data/agent_data")
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
         with open(position_file_path, "a") as f:
             # Write JSON format transaction record, containing date, operation ID and updated position
             print(
@@ -314,12 +326,15 @@ def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
                         "date": today_date,
                         "id": current_action_id + 1,
                         "this_action": {"action": "sell_crypto", "symbol": symbol, "amount": amount},
+                        **({"idempotency_key": idempotency_key} if idempotency_key else {}),
                         "positions": new_position,
                     }
                 )
                 + "\n"
             )
 
+        # Mark the new position to market in the agent's portfolio-value series
+        safe_append_portfolio_value(position_file_path, {"date": today_date, "positions": new_position}, market)
         # Step 7: Return updated position
         write_config_value("IF_TRADE", True)
     
@@ -21,6 +21,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 
 
 def _workspace_data_path(filename: str, symbol: Optional[str] = None) -> Path:
@@ -63,6 +64,7 @@ def _validate_date_hourly(date_str: str) -> None:
         raise ValueError("date must be in YYYY-MM-DD HH:MM:SS format") from exc
 
 @mcp.tool()
+@traced("mcp.server.get_price_local")
 def get_price_local(symbol: str, date: str) -> Dict[str, Any]:
     """Read OHLCV data for specified stock and date. Get historical information for specified stock.
     
@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -214,6 +215,7 @@ mcp = FastMCP("Search")
 
 
 @mcp.tool()
+@traced("mcp.server.get_information")
 def get_information(query: str) -> str:
     """
     Use search tool to scrape and return main content information related to specified query in a structured way.
@@ -6,12 +6,14 @@ from fastmcp import FastMCP
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 load_dotenv()
 
 mcp = FastMCP("Math")
 
 
 @mcp.tool()
+@traced("mcp.server.add")
 def add(a: float, b: float) -> float:
     """Add two numbers (supports int and float)"""
     # log_file = get_config_value("LOG_FILE")
@@ -26,6 +28,7 @@ def add(a: float, b: float) -> float:
 
 
 @mcp.tool()
+@traced("mcp.server.multiply")
 def multiply(a: float, b: float) -> float:
     """Multiply two numbers (supports int and float)"""
     # log_file = get_config_value("LOG_FILE")
@@ -13,10 +13,13 @@ sys.path.insert(0, project_root)
 import json
 
 from tools.general_tools import get_config_value, write_config_value
+from tools.tracing import traced
+from tools.portfolio_series import safe_append_portfolio_value
 from tools.price_tools import (get_latest_position, get_open_prices,
-                               get_yesterday_date,
+                               get_position_file_path, get_yesterday_date,
                                get_yesterday_open_and_close_price,
                                get_yesterday_profit)
+from tools.session_checkpoint import find_trade_by_key, trade_idempotency_key
 
 mcp = FastMCP("TradeTools")
 
@@ -54,6 +57,7 @@ def _position_lock(signature: str):
 
 
 @mcp.tool()
+@traced("mcp.server.buy")
 def buy(symbol: str, amount: int) -> Dict[str, Any]:
     """
     Buy stock function
@@ -130,99 +134,104 @@ def buy(symbol: str, amount: int) -> Dict[str, Any]:
     # Step 2: Get current latest position and operation ID
     # get_latest_position returns two values: position dictionary and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    # Acquire lock for atomic read-modify-write on positions
+    # Acquire lock for atomic read-modify-write on positions (held until the trade is recorded)
     with _position_lock(signature):
+        # Idempotency: the same order retried within a session step returns the recorded trade
+        position_file_path = get_position_file_path(signature)
+        idempotency_key = trade_idempotency_key("buy", symbol, amount)
+        previous = find_trade_by_key(position_file_path, idempotency_key)
+        if previous is not None:
+            return previous.get("positions", {})
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
             print(e)
             print(today_date, signature)
             return {"error": f"Failed to load latest position: {e}", "symbol": symbol, "date": today_date}
-    # Step 3: Get stock opening price for the day
-    # Use get_open_prices function to get the opening price of specified stock for the day
-    # If stock symbol does not exist or price data is missing, KeyError exception will be raised
-    try:
-        this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
-    except KeyError:
-        # Stock symbol does not exist or price data is missing, return error message
-        return {
-            "error": f"Symbol {symbol} not found! This action will not be allowed.",
-            "symbol": symbol,
-            "date": today_date,
-        }
-    # Validate price availability (e.g., timestamp not present in dataset yet)
-    if this_symbol_price is None:
-        return {
-            "error": f"Price data not available for {symbol} at {today_date}.",
-            "symbol": symbol,
-            "date": today_date,
-            "market": market,
-        }
-
-    # Step 4: Validate buy conditions
-    # Calculate cash required for purchase: stock price × buy quantity
-    try:
-        cash_left = current_position["CASH"] - this_symbol_price * amount
-    except Exception as e:
-        # Defensive: if any unexpected structure, surface a clear error
-        return {
-            "error": f"Failed to compute cash after purchase: {e}",
-            "symbol": symbol,
-            "date": today_date,
-            "price": this_symbol_price,
-            "amount": amount,
-            "position_keys": list(current_position.keys()),
-        }
-
-    # Check if cash balance is sufficient for purchase
-    if cash_left < 0:
-        # Insufficient cash, return error message
-        return {
-            "error": "Insufficient cash! This action will not be allowed.",
-            "required_cash": this_symbol_price * amount,
-            "cash_available": current_position.get("CASH", 0),
-            "symbol": symbol,
-            "date": today_date,
-        }
-    else:
-        # Step 5: Execute buy operation, update position
-        # Create a copy of current position to avoid directly modifying original data
-        new_position = current_position.copy()
-
-        # Decrease cash balance
-        new_position["CASH"] = cash_left
-
-        # Increase stock position quantity
-        new_position[symbol] = new_position.get(symbol, 0) + amount
-
-        # Step 6: Record transaction to position.jsonl file
-        # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-        # Use append mode ("a") to write new transaction record
-        # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-        log_path = get_config_value("LOG_PATH", "./data/agent_data")
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-        with open(position_file_path, "a") as f:
-            # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
-            print(
-                f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'buy','symbol':symbol,'amount':amount},'positions': new_position})}"
-            )
-            f.write(
-                json.dumps(
-                    {
-                        "date": today_date,
-                        "id": current_action_id + 1,
-                        "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
-                        "positions": new_position,
-                    }
+        # Step 3: Get stock opening price for the day
+        # Use get_open_prices function to get the opening price of specified stock for the day
+        # If stock symbol does not exist or price data is missing, KeyError exception will be raised
+        try:
+            this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
+        except KeyError:
+            # Stock symbol does not exist or price data is missing, return error message
+            return {
+                "error": f"Symbol {symbol} not found! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+        # Validate price availability (e.g., timestamp not present in dataset yet)
+        if this_symbol_price is None:
+            return {
+                "error": f"Price data not available for {symbol} at {today_date}.",
+                "symbol": symbol,
+                "date": today_date,
+                "market": market,
+            }
+
+        # Step 4: Validate buy conditions
+        # Calculate cash required for purchase: stock price × buy quantity
+        try:
+            cash_left = current_position["CASH"] - this_symbol_price * amount
+        except Exception as e:
+            # Defensive: if any unexpected structure, surface a clear error
+            return {
+                "error": f"Failed to compute cash after purchase: {e}",
+                "symbol": symbol,
+                "date": today_date,
+                "price": this_symbol_price,
+                "amount": amount,
+                "position_keys": list(current_position.keys()),
+            }
+
+        # Check if cash balance is sufficient for purchase
+        if cash_left < 0:
+            # Insufficient cash, return error message
+            return {
+                "error": "Insufficient cash! This action will not be allowed.",
+                "required_cash": this_symbol_price * amount,
+                "cash_available": current_position.get("CASH", 0),
+                "symbol": symbol,
+                "date": today_date,
+            }
+        else:
+            # Step 5: Execute buy operation, update position
+            # Create a copy of current position to avoid directly modifying original data
+            new_position = current_position.copy()
+
+            # Decrease cash balance
+            new_position["CASH"] = cash_left
+
+            # Increase stock position quantity
+            new_position[symbol] = new_position.get(symbol, 0) + amount
+
+            # Step 6: Record transaction to position.jsonl file
+            # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
+            # Use append mode ("a") to write new transaction record
+            # Each operation ID increments by 1, ensuring uniqueness of operation sequence
+            with open(position_file_path, "a") as f:
+                # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
+                print(
+                    f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'buy','symbol':symbol,'amount':amount},'positions': new_position})}"
                 )
-                + "\n"
-            )
-        # Step 7: Return updated position
-        write_config_value("IF_TRADE", True)
-        print("IF_TRADE", get_config_value("IF_TRADE"))
-        return new_position
+                f.write(
+                    json.dumps(
+                        {
+                            "date": today_date,
+                            "id": current_action_id + 1,
+                            "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
+                            **({"idempotency_key": idempotency_key} if idempotency_key else {}),
+                            "positions": new_position,
+                        }
+                    )
+                    + "\n"
+                )
+            # Mark the new position to market in the agent's portfolio-value series
+            safe_append_portfolio_value(position_file_path, {"date": today_date, "positions": new_position}, market)
+            # Step 7: Return updated position
+            write_config_value("IF_TRADE", True)
+            print("IF_TRADE", get_config_value("IF_TRADE"))
+            return new_position
 
 
 def _get_today_buy_amount(symbol: str, today_date: str, signature: str) -> int:
@@ -237,10 +246,7 @@ def _get_today_buy_amount(symbol: str, today_date: str, signature: str) -> int:
     Returns:
         Total shares bought today
     """
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
+    position_file_path = get_position_file_path(signature)
 
     if not os.path.exists(position_file_path):
         return 0
@@ -263,6 +269,7 @@ def _get_today_buy_amount(symbol: str, today_date: str, signature: str) -> int:
 
 
 @mcp.tool()
+@traced("mcp.server.sell")
 def sell(symbol: str, amount: int) -> Dict[str, Any]:
     """
     Sell stock function
@@ -340,96 +347,104 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
     # Step 2: Get current latest position and operation ID
     # get_latest_position returns two values: position dictionary and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    current_position, current_action_id = get_latest_position(today_date, signature)
+    # Acquire lock for atomic read-modify-write on positions (held until the trade is recorded)
+    with _position_lock(signature):
+        # Idempotency: the same order retried within a session step returns the recorded trade
+        position_file_path = get_position_file_path(signature)
+        idempotency_key = trade_idempotency_key("sell", symbol, amount)
+        previous = find_trade_by_key(position_file_path, idempotency_key)
+        if previous is not None:
+            return previous.get("positions", {})
+
+        current_position, current_action_id = get_latest_position(today_date, signature)
+
+        # Step 3: Get stock opening price for the day
+        # Use get_open_prices function to get the opening price of specified stock for the day
+        # If stock symbol does not exist or price data is missing, KeyError exception will be raised
+        try:
+            this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
+        except KeyError:
+            # Stock symbol does not exist or price data is missing, return error message
+            return {
+                "error": f"Symbol {symbol} not found! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # Step 4: Validate sell conditions
+        # Check if holding this stock
+        if symbol not in current_position:
+            return {
+                "error": f"No position for {symbol}! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # Check if position quantity is sufficient for selling
+        if current_position[symbol] < amount:
+            return {
+                "error": "Insufficient shares! This action will not be allowed.",
+                "have": current_position.get(symbol, 0),
+                "want_to_sell": amount,
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
+        if market == "cn":
+            bought_today = _get_today_buy_amount(symbol, today_date, signature)
+            if bought_today > 0:
+                # Calculate sellable quantity (total position - bought today)
+                sellable_amount = current_position[symbol] - bought_today
+                if amount > sellable_amount:
+                    return {
+                        "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow.",
+                        "symbol": symbol,
+                        "total_position": current_position[symbol],
+                        "bought_today": bought_today,
+                        "sellable_today": max(0, sellable_amount),
+                        "want_to_sell": amount,
+                        "date": today_date,
+                    }
 
-    # Step 3: Get stock opening price for the day
-    # Use get_open_prices function to get the opening price of specified stock for the day
-    # If stock symbol does not exist or price data is missing, KeyError exception will be raised
-    try:
-        this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
-    except KeyError:
-        # Stock symbol does not exist or price data is missing, return error message
-        return {
-            "error": f"Symbol {symbol} not found! This action will not be allowed.",
-            "symbol": symbol,
-            "date": today_date,
-        }
+        # Step 5: Execute sell operation, update position
+        # Create a copy of current position to avoid directly modifying original data
+        new_position = current_position.copy()
 
-    # Step 4: Validate sell conditions
-    # Check if holding this stock
-    if symbol not in current_position:
-        return {
-            "error": f"No position for {symbol}! This action will not be allowed.",
-            "symbol": symbol,
-            "date": today_date,
-        }
+        # Decrease stock position quantity
+        new_position[symbol] -= amount
 
-    # Check if position quantity is sufficient for selling
-    if current_position[symbol] < amount:
-        return {
-            "error": "Insufficient shares! This action will not be allowed.",
-            "have": current_position.get(symbol, 0),
-            "want_to_sell": amount,
-            "symbol": symbol,
-            "date": today_date,
-        }
+        # Increase cash balance: sell price × sell quantity
+        # Use get method to ensure CASH field exists, default to 0 if not present
+        new_position["CASH"] = new_position.get("CASH", 0) + this_symbol_price * amount
 
-    # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
-    if market == "cn":
-        bought_today = _get_today_buy_amount(symbol, today_date, signature)
-        if bought_today > 0:
-            # Calculate sellable quantity (total position - bought today)
-            sellable_amount = current_position[symbol] - bought_today
-            if amount > sellable_amount:
-                return {
-                    "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow.",
-                    "symbol": symbol,
-                    "total_position": current_position[symbol],
-                    "bought_today": bought_today,
-                    "sellable_today": max(0, sellable_amount),
-                    "want_to_sell": amount,
-                    "date": today_date,
-                }
-
-    # Step 5: Execute sell operation, update position
-    # Create a copy of current position to avoid directly modifying original data
-    new_position = current_position.copy()
-
-    # Decrease stock position quantity
-    new_position[symbol] -= amount
-
-    # Increase cash balance: sell price × sell quantity
-    # Use get method to ensure CASH field exists, default to 0 if not present
-    new_position["CASH"] = new_position.get("CASH", 0) + this_symbol_price * amount
-
-    # Step 6: Record transaction to position.jsonl file
-    # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-    # Use append mode ("a") to write new transaction record
-    # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-    with open(position_file_path, "a") as f:
-        # Write JSON format transaction record, containing date, operation ID and updated position
-        print(
-            f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'sell','symbol':symbol,'amount':amount},'positions': new_position})}"
-        )
-        f.write(
-            json.dumps(
-                {
-                    "date": today_date,
-                    "id": current_action_id + 1,
-                    "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
-                    "positions": new_position,
-                }
+        # Step 6: Record transaction to position.jsonl file
+        # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
+        # Use append mode ("a") to write new transaction record
+        # Each operation ID increments by 1, ensuring uniqueness of operation sequence
+        with open(position_file_path, "a") as f:
+            # Write JSON format transaction record, containing date, operation ID and updated position
+            print(
+                f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'sell','symbol':symbol,'amount':amount},'positions': new_position})}"
+            )
+            f.write(
+                json.dumps(
+                    {
+                        "date": today_date,
+                        "id": current_action_id + 1,
+                        "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
+                        **({"idempotency_key": idempotency_key} if idempotency_key else {}),
+                        "positions": new_position,
+                    }
+                )
+                + "\n"
             )
-            + "\n"
-        )
 
-    # Step 7: Return updated position
-    write_config_value("IF_TRADE", True)
-    return new_position
+        # Mark the new position to market in the agent's portfolio-value series
+        safe_append_portfolio_value(position_file_path, {"date": today_date, "positions": new_position}, market)
+        # Step 7: Return updated position
+        write_config_value("IF_TRADE", True)
+        return new_position
 
 
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for price tools, trade tools, metrics and the frontend cache
+
+Generates a deterministic synthetic dataset (see synthetic_data.py), points the
+runtime config at it and times every target over several repeats. Results are
+written as JSON so runs from different commits can be compared.
+
+Targets:
+    get_open_prices, get_yesterday_date, get_latest_position (same day / previous day),
+    buy, sell, calculate_portfolio_values, calculate_rolling_metrics,
+    precompute_frontend_cache (end-to-end, US and merged markets)
+
+Usage:
+    python benchmarks/run_benchmarks.py --symbols 100 --bars 500 --ledger 1000
+    python benchmarks/run_benchmarks.py --symbols 500 --bars 3000 --ledger 10000 --output results/big.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/before.json --output benchmarks/results/after.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from benchmarks.synthetic_data import generate_dataset, make_timestamps
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, timeout=10
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def time_call(
+    fn: Callable[[], Any],
+    repeat: int,
+    setup: Optional[Callable[[], None]] = None,
+    check: Optional[Callable[[Any], Optional[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Time fn over `repeat` runs (setup runs untimed before each run)
+
+    Returns:
+        {"runs", "min", "median", "mean", "max"} in seconds, plus "error" if check() rejected a result
+    """
+    samples: List[float] = []
+    error = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - start)
+        if check is not None and error is None:
+            error = check(result)
+    stats: Dict[str, Any] = {
+        "runs": len(samples),
+        "min": round(min(samples), 6),
+        "median": round(statistics.median(samples), 6),
+        "mean": round(statistics.mean(samples), 6),
+        "max": round(max(samples), 6),
+    }
+    if error:
+        stats["error"] = error
+    return stats
+
+
+@contextlib.contextmanager
+def redirect_merged_file(merged_file: str):
+    """Make price_tools resolve merged.jsonl to the synthetic file for every market"""
+    import tools.price_tools as price_tools
+
+    original = price_tools.get_merged_file_path
+    price_tools.get_merged_file_path = lambda market="us": Path(merged_file)
+    try:
+        yield
+    finally:
+        price_tools.get_merged_file_path = original
+
+
+def _trade_error(result: Any) -> Optional[str]:
+    if isinstance(result, dict) and "error" in result:
+        return str(result["error"])
+    return None
+
+
+def bench_price_tools(dataset: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    from tools.price_tools import get_latest_position, get_open_prices, get_yesterday_date
+
+    symbols = dataset["symbols"]
+    timestamps = dataset["timestamps"]
+    merged_file = dataset["merged_file"]
+    today = timestamps[-1]
+    # The bar after the dataset has no ledger records, which forces the previous-day fallback path
+    after_last = make_timestamps(len(timestamps) + 1, dataset["granularity"])[-1]
+
+    return {
+        "get_open_prices": time_call(lambda: get_open_prices(today, symbols, merged_path=merged_file), repeat),
+        "get_yesterday_date": time_call(lambda: get_yesterday_date(today, merged_path=merged_file), repeat),
+        "get_latest_position[same_day]": time_call(
+            lambda: get_latest_position(today, dataset["signature"]), repeat
+        ),
+        "get_latest_position[previous_day]": time_call(
+            lambda: get_latest_position(after_last, dataset["signature"]), repeat
+        ),
+    }
+
+
+def bench_trade_tools(dataset: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    from agent_tools.tool_trade import buy, sell
+
+    buy_fn = getattr(buy, "fn", buy)  # FastMCP wraps tools; .fn is the plain function
+    sell_fn = getattr(sell, "fn", sell)
+    position_file = dataset["position_file"]
+    snapshot = position_file + ".orig"
+    shutil.copyfile(position_file, snapshot)
+    symbol = dataset["symbols"][0]
+
+    def restore() -> None:
+        shutil.copyfile(snapshot, position_file)
+
+    def restore_and_buy() -> None:
+        restore()
+        with contextlib.redirect_stdout(io.StringIO()):
+            buy_fn(symbol, 1)
+
+    try:
+        return {
+            "buy": time_call(lambda: buy_fn(symbol, 1), repeat, setup=restore, check=_trade_error),
+            "sell": time_call(lambda: sell_fn(symbol, 1), repeat, setup=restore_and_buy, check=_trade_error),
+        }
+    finally:
+        restore()
+        os.remove(snapshot)
+
+
+def bench_metrics(dataset: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    from tools.calculate_metrics import calculate_portfolio_values, load_all_price_files, load_position_data
+
+    positions = load_position_data(dataset["position_file"])
+    price_data = load_all_price_files(dataset["data_dir"])
+    results = {
+        "calculate_portfolio_values": time_call(
+            lambda: calculate_portfolio_values(positions, price_data, verbose=False), repeat
+        ),
+    }
+
+    try:
+        from tools.plot_metrics import calculate_rolling_metrics
+    except ImportError as e:
+        results["calculate_rolling_metrics"] = {"skipped": f"import failed: {e}"}
+        return results
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        portfolio = calculate_portfolio_values(positions, price_data, verbose=False)
+    is_hourly = dataset["granularity"] == "hourly"
+    results["calculate_rolling_metrics"] = time_call(
+        lambda: calculate_rolling_metrics(portfolio.copy(), is_hourly=is_hourly), repeat
+    )
+    return results
+
+
+def bench_frontend_cache(dataset: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    """Run scripts/precompute_frontend_cache.py end-to-end against the synthetic docs/ tree"""
+    root = Path(dataset["root"])
+    scripts_dir = root / "scripts"
+    scripts_dir.mkdir(exist_ok=True)
+    # The script resolves docs/ relative to its own location, so run a copy inside the synthetic tree
+    script = scripts_dir / "precompute_frontend_cache.py"
+    shutil.copyfile(project_root / "scripts" / "precompute_frontend_cache.py", script)
+
+    spec = importlib.util.spec_from_file_location("bench_precompute_frontend_cache", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    def check(_: Any) -> Optional[str]:
+        for market in ("us", "cn"):
+            if not (root / "docs" / "data" / "cache" / market / "manifest.json").exists():
+                return f"cache/{market}/manifest.json was not written"
+        return None
+
+    return {"precompute_frontend_cache": time_call(module.main, repeat, check=check)}
+
+
+BENCHMARKS = {
+    "price_tools": bench_price_tools,
+    "trade_tools": bench_trade_tools,
+    "metrics": bench_metrics,
+    "frontend_cache": bench_frontend_cache,
+}
+
+
+def configure_runtime(dataset: Dict[str, Any], runtime_env_path: str) -> None:
+    """Point the runtime config (LOG_PATH, SIGNATURE, TODAY_DATE, MARKET) at the synthetic dataset"""
+    os.environ["RUNTIME_ENV_PATH"] = runtime_env_path
+    from tools.general_tools import write_config_value
+
+    write_config_value("LOG_PATH", dataset["log_path"])
+    write_config_value("SIGNATURE", dataset["signature"])
+    write_config_value("TODAY_DATE", dataset["timestamps"][-1])
+    write_config_value("MARKET", "us")
+    write_config_value("IF_TRADE", False)
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    work_dir = args.data_dir or tempfile.mkdtemp(prefix="ai_trader_bench_")
+    print(f"🧪 Generating synthetic dataset in {work_dir} ...")
+    start = time.perf_counter()
+    dataset = generate_dataset(
+        work_dir, args.symbols, args.bars, args.ledger, args.granularity, seed=args.seed
+    )
+    generate_time = time.perf_counter() - start
+    print(f"✅ Dataset ready in {generate_time:.2f}s")
+
+    results: Dict[str, Any] = {}
+    try:
+        configure_runtime(dataset, os.path.join(dataset["root"], ".runtime_env.json"))
+        selected = args.only.split(",") if args.only else list(BENCHMARKS)
+        with redirect_merged_file(dataset["merged_file"]):
+            for name in selected:
+                print(f"⏱️  Running {name} ...")
+                try:
+                    results.update(BENCHMARKS[name](dataset, args.repeat))
+                except ImportError as e:
+                    # Optional dependencies (numpy/pandas/fastmcp, ...) missing in this environment
+                    results[name] = {"skipped": f"import failed: {e}"}
+                    print(f"⚠️  Skipping {name}: {e}")
+    finally:
+        if not args.data_dir and not args.keep_data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "symbols": args.symbols,
+                "bars": args.bars,
+                "ledger": args.ledger,
+                "granularity": args.granularity,
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "generate_seconds": round(generate_time, 4),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print median timings of the current run against a baseline result file"""
+    if current["meta"]["params"] != baseline["meta"]["params"]:
+        print("⚠️  Baseline was recorded with different parameters; ratios are not comparable")
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name, {})
+        if "median" not in stats or "median" not in base:
+            continue
+        ratio = stats["median"] / base["median"] if base["median"] else float("inf")
+        print(f"{name:<40} {base['median']:>12.6f} {stats['median']:>12.6f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI-Trader benchmark suite")
+    parser.add_argument("--symbols", type=int, default=100, help="Number of symbols")
+    parser.add_argument("--bars", type=int, default=500, help="Bars per symbol")
+    parser.add_argument("--ledger", type=int, default=1000, help="position.jsonl records")
+    parser.add_argument("--granularity", choices=["hourly", "daily"], default="hourly")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--data-dir", help="Generate the dataset here instead of a temp dir (kept afterwards)")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the temporary dataset")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    print("\n📊 Results (seconds, median of runs):")
+    for name, stats in report["results"].items():
+        if "median" in stats:
+            suffix = f"  ❌ {stats['error']}" if "error" in stats else ""
+            print(f"  {name:<40} {stats['median']:.6f}{suffix}")
+        else:
+            print(f"  {name:<40} skipped ({stats.get('skipped')})")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
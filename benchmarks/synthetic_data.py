@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic market generator for the benchmark suite
+
+Writes a self-contained project-shaped tree in the exact schemas the code reads:
+
+    {root}/docs/config.yaml                              frontend config (markets "us" and "cn")
+    {root}/docs/data/merged.jsonl                        one AlphaVantage-style document per symbol
+    {root}/docs/data/daily_prices_{SYMBOL}.json          per-symbol price files
+    {root}/docs/data/Adaily_prices_QQQ.json              benchmark index
+    {root}/docs/data/agent_data/{signature}/position/position.jsonl
+
+Sizes are configurable (symbols x bars x ledger length) and the same seed
+always produces byte-identical files, so timings are comparable across commits.
+
+Usage:
+    python benchmarks/synthetic_data.py --out /tmp/ai_trader_bench --symbols 500 --bars 2000 --ledger 5000
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+# US hourly bar timestamps, matching data/merged.jsonl
+HOURLY_TIMES = ["10:00:00", "11:00:00", "12:00:00", "13:00:00", "14:00:00", "15:00:00", "16:00:00"]
+START_DATE = "2024-01-02"
+INITIAL_CASH = 10000.0
+
+
+def make_symbols(n_symbols: int) -> List[str]:
+    """Return n deterministic ticker-like symbols"""
+    return [f"S{i:04d}" for i in range(n_symbols)]
+
+
+def make_timestamps(n_bars: int, granularity: str = "hourly") -> List[str]:
+    """
+    Return n ascending bar timestamps on weekdays
+
+    Args:
+        n_bars: Number of bars
+        granularity: "hourly" (YYYY-MM-DD HH:MM:SS) or "daily" (YYYY-MM-DD)
+    """
+    timestamps: List[str] = []
+    day = datetime.strptime(START_DATE, "%Y-%m-%d")
+    while len(timestamps) < n_bars:
+        if day.weekday() < 5:
+            date_str = day.strftime("%Y-%m-%d")
+            if granularity == "hourly":
+                for t in HOURLY_TIMES:
+                    timestamps.append(f"{date_str} {t}")
+                    if len(timestamps) == n_bars:
+                        break
+            else:
+                timestamps.append(date_str)
+        day += timedelta(days=1)
+    return timestamps
+
+
+def make_series(symbol: str, timestamps: List[str], seed: int) -> Dict[str, Dict[str, str]]:
+    """Generate a geometric random walk in the project's bar schema (newest first, like AlphaVantage)"""
+    rng = random.Random(f"{seed}:{symbol}")
+    price = rng.uniform(20.0, 500.0)
+    bars: Dict[str, Dict[str, str]] = {}
+    for ts in timestamps:
+        open_price = price
+        close_price = max(1.0, open_price * (1.0 + rng.gauss(0.0, 0.01)))
+        high = max(open_price, close_price) * (1.0 + abs(rng.gauss(0.0, 0.003)))
+        low = min(open_price, close_price) * (1.0 - abs(rng.gauss(0.0, 0.003)))
+        bars[ts] = {
+            "1. buy price": f"{open_price:.4f}",
+            "2. high": f"{high:.4f}",
+            "3. low": f"{low:.4f}",
+            "4. sell price": f"{close_price:.4f}",
+            "5. volume": str(rng.randint(100000, 20000000)),
+        }
+        price = close_price
+    return dict(reversed(list(bars.items())))
+
+
+def make_document(symbol: str, series: Dict[str, Dict[str, str]], granularity: str) -> Dict[str, Any]:
+    """Wrap a bar series into an AlphaVantage-style document"""
+    series_key = "Time Series (60min)" if granularity == "hourly" else "Time Series (Daily)"
+    meta = {
+        "1. Information": "Daily Prices (buy price, high, low, sell price) and Volumes",
+        "2. Symbol": symbol,
+        "3. Last Refreshed": next(iter(series)),
+        "4. Interval": "60min" if granularity == "hourly" else "Daily",
+        "5. Output Size": "Full size",
+        "6. Time Zone": "US/Eastern",
+    }
+    return {"Meta Data": meta, series_key: series}
+
+
+def make_ledger(
+    symbols: List[str],
+    timestamps: List[str],
+    open_prices: Dict[str, Dict[str, float]],
+    ledger_length: int,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    """
+    Generate a position.jsonl ledger of ledger_length records spread over the timestamps
+
+    Records carry the full positions dict (every symbol plus CASH), like the agents write.
+    """
+    rng = random.Random(f"{seed}:ledger")
+    positions: Dict[str, float] = {symbol: 0 for symbol in symbols}
+    positions["CASH"] = INITIAL_CASH
+    records = [{"date": timestamps[0], "id": 0, "positions": dict(positions)}]
+    for i in range(1, ledger_length):
+        ts = timestamps[min(len(timestamps) - 1, i * len(timestamps) // ledger_length)]
+        symbol = rng.choice(symbols)
+        price = open_prices[symbol][ts]
+        roll = rng.random()
+        action = {"action": "no_trade", "symbol": "", "amount": 0}
+        if roll < 0.4:
+            amount = rng.randint(1, 10)
+            if positions["CASH"] >= price * amount:
+                positions[symbol] += amount
+                positions["CASH"] = round(positions["CASH"] - price * amount, 4)
+                action = {"action": "buy", "symbol": symbol, "amount": amount}
+        elif roll < 0.8 and positions[symbol] > 0:
+            amount = rng.randint(1, int(positions[symbol]))
+            positions[symbol] -= amount
+            positions["CASH"] = round(positions["CASH"] + price * amount, 4)
+            action = {"action": "sell", "symbol": symbol, "amount": amount}
+        records.append({"date": ts, "id": i, "this_action": action, "positions": dict(positions)})
+    return records
+
+
+def write_frontend_config(root: Path, signature: str, granularity: str) -> None:
+    """Write docs/config.yaml pointing both markets at the synthetic data"""
+    agents = [{"folder": signature, "display_name": signature, "enabled": True}]
+    config = {
+        "markets": {
+            "us": {
+                "name": "Synthetic US",
+                "data_dir": "agent_data",
+                "benchmark_file": "Adaily_prices_QQQ.json",
+                "price_data_type": "individual",
+                "time_granularity": granularity,
+                "agents": agents,
+            },
+            "cn": {
+                "name": "Synthetic merged",
+                "data_dir": "agent_data",
+                "benchmark_file": "index_daily_missing.json",
+                "price_data_type": "merged",
+                "price_data_file": "merged.jsonl",
+                "time_granularity": granularity,
+                "agents": agents,
+            },
+        }
+    }
+    with open(root / "docs" / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def generate_dataset(
+    out_dir: str,
+    n_symbols: int = 100,
+    n_bars: int = 500,
+    ledger_length: int = 1000,
+    granularity: str = "hourly",
+    signature: str = "bench-agent",
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """
+    Generate a synthetic dataset under out_dir
+
+    Args:
+        out_dir: Root of the synthetic project tree
+        n_symbols: Number of symbols in the universe
+        n_bars: Number of bars per symbol
+        ledger_length: Number of records in position.jsonl
+        granularity: "hourly" or "daily"
+        signature: Agent signature (folder under agent_data)
+        seed: Random seed; identical seeds produce identical files
+
+    Returns:
+        Dataset description with paths, symbols and timestamps
+    """
+    root = Path(out_dir).resolve()
+    data_dir = root / "docs" / "data"
+    position_dir = data_dir / "agent_data" / signature / "position"
+    position_dir.mkdir(parents=True, exist_ok=True)
+
+    symbols = make_symbols(n_symbols)
+    timestamps = make_timestamps(n_bars, granularity)
+    open_prices: Dict[str, Dict[str, float]] = {}
+
+    merged_file = data_dir / "merged.jsonl"
+    with open(merged_file, "w", encoding="utf-8") as merged:
+        for symbol in symbols:
+            series = make_series(symbol, timestamps, seed)
+            open_prices[symbol] = {ts: float(bar["1. buy price"]) for ts, bar in series.items()}
+            doc = make_document(symbol, series, granularity)
+            merged.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            with open(data_dir / f"daily_prices_{symbol}.json", "w", encoding="utf-8") as f:
+                json.dump(doc, f, ensure_ascii=False, indent=4)
+
+    qqq = make_document("QQQ", make_series("QQQ", timestamps, seed), granularity)
+    with open(data_dir / "Adaily_prices_QQQ.json", "w", encoding="utf-8") as f:
+        json.dump(qqq, f, ensure_ascii=False, indent=4)
+
+    position_file = position_dir / "position.jsonl"
+    with open(position_file, "w", encoding="utf-8") as f:
+        for record in make_ledger(symbols, timestamps, open_prices, ledger_length, seed):
+            f.write(json.dumps(record) + "\n")
+
+    write_frontend_config(root, signature, granularity)
+
+    return {
+        "root": str(root),
+        "data_dir": str(data_dir),
+        "merged_file": str(merged_file),
+        "log_path": str(data_dir / "agent_data"),
+        "position_file": str(position_file),
+        "signature": signature,
+        "symbols": symbols,
+        "timestamps": timestamps,
+        "granularity": granularity,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic market dataset")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--symbols", type=int, default=100, help="Number of symbols")
+    parser.add_argument("--bars", type=int, default=500, help="Bars per symbol")
+    parser.add_argument("--ledger", type=int, default=1000, help="position.jsonl records")
+    parser.add_argument("--granularity", choices=["hourly", "daily"], default="hourly")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.out, args.symbols, args.bars, args.ledger, args.granularity, seed=args.seed)
+    print(f"✅ Synthetic dataset written to {dataset['root']}")
+    print(f"   {len(dataset['symbols'])} symbols x {len(dataset['timestamps'])} bars, ledger {args.ledger} records")
+
+
+if __name__ == "__main__":
+    main()
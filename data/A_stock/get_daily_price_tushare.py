@@ -9,6 +9,8 @@ import pandas as pd
 import tushare as ts
 from dotenv import load_dotenv
 
+from tushare_batch_scheduler import BatchScheduler, compact_partitions, make_date_windows
+
 load_dotenv()
 
 
@@ -111,17 +113,22 @@ def get_daily_price_a_stock(
     output_dir: Optional[Path] = None,
     daily_start_date: str = "20250101",
     fallback_csv: Optional[Path] = None,
-) -> Optional[pd.DataFrame]:
+    max_workers: int = 4,
+) -> Optional[Path]:
     """Get daily price data for A-share index constituents.
 
+    Date windows are fetched concurrently (see tushare_batch_scheduler.py) and
+    checkpointed, so an interrupted run resumes with the missing windows.
+
     Args:
         index_code: Index code, default is SSE 50 (000016.SH)
         output_dir: Output directory, defaults to './data/A_stock' if None
         daily_start_date: Start date for daily price data in 'YYYYMMDD' format
         fallback_csv: Fallback CSV file path for index constituents
+        max_workers: Number of batches fetched concurrently
 
     Returns:
-        pd.DataFrame: DataFrame containing daily price data, None if failed
+        Path: Daily price CSV file, None if failed
     """
     token = os.getenv("TUSHARE_TOKEN")
     if not token:
@@ -167,52 +174,7 @@ def get_daily_price_a_stock(
 
         # Calculate batch size based on 6000 records limit
         batch_days = calculate_batch_days(num_stocks)
-
-        # Parse dates
-        start_dt = datetime.strptime(daily_start_date, "%Y%m%d")
-        end_dt = datetime.strptime(daily_end_date, "%Y%m%d")
-
-        all_data = []
-        current_start = start_dt
-        total_batches = ((end_dt - start_dt).days // batch_days) + 1
-        batch_num = 0
-
-        while current_start <= end_dt:
-            current_end = min(current_start + timedelta(days=batch_days - 1), end_dt)
-
-            batch_start_str = current_start.strftime("%Y%m%d")
-            batch_end_str = current_end.strftime("%Y%m%d")
-            batch_num += 1
-
-            print(f"正在获取批次 {batch_num}/{total_batches}: {batch_start_str} - {batch_end_str}")
-            
-            df_batch = api_call_with_retry(
-                pro.daily,
-                pro_api_instance=pro,
-                ts_code=code_str,
-                start_date=batch_start_str,
-                end_date=batch_end_str,
-                timeout=120
-            )
-
-            if not df_batch.empty:
-                all_data.append(df_batch)
-                print(f"✅ 批次 {batch_num} 获取成功，获得 {len(df_batch)} 条记录")
-
-            # Add delay between batches to avoid rate limiting
-            if current_start < end_dt:
-                time.sleep(1)  # 1 second delay between batches
-
-            current_start = current_end + timedelta(days=1)
-
-        if not all_data:
-            print("No daily price data found")
-            return None
-
-        df2 = pd.concat(all_data, ignore_index=True)
-
-        # Sort by trade_date and ts_code in ascending order
-        df2 = df2.sort_values(by=["trade_date", "ts_code"], ascending=True).reset_index(drop=True)
+        windows = make_date_windows(daily_start_date, daily_end_date, batch_days)
 
         if output_dir is None:
             # Use A_stock_data subdirectory as default
@@ -225,10 +187,25 @@ def get_daily_price_a_stock(
         # Simplified filename
         index_name = "sse_50" if index_code == "000016.SH" else index_code.replace(".", "_")
         daily_file = output_dir / f"daily_prices_{index_name}.csv"
-        df2.to_csv(daily_file, index=False, encoding="utf-8")
-        print(f"Data saved to: {daily_file} (shape: {df2.shape})")
+        parts_dir = output_dir / f"daily_parts_{index_name}"
+
+        # Fetch batches concurrently; each batch is written to its own partition and checkpointed
+        print(f"共 {len(windows)} 个批次（每批 {batch_days} 天），并发数 {max_workers}")
+        scheduler = BatchScheduler(pro, code_str, windows, parts_dir, max_workers=max_workers, timeout=120)
+        summary = scheduler.run()
+        if summary["failed"]:
+            print(f"❌ {len(summary['failed'])} 个批次获取失败，重新运行将从检查点继续: {', '.join(summary['failed'])}")
+            return None
+
+        # The row count and latest trade date come from compaction; the CSV is not read back
+        rows, last_date = compact_partitions(parts_dir, windows, daily_file)
+        if rows == 0:
+            print("No daily price data found")
+            return None
+
+        print(f"Data saved to: {daily_file} ({rows} rows, latest trade date {last_date})")
 
-        return df2
+        return daily_file
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -368,7 +345,7 @@ if __name__ == "__main__":
     fallback_path = Path(__file__).parent / "A_stock_data" / "sse_50_weight.csv"
 
     # Get constituent stocks daily prices
-    df = get_daily_price_a_stock(index_code="000016.SH", daily_start_date="20251001", fallback_csv=fallback_path)
+    daily_file = get_daily_price_a_stock(index_code="000016.SH", daily_start_date="20251001", fallback_csv=fallback_path)
 
     # Get index daily data and convert to JSON
     print("\n" + "=" * 50)
@@ -1,7 +1,9 @@
 from pathlib import Path
 from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
+import csv
 import logging
+import os
 
 import pandas as pd
 import efinance as ef
@@ -14,6 +16,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 输出CSV的列
+OUTPUT_COLUMNS = ['stock_name', 'stock_code', 'trade_date', 'open', 'close', 'high', 'low', 'volume']
+
 
 class AStockIntradayDataFetcher:
     """A股盘中数据获取器
@@ -115,13 +120,10 @@ class AStockIntradayDataFetcher:
         if self.output_path.exists():
             try:
                 logger.info(f"检测到已存在的数据文件: {self.output_path}")
-                df_existing = pd.read_csv(self.output_path)
-                
-                if not df_existing.empty and 'trade_date' in df_existing.columns:
-                    # 获取最后一条记录的日期
-                    # trade_date格式: "2025-10-09 10:30"
-                    last_date_str = df_existing['trade_date'].max()
-                    
+                # trade_date格式: "2025-10-09 10:30"；文件按 trade_date 排序，只需读取最后一行
+                last_date_str = self.read_last_trade_date()
+
+                if last_date_str:
                     # 提取日期部分（去掉时间）
                     last_date = datetime.strptime(last_date_str.split()[0], "%Y-%m-%d")
                     
@@ -148,7 +150,35 @@ class AStockIntradayDataFetcher:
         else:
             logger.info(f"未检测到已有数据文件，将从 {default_start_date} 开始获取")
             return default_start_date, end_date
-    
+
+    def read_header(self) -> List[str]:
+        """读取已有CSV文件的表头"""
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+
+    def read_last_trade_date(self, tail_bytes: int = 4096) -> Optional[str]:
+        """读取已有CSV文件中最后一条记录的 trade_date
+
+        文件按 trade_date 排序写入，因此只需读取文件末尾，耗时与历史数据量无关。
+
+        Returns:
+            最后一条记录的 trade_date，文件为空或缺少 trade_date 列时返回 None
+        """
+        header = self.read_header()
+        if "trade_date" not in header:
+            return None
+        with open(self.output_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - tail_bytes))
+            tail = f.read().decode("utf-8", errors="ignore")
+        lines = [line for line in tail.splitlines() if line.strip()]
+        if len(lines) < 2 and size <= tail_bytes:
+            # 只有表头
+            return None
+        row = next(csv.reader([lines[-1]]))
+        return row[header.index("trade_date")] if len(row) == len(header) else None
+
     def fetch_intraday_data(
         self,
         stock_list: List[str],
@@ -189,66 +219,79 @@ class AStockIntradayDataFetcher:
         """处理并保存数据
         
         将字典格式的数据整合为单个DataFrame，统一列名并保存。
-        支持增量更新模式，新数据会追加到已有数据中。
+        支持增量更新模式，只把晚于已有最后 trade_date 的新记录追加到文件末尾。
+        已有文件的列不一致或追加失败时，与已有数据合并后整体重写；已有数据无法读取时不改动原文件。
         
         Args:
             df_dict: 股票数据字典
             is_incremental: 是否为增量更新模式
             
         Returns:
-            整合后的DataFrame
+            本次写入文件的数据（增量模式下只包含新追加的记录）
         """
         logger.info("开始处理数据")
         
-        df_new = pd.DataFrame()
-        
-        # 遍历每只股票的数据
-        for stock_code, df_one in df_dict.items():
-            df_new = pd.concat([df_new, df_one], ignore_index=True)
-        
-        # 重置索引
-        df_new.reset_index(drop=True, inplace=True)
+        # 一次性合并所有股票的数据（避免在循环中反复 concat）
+        frames = [df_one for df_one in df_dict.values() if df_one is not None and not df_one.empty]
+        if not frames:
+            logger.info("没有获取到新数据")
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        df_new = pd.concat(frames, ignore_index=True)
         
         # 选择并重命名列
         df_new = df_new[['股票名称', '股票代码', '日期', '开盘', '收盘', '最高', '最低', '成交量']]
-        df_new.columns = ['stock_name', 'stock_code', 'trade_date', 'open', 'close', 'high', 'low', 'volume']
+        df_new.columns = OUTPUT_COLUMNS
         
         # 统一股票代码格式（添加.SH后缀）
-        df_new["stock_code"] = df_new["stock_code"].apply(lambda x: x + ".SH")
+        df_new["stock_code"] = df_new["stock_code"].astype(str) + ".SH"
+        
+        # 去重（基于stock_code和trade_date，保留最新的数据），按日期和股票代码排序
+        df_new = df_new.drop_duplicates(subset=['stock_code', 'trade_date'], keep='last')
+        df_new = df_new.sort_values(by=['trade_date', 'stock_code']).reset_index(drop=True)
         
-        # 如果是增量更新且已有文件存在，则合并数据
+        # 增量更新：只追加比已有最后 trade_date 更新的记录，不再读取和重写整个文件
         if is_incremental and self.output_path.exists():
+            if self.read_header() == OUTPUT_COLUMNS:
+                size_before = self.output_path.stat().st_size
+                try:
+                    last_trade_date = self.read_last_trade_date()
+                    if last_trade_date is not None:
+                        df_append = df_new[df_new["trade_date"] > last_trade_date]
+                        skipped = len(df_new) - len(df_append)
+                        if skipped:
+                            logger.info(f"跳过 {skipped} 条不晚于 {last_trade_date} 的记录")
+                    else:
+                        df_append = df_new
+                    df_append.to_csv(self.output_path, mode="a", header=False, index=False, encoding='utf-8')
+                    logger.info(f"增量更新模式：追加 {len(df_append)} 条记录到: {self.output_path}")
+                    return df_append
+                except Exception as e:
+                    # 截掉可能写了一半的记录，再走下面的合并重写
+                    with open(self.output_path, "r+b") as f:
+                        f.truncate(size_before)
+                    logger.warning(f"追加数据失败: {e}，将与已有数据合并后重写文件")
+            else:
+                logger.warning("已有文件的列与新数据不一致，将与已有数据合并后重写文件")
+
+            # 合并已有数据和新数据后整体重写；已有数据无法读取时放弃本次保存，不改动原文件
             try:
-                logger.info("增量更新模式：合并新旧数据")
-                df_old = pd.read_csv(self.output_path)
-                
-                # 合并新旧数据
-                df_total = pd.concat([df_old, df_new], ignore_index=True)
-                
-                # 去重（基于stock_code和trade_date，保留最新的数据）
-                df_total = df_total.drop_duplicates(
-                    subset=['stock_code', 'trade_date'],
-                    keep='last'
-                ).reset_index(drop=True)
-                
-                # 按日期和股票代码排序
-                df_total = df_total.sort_values(
-                    by=['trade_date', 'stock_code']
-                ).reset_index(drop=True)
-                
-                logger.info(f"合并后总记录数: {len(df_total)} (旧: {len(df_old)}, 新: {len(df_new)})")
+                df_old = pd.read_csv(self.output_path, dtype=str)
+                df_old = df_old[OUTPUT_COLUMNS]
             except Exception as e:
-                logger.warning(f"合并数据失败: {e}，将只保存新数据")
-                df_total = df_new
-        else:
-            df_total = df_new
-        
-        # 保存到CSV
-        df_total.to_csv(self.output_path, index=False, encoding='utf-8')
+                logger.error(f"读取已有数据失败: {e}，未修改文件: {self.output_path}")
+                raise
+            df_new = pd.concat([df_old, df_new.astype({"trade_date": str})], ignore_index=True)
+            df_new = df_new.drop_duplicates(subset=['stock_code', 'trade_date'], keep='last')
+            df_new = df_new.sort_values(by=['trade_date', 'stock_code']).reset_index(drop=True)
+
+        # 保存到CSV（先写临时文件再替换，避免读取方看到写了一半的文件）
+        tmp_path = self.output_path.with_name(self.output_path.name + ".tmp")
+        df_new.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, self.output_path)
         logger.info(f"数据已保存到: {self.output_path}")
-        logger.info(f"总共 {len(df_total)} 条记录")
+        logger.info(f"总共 {len(df_new)} 条记录")
         
-        return df_total
+        return df_new
     
     def run(
         self,
@@ -267,7 +310,7 @@ class AStockIntradayDataFetcher:
             auto_date_range: 是否自动检测日期范围，默认True
             
         Returns:
-            整合后的DataFrame，如果无需更新则返回None
+            本次写入的数据（无需更新时返回已有数据），如果没有数据则返回None
         """
         try:
             # 1. 加载股票列表
@@ -0,0 +1,252 @@
+"""
+Vectorized builder for merged JSONL files from A-share price tables
+
+Shared by merge_jsonl_tushare.py (daily) and merge_jsonl_hourly.py (60min).
+Columns are converted to text once, every bar is rendered to its JSON fragment
+in a single pass over the column arrays and fragments are joined per symbol
+block, so there is no iterrows/groupby loop or dict round trip and conversion
+time grows linearly with the number of rows. The output is the same text
+json.dumps would produce for the equivalent dicts.
+
+update_jsonl() makes the conversion incremental: the price CSVs only grow at
+the end, so it remembers how many bytes of the CSV were converted and the last
+bar of every symbol ({output}.state.json), parses only the appended rows and
+splices them into the affected symbol lines. Any other change (rewritten CSV,
+different columns, a row that is not newer than its symbol's last bar, an
+edited output or stock-name file) falls back to a full rebuild.
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+STATE_VERSION = 1
+# Bytes before the converted offset that must be unchanged for an incremental run
+_CHECK_BYTES = 4096
+
+# Bar fields in output order: (JSON key, source column)
+BAR_FIELDS = [
+    ("1. buy price", "open"),
+    ("2. high", "high"),
+    ("3. low", "low"),
+    ("4. sell price", "close"),
+    ("5. volume", "volume"),
+]
+
+
+def _text(values: pd.Series) -> List[str]:
+    # str() of the Python scalar, as the row-by-row converters wrote it
+    return list(map(str, values.tolist()))
+
+
+def build_jsonl_lines(
+    df: pd.DataFrame,
+    symbol_col: str,
+    series_key: str,
+    meta_for: Callable[[str, str], Dict[str, str]],
+) -> List[str]:
+    """
+    Render one JSONL line per symbol
+
+    For the latest bar of each symbol only the buy price is written (to prevent
+    future information leakage), matching the row-by-row converters.
+
+    Args:
+        df: Rows with `symbol_col`, "key" (time-series timestamp), "sort_key" and
+            the columns named in BAR_FIELDS (volume already converted to shares)
+        symbol_col: Symbol column name
+        series_key: e.g. "Time Series (Daily)"
+        meta_for: Called with (symbol, latest sort_key); returns the "Meta Data" dict
+
+    Returns:
+        JSONL lines (with trailing newline), sorted by symbol
+    """
+    return [
+        _line(meta_for(symbol, last_sort_key), series_key, entries[:-1] + [truncated])
+        for symbol, entries, truncated, last_sort_key, _ in _symbol_blocks(df, symbol_col)
+    ]
+
+
+def _symbol_blocks(df: pd.DataFrame, symbol_col: str) -> List[Tuple[str, List[str], str, str, str]]:
+    # Per symbol (sorted): full bar entries, the truncated latest entry, latest sort_key, earliest sort_key
+    df = df.sort_values([symbol_col, "sort_key"], kind="mergesort")
+    df = df.drop_duplicates(subset=[symbol_col, "key"], keep="last")
+    if df.empty:
+        return []
+
+    symbols = df[symbol_col].to_numpy()
+    # Row index where each symbol's block starts; rows are sorted by symbol
+    starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    ends = np.r_[starts[1:], len(symbols)]
+
+    keys, opens, highs, lows, closes, volumes = (
+        _text(df[column]) for column in ["key"] + [column for _, column in BAR_FIELDS]
+    )
+    # Values are dates and numbers, which need no JSON escaping
+    entries = [
+        f'"{k}": {{"1. buy price": "{o}", "2. high": "{h}", "3. low": "{lo}", "4. sell price": "{c}", "5. volume": "{v}"}}'
+        for k, o, h, lo, c, v in zip(keys, opens, highs, lows, closes, volumes)
+    ]
+    sort_keys = _text(df["sort_key"])
+
+    blocks = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        last = end - 1
+        truncated = f'"{keys[last]}": {{"1. buy price": "{opens[last]}"}}'
+        blocks.append((symbols[start], entries[start:end], truncated, sort_keys[last], sort_keys[start]))
+    return blocks
+
+
+def _line(meta: Dict[str, Any], series_key: str, entries: List[str]) -> str:
+    body = ", ".join(entries)
+    return f'{{"Meta Data": {json.dumps(meta, ensure_ascii=False)}, "{series_key}": {{{body}}}}}\n'
+
+
+def write_lines_atomic(output_path: Path, lines: List[str]) -> None:
+    """Write lines to a temp file and rename it over output_path"""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fout:
+        fout.writelines(lines)
+    os.replace(tmp_path, output_path)
+
+
+class _Rebuild(Exception):
+    """The previous output cannot be extended; convert the whole CSV"""
+
+
+def _signature(path: Path) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def update_jsonl(
+    csv_path: Path,
+    output_path: Path,
+    to_table: Callable[[pd.DataFrame], pd.DataFrame],
+    symbol_col: str,
+    series_key: str,
+    meta_for: Callable[[str, str], Dict[str, str]],
+    inputs: Iterable[Path] = (),
+    rebuild: bool = False,
+) -> Dict[str, Any]:
+    """
+    Convert a price CSV to merged JSONL, converting only the rows appended since the last run
+
+    Args:
+        csv_path: Price CSV (appended to by the fetch scripts)
+        output_path: Merged JSONL file
+        to_table: Turns raw CSV rows into the table build_jsonl_lines expects
+        symbol_col, series_key, meta_for: As for build_jsonl_lines
+        inputs: Other files the lines depend on (e.g. the stock-name CSV); a change forces a rebuild
+        rebuild: Always convert the whole CSV
+
+    Returns:
+        {"mode": "unchanged" | "appended" | "rebuilt", "rows": rows converted, "symbols": lines written}
+    """
+    csv_path, output_path = Path(csv_path), Path(output_path)
+    state_file = Path(f"{output_path}.state.json")
+    input_signatures = {str(p): _signature(Path(p)) for p in inputs}
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    # Only complete lines are converted; a row being appended right now is picked up next run
+    end = data.rfind(b"\n") + 1
+    header = data[: data.find(b"\n") + 1]
+
+    state: Dict[str, Any] = {}
+    if not rebuild and state_file.exists():
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            state = {}
+
+    try:
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("source") != str(csv_path)
+            or state.get("header") != header.decode("utf-8")
+            or state.get("inputs") != input_signatures
+            or state.get("output") != _signature(output_path)
+        ):
+            raise _Rebuild()
+        offset = int(state["offset"])
+        if end < offset or _sha1(data[max(0, offset - _CHECK_BYTES) : offset]) != state["check"]:
+            raise _Rebuild()
+        if end == offset:
+            return {"mode": "unchanged", "rows": 0, "symbols": 0}
+
+        raw = pd.read_csv(io.BytesIO(header + data[offset:end]))
+        try:
+            # Parse the appended rows with the column types of the full file
+            raw = raw.astype(state["dtypes"])
+        except (KeyError, TypeError, ValueError):
+            raise _Rebuild()
+        blocks = _symbol_blocks(to_table(raw), symbol_col)
+
+        with open(output_path, "r", encoding="utf-8") as f:
+            lines = dict(zip(state["symbols"], f.readlines()))
+        last = state["last"]
+        marker = f', "{series_key}": {{'
+        for symbol, entries, truncated, last_sort_key, first_sort_key in blocks:
+            previous = last.get(symbol)
+            if previous is None:
+                lines[symbol] = _line(meta_for(symbol, last_sort_key), series_key, entries[:-1] + [truncated])
+            else:
+                line = lines.get(symbol, "")
+                body = line[line.find(marker) + len(marker) : -len("}}\n")]
+                if first_sort_key <= previous["sort_key"] or marker not in line or not body.endswith(previous["truncated"]):
+                    raise _Rebuild()
+                # The previous latest bar gets its full fields back; the new latest bar is truncated
+                body = body[: -len(previous["truncated"])] + ", ".join([previous["full"]] + entries[:-1] + [truncated])
+                lines[symbol] = _line(meta_for(symbol, last_sort_key), series_key, [body])
+            last[symbol] = {"sort_key": last_sort_key, "full": entries[-1], "truncated": truncated}
+        symbols = sorted(lines)
+        write_lines_atomic(output_path, [lines[symbol] for symbol in symbols])
+        result = {"mode": "appended", "rows": len(raw), "symbols": len(blocks)}
+        dtypes = state["dtypes"]
+    except _Rebuild:
+        raw = pd.read_csv(io.BytesIO(data[:end]))
+        blocks = _symbol_blocks(to_table(raw), symbol_col)
+        last = {
+            symbol: {"sort_key": last_sort_key, "full": entries[-1], "truncated": truncated}
+            for symbol, entries, truncated, last_sort_key, _ in blocks
+        }
+        symbols = [block[0] for block in blocks]
+        write_lines_atomic(
+            output_path,
+            [_line(meta_for(symbol, sort_key), series_key, entries[:-1] + [truncated])
+             for symbol, entries, truncated, sort_key, _ in blocks],
+        )
+        result = {"mode": "rebuilt", "rows": len(raw), "symbols": len(blocks)}
+        dtypes = {column: str(dtype) for column, dtype in raw.dtypes.items()}
+
+    state = {
+        "version": STATE_VERSION,
+        "source": str(csv_path),
+        "header": header.decode("utf-8"),
+        "offset": end,
+        "check": _sha1(data[max(0, end - _CHECK_BYTES) : end]),
+        "dtypes": dtypes,
+        "inputs": input_signatures,
+        "output": _signature(output_path),
+        "symbols": [str(symbol) for symbol in symbols],
+        "last": last,
+    }
+    with open(f"{state_file}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(f"{state_file}.tmp", state_file)
+    return result
@@ -2,8 +2,12 @@ import glob
 import json
 import os
 import csv
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.merge_engine import IncrementalMerger
+
 sse_50_codes = [
     "600519.SHH",
     "601318.SHH",
@@ -81,80 +85,86 @@ def load_stock_name_mapping():
 stock_name_map = load_stock_name_mapping()
 
 
-# 合并所有以 daily_price 开头的 json，逐文件一行写入 merged.jsonl
-current_dir = os.path.dirname(__file__)
-pattern = os.path.join(current_dir, "A_stock_data/daily_price*.json")
-files = sorted(glob.glob(pattern))
-
-
-output_file = os.path.join(current_dir, "merged.jsonl")
-
-processed_count = 0
-skipped_count = 0
-
-with open(output_file, "w", encoding="utf-8") as fout:
-    for fp in files:
-        basename = os.path.basename(fp)
-        # 仅当文件名包含任一纳指100成分符号时才写入
-        if not any(symbol in basename for symbol in sse_50_codes):
-            skipped_count += 1
-            continue
-        with open(fp, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        # 统一重命名："1. open" -> "1. buy price"；"4. close" -> "4. sell price"
-        # 对于最新的一天，只保留并写入 "1. buy price"
-        try:
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in data.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if isinstance(series, dict) and series:
-                # 先对所有日期做键名重命名
-                for d, bar in list(series.items()):
-                    if not isinstance(bar, dict):
-                        continue
-                    if "1. open" in bar:
-                        bar["1. buy price"] = bar.pop("1. open")
-                    if "4. close" in bar:
-                        bar["4. sell price"] = bar.pop("4. close")
-                # 再处理最新日期，仅保留买入价
-                latest_date = max(series.keys())
-                latest_bar = series.get(latest_date, {})
-                if isinstance(latest_bar, dict):
-                    buy_val = latest_bar.get("1. buy price")
-                    series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
-                # 更新 Meta Data 描述
-                meta = data.get("Meta Data", {})
-                if isinstance(meta, dict):
-                    meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
-                    # 如果包含.SHH，替换成.SH
-                    symbol = meta.get("2. Symbol", "")
-                    # print("symbol: ", symbol)
-                    symbol = symbol.replace(".SHH", ".SH")
-                    # print("symbol: ", symbol)
-                    meta["2. Symbol"] = symbol
-                    
-                    # 添加股票名称 (2.1. Name)
-                    stock_name = stock_name_map.get(symbol, "未知")
-                    if symbol in stock_name_map:
-                        meta["2.1. Name"] = stock_name
-                    
-                    # 强制修改时区为 Asia/Shanghai
-                    meta["5. Time Zone"] = "Asia/Shanghai"
-                    
-                    processed_count += 1
-        except Exception as e:
-            # 若结构异常则原样写入
-            print(f"  ⚠️  {basename} - 处理异常: {e}")
-            pass
-
-        fout.write(json.dumps(data, ensure_ascii=False) + "\n")
-
-print(f"✅ 合并完成!")
-print(f"📊 统计信息:")
-print(f"   - 成功处理: {processed_count} 个文件")
-print(f"   - 跳过文件: {skipped_count} 个文件")
-print(f"   - 输出文件: {output_file}")
+def transform_price_document(data, basename):
+    # 统一重命名："1. open" -> "1. buy price"；"4. close" -> "4. sell price"
+    # 对于最新的一天，只保留并写入 "1. buy price"
+    try:
+        # 查找所有以 "Time Series" 开头的键
+        series = None
+        for key, value in data.items():
+            if key.startswith("Time Series"):
+                series = value
+                break
+        if isinstance(series, dict) and series:
+            # 先对所有日期做键名重命名
+            for d, bar in list(series.items()):
+                if not isinstance(bar, dict):
+                    continue
+                if "1. open" in bar:
+                    bar["1. buy price"] = bar.pop("1. open")
+                if "4. close" in bar:
+                    bar["4. sell price"] = bar.pop("4. close")
+            # 再处理最新日期，仅保留买入价
+            latest_date = max(series.keys())
+            latest_bar = series.get(latest_date, {})
+            if isinstance(latest_bar, dict):
+                buy_val = latest_bar.get("1. buy price")
+                series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
+            # 更新 Meta Data 描述
+            meta = data.get("Meta Data", {})
+            if isinstance(meta, dict):
+                meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
+                # 如果包含.SHH，替换成.SH
+                symbol = meta.get("2. Symbol", "")
+                symbol = symbol.replace(".SHH", ".SH")
+                meta["2. Symbol"] = symbol
+
+                # 添加股票名称 (2.1. Name)
+                if symbol in stock_name_map:
+                    meta["2.1. Name"] = stock_name_map[symbol]
+
+                # 强制修改时区为 Asia/Shanghai
+                meta["5. Time Zone"] = "Asia/Shanghai"
+    except Exception as e:
+        # 若结构异常则原样写入
+        print(f"  ⚠️  {basename} - 处理异常: {e}")
+
+    return data
+
+
+def merge_price_files():
+    """
+    合并所有以 daily_price 开头的 json，逐文件一行写入 merged.jsonl
+
+    只重新处理自上次合并后变化的文件，输出文件原子替换。
+
+    Returns:
+        IncrementalMerger 的统计信息
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    all_files = sorted(glob.glob(os.path.join(current_dir, "A_stock_data/daily_price*.json")))
+    output_file = os.path.join(current_dir, "merged.jsonl")
+
+    # 仅当文件名对应上证50成分股代码时才写入
+    code_set = set(sse_50_codes)
+    files = [fp for fp in all_files if os.path.basename(fp)[len("daily_prices_") : -len(".json")] in code_set]
+    skipped_count = len(all_files) - len(files)
+
+    # 股票名称映射变化时需要全部重新处理
+    name_csv = os.path.join(current_dir, "A_stock_data", "sse_50_weight.csv")
+    names_version = os.stat(name_csv).st_mtime_ns if os.path.exists(name_csv) else 0
+    merger = IncrementalMerger(
+        output_file, transform_price_document, transform_version=f"astock-1:{names_version}"
+    )
+    stats = merger.run(files)
+
+    print(f"✅ 合并完成!")
+    print(f"📊 统计信息:")
+    print(f"   - 成功处理: {len(files)} 个文件 (变化 {stats['processed']} 个, 未变化 {stats['reused']} 个)")
+    print(f"   - 跳过文件: {skipped_count} 个文件")
+    print(f"   - 输出文件: {output_file}")
+    return stats
+
 
+if __name__ == "__main__":
+    merge_price_files()
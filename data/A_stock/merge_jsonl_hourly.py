@@ -13,17 +13,20 @@ A股小时级数据转JSONL格式脚本
 日期: 2025-11-16
 """
 
-import json
+import argparse
 from pathlib import Path
 from typing import Dict
 
 import pandas as pd
 
+from jsonl_builder import update_jsonl
+
 
 def convert_hourly_to_jsonl(
     csv_path: str = "A_stock_data/A_stock_hourly.csv",
     output_path: str = "merged_hourly.jsonl",
     stock_name_csv: str = "A_stock_data/sse_50_weight.csv",
+    rebuild: bool = False,
 ) -> None:
     """Convert A-share hourly CSV data to JSONL format compatible with the trading system.
 
@@ -37,6 +40,7 @@ def convert_hourly_to_jsonl(
         csv_path: Path to the A-share hourly price CSV file (default: A_stock_data/A_stock_hourly.csv)
         output_path: Path to output JSONL file (default: merged_hourly.jsonl - current directory)
         stock_name_csv: Path to SSE 50 weight CSV containing stock names (default: A_stock_data/sse_50_weight.csv)
+        rebuild: Convert the whole CSV instead of only the rows appended since the last run
     """
     csv_path = Path(csv_path)
     output_path = Path(output_path)
@@ -48,9 +52,6 @@ def convert_hourly_to_jsonl(
 
     print(f"📖 Reading CSV file: {csv_path}")
 
-    # Read CSV data
-    df = pd.read_csv(csv_path)
-
     # Read stock name mapping
     stock_name_map = {}
     if stock_name_csv.exists():
@@ -62,81 +63,54 @@ def convert_hourly_to_jsonl(
     else:
         print(f"⚠️  Warning: Stock name file not found: {stock_name_csv}")
 
-    print(f"📊 Total records: {len(df)}")
-    print(f"📋 Columns: {df.columns.tolist()}")
-
-    # Ensure output directory exists
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Group by stock symbol
-    grouped = df.groupby("stock_code")
-
-    print(f"🔄 Processing {len(grouped)} stocks...")
-
-    with open(output_path, "w", encoding="utf-8") as fout:
-        for stock_code, group_df in grouped:
-            # Sort by datetime ascending
-            group_df = group_df.sort_values("trade_date", ascending=True)
-
-            # Get latest datetime for Meta Data
-            latest_datetime = str(group_df["trade_date"].max())
-
-            # Build Time Series (60min) data
-            time_series = {}
-
-            for idx, row in group_df.iterrows():
-                datetime_str = str(row["trade_date"])  # Format: "2025-10-09 10:30"
-                
-                # Add :00 seconds if not present (e.g., "10:30" -> "10:30:00", "14:00" -> "14:00:00")
-                if datetime_str.count(':') == 1:
-                    datetime_formatted = datetime_str + ":00"
-                else:
-                    datetime_formatted = datetime_str
-
-                # For the latest datetime, only include buy price (to prevent future information leakage)
-                if datetime_str == latest_datetime:
-                    time_series[datetime_formatted] = {
-                        "1. buy price": str(row["open"])
-                    }
-                else:
-                    time_series[datetime_formatted] = {
-                        "1. buy price": str(row["open"]),
-                        "2. high": str(row["high"]),
-                        "3. low": str(row["low"]),
-                        "4. sell price": str(row["close"]),
-                        "5. volume": str(int(row["volume"])) if pd.notna(row["volume"]) else "0",
-                    }
-
-            # Get stock name from mapping
-            stock_name = stock_name_map.get(stock_code, "Unknown")
-
-            # Build complete JSON object
-            json_obj = {
-                "Meta Data": {
-                    "1. Information": "Intraday (60min) open, high, low, close prices and volume",
-                    "2. Symbol": stock_code,
-                    "2.1. Name": stock_name,
-                    "3. Last Refreshed": latest_datetime,
-                    "4. Interval": "60min",
-                    "5. Output Size": "Full size",
-                    "6. Time Zone": "Asia/Shanghai",
-                },
-                "Time Series (60min)": time_series,
+    def to_table(df: pd.DataFrame) -> pd.DataFrame:
+        # Format every column once (vectorized) instead of row by row
+        trade_date = df["trade_date"].astype(str)  # Format: "2025-10-09 10:30"
+        # Add :00 seconds if not present (e.g., "10:30" -> "10:30:00", "14:00" -> "14:00:00")
+        needs_seconds = trade_date.str.count(":") == 1
+        volume = df["volume"]
+        return pd.DataFrame(
+            {
+                "stock_code": df["stock_code"],
+                "sort_key": trade_date,
+                "key": trade_date.where(~needs_seconds, trade_date + ":00"),
+                "open": df["open"],
+                "high": df["high"],
+                "low": df["low"],
+                "close": df["close"],
+                "volume": volume.fillna(0).astype("int64"),  # missing volume is written as "0"
             }
-
-            # Write to JSONL file
-            fout.write(json.dumps(json_obj, ensure_ascii=False) + "\n")
+        )
+
+    def meta_for(stock_code: str, latest_datetime: str) -> Dict[str, str]:
+        return {
+            "1. Information": "Intraday (60min) open, high, low, close prices and volume",
+            "2. Symbol": stock_code,
+            "2.1. Name": stock_name_map.get(stock_code, "Unknown"),
+            "3. Last Refreshed": latest_datetime,
+            "4. Interval": "60min",
+            "5. Output Size": "Full size",
+            "6. Time Zone": "Asia/Shanghai",
+        }
+
+    result = update_jsonl(
+        csv_path, output_path, to_table, "stock_code", "Time Series (60min)", meta_for,
+        inputs=[stock_name_csv], rebuild=rebuild,
+    )
 
     print(f"✅ Data conversion completed: {output_path}")
-    print(f"✅ Total stocks: {len(grouped)}")
+    print(f"✅ {result['mode'].capitalize()}: {result['rows']} records, {result['symbols']} stocks updated")
     print(f"✅ File size: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
 
 
 if __name__ == "__main__":
     # Convert A-share hourly data to JSONL format
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Convert the whole CSV instead of only the appended rows")
+    args = parser.parse_args()
     print("=" * 60)
     print("A-Share Hourly Data Converter")
     print("=" * 60)
-    convert_hourly_to_jsonl()
+    convert_hourly_to_jsonl(rebuild=args.rebuild)
     print("=" * 60)
 
@@ -0,0 +1,259 @@
+"""
+Concurrent, checkpointed batch fetching for Tushare daily prices
+
+pro.daily returns at most 6,000 records per call, so get_daily_price_a_stock
+splits the requested range into date windows. BatchScheduler fetches those
+windows with a bounded thread pool behind a shared per-minute rate limiter,
+writes each window to its own partition file as soon as it arrives and records
+it in a checkpoint, so a crash resumes with the windows that are still missing.
+compact_partitions() then streams the partitions, in date order, into the
+single CSV the merge scripts read.
+
+Any object with a `daily(**kwargs) -> pd.DataFrame` method can stand in for
+pro_api, which keeps the scheduler testable without network access.
+
+Usage:
+    windows = make_date_windows("20250101", "20251120", batch_days=120)
+    scheduler = BatchScheduler(pro, code_str, windows, parts_dir, max_workers=4)
+    summary = scheduler.run()
+    rows, last_date = compact_partitions(parts_dir, windows, "A_stock_data/daily_prices_sse_50.csv")
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def make_date_windows(start_date: str, end_date: str, batch_days: int) -> List[Tuple[str, str]]:
+    """Split [start_date, end_date] ('YYYYMMDD') into consecutive windows of batch_days days"""
+    start_dt = datetime.strptime(start_date, "%Y%m%d")
+    end_dt = datetime.strptime(end_date, "%Y%m%d")
+    windows = []
+    current = start_dt
+    while current <= end_dt:
+        window_end = min(current + timedelta(days=batch_days - 1), end_dt)
+        windows.append((current.strftime("%Y%m%d"), window_end.strftime("%Y%m%d")))
+        current = window_end + timedelta(days=1)
+    return windows
+
+
+def partition_path(parts_dir: Path, window: Tuple[str, str]) -> Path:
+    return Path(parts_dir) / f"part_{window[0]}_{window[1]}.csv"
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls to at most `calls_per_minute`"""
+
+    def __init__(self, calls_per_minute: float):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BatchScheduler:
+    """Fetch date windows of pro.daily concurrently, streaming each to a partition file"""
+
+    def __init__(
+        self,
+        pro: Any,
+        code_str: str,
+        windows: List[Tuple[str, str]],
+        parts_dir: Path,
+        max_workers: int = 4,
+        calls_per_minute: Optional[float] = None,
+        max_retries: int = 3,
+        retry_delay: float = 5.0,
+        timeout: int = 120,
+        today: Optional[str] = None,
+    ):
+        """
+        Args:
+            pro: Tushare pro_api instance (or a fake with a `daily` method)
+            code_str: Comma separated ts_code list
+            windows: Date windows from make_date_windows
+            parts_dir: Directory for partition files and the checkpoint
+            max_workers: Windows fetched concurrently
+            calls_per_minute: Rate limit (default: $TUSHARE_CALLS_PER_MINUTE or 200)
+            max_retries: Attempts per window
+            retry_delay: Base delay for exponential backoff with jitter
+            timeout: Request timeout in seconds set on pro.api (as api_call_with_retry does)
+            today: 'YYYYMMDD'; windows reaching today are never checkpointed (data may still change)
+        """
+        if calls_per_minute is None:
+            calls_per_minute = float(os.getenv("TUSHARE_CALLS_PER_MINUTE") or 200)
+        self.pro = pro
+        if hasattr(pro, "api") and hasattr(pro.api, "timeout"):
+            pro.api.timeout = timeout
+        self.code_str = code_str
+        self.windows = list(windows)
+        self.parts_dir = Path(parts_dir)
+        self.max_workers = max(1, max_workers)
+        self.limiter = RateLimiter(calls_per_minute)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.today = today or datetime.now().strftime("%Y%m%d")
+        self.checkpoint_path = self.parts_dir / CHECKPOINT_FILE
+        # Completed windows are only valid for the same constituents
+        self.codes_hash = hashlib.sha1(code_str.encode("utf-8")).hexdigest()
+        self._lock = threading.Lock()
+        self.completed = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, int]:
+        if not self.checkpoint_path.exists():
+            return {}
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"⚠️ 无法读取检查点 {self.checkpoint_path}: {e}，将重新获取全部批次")
+            return {}
+        if checkpoint.get("codes_hash") != self.codes_hash:
+            print("ℹ️ 成分股列表已变化，忽略已有检查点")
+            return {}
+        completed = checkpoint.get("completed", {})
+        # A checkpointed window whose partition file disappeared must be fetched again
+        return {
+            key: rows
+            for key, rows in completed.items()
+            if partition_path(self.parts_dir, tuple(key.split("_"))).exists()
+        }
+
+    def _save_checkpoint(self) -> None:
+        tmp_path = self.checkpoint_path.with_name(CHECKPOINT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"codes_hash": self.codes_hash, "completed": self.completed}, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    @staticmethod
+    def window_key(window: Tuple[str, str]) -> str:
+        return f"{window[0]}_{window[1]}"
+
+    def pending_windows(self) -> List[Tuple[str, str]]:
+        return [w for w in self.windows if self.window_key(w) not in self.completed]
+
+    def _fetch(self, window: Tuple[str, str]) -> pd.DataFrame:
+        for attempt in range(1, self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                return self.pro.daily(ts_code=self.code_str, start_date=window[0], end_date=window[1])
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                wait_time = self.retry_delay * (2 ** (attempt - 1)) * (0.5 + random.random())
+                print(f"⚠️ 批次 {window[0]} - {window[1]} 调用失败 (尝试 {attempt}/{self.max_retries})，{wait_time:.1f} 秒后重试: {e}")
+                time.sleep(wait_time)
+        raise RuntimeError("unreachable")
+
+    def _run_window(self, window: Tuple[str, str]) -> int:
+        df_batch = self._fetch(window)
+        if df_batch is None:
+            df_batch = pd.DataFrame()
+        path = partition_path(self.parts_dir, window)
+        tmp_path = path.with_name(path.name + ".tmp")
+        if df_batch.empty:
+            # Windows without trading days (holidays) leave an empty partition
+            tmp_path.write_text("", encoding="utf-8")
+        else:
+            df_batch.to_csv(tmp_path, index=False, encoding="utf-8")
+        os.replace(tmp_path, path)
+        if window[1] < self.today:
+            with self._lock:
+                self.completed[self.window_key(window)] = len(df_batch)
+                self._save_checkpoint()
+        return len(df_batch)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Fetch every window that is not checkpointed yet
+
+        Returns:
+            {"fetched", "resumed", "failed": [window keys], "rows"}
+        """
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        pending = self.pending_windows()
+        summary: Dict[str, Any] = {"fetched": 0, "resumed": len(self.windows) - len(pending), "failed": [], "rows": 0}
+        if summary["resumed"]:
+            print(f"⏭️ 从检查点恢复：跳过 {summary['resumed']} 个已完成批次")
+
+        total = len(pending)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._run_window, window): window for window in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                window = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"❌ 批次 {window[0]} - {window[1]} 获取失败: {e}")
+                    summary["failed"].append(self.window_key(window))
+                    continue
+                summary["fetched"] += 1
+                summary["rows"] += rows
+                print(f"✅ 批次 {done}/{total} ({window[0]} - {window[1]}) 获取成功，获得 {rows} 条记录")
+        return summary
+
+
+def compact_partitions(parts_dir: Path, windows: List[Tuple[str, str]], output_file: Path) -> Tuple[int, Optional[str]]:
+    """
+    Stream the partitions of `windows` (in date order) into one CSV sorted by trade_date, ts_code
+
+    Windows do not overlap, so sorting each partition on its own yields a sorted
+    file while only one partition is held in memory. Partitions of windows that
+    are no longer requested are removed.
+
+    Returns:
+        (rows written, last trade_date written); (0, None) leaves output_file untouched
+    """
+    parts_dir = Path(parts_dir)
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_file.with_name(output_file.name + ".tmp")
+
+    wanted = {partition_path(parts_dir, w).name for w in windows}
+    for stale in parts_dir.glob("part_*.csv"):
+        if stale.name not in wanted:
+            stale.unlink()
+
+    rows = 0
+    last_date = None
+    header_written = False
+    with open(tmp_path, "w", encoding="utf-8", newline="") as fout:
+        for window in sorted(windows):
+            path = partition_path(parts_dir, window)
+            if not path.exists() or path.stat().st_size == 0:
+                continue
+            try:
+                df_part = pd.read_csv(path, dtype={"trade_date": str})
+            except pd.errors.EmptyDataError:
+                continue
+            if df_part.empty:
+                continue
+            df_part = df_part.sort_values(by=["trade_date", "ts_code"], ascending=True)
+            df_part.to_csv(fout, index=False, header=not header_written)
+            header_written = True
+            rows += len(df_part)
+            last_date = df_part["trade_date"].iloc[-1]
+    if not header_written:
+        # Keep the previous output rather than replacing it with an empty file
+        tmp_path.unlink()
+        return 0, None
+    os.replace(tmp_path, output_file)
+    return rows, last_date
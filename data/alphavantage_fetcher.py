@@ -0,0 +1,332 @@
+"""
+Concurrent, rate-limited, resumable AlphaVantage downloader
+
+Shared by get_daily_price.py, get_interdaily_price.py and
+crypto/get_daily_price_crypto.py. Requests go through a token bucket sized to
+the API plan, so a full refresh runs as fast as the quota allows and no call is
+wasted on a "Note"/"Information" throttle response.
+
+    - Token bucket: ALPHAVANTAGE_CALLS_PER_MINUTE (default 5, the free plan),
+      slowing down adaptively when the server throttles
+    - Retries: network errors, HTTP 429/5xx and throttle responses back off
+      exponentially (with jitter); "Error Message" responses fail immediately
+    - Resumable: completed symbols are recorded in a manifest after each write,
+      so an interrupted run picks up where it stopped
+    - Up-to-date skip: symbols whose file already holds the latest completed
+      session are not requested at all
+    - ALPHAVANTAGE_BASE_URL points the fetcher at another server (e.g. a local stub)
+
+Requests use one requests.Session per worker thread, driven from asyncio.
+
+Usage:
+    fetcher = AlphaVantageFetcher(api_key)
+    asyncio.run(fetcher.fetch_all(symbols, params_for, save, is_up_to_date))
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+
+DEFAULT_BASE_URL = "https://www.alphavantage.co/query"
+
+# Intraday data is delayed by 15 minutes; treat a session as complete a little after that
+SESSION_COMPLETE_ET = (16, 30)
+LAST_HOURLY_BAR = "15:00:00"
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate_per_minute` tokens per minute, bursts up to `capacity`
+
+    The rate adapts to the server: a throttle response halves it (down to 1/8 of
+    the configured rate) and each success restores a tenth of the configured rate.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[int] = None):
+        self.max_rate = rate_per_minute / 60.0
+        self.min_rate = self.max_rate / 8
+        self.rate = self.max_rate
+        self.capacity = max(1, int(capacity if capacity is not None else rate_per_minute))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` and drop the current burst (server said we are over quota)"""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.paused_until)
+
+    def throttled(self, seconds: float) -> None:
+        """Pause and halve the rate after a throttle response"""
+        self.pause(seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self) -> None:
+        """Additively restore the rate after a successful call"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class DownloadManifest:
+    """
+    Record of symbols completed in the current run, persisted after every symbol
+
+    A manifest belongs to one run key (e.g. "TIME_SERIES_DAILY:2025-11-10"); a
+    manifest from another key is ignored so the next session starts fresh.
+    """
+
+    def __init__(self, path: Optional[str], run_key: str):
+        self.path = path
+        self.run_key = run_key
+        self.completed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("run_key") == run_key:
+                    self.completed = dict(data.get("completed", {}))
+            except (IOError, json.JSONDecodeError) as e:
+                print(f"⚠️  Ignoring unreadable manifest {path}: {e}")
+
+    def is_done(self, symbol: str) -> bool:
+        return symbol in self.completed
+
+    def mark_done(self, symbol: str, status: str = "downloaded") -> None:
+        with self._lock:
+            self.completed[symbol] = status
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"run_key": self.run_key, "updated": datetime.now().isoformat(), "completed": self.completed}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def latest_completed_session(now: Optional[datetime] = None) -> str:
+    """
+    Date (YYYY-MM-DD) of the most recent US session whose data should be available
+
+    Weekends are skipped; exchange holidays are not known here, so on a holiday
+    the previous session's symbols are simply fetched once more.
+    """
+    if now is None:
+        try:
+            from zoneinfo import ZoneInfo
+
+            now = datetime.now(ZoneInfo("America/New_York"))
+        except Exception:
+            now = datetime.utcnow() - timedelta(hours=5)
+    day = now.date()
+    if (now.hour, now.minute) < SESSION_COMPLETE_ET:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime("%Y-%m-%d")
+
+
+def last_timestamp(file_path: str, series_key: str) -> Optional[str]:
+    """Latest timestamp stored in a price file, or None if the file is missing/unreadable"""
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return None
+    series = data.get(series_key) or {}
+    return max(series) if series else None
+
+
+def is_file_up_to_date(file_path: str, series_key: str, session: str, hourly: bool = False) -> bool:
+    """True if the file already contains the last bar of `session`"""
+    latest = last_timestamp(file_path, series_key)
+    if latest is None:
+        return False
+    target = f"{session} {LAST_HOURLY_BAR}" if hourly else session
+    return latest >= target
+
+
+def _throttle_message(data: Dict[str, Any]) -> Optional[str]:
+    return data.get("Note") or data.get("Information")
+
+
+class AlphaVantageFetcher:
+    """Download AlphaVantage queries for many symbols concurrently within the plan's quota"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        calls_per_minute: Optional[float] = None,
+        burst: Optional[int] = None,
+        concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 2.0,
+        timeout: float = 30.0,
+        base_url: Optional[str] = None,
+    ):
+        """
+        Args:
+            api_key: AlphaVantage API key
+            calls_per_minute: Plan quota (default: $ALPHAVANTAGE_CALLS_PER_MINUTE or 5)
+            burst: Calls allowed back to back before the per-minute rate applies (default: calls_per_minute)
+            concurrency: Maximum requests in flight
+            max_retries: Retries per symbol for transient failures
+            backoff_base: Base delay in seconds for exponential backoff
+            timeout: HTTP timeout in seconds
+            base_url: Query endpoint (default: $ALPHAVANTAGE_BASE_URL or the public API)
+        """
+        if calls_per_minute is None:
+            calls_per_minute = float(os.getenv("ALPHAVANTAGE_CALLS_PER_MINUTE") or 5)
+        self.api_key = api_key
+        self.calls_per_minute = calls_per_minute
+        self.burst = burst
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.base_url = base_url or os.getenv("ALPHAVANTAGE_BASE_URL") or DEFAULT_BASE_URL
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _get(self, params: Dict[str, Any]) -> requests.Response:
+        return self._session().get(self.base_url, params={**params, "apikey": self.api_key}, timeout=self.timeout)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+
+    async def fetch(self, bucket: TokenBucket, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one query with rate limiting and retries
+
+        Returns:
+            The JSON payload
+
+        Raises:
+            RuntimeError: The API returned an error or retries were exhausted
+        """
+        last_error = "no attempt made"
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                response = await asyncio.to_thread(self._get, params)
+            except requests.RequestException as e:
+                last_error = f"request failed: {e}"
+            else:
+                if response.status_code == 429 or response.status_code >= 500:
+                    last_error = f"HTTP {response.status_code}"
+                    if response.status_code == 429:
+                        bucket.throttled(self._backoff(attempt))
+                elif response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                else:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        last_error = "invalid JSON response"
+                    else:
+                        if "Error Message" in data:
+                            raise RuntimeError(data["Error Message"])
+                        throttle = _throttle_message(data)
+                        if throttle is None:
+                            bucket.succeeded()
+                            return data
+                        last_error = f"throttled: {throttle}"
+                        # Over quota: hold every worker back, not just this one, and slow down
+                        bucket.throttled(max(60.0 / self.calls_per_minute, self._backoff(attempt)))
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+        raise RuntimeError(last_error)
+
+    async def fetch_all(
+        self,
+        symbols: Iterable[str],
+        params_for: Callable[[str], Dict[str, Any]],
+        save: Callable[[str, Dict[str, Any]], None],
+        is_up_to_date: Optional[Callable[[str], bool]] = None,
+        manifest: Optional[DownloadManifest] = None,
+    ) -> Dict[str, List[str]]:
+        """
+        Download every symbol and hand each payload to `save`
+
+        Args:
+            symbols: Symbols to download (duplicates are ignored)
+            params_for: Builds the query parameters (without apikey) for a symbol
+            save: Called with (symbol, payload) for each successful download
+            is_up_to_date: Returns True for symbols that need no download
+            manifest: Resume state; completed symbols are skipped and new ones recorded
+
+        Returns:
+            {"downloaded": [...], "skipped": [...], "failed": [...]}
+        """
+        bucket = TokenBucket(self.calls_per_minute, self.burst)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summary: Dict[str, List[str]] = {"downloaded": [], "skipped": [], "failed": []}
+
+        async def run_one(symbol: str) -> None:
+            if manifest is not None and manifest.is_done(symbol):
+                summary["skipped"].append(symbol)
+                return
+            if is_up_to_date is not None and is_up_to_date(symbol):
+                print(f"⏭️  {symbol} already up to date")
+                summary["skipped"].append(symbol)
+                if manifest is not None:
+                    manifest.mark_done(symbol, "up_to_date")
+                return
+            async with semaphore:
+                try:
+                    data = await self.fetch(bucket, params_for(symbol))
+                    await asyncio.to_thread(save, symbol, data)
+                except Exception as e:
+                    print(f"❌ {symbol}: {e}")
+                    summary["failed"].append(symbol)
+                    return
+            print(f"✅ {symbol} downloaded")
+            summary["downloaded"].append(symbol)
+            if manifest is not None:
+                manifest.mark_done(symbol)
+
+        unique = list(dict.fromkeys(symbols))
+        start = time.perf_counter()
+        await asyncio.gather(*(run_one(symbol) for symbol in unique))
+        elapsed = time.perf_counter() - start
+        print(
+            f"📊 {len(summary['downloaded'])} downloaded, {len(summary['skipped'])} skipped, "
+            f"{len(summary['failed'])} failed in {elapsed:.1f}s"
+        )
+        if summary["failed"]:
+            print(f"⚠️  Failed symbols (rerun to retry): {', '.join(summary['failed'])}")
+        return summary
@@ -0,0 +1,260 @@
+"""
+Append-only per-symbol bar store
+
+Price bars live in one SQLite table keyed by (symbol, series, timestamp): the
+primary key is the timestamp index and deduplicates on write, so a refresh only
+touches the bars it downloaded instead of re-reading and rewriting the whole
+history. The legacy daily_prices_{SYMBOL}.json files are an explicit export
+step (export_changed(), or running this file) for the merge scripts and the
+frontend; the downloaders only export when asked to (--export-json). Every
+upsert bumps a per-series revision, so an export only rewrites the files of
+symbols that changed since they were last exported.
+
+Bars are stored exactly as AlphaVantage returns them (string values), so an
+exported file matches what the old read-merge-rewrite produced.
+
+Usage:
+    store = BarStore("./price_bars.sqlite")
+    store.import_legacy_json("./daily_prices_AAPL.json", "AAPL")   # one-time seed, no-op afterwards
+    store.upsert("AAPL", "Time Series (60min)", data["Time Series (60min)"], data.get("Meta Data"))
+    store.export_changed("Time Series (60min)", ".")                  # only symbols updated since the last export
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_STORE_FILE = "price_bars.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL,
+    series TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    bar TEXT NOT NULL,
+    PRIMARY KEY (symbol, series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    symbol TEXT NOT NULL,
+    series TEXT NOT NULL,
+    meta TEXT,
+    PRIMARY KEY (symbol, series)
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    symbol TEXT NOT NULL,
+    series TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    PRIMARY KEY (symbol, series)
+);
+CREATE TABLE IF NOT EXISTS exports (
+    path TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+"""
+
+
+def find_series_key(data: Dict[str, Any]) -> Optional[str]:
+    """Return the "Time Series (...)" key of an AlphaVantage-style document"""
+    for key in data:
+        if key.startswith("Time Series"):
+            return key
+    return None
+
+
+class BarStore:
+    """SQLite-backed bar store shared by the price download scripts"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file (default: $BAR_STORE_PATH or ./price_bars.sqlite)
+        """
+        self.path = path or os.getenv("BAR_STORE_PATH") or os.path.join(".", DEFAULT_STORE_FILE)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Download workers save from several threads; one connection behind a lock keeps writes serialized
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def has_series(self, symbol: str, series: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM meta WHERE symbol = ? AND series = ?", (symbol, series)
+            ).fetchone()
+        return row is not None
+
+    def upsert(self, symbol: str, series: str, bars: Dict[str, Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Write bars for one symbol; a bar with an existing timestamp replaces the stored one
+
+        Args:
+            symbol: Symbol, e.g. "AAPL"
+            series: Series key, e.g. "Time Series (60min)"
+            bars: {timestamp: bar}
+            meta: "Meta Data" block; kept from earlier writes when None
+
+        Returns:
+            Number of timestamps that were not stored before
+        """
+        rows = [(symbol, series, ts, json.dumps(bar, ensure_ascii=False)) for ts, bar in bars.items()]
+        with self._lock, self._conn:
+            before = self._count(symbol, series)
+            self._conn.executemany("INSERT OR REPLACE INTO bars (symbol, series, ts, bar) VALUES (?, ?, ?, ?)", rows)
+            if meta is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (symbol, series, meta) VALUES (?, ?, ?)",
+                    (symbol, series, json.dumps(meta, ensure_ascii=False)),
+                )
+            else:
+                self._conn.execute("INSERT OR IGNORE INTO meta (symbol, series, meta) VALUES (?, ?, NULL)", (symbol, series))
+            self._conn.execute(
+                "INSERT INTO revisions (symbol, series, revision) VALUES (?, ?, 1) "
+                "ON CONFLICT (symbol, series) DO UPDATE SET revision = revision + 1",
+                (symbol, series),
+            )
+            return self._count(symbol, series) - before
+
+    def _count(self, symbol: str, series: str) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM bars WHERE symbol = ? AND series = ?", (symbol, series)).fetchone()[0]
+
+    def import_legacy_json(self, file_path: str, symbol: str) -> bool:
+        """
+        Seed the store from an existing daily_prices_*.json file
+
+        Only runs when the store has nothing for the file's series yet, so calling
+        it before every upsert is cheap once the migration has happened.
+
+        Returns:
+            True if bars were imported
+        """
+        if not os.path.exists(file_path):
+            return False
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"⚠️  Cannot import {file_path}: {e}")
+            return False
+        series = find_series_key(data)
+        if series is None or self.has_series(symbol, series):
+            return False
+        self.upsert(symbol, series, data.get(series) or {}, data.get("Meta Data"))
+        print(f"📦 Imported {file_path} into {self.path}")
+        return True
+
+    def last_timestamp(self, symbol: str, series: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(ts) FROM bars WHERE symbol = ? AND series = ?", (symbol, series)
+            ).fetchone()
+        return row[0] if row else None
+
+    def symbols(self, series: Optional[str] = None) -> List[str]:
+        with self._lock:
+            if series is None:
+                rows = self._conn.execute("SELECT DISTINCT symbol FROM meta ORDER BY symbol").fetchall()
+            else:
+                rows = self._conn.execute("SELECT symbol FROM meta WHERE series = ? ORDER BY symbol", (series,)).fetchall()
+        return [r[0] for r in rows]
+
+    def load(self, symbol: str, series: str, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the legacy document {"Meta Data": ..., series: {timestamp: bar}} (newest first)
+
+        Args:
+            since: Only include bars with timestamp >= since
+        """
+        with self._lock:
+            meta_row = self._conn.execute(
+                "SELECT meta FROM meta WHERE symbol = ? AND series = ?", (symbol, series)
+            ).fetchone()
+            query = "SELECT ts, bar FROM bars WHERE symbol = ? AND series = ?"
+            params: tuple = (symbol, series)
+            if since is not None:
+                query += " AND ts >= ?"
+                params += (since,)
+            rows = self._conn.execute(query + " ORDER BY ts DESC", params).fetchall()
+        document: Dict[str, Any] = {}
+        if meta_row and meta_row[0]:
+            document["Meta Data"] = json.loads(meta_row[0])
+        document[series] = {ts: json.loads(bar) for ts, bar in rows}
+        return document
+
+    def export_json(self, symbol: str, series: str, out_path: str, changed_only: bool = False) -> bool:
+        """
+        Write the legacy daily_prices_{SYMBOL}.json file (atomically)
+
+        Args:
+            changed_only: Skip the write if out_path exists and the series has not
+                been upserted since it was last exported there
+
+        Returns:
+            True if the file was written
+        """
+        key = os.path.abspath(out_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision FROM revisions WHERE symbol = ? AND series = ?", (symbol, series)
+            ).fetchone()
+            revision = row[0] if row else 0
+            exported = self._conn.execute("SELECT revision FROM exports WHERE path = ?", (key,)).fetchone()
+        if changed_only and exported is not None and exported[0] == revision and os.path.exists(out_path):
+            return False
+
+        document = self.load(symbol, series)
+        tmp_path = f"{out_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, out_path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO exports (path, revision) VALUES (?, ?)", (key, revision))
+        return True
+
+    def export_changed(self, series: str, out_dir: str, symbols: Optional[List[str]] = None) -> List[str]:
+        """
+        Export daily_prices_{SYMBOL}.json into out_dir for every symbol updated since its last export
+
+        Args:
+            series: Series key, e.g. "Time Series (60min)"
+            out_dir: Directory of the legacy JSON files
+            symbols: Symbols to consider (default: all in the store for this series)
+
+        Returns:
+            Symbols whose file was written
+        """
+        written = []
+        for symbol in symbols if symbols is not None else self.symbols(series):
+            if self.export_json(symbol, series, os.path.join(out_dir, f"daily_prices_{symbol}.json"), changed_only=True):
+                written.append(symbol)
+        return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export legacy JSON price files from the bar store")
+    parser.add_argument("--store", help="SQLite store (default: $BAR_STORE_PATH or ./price_bars.sqlite)")
+    parser.add_argument("--series", default="Time Series (60min)", help="Series key to export")
+    parser.add_argument("--out-dir", default=".", help="Directory for daily_prices_{SYMBOL}.json")
+    parser.add_argument("--symbols", help="Comma separated symbols (default: all in the store)")
+    parser.add_argument("--all", action="store_true", help="Rewrite every file, not only symbols updated since the last export")
+    args = parser.parse_args()
+
+    store = BarStore(args.store)
+    symbols = args.symbols.split(",") if args.symbols else store.symbols(args.series)
+    if args.all:
+        for symbol in symbols:
+            store.export_json(symbol, args.series, os.path.join(args.out_dir, f"daily_prices_{symbol}.json"))
+        written = symbols
+    else:
+        written = store.export_changed(args.series, args.out_dir, symbols)
+    print(f"✅ Exported {len(written)} of {len(symbols)} symbols from {store.path} to {args.out_dir}")
@@ -0,0 +1,111 @@
+"""
+Content-addressed backups for price files
+
+Each backed-up file is stored once under {backup_root}/objects/<sha1>; a backup
+snapshot is a directory of hard links into that store. Backing up a directory
+in which most files did not change therefore costs a hash per file and a link
+per file, and only changed files take new space. Where hard links are not
+supported the object is copied instead.
+
+Layout:
+    {backup_root}/objects/ab/abcdef...          file contents, named by SHA-1
+    {backup_root}/snapshots/20251116_120000/    hard links, original file names
+
+Usage:
+    store = ContentBackup("coin_backups")
+    store.snapshot_file("coin/daily_prices_BTC.json")
+    store.snapshot_directory("coin")
+"""
+
+import hashlib
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def file_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentBackup:
+    """Hard-link snapshots backed by a SHA-1 object store"""
+
+    def __init__(self, backup_root: str):
+        self.root = Path(backup_root)
+        self.objects = self.root / "objects"
+        self.snapshots = self.root / "snapshots"
+        self._hash_cache: Dict[str, tuple] = {}
+
+    def _hash(self, path: Path) -> str:
+        # Files whose size and mtime did not change since the last hash keep their digest
+        st = path.stat()
+        cached = self._hash_cache.get(str(path))
+        if cached and cached[0] == (st.st_size, st.st_mtime_ns):
+            return cached[1]
+        digest = file_sha1(path)
+        self._hash_cache[str(path)] = ((st.st_size, st.st_mtime_ns), digest)
+        return digest
+
+    def store_object(self, path: Path) -> Path:
+        """Add a file's contents to the object store (no-op if already present) and return the object path"""
+        digest = self._hash(path)
+        obj = self.objects / digest[:2] / digest
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_name(obj.name + ".tmp")
+            shutil.copy2(path, tmp)
+            os.replace(tmp, obj)
+        return obj
+
+    def _link(self, obj: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            target.unlink()
+        try:
+            os.link(obj, target)
+        except OSError:
+            shutil.copy2(obj, target)
+
+    def _snapshot_dir(self, label: Optional[str]) -> Path:
+        return self.snapshots / (label or datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+    def snapshot_file(self, path: str, label: Optional[str] = None) -> Optional[Path]:
+        """
+        Back up one file into a snapshot
+
+        Returns:
+            Path of the snapshot entry, or None if the file does not exist
+        """
+        path = Path(path)
+        if not path.is_file():
+            return None
+        target = self._snapshot_dir(label) / path.name
+        # A snapshot keeps the first version it saw, i.e. the state before the run changed the file
+        if not target.exists():
+            self._link(self.store_object(path), target)
+        return target
+
+    def snapshot_directory(self, directory: str, label: Optional[str] = None, pattern: str = "*") -> Optional[Path]:
+        """
+        Back up the files of a directory matching `pattern` (recursively) into one snapshot
+
+        Returns:
+            The snapshot directory, or None if `directory` does not exist
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            return None
+        snapshot = self._snapshot_dir(label)
+        stored = 0
+        for path in sorted(directory.rglob(pattern)):
+            if path.is_file():
+                self._link(self.store_object(path), snapshot / path.relative_to(directory))
+                stored += 1
+        print(f"Created snapshot {snapshot} ({stored} files, unchanged contents shared)")
+        return snapshot
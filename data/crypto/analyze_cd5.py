@@ -4,62 +4,60 @@ import numpy as np
 import sys
 from pathlib import Path
 
-# 添加项目根目录到路径，以便导入result_tools
+# 添加项目根目录到路径，以便导入tools.metrics
 project_root = Path(__file__).resolve().parents[2]  # data/crypto -> AI-Trader
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from tools.result_tools import (
-    calculate_daily_returns, calculate_sharpe_ratio, calculate_max_drawdown,
-    calculate_cumulative_return, calculate_volatility, calculate_win_rate
+from tools.benchmark_series import load_benchmark
+from tools.metrics import (
+    cumulative_return as calculate_cumulative_return, max_drawdown_period as calculate_max_drawdown,
+    period_returns as calculate_daily_returns, periods_per_year,
+    sharpe_ratio as calculate_sharpe_ratio, volatility as calculate_volatility, win_stats
 )
 
-# 读取CD5指数数据
-with open('CD5_crypto_index.json', 'r') as f:
-    data = json.load(f)
-
-time_series = data['Time Series (Daily)']
-dates = sorted(time_series.keys())
+# 读取CD5指数数据（tools/benchmark_series.py，按时间排序的数组）
+cd5 = load_benchmark('CD5_crypto_index.json')
 
 # 过滤掉11-01的数据，从11-02开始，与agent模拟时间保持一致
 agent_start_date = "2025-11-02"
-if agent_start_date in dates:
-    start_index = dates.index(agent_start_date)
-    dates = dates[start_index:]
+if agent_start_date in cd5.timestamps:
+    cd5 = cd5.window(agent_start_date)
     print(f'⚠️ 时间对齐: 跳过11-01，从{agent_start_date}开始计算，与agent模拟保持一致')
 else:
     print(f'⚠️ 未找到{agent_start_date}数据，使用全部可用数据')
 
+dates = cd5.timestamps.tolist()
+
 print('=== CD5指数数据分析 (与Agent时间对齐) ===')
 print(f'数据日期范围: {dates[0]} 到 {dates[-1]}')
 print(f'总交易日数: {len(dates)}')
 
-# 计算CD5指数表现 (与result_tools.py保持一致，使用收盘价)
-# 构建组合价值字典 (与result_tools.py格式一致)
-portfolio_values = {}
-for date in dates:
-    portfolio_values[date] = float(time_series[date]['4. close'])
+# 计算CD5指数表现 (使用收盘价，指标定义与calculate_metrics.py一致，见tools/metrics.py)
+values = cd5.closes
 
-initial_value = portfolio_values[dates[0]]  # 使用第一天的收盘价，与result_tools.py一致
-final_value = portfolio_values[dates[-1]]  # 使用最后一天的收盘价
+initial_value = values[0]  # 使用第一天的收盘价
+final_value = values[-1]  # 使用最后一天的收盘价
 
 print(f'初始价值: ${initial_value:,.2f}')
 print(f'最终价值: ${final_value:,.2f}')
 print(f'价值变化: ${final_value - initial_value:,.2f}')
 
-# 使用result_tools.py的函数计算指标，确保完全一致
 from datetime import datetime
 
-# 计算各项指标 (与result_tools.py保持完全一致)
-daily_returns = calculate_daily_returns(portfolio_values)
-volatility = calculate_volatility(daily_returns, trading_days=365)  # 加密货币365天
-win_rate = calculate_win_rate(daily_returns)
-sharpe_ratio = calculate_sharpe_ratio(daily_returns, trading_days=365)  # 加密货币365天
-max_drawdown, drawdown_start, drawdown_end = calculate_max_drawdown(portfolio_values)
+# 计算各项指标
+trading_days = periods_per_year(is_crypto=True)  # 加密货币365天
+risk_free_rate = 0.02
+daily_returns = calculate_daily_returns(values)[0]
+volatility = float(calculate_volatility(values, trading_days)[0])
+win_rate = float(win_stats(values)["Win Rate"][0])
+sharpe_ratio = float(calculate_sharpe_ratio(values, trading_days, risk_free_rate)[0])
+max_drawdown, peak_index, trough_index = (x[0] for x in calculate_max_drawdown(values))
+max_drawdown = float(max_drawdown)
+drawdown_start, drawdown_end = dates[peak_index], dates[trough_index]
 
-# 使用result_tools.py的累计收益率函数确保一致性
-cumulative_return = calculate_cumulative_return(portfolio_values)
-print(f'累计收益率: {cumulative_return:.2%} (使用result_tools.py计算)')
+cumulative_return = float(calculate_cumulative_return(values)[0])
+print(f'累计收益率: {cumulative_return:.2%}')
 
 # 计算年化收益率
 start_date = datetime.strptime(dates[0], "%Y-%m-%d")
@@ -80,12 +78,9 @@ print(f'夏普比率: {sharpe_ratio:.4f}')
 print(f'胜率: {win_rate:.2%}')
 
 # 为了兼容性，保留原有的变量名
-daily_volatility = np.std(daily_returns, ddof=1) if daily_returns else 0.0
-mean_return = np.mean(daily_returns) if daily_returns else 0.0
+daily_volatility = float(np.std(daily_returns)) if len(daily_returns) else 0.0
+mean_return = float(np.mean(daily_returns)) if len(daily_returns) else 0.0
 annualized_return_for_sharpe = mean_return * 365
-risk_free_rate = 0.02
-
-# portfolio_values 已经在上面构建了，无需重复
 
 # 输出用于报告的数据
 print(f'\n=== 用于报告的数据 ===')
@@ -111,9 +106,9 @@ if save_cd5_results:
         "trading_days": len(dates),
         "start_date": dates[0],
         "end_date": dates[-1],
-        "initial_value": initial_value,
-        "final_value": final_value,
-        "value_change": final_value - initial_value,
+        "initial_value": float(initial_value),
+        "final_value": float(final_value),
+        "value_change": float(final_value - initial_value),
         "cumulative_return": round(cumulative_return, 4),
         "annualized_return": round(annualized_return, 4),
         "sharpe_ratio": round(sharpe_ratio, 4),
@@ -166,9 +161,9 @@ if save_cd5_results:
         "max_drawdown": round(max_drawdown, 4),
         "volatility": round(volatility, 4),
         "win_rate": round(win_rate, 4),
-        "initial_value": initial_value,
-        "final_value": final_value,
-        "value_change": final_value - initial_value,
+        "initial_value": float(initial_value),
+        "final_value": float(final_value),
+        "value_change": float(final_value - initial_value),
         "value_change_percent": round(cumulative_return, 4),
         "is_benchmark": True
     }
@@ -1,11 +1,17 @@
+import argparse
+import asyncio
 import os
-import time
 import json
 import requests
-import shutil
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from alphavantage_fetcher import AlphaVantageFetcher
+from bar_store import DEFAULT_STORE_FILE, BarStore
+from content_backup import ContentBackup
+
 load_dotenv()
 
 # Load crypto configuration
@@ -49,23 +55,35 @@ if crypto_config and "symbols" in crypto_config:
     print(f"Using symbols from config: {crypto_symbols_usdt}")
 
 
+# One snapshot per run: every file backed up by this process lands in the same snapshot
+BACKUP_LABEL = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+_content_backups = {}
+
+
+def get_content_backup():
+    """Content-addressed backup store next to the coin folder (one per run, so file hashes are reused)"""
+    backup_folder = get_config_value("file_paths.backup_folder", "coin_backups")
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    backup_root = os.path.join(current_dir, backup_folder)
+    if backup_root not in _content_backups:
+        _content_backups[backup_root] = ContentBackup(backup_root)
+    return _content_backups[backup_root]
+
+
 def backup_data(path):
-    """Create backup of file or directory by adding _backup suffix"""
+    """Back up a file or directory into the content-addressed store (unchanged files are hard-linked)"""
     if not os.path.exists(path):
         return False
 
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"{path}_backup_{timestamp}"
-
+        store = get_content_backup()
         if os.path.isfile(path):
-            shutil.copy2(path, backup_path)
+            backup_path = store.snapshot_file(path, label=BACKUP_LABEL)
             print(f"Created file backup: {backup_path}")
         elif os.path.isdir(path):
-            if os.path.exists(backup_path):
-                shutil.rmtree(backup_path)
-            shutil.copytree(path, backup_path)
-            print(f"Created directory backup: {backup_path}")
+            store.snapshot_directory(path, label=BACKUP_LABEL, pattern="*.json")
 
         return True
     except Exception as e:
@@ -103,78 +121,38 @@ def get_config_value(key, default=None):
     return value
 
 
-def merge_crypto_data(new_data, old_data):
-    """Merge new crypto data with old data, always using new data for conflicts"""
-    if not old_data:
-        return new_data
+_bar_stores = {}
 
-    if not new_data:
-        return old_data
 
-    merged_data = old_data.copy()
+def get_bar_store(coin_dir):
+    """Open (once) the bar store kept next to the coin JSON files"""
+    if coin_dir not in _bar_stores:
+        _bar_stores[coin_dir] = BarStore(os.path.join(coin_dir, DEFAULT_STORE_FILE))
+    return _bar_stores[coin_dir]
 
-    # Get time series data
-    old_time_series = old_data.get("Time Series (Daily)", {})
-    new_time_series = new_data.get("Time Series (Daily)", {})
 
-    # Merge time series data
-    merged_time_series = old_time_series.copy()
-
-    for date, new_values in new_time_series.items():
-        # Always use new data (overwrite old data if date exists)
-        merged_time_series[date] = new_values
-
-    # Sort the merged time series by date (latest to oldest)
-    sorted_time_series = dict(sorted(merged_time_series.items(), reverse=True))
-
-    # Update merged data with sorted time series
-    merged_data["Time Series (Daily)"] = sorted_time_series
-
-    # Update metadata from new data if available
-    if new_data.get("Meta Data"):
-        merged_data["Meta Data"] = new_data["Meta Data"].copy()
-
-    return merged_data
-
-
-def load_existing_crypto_data(filepath):
-    """Load existing crypto data from JSON file"""
-    if not os.path.exists(filepath):
-        return None
-
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"Error loading existing data from {filepath}: {e}")
-        return None
+def save_crypto_data_with_merge(data, symbol, filepath):
+    """
+    Merge downloaded crypto bars into the bar store next to filepath (with backup)
 
+    The legacy JSON file is not rewritten here; see export_json_files.
 
-def save_crypto_data_with_merge(data, symbol, filepath):
-    """Save crypto data with forced merging and backup"""
+    Returns:
+        Number of days that were not stored before
+    """
     # Check if we should create backup
     backup_before_merge = get_config_value("auto_merge.backup_before_merge", True)
 
-    # Load existing data
-    existing_data = load_existing_crypto_data(filepath)
-
-    if existing_data and backup_before_merge:
+    if os.path.exists(filepath) and backup_before_merge:
         backup_data(filepath)
 
-    # Merge data (always merge - no configuration option)
-    if existing_data:
-        merged_data = merge_crypto_data(data, existing_data)
-        print(f"Merged data for {symbol} (always using new data)")
-    else:
-        merged_data = data
-        print(f"No existing data found for {symbol}, saving new data")
-
-    # Save merged data
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(merged_data, f, ensure_ascii=False, indent=4)
-
-    return merged_data
+    # Seed the store from the existing JSON once, then only write the downloaded bars
+    # (always using new data for dates that already exist)
+    store = get_bar_store(os.path.dirname(os.path.abspath(filepath)))
+    store.import_legacy_json(filepath, symbol)
+    added = store.upsert(symbol, "Time Series (Daily)", data.get("Time Series (Daily)", {}), data.get("Meta Data"))
+    print(f"Merged data for {symbol} ({added} new days, always using new data)")
+    return added
 
 
 def convert_crypto_to_standard_format(data, symbol):
@@ -212,6 +190,49 @@ def convert_crypto_to_standard_format(data, symbol):
     return standard_data
 
 
+def get_coin_dir():
+    """Folder of the coin price files (and their bar store)"""
+    coin_folder = get_config_value("file_paths.coin_folder", "coin")
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), coin_folder)
+
+
+def save_crypto_response(symbol, data):
+    """Convert an Alpha Vantage DIGITAL_CURRENCY_DAILY response and merge it into the coin bar store"""
+    # Check if we got valid data
+    if "Time Series (Digital Currency Daily)" not in data:
+        raise ValueError(f"No time series data found for {symbol}: {data}")
+
+    # Convert to standard format
+    standard_data = convert_crypto_to_standard_format(data, symbol)
+
+    # Save with same naming convention as stocks
+    # Ensure the coin folder exists relative to this script's directory
+    coin_dir = get_coin_dir()
+    os.makedirs(coin_dir, exist_ok=True)
+    filename = f"{coin_dir}/daily_prices_{symbol}.json"
+
+    # Save with merging functionality
+    added = save_crypto_data_with_merge(standard_data, symbol, filename)
+
+    print(f"Successfully saved data for {symbol}")
+    return added
+
+
+def export_json_files(symbols_list=None):
+    """
+    Export coin/daily_prices_{symbol}.json (read by merge_crypto_jsonl.py) for coins updated since their last export
+
+    Returns:
+        Symbols whose file was written
+    """
+    if symbols_list is None:
+        symbols_list = crypto_symbols_usdt
+    coin_dir = get_coin_dir()
+    written = get_bar_store(coin_dir).export_changed("Time Series (Daily)", coin_dir, symbols_list)
+    print(f"Exported {len(written)} of {len(symbols_list)} JSON files to {coin_dir}")
+    return written
+
+
 def get_crypto_daily_price(symbol: str, market: str = "USD"):
     """
     Get daily cryptocurrency price data from Alpha Vantage
@@ -243,30 +264,7 @@ def get_crypto_daily_price(symbol: str, market: str = "USD"):
             print(f"API Error for {symbol}: {data.get('Note', data.get('Information', 'Unknown error'))}")
             return None
 
-        # Check if we got valid data
-        if "Time Series (Digital Currency Daily)" not in data:
-            print(f"No time series data found for {symbol}")
-            print(f"Response: {data}")
-            return None
-
-        # Convert to standard format
-        standard_data = convert_crypto_to_standard_format(data, symbol)
-
-        # Get file paths from config or use defaults
-        coin_folder = get_config_value("file_paths.coin_folder", "coin")
-
-        # Save with same naming convention as stocks
-        # Ensure the coin folder exists relative to this script's directory
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        coin_dir = os.path.join(current_dir, coin_folder)
-        os.makedirs(coin_dir, exist_ok=True)
-        filename = f"{coin_dir}/daily_prices_{symbol}.json"
-
-        # Save with merging functionality
-        saved_data = save_crypto_data_with_merge(standard_data, symbol, filename)
-
-        print(f"Successfully saved data for {symbol} to {filename}")
-        return saved_data
+        return save_crypto_response(symbol, data)
 
     except requests.exceptions.RequestException as e:
         print(f"Network error fetching {symbol}: {e}")
@@ -279,46 +277,57 @@ def get_crypto_daily_price(symbol: str, market: str = "USD"):
         return None
 
 
-def get_all_crypto_prices(symbols_list=None, delay_seconds=None):
+def get_all_crypto_prices(symbols_list=None, delay_seconds=None, calls_per_minute=None, concurrency=None):
     """
-    Get daily prices for all cryptocurrencies with rate limiting
+    Get daily prices for all cryptocurrencies concurrently within the API quota
+
+    Requests are paced by an adaptive token bucket (see alphavantage_fetcher.py)
+    instead of a fixed sleep between coins, so up to `concurrency` calls are in
+    flight while quota remains.
 
     Args:
         symbols_list: List of crypto symbols, defaults to crypto_symbols_usdt
-        delay_seconds: Delay between API calls (default: from config, typically 12 seconds)
+        delay_seconds: Legacy pacing option; converted to calls_per_minute = 60 / delay_seconds
+        calls_per_minute: API plan quota (default: from config, typically 5)
+        concurrency: Maximum requests in flight (default: from config, typically 5)
+
+    Returns:
+        {"downloaded": [...], "skipped": [...], "failed": [...]}
     """
     if symbols_list is None:
         symbols_list = crypto_symbols_usdt
 
-    # Use delay from config if not specified
-    if delay_seconds is None:
-        delay_seconds = get_config_value("api_settings.delay_seconds", 12)
-
-    print(f"Starting crypto price collection for {len(symbols_list)} symbols...")
-    print(f"Using {delay_seconds} second delay between calls to respect API rate limits")
-
-    successful = 0
-    failed = 0
-
-    for i, symbol in enumerate(symbols_list, 1):
-        print(f"\n[{i}/{len(symbols_list)}] Processing {symbol}...")
-
-        result = get_crypto_daily_price(symbol)
-
-        if result:
-            successful += 1
+    if calls_per_minute is None:
+        if delay_seconds is not None:
+            calls_per_minute = 60.0 / delay_seconds
         else:
-            failed += 1
+            calls_per_minute = get_config_value("api_settings.calls_per_minute", 5)
+    if concurrency is None:
+        concurrency = get_config_value("api_settings.concurrency", 5)
+    market = get_config_value("api_settings.market", "USD")
 
-        # Add delay between API calls except for the last one
-        if i < len(symbols_list):
-            print(f"Waiting {delay_seconds} seconds before next request...")
-            time.sleep(delay_seconds)
+    APIKEY = os.getenv("ALPHAADVANTAGE_API_KEY")
+    if not APIKEY:
+        print("Error: ALPHAADVANTAGE_API_KEY not found in environment variables")
+        return None
+
+    print(f"Starting crypto price collection for {len(symbols_list)} symbols...")
+    print(f"Using up to {calls_per_minute:g} calls/min with {concurrency} requests in flight")
+
+    fetcher = AlphaVantageFetcher(APIKEY, calls_per_minute=calls_per_minute, concurrency=concurrency)
+    summary = asyncio.run(
+        fetcher.fetch_all(
+            symbols_list,
+            lambda symbol: {"function": "DIGITAL_CURRENCY_DAILY", "symbol": symbol, "market": market},
+            save_crypto_response,
+        )
+    )
 
     print(f"\n" + "="*50)
-    print(f"Summary: {successful} successful, {failed} failed")
-    print(f"Rate limit: {delay_seconds}s delay between calls")
+    print(f"Summary: {len(summary['downloaded'])} successful, {len(summary['failed'])} failed")
+    print(f"Rate limit: {calls_per_minute:g} calls/min")
     print("="*50)
+    return summary
 
 
 def get_daily_price(symbol: str):
@@ -330,11 +339,18 @@ def get_daily_price(symbol: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download daily crypto prices from Alpha Vantage")
+    parser.add_argument("--export-json", action="store_true",
+                        help="After downloading, export coin/daily_prices_{symbol}.json for coins that changed")
+    args = parser.parse_args()
+
     # Test with BTC only
     # test_symbols = ["BTC"]
 
     print("Testing with sample symbols first...")
-    # get_all_crypto_prices(test_symbols, delay_seconds=12)
+    # get_all_crypto_prices(test_symbols)
 
     # Uncomment the line below to fetch all cryptocurrencies
-    get_all_crypto_prices(crypto_symbols_usdt, delay_seconds=12)
\ No newline at end of file
+    get_all_crypto_prices(crypto_symbols_usdt)
+    if args.export_json:
+        export_json_files(crypto_symbols_usdt)
\ No newline at end of file
@@ -0,0 +1,367 @@
+"""
+Vectorized engine for synthetic crypto indices (CD5 and other baselines)
+
+Prices are loaded once into aligned arrays: a sorted timestamp vector and
+timestamps × coins matrices of open (buy) and close (sell) prices, NaN where a
+coin has no bar. An index holds a number of units per coin; between rebalances
+the units are constant, so the index value of every bar in that stretch is one
+matrix-vector product. Only the rebalance points (a handful per run) are
+visited in Python, which keeps building an index in the millisecond range and
+lets many baselines share one loaded matrix.
+
+Weighting schemes:
+    FixedWeights({"BTC-USDT": 74.56, ...})              buy and hold at the base bar
+    FixedWeights(weights, rebalance_every=30)           reset to the target weights every 30 bars
+    CapWeights({"BTC-USDT": 19.9e6, ...}, rebalance_every=30)
+                                                        weights ∝ price × circulating supply
+    EqualWeights(rebalance_every=7)
+
+Incremental updates: IndexResult.state() captures units and the last bar;
+extend_index() continues from that state over bars that arrived since, so a
+daily refresh touches only the new rows.
+
+Usage:
+    matrix = load_price_matrix("crypto_merged.jsonl").common()
+    result = build_index(matrix, FixedWeights(weights), 50000.0, base_timestamp="2025-11-02")
+    series = result.to_series()
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Output format of the index bars (QQQ-compatible)
+SERIES_KEYS = {"daily": "Time Series (Daily)", "hourly": "Time Series (60min)"}
+
+
+class PriceMatrix:
+    """Aligned open/close prices: `timestamps` (T,), `opens` and `closes` (T, N) for `symbols`"""
+
+    def __init__(self, timestamps: np.ndarray, symbols: List[str], opens: np.ndarray, closes: np.ndarray):
+        self.timestamps = timestamps
+        self.symbols = list(symbols)
+        self.opens = opens
+        self.closes = closes
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def select(self, symbols: List[str]) -> "PriceMatrix":
+        """Columns for `symbols`, in that order"""
+        missing = [s for s in symbols if s not in self.symbols]
+        if missing:
+            raise ValueError(f"Symbols not found in data: {missing}. Available: {self.symbols}")
+        cols = [self.symbols.index(s) for s in symbols]
+        return PriceMatrix(self.timestamps, symbols, self.opens[:, cols], self.closes[:, cols])
+
+    def common(self) -> "PriceMatrix":
+        """Rows where every symbol has a bar (open or close)"""
+        present = ~(np.isnan(self.opens) & np.isnan(self.closes))
+        rows = present.all(axis=1)
+        return PriceMatrix(self.timestamps[rows], self.symbols, self.opens[rows], self.closes[rows])
+
+    def after(self, timestamp: str) -> "PriceMatrix":
+        """Rows strictly after `timestamp`"""
+        start = int(np.searchsorted(self.timestamps, timestamp, side="right"))
+        return PriceMatrix(self.timestamps[start:], self.symbols, self.opens[start:], self.closes[start:])
+
+    def row_of(self, timestamp: str) -> Optional[int]:
+        row = int(np.searchsorted(self.timestamps, timestamp))
+        if row < len(self.timestamps) and self.timestamps[row] == timestamp:
+            return row
+        return None
+
+
+def _series_of(doc: Dict[str, Any], series_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    if series_key is not None:
+        return doc.get(series_key)
+    for key, value in doc.items():
+        if key.startswith("Time Series") and isinstance(value, dict):
+            return value
+    return None
+
+
+def load_price_matrix(crypto_file: str, series_key: Optional[str] = None) -> PriceMatrix:
+    """
+    Load a merged crypto JSONL file into a PriceMatrix
+
+    Args:
+        crypto_file: Path of crypto_merged.jsonl (one document per coin)
+        series_key: Series to read, e.g. "Time Series (60min)" (default: the first "Time Series ..." key)
+
+    Returns:
+        PriceMatrix over the union of timestamps, columns named by Meta Data "2. Symbol"
+    """
+    columns: Dict[str, Dict[str, Any]] = {}
+    with open(crypto_file, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Error parsing line {line_num}: {e}")
+                continue
+            symbol = doc.get("Meta Data", {}).get("2. Symbol")
+            series = _series_of(doc, series_key)
+            if symbol and isinstance(series, dict):
+                columns[symbol] = series
+
+    symbols = list(columns)
+    timestamps = np.array(sorted(set().union(*columns.values())) if columns else [], dtype=object)
+    index = {ts: i for i, ts in enumerate(timestamps)}
+    opens = np.full((len(timestamps), len(symbols)), np.nan)
+    closes = np.full((len(timestamps), len(symbols)), np.nan)
+    for col, symbol in enumerate(symbols):
+        series = columns[symbol]
+        rows = np.fromiter((index[ts] for ts in series), dtype=np.intp, count=len(series))
+        bars = list(series.values())
+        opens[rows, col] = [float(bar.get("1. buy price", "nan")) for bar in bars]
+        closes[rows, col] = [float(bar.get("4. sell price", "nan")) for bar in bars]
+    return PriceMatrix(timestamps, symbols, opens, closes)
+
+
+class WeightingScheme:
+    """Target weights per coin, applied at the base bar and every `rebalance_every` bars after it"""
+
+    def __init__(self, rebalance_every: Optional[int] = None):
+        self.rebalance_every = rebalance_every
+
+    def raw_weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        """Weights at `row`, normalised over the coins that have a valid open price there"""
+        w = np.asarray(self.raw_weights(matrix, row), dtype=float)
+        w = np.where(np.isfinite(matrix.opens[row]) & (matrix.opens[row] > 0), w, 0.0)
+        total = w.sum()
+        if total <= 0:
+            raise ValueError(f"No tradable coins at {matrix.timestamps[row]}")
+        return w / total
+
+    def key(self) -> str:
+        """Identifies the scheme in saved index state; a different key forces a rebuild"""
+        return f"{type(self).__name__}:{self.rebalance_every}"
+
+
+class FixedWeights(WeightingScheme):
+    """
+    Constant target weights per symbol, as fractions of the index value
+
+    The weights are used as given rather than normalised, so a published
+    composition whose rounded percentages sum to 100.02% invests exactly that.
+    """
+
+    def __init__(self, weights: Dict[str, float], rebalance_every: Optional[int] = None):
+        super().__init__(rebalance_every)
+        self.target = dict(weights)
+
+    def raw_weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        return np.array([self.target.get(symbol, 0.0) for symbol in matrix.symbols])
+
+    def weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        w = self.raw_weights(matrix, row)
+        return np.where(np.isfinite(matrix.opens[row]) & (matrix.opens[row] > 0), w, 0.0)
+
+    def key(self) -> str:
+        return f"{super().key()}:{json.dumps(self.target, sort_keys=True)}"
+
+
+class CapWeights(WeightingScheme):
+    """Market-cap weights: open price × circulating supply at each rebalance bar"""
+
+    def __init__(self, supply: Dict[str, float], rebalance_every: Optional[int] = None):
+        super().__init__(rebalance_every)
+        self.supply = dict(supply)
+
+    def raw_weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        supply = np.array([self.supply.get(symbol, 0.0) for symbol in matrix.symbols])
+        return np.nan_to_num(matrix.opens[row]) * supply
+
+    def key(self) -> str:
+        return f"{super().key()}:{json.dumps(self.supply, sort_keys=True)}"
+
+
+class EqualWeights(WeightingScheme):
+    """Same weight for every coin"""
+
+    def raw_weights(self, matrix: PriceMatrix, row: int) -> np.ndarray:
+        return np.ones(len(matrix.symbols))
+
+
+class IndexResult:
+    """Index bars produced by build_index / extend_index"""
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        opens: np.ndarray,
+        closes: np.ndarray,
+        units: np.ndarray,
+        since_rebalance: int,
+        scheme_key: str,
+        symbols: List[str],
+        skipped: List[str],
+    ):
+        self.timestamps = timestamps
+        self.opens = opens
+        self.closes = closes
+        self.units = units
+        self.since_rebalance = since_rebalance
+        self.scheme_key = scheme_key
+        self.symbols = symbols
+        self.skipped = skipped
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def to_series(self) -> Dict[str, Dict[str, str]]:
+        """Bars in QQQ format (strings with 4 decimal places; high/low/volume are not computed)"""
+        return {
+            ts: {
+                "1. open": f"{o:.4f}",
+                "2. high": "0.0000",
+                "3. low": "0.0000",
+                "4. close": f"{c:.4f}",
+                "5. volume": "0",
+            }
+            for ts, o, c in zip(self.timestamps.tolist(), self.opens.tolist(), self.closes.tolist())
+        }
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        """Everything extend_index needs to continue after the last bar (None if there are no bars)"""
+        if not len(self):
+            return None
+        return {
+            "scheme": self.scheme_key,
+            "symbols": self.symbols,
+            "last_timestamp": self.timestamps[-1],
+            "last_close": float(self.closes[-1]),
+            "units": self.units.tolist(),
+            "since_rebalance": self.since_rebalance,
+        }
+
+
+def _run(
+    matrix: PriceMatrix,
+    scheme: WeightingScheme,
+    units: np.ndarray,
+    prev_close: Optional[float],
+    since_rebalance: int,
+) -> IndexResult:
+    """
+    Value `units` over every row of `matrix`, rebalancing per `scheme`
+
+    A bar is kept when at least half of the coins have positive open and close
+    prices and the index closes above zero; missing coins contribute nothing.
+    Each kept bar opens at the previous kept close (the first one at the value
+    of the units at its open).
+    """
+    n_rows, n_coins = matrix.opens.shape
+    opens = np.nan_to_num(matrix.opens)
+    closes = np.nan_to_num(matrix.closes)
+    valid_coins = ((opens > 0) & (closes > 0)).sum(axis=1)
+
+    # Rebalance rows split the run into stretches of constant units
+    every = scheme.rebalance_every
+    rebalance_rows = set()
+    if every:
+        rebalance_rows = set(range((every - 1 - since_rebalance) % every, n_rows, every))
+        # A fresh index was bought at its base bar with the target weights already
+        rebalance_rows.discard(0 if prev_close is None else -1)
+    bounds = sorted({0, n_rows} | rebalance_rows)
+
+    open_values = np.empty(n_rows)
+    close_values = np.empty(n_rows)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start in rebalance_rows:
+            value = float(opens[start] @ units)
+            units = scheme.weights(matrix, start) * value / np.where(opens[start] > 0, opens[start], 1.0)
+        open_values[start:end] = opens[start:end] @ units
+        close_values[start:end] = closes[start:end] @ units
+
+    keep = (valid_coins >= n_coins / 2) & (close_values > 0)
+    kept_close = close_values[keep]
+    kept_open = np.empty_like(kept_close)
+    if len(kept_close):
+        kept_open[1:] = kept_close[:-1]
+        kept_open[0] = prev_close if prev_close is not None else open_values[keep][0]
+
+    if every:
+        since_rebalance = (since_rebalance + n_rows) % every
+    return IndexResult(
+        matrix.timestamps[keep],
+        kept_open,
+        kept_close,
+        units,
+        since_rebalance,
+        scheme.key(),
+        matrix.symbols,
+        matrix.timestamps[~keep].tolist(),
+    )
+
+
+def build_index(
+    matrix: PriceMatrix,
+    scheme: WeightingScheme,
+    total_value: float,
+    base_timestamp: Optional[str] = None,
+) -> IndexResult:
+    """
+    Build an index from `base_timestamp` on, buying `total_value` at that bar's open prices
+
+    Args:
+        matrix: Prices (usually PriceMatrix.common() of the constituents)
+        scheme: Weighting scheme
+        total_value: Index value at the base bar's open
+        base_timestamp: Purchase bar (default: the first row)
+
+    Returns:
+        IndexResult for the base bar and every later row
+    """
+    base_row = 0 if base_timestamp is None else matrix.row_of(base_timestamp)
+    if base_row is None:
+        raise ValueError(f"Base timestamp {base_timestamp} not found in data")
+    weights = scheme.weights(matrix, base_row)
+    units = weights * total_value / np.where(matrix.opens[base_row] > 0, matrix.opens[base_row], 1.0)
+    units = np.nan_to_num(units)
+    rows = PriceMatrix(
+        matrix.timestamps[base_row:], matrix.symbols, matrix.opens[base_row:], matrix.closes[base_row:]
+    )
+    # since_rebalance counts bars after the last rebalance; the base bar is one, so it starts at -1
+    return _run(rows, scheme, units, None, -1)
+
+
+def extend_index(matrix: PriceMatrix, scheme: WeightingScheme, state: Dict[str, Any]) -> Optional[IndexResult]:
+    """
+    Continue an index from IndexResult.state() over the rows after its last bar
+
+    Returns:
+        IndexResult with only the new bars, or None when `state` does not belong
+        to this scheme/constituent set (rebuild with build_index instead)
+    """
+    if state.get("scheme") != scheme.key() or state.get("symbols") != matrix.symbols:
+        return None
+    if matrix.row_of(state["last_timestamp"]) is None:
+        return None
+    rows = matrix.after(state["last_timestamp"])
+    return _run(rows, scheme, np.array(state["units"], dtype=float), state["last_close"], state["since_rebalance"])
+
+
+def load_state(path: Path) -> Optional[Dict[str, Any]]:
+    if not Path(path).exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return None
+
+
+def save_state(path: Path, state: Dict[str, Any]) -> None:
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    tmp_path.replace(path)
@@ -20,9 +20,13 @@ import glob
 import json
 import os
 import shutil
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.merge_engine import IncrementalMerger
+
 load_dotenv()
 
 # Major cryptocurrencies against USDT (using USD as proxy on Alpha Vantage)
@@ -119,90 +123,105 @@ def verify_symbol_fixes():
         print(f"❌ Error during verification: {e}")
         return False
 
-# Merge all crypto daily price JSON files, write one line per file to crypto_merged.jsonl
-current_dir = os.path.dirname(__file__)
-assert (Path(current_dir) / "coin").exists(), "coin/ directory not found!"
-pattern = os.path.join(current_dir, "coin", "daily_prices_*.json")
-files = sorted(glob.glob(pattern))
-assert files, "No crypto daily price files found to merge!"
+current_dir = os.path.dirname(os.path.abspath(__file__))
 output_file = os.path.join(current_dir, "crypto_merged.jsonl")
 
-print(f"Found {len(files)} crypto files to merge")
-print(f"Output file: {output_file}")
 
-# Create backup of existing file if it exists
-backup_crypto_data()
+def transform_crypto_document(data, basename):
+    """Rename price fields, keep only the buy price on the latest date and add the -USDT suffix"""
+    # Rename fields: "1. open" -> "1. buy price"；"4. close" -> "4. sell price"
+    # For the latest date, only keep "1. buy price"
+    # Also fix crypto symbols by adding -USDT suffix
+    try:
+        # Find all keys starting with "Time Series"
+        series = None
+        for key, value in data.items():
+            if key.startswith("Time Series"):
+                series = value
+                break
+
+        if isinstance(series, dict) and series:
+            # First rename fields for all dates
+            for d, bar in list(series.items()):
+                if not isinstance(bar, dict):
+                    continue
+                if "1. open" in bar:
+                    bar["1. buy price"] = bar.pop("1. open")
+                if "4. close" in bar:
+                    bar["4. sell price"] = bar.pop("4. close")
+
+            # Then process latest date, keep only buy price
+            latest_date = max(series.keys())
+            latest_bar = series.get(latest_date, {})
+            if isinstance(latest_bar, dict):
+                buy_val = latest_bar.get("1. buy price")
+                series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
+
+            # Update Meta Data description and fix symbol
+            meta = data.get("Meta Data", {})
+            if isinstance(meta, dict):
+                meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
+
+                # Fix crypto symbol by adding -USDT suffix
+                original_symbol = meta.get("2. Symbol", "")
+                if original_symbol and not original_symbol.endswith("-USDT"):
+                    new_symbol = f"{original_symbol}-USDT"
+                    meta["2. Symbol"] = new_symbol
+
+                    # Also update the information field
+                    if "1. Information" in meta and original_symbol in meta["1. Information"]:
+                        meta["1. Information"] = meta["1. Information"].replace(original_symbol, new_symbol)
+
+                    print(f"  Fixed symbol: {original_symbol} → {new_symbol}")
 
-with open(output_file, "w", encoding="utf-8") as fout:
-    for fp in files:
-        basename = os.path.basename(fp)
-        print(f"Processing: {basename}")
+    except Exception as e:
+        print(f"  Error processing {basename}: {e}")
+        # If structure error, write as-is
+        pass
+
+    return data
+
+
+def merge_crypto_files():
+    """
+    Merge all crypto daily price JSON files into crypto_merged.jsonl, one line per file
+
+    Only files that changed since the last run are re-processed; the output is replaced atomically.
+
+    Returns:
+        IncrementalMerger statistics
+    """
+    assert (Path(current_dir) / "coin").exists(), "coin/ directory not found!"
+    pattern = os.path.join(current_dir, "coin", "daily_prices_*.json")
+    all_files = sorted(glob.glob(pattern))
+    assert all_files, "No crypto daily price files found to merge!"
 
-        # Only process files that contain our crypto symbols
-        if not any(symbol in basename for symbol in crypto_symbols_usdt):
+    # Only process files that belong to our crypto symbols
+    symbol_set = set(crypto_symbols_usdt)
+    files = []
+    for fp in all_files:
+        basename = os.path.basename(fp)
+        if basename[len("daily_prices_") : -len(".json")] in symbol_set:
+            files.append(fp)
+        else:
             print(f"  Skipping: {basename} (not in crypto symbols list)")
-            continue
-
-        with open(fp, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        # Rename fields: "1. open" -> "1. buy price"；"4. close" -> "4. sell price"
-        # For the latest date, only keep "1. buy price"
-        # Also fix crypto symbols by adding -USDT suffix
-        try:
-            # Find all keys starting with "Time Series"
-            series = None
-            for key, value in data.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-
-            if isinstance(series, dict) and series:
-                # First rename fields for all dates
-                for d, bar in list(series.items()):
-                    if not isinstance(bar, dict):
-                        continue
-                    if "1. open" in bar:
-                        bar["1. buy price"] = bar.pop("1. open")
-                    if "4. close" in bar:
-                        bar["4. sell price"] = bar.pop("4. close")
-
-                # Then process latest date, keep only buy price
-                latest_date = max(series.keys())
-                latest_bar = series.get(latest_date, {})
-                if isinstance(latest_bar, dict):
-                    buy_val = latest_bar.get("1. buy price")
-                    series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
-
-                # Update Meta Data description and fix symbol
-                meta = data.get("Meta Data", {})
-                if isinstance(meta, dict):
-                    meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
-
-                    # Fix crypto symbol by adding -USDT suffix
-                    original_symbol = meta.get("2. Symbol", "")
-                    if original_symbol and not original_symbol.endswith("-USDT"):
-                        new_symbol = f"{original_symbol}-USDT"
-                        meta["2. Symbol"] = new_symbol
-
-                        # Also update the information field
-                        if "1. Information" in meta and original_symbol in meta["1. Information"]:
-                            meta["1. Information"] = meta["1. Information"].replace(original_symbol, new_symbol)
-
-                        print(f"  Fixed symbol: {original_symbol} → {new_symbol}")
-
-        except Exception as e:
-            print(f"  Error processing {basename}: {e}")
-            # If structure error, write as-is
-            pass
-
-        # Write to merged file
-        fout.write(json.dumps(data, ensure_ascii=False) + "\n")
-        print(f"  Added to merged file")
-
-print(f"\nCrypto merge complete! Output saved to: {output_file}")
-processed_count = len([f for f in files if any(symbol in os.path.basename(f) for symbol in crypto_symbols_usdt)])
-print(f"Total symbols processed: {processed_count}")
-
-# Verify that symbol fixes were applied correctly
-verify_symbol_fixes()
\ No newline at end of file
+
+    print(f"Found {len(files)} crypto files to merge")
+    print(f"Output file: {output_file}")
+
+    # Create backup of existing file if it exists
+    backup_crypto_data()
+
+    merger = IncrementalMerger(output_file, transform_crypto_document, transform_version="crypto-1")
+    stats = merger.run(files)
+
+    print(f"\nCrypto merge complete! Output saved to: {output_file}")
+    print(f"Total symbols processed: {len(files)} ({stats['processed']} changed, {stats['reused']} unchanged)")
+    return stats
+
+
+if __name__ == "__main__":
+    merge_crypto_files()
+
+    # Verify that symbol fixes were applied correctly
+    verify_symbol_fixes()
@@ -1,3 +1,5 @@
+import argparse
+import asyncio
 import os
 
 import requests
@@ -6,6 +8,8 @@ from dotenv import load_dotenv
 load_dotenv()
 import json
 
+from alphavantage_fetcher import AlphaVantageFetcher, DownloadManifest, is_file_up_to_date, latest_completed_session
+
 all_nasdaq_100_symbols = [
     "NVDA",
     "MSFT",
@@ -111,9 +115,20 @@ all_nasdaq_100_symbols = [
 ]
 
 
+FUNCTION = "TIME_SERIES_DAILY"
+OUTPUTSIZE = "compact"
+SERIES_KEY = "Time Series (Daily)"
+
+
+def save_daily_price(SYMBOL: str, data: dict):
+    with open(f"./daily_prices_{SYMBOL}.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    if SYMBOL == "QQQ":
+        with open(f"./Adaily_prices_{SYMBOL}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+
+
 def get_daily_price(SYMBOL: str):
-    FUNCTION = "TIME_SERIES_DAILY"
-    OUTPUTSIZE = "compact"
     APIKEY = os.getenv("ALPHAADVANTAGE_API_KEY")
     url = (
         f"https://www.alphavantage.co/query?function={FUNCTION}&symbol={SYMBOL}&outputsize={OUTPUTSIZE}&apikey={APIKEY}"
@@ -124,15 +139,46 @@ def get_daily_price(SYMBOL: str):
     if data.get("Note") is not None or data.get("Information") is not None:
         print(f"Error")
         return
-    with open(f"./daily_prices_{SYMBOL}.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-    if SYMBOL == "QQQ":
-        with open(f"./Adaily_prices_{SYMBOL}.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+    save_daily_price(SYMBOL, data)
+
+
+def download_all(symbols: list, force: bool = False, calls_per_minute: float = None, concurrency: int = 8) -> dict:
+    """
+    Download daily prices for all symbols concurrently within the API quota
+
+    Args:
+        symbols: Symbols to download
+        force: Ignore the resume manifest and re-download up-to-date symbols
+        calls_per_minute: API plan quota (default: $ALPHAVANTAGE_CALLS_PER_MINUTE or 5)
+        concurrency: Maximum requests in flight
+
+    Returns:
+        {"downloaded": [...], "skipped": [...], "failed": [...]}
+    """
+    session = latest_completed_session()
+    manifest = None if force else DownloadManifest(f"./.download_manifest_{FUNCTION}.json", f"{FUNCTION}:{session}")
+    fetcher = AlphaVantageFetcher(
+        os.getenv("ALPHAADVANTAGE_API_KEY"), calls_per_minute=calls_per_minute, concurrency=concurrency
+    )
+    print(f"📥 Downloading {len(symbols)} symbols (latest session {session}, {fetcher.calls_per_minute:g} calls/min)")
+    return asyncio.run(
+        fetcher.fetch_all(
+            symbols,
+            lambda symbol: {"function": FUNCTION, "symbol": symbol, "outputsize": OUTPUTSIZE},
+            save_daily_price,
+            None if force else lambda symbol: is_file_up_to_date(f"./daily_prices_{symbol}.json", SERIES_KEY, session),
+            manifest,
+        )
+    )
 
 
 if __name__ == "__main__":
-    for symbol in all_nasdaq_100_symbols:
-        get_daily_price(symbol)
+    parser = argparse.ArgumentParser(description="Download NASDAQ-100 daily prices from AlphaVantage")
+    parser.add_argument("--symbols", help="Comma separated symbols (default: NASDAQ-100 + QQQ)")
+    parser.add_argument("--force", action="store_true", help="Re-download everything, ignoring manifest and up-to-date files")
+    parser.add_argument("--calls-per-minute", type=float, help="API plan quota (default: $ALPHAVANTAGE_CALLS_PER_MINUTE or 5)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    args = parser.parse_args()
 
-    get_daily_price("QQQ")
+    symbols = args.symbols.split(",") if args.symbols else all_nasdaq_100_symbols + ["QQQ"]
+    download_all(symbols, force=args.force, calls_per_minute=args.calls_per_minute, concurrency=args.concurrency)
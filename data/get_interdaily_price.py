@@ -1,4 +1,8 @@
+import argparse
+import asyncio
 import os
+import shutil
+import sqlite3
 
 import requests
 from dotenv import load_dotenv
@@ -6,6 +10,15 @@ from dotenv import load_dotenv
 load_dotenv()
 import json
 
+from alphavantage_fetcher import (
+    LAST_HOURLY_BAR,
+    AlphaVantageFetcher,
+    DownloadManifest,
+    is_file_up_to_date,
+    latest_completed_session,
+)
+from bar_store import BarStore
+
 all_nasdaq_100_symbols = [
     "NVDA",
     "MSFT",
@@ -111,58 +124,50 @@ all_nasdaq_100_symbols = [
 ]
 
 
-def update_json(data: dict, SYMBOL: str):
+_bar_store = None
+
+
+def get_bar_store() -> BarStore:
+    """Lazily open the bar store (./price_bars.sqlite or $BAR_STORE_PATH)"""
+    global _bar_store
+    if _bar_store is None:
+        _bar_store = BarStore()
+    return _bar_store
+
+
+def update_json(data: dict, SYMBOL: str) -> int:
+    """Upsert the downloaded bars of one symbol into the bar store; returns the number of new bars"""
+    series_key = "Time Series (60min)"
     file_path = f'./daily_prices_{SYMBOL}.json'
-    
+
     try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                old_data = json.load(f)
-            
-            # 合并新旧的"Time Series (60min)"，新data优先（相同时间戳用新数据覆盖）
-            old_ts = old_data.get("Time Series (60min)", {})
-            new_ts = data.get("Time Series (60min)", {})
-            merged_ts = {**old_ts, **new_ts}  # 新数据覆盖旧数据中相同的时间戳
-            
-            # 创建新的数据字典，避免直接修改传入的data
-            merged_data = data.copy()
-            merged_data["Time Series (60min)"] = merged_ts
-            
-            # 如果新数据没有Meta Data，保留旧的Meta Data
-            if "Meta Data" not in merged_data and "Meta Data" in old_data:
-                merged_data["Meta Data"] = old_data["Meta Data"]
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(merged_data, f, ensure_ascii=False, indent=4)
-        else:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        
-        # QQQ 特殊处理：同时保存到另一个文件
-        if SYMBOL == "QQQ":
-            file_path_qqq = f'./Adaily_prices_{SYMBOL}.json'
-            if os.path.exists(file_path_qqq):
-                with open(file_path_qqq, 'r', encoding='utf-8') as f:
-                    old_data = json.load(f)
-                old_ts = old_data.get("Time Series (60min)", {})
-                new_ts = data.get("Time Series (60min)", {})
-                merged_ts = {**old_ts, **new_ts}
-                merged_data = data.copy()
-                merged_data["Time Series (60min)"] = merged_ts
-                if "Meta Data" not in merged_data and "Meta Data" in old_data:
-                    merged_data["Meta Data"] = old_data["Meta Data"]
-                with open(file_path_qqq, 'w', encoding='utf-8') as f:
-                    json.dump(merged_data, f, ensure_ascii=False, indent=4)
-            else:
-                with open(file_path_qqq, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-                    
-    except (IOError, json.JSONDecodeError, KeyError) as e:
+        store = get_bar_store()
+        # 首次使用时把已有的 JSON 历史导入 bar store（之后为空操作）
+        store.import_legacy_json(file_path, SYMBOL)
+
+        # 只写入本次下载的 bars，相同时间戳用新数据覆盖；新数据没有 Meta Data 时保留旧的
+        added = store.upsert(SYMBOL, series_key, data.get(series_key, {}), data.get("Meta Data"))
+        print(f"{SYMBOL}: {added} new bars")
+        return added
+
+    except (IOError, sqlite3.Error, json.JSONDecodeError, KeyError) as e:
         print(f"Error when update {SYMBOL}: {e}")
         raise
-         
 
 
+def export_json_files(symbols: list) -> list:
+    """
+    Export daily_prices_{SYMBOL}.json (read by merge_jsonl.py) for symbols updated since their last export
+
+    Returns:
+        Symbols whose file was written
+    """
+    written = get_bar_store().export_changed("Time Series (60min)", ".", symbols)
+    # QQQ 特殊处理：同时保存到另一个文件（复制导出结果，不再序列化第二次）
+    if "QQQ" in written:
+        shutil.copyfile("./daily_prices_QQQ.json", "./Adaily_prices_QQQ.json")
+    print(f"📝 Exported {len(written)} of {len(symbols)} JSON files")
+    return written
 
 
 def get_daily_price(SYMBOL: str):
@@ -181,8 +186,63 @@ def get_daily_price(SYMBOL: str):
     update_json(data, SYMBOL)
 
 
+def is_up_to_date(SYMBOL: str, session: str) -> bool:
+    # bar store 中有数据时直接查最新时间戳，否则回退到读取 JSON 文件
+    latest = get_bar_store().last_timestamp(SYMBOL, "Time Series (60min)")
+    if latest is None:
+        return is_file_up_to_date(f"./daily_prices_{SYMBOL}.json", "Time Series (60min)", session, hourly=True)
+    return latest >= f"{session} {LAST_HOURLY_BAR}"
+
+
+def download_all(symbols: list, force: bool = False, calls_per_minute: float = None, concurrency: int = 8) -> dict:
+    """
+    Download hourly prices for all symbols concurrently within the API quota
+
+    Args:
+        symbols: Symbols to download
+        force: Ignore the resume manifest and re-download up-to-date symbols
+        calls_per_minute: API plan quota (default: $ALPHAVANTAGE_CALLS_PER_MINUTE or 5)
+        concurrency: Maximum requests in flight
+
+    Returns:
+        {"downloaded": [...], "skipped": [...], "failed": [...]}
+    """
+    function = "TIME_SERIES_INTRADAY"
+    session = latest_completed_session()
+    manifest = None if force else DownloadManifest(f"./.download_manifest_{function}.json", f"{function}:{session}")
+    fetcher = AlphaVantageFetcher(
+        os.getenv("ALPHAADVANTAGE_API_KEY"), calls_per_minute=calls_per_minute, concurrency=concurrency
+    )
+    params = {
+        "function": function,
+        "interval": "60min",
+        "outputsize": "full",
+        "entitlement": "delayed",
+        "extended_hours": "false",
+    }
+    print(f"📥 Downloading {len(symbols)} symbols (latest session {session}, {fetcher.calls_per_minute:g} calls/min)")
+    return asyncio.run(
+        fetcher.fetch_all(
+            symbols,
+            lambda symbol: {**params, "symbol": symbol},
+            lambda symbol, data: update_json(data, symbol),
+            None if force else lambda symbol: is_up_to_date(symbol, session),
+            manifest,
+        )
+    )
+
+
 if __name__ == "__main__":
-    for symbol in all_nasdaq_100_symbols:
-        get_daily_price(symbol)
+    parser = argparse.ArgumentParser(description="Download NASDAQ-100 hourly prices from AlphaVantage")
+    parser.add_argument("--symbols", help="Comma separated symbols (default: NASDAQ-100 + QQQ)")
+    parser.add_argument("--force", action="store_true", help="Re-download everything, ignoring manifest and up-to-date files")
+    parser.add_argument("--calls-per-minute", type=float, help="API plan quota (default: $ALPHAVANTAGE_CALLS_PER_MINUTE or 5)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--export-json", action="store_true",
+                        help="After downloading, export daily_prices_{SYMBOL}.json for symbols that changed")
+    args = parser.parse_args()
 
-    get_daily_price("QQQ")
+    symbols = args.symbols.split(",") if args.symbols else all_nasdaq_100_symbols + ["QQQ"]
+    download_all(symbols, force=args.force, calls_per_minute=args.calls_per_minute, concurrency=args.concurrency)
+    if args.export_json:
+        export_json_files(symbols)
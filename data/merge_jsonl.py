@@ -1,6 +1,9 @@
 import glob
-import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.merge_engine import IncrementalMerger
 
 all_nasdaq_100_symbols = [
     "NVDA",
@@ -106,51 +109,66 @@ all_nasdaq_100_symbols = [
     "GFS",
 ]
 
-# 合并所有以 daily_price 开头的 json，逐文件一行写入 merged.jsonl
-current_dir = os.path.dirname(__file__)
-pattern = os.path.join(current_dir, "daily_price*.json")
-files = sorted(glob.glob(pattern))
 
-output_file = os.path.join(current_dir, "merged.jsonl")
+def transform_price_document(data: dict, basename: str) -> dict:
+    # 统一重命名："1. open" -> "1. buy price"；"4. close" -> "4. sell price"
+    # 对于最新的一天，只保留并写入 "1. buy price"
+    try:
+        # 查找所有以 "Time Series" 开头的键
+        series = None
+        for key, value in data.items():
+            if key.startswith("Time Series"):
+                series = value
+                break
+        if isinstance(series, dict) and series:
+            # 先对所有日期做键名重命名
+            for d, bar in list(series.items()):
+                if not isinstance(bar, dict):
+                    continue
+                if "1. open" in bar:
+                    bar["1. buy price"] = bar.pop("1. open")
+                if "4. close" in bar:
+                    bar["4. sell price"] = bar.pop("4. close")
+            # 再处理最新日期，仅保留买入价
+            latest_date = max(series.keys())
+            latest_bar = series.get(latest_date, {})
+            if isinstance(latest_bar, dict):
+                buy_val = latest_bar.get("1. buy price")
+                series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
+            # 更新 Meta Data 描述
+            meta = data.get("Meta Data", {})
+            if isinstance(meta, dict):
+                meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
+    except Exception:
+        # 若结构异常则原样写入
+        pass
+    return data
+
+
+def merge_price_files() -> dict:
+    """
+    合并所有以 daily_price 开头的 json，逐文件一行写入 merged.jsonl（增量、原子写入）
+
+    Returns:
+        IncrementalMerger 的统计信息
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    symbol_set = set(all_nasdaq_100_symbols)
+    # 仅当文件名对应纳指100成分符号时才写入
+    files = [
+        fp
+        for fp in sorted(glob.glob(os.path.join(current_dir, "daily_price*.json")))
+        if os.path.basename(fp)[len("daily_prices_") : -len(".json")] in symbol_set
+    ]
+    output_file = os.path.join(current_dir, "merged.jsonl")
+    merger = IncrementalMerger(output_file, transform_price_document, transform_version="us-1")
+    stats = merger.run(files)
+    print(
+        f"✅ merged.jsonl: {stats['processed']} processed, {stats['reused']} unchanged, "
+        f"{stats['removed']} removed -> {output_file}"
+    )
+    return stats
 
-with open(output_file, "w", encoding="utf-8") as fout:
-    for fp in files:
-        basename = os.path.basename(fp)
-        # 仅当文件名包含任一纳指100成分符号时才写入
-        if not any(symbol in basename for symbol in all_nasdaq_100_symbols):
-            continue
-        with open(fp, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        # 统一重命名："1. open" -> "1. buy price"；"4. close" -> "4. sell price"
-        # 对于最新的一天，只保留并写入 "1. buy price"
-        try:
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in data.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if isinstance(series, dict) and series:
-                # 先对所有日期做键名重命名
-                for d, bar in list(series.items()):
-                    if not isinstance(bar, dict):
-                        continue
-                    if "1. open" in bar:
-                        bar["1. buy price"] = bar.pop("1. open")
-                    if "4. close" in bar:
-                        bar["4. sell price"] = bar.pop("4. close")
-                # 再处理最新日期，仅保留买入价
-                latest_date = max(series.keys())
-                latest_bar = series.get(latest_date, {})
-                if isinstance(latest_bar, dict):
-                    buy_val = latest_bar.get("1. buy price")
-                    series[latest_date] = {"1. buy price": buy_val} if buy_val is not None else {}
-                # 更新 Meta Data 描述
-                meta = data.get("Meta Data", {})
-                if isinstance(meta, dict):
-                    meta["1. Information"] = "Daily Prices (buy price, high, low, sell price) and Volumes"
-        except Exception:
-            # 若结构异常则原样写入
-            pass
 
-        fout.write(json.dumps(data, ensure_ascii=False) + "\n")
+if __name__ == "__main__":
+    merge_price_files()
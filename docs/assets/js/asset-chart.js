@@ -663,17 +663,24 @@ function toggleScale() {
 }
 
 // Export chart data as CSV
-function exportData() {
+async function exportData() {
     let csv = 'Date,';
 
     // Header row with agent names
     const agentNames = Object.keys(allAgentsData);
     csv += agentNames.map(name => dataLoader.getAgentDisplayName(name)).join(',') + '\n';
 
+    // The chart shows downsampled series; export every point
+    const valuesByAgent = {};
+    await Promise.all(agentNames.map(async name => {
+        const history = await dataLoader.getFullAssetHistory(name);
+        valuesByAgent[name] = new Map(history.map(h => [h.date, h.value]));
+    }));
+
     // Collect all unique dates
     const allDates = new Set();
     agentNames.forEach(name => {
-        allAgentsData[name].assetHistory.forEach(h => allDates.add(h.date));
+        valuesByAgent[name].forEach((value, date) => allDates.add(date));
     });
 
     // Sort dates
@@ -683,9 +690,8 @@ function exportData() {
     sortedDates.forEach(date => {
         const row = [date];
         agentNames.forEach(name => {
-            const history = allAgentsData[name].assetHistory;
-            const entry = history.find(h => h.date === date);
-            row.push(entry ? entry.value.toFixed(2) : '');
+            const value = valuesByAgent[name].get(date);
+            row.push(value !== undefined ? value.toFixed(2) : '');
         });
         csv += row.join(',') + '\n';
     });
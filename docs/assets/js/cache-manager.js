@@ -9,6 +9,9 @@ class CacheManager {
         this.CACHE_TIMESTAMP_KEY = 'cache_timestamp';
         this.CACHE_ENABLED_KEY = 'cache_enabled_override';
         this.CACHE_MAX_AGE = 7 * 24 * 60 * 60 * 1000; // 7 days in milliseconds (default, can be overridden by config)
+        this.SERVER_CACHE_DIR = './data/cache';
+        this.versions = {}; // market -> cache version in use (tags lazily-loaded shard URLs)
+        this.lazyFiles = {}; // shard URL -> Promise of its JSON
         this.performanceMetrics = {
             lastLoadTime: null,
             cacheHit: null,
@@ -117,23 +120,42 @@ class CacheManager {
     }
 
     /**
-     * Load pre-computed cache from server (static JSON file)
+     * Base URL of a market's sharded server cache
+     */
+    getServerCacheBase(market) {
+        return `${this.SERVER_CACHE_DIR}/${market}/`;
+    }
+
+    /**
+     * Fetch a JSON file, bypassing the browser HTTP cache
+     */
+    async fetchFresh(url) {
+        // Add cache-busting to prevent browser HTTP cache from serving stale files
+        // This ensures we always check for the latest version from the server
+        const timestamp = Date.now();
+        return fetch(`${url}?v=${timestamp}`, {
+            cache: 'no-store',
+            headers: {
+                'Cache-Control': 'no-cache, no-store, must-revalidate',
+                'Pragma': 'no-cache',
+                'Expires': '0'
+            }
+        });
+    }
+
+    /**
+     * Load pre-computed cache from server (manifest of the sharded cache)
+     * Falls back to the single-file {market}_cache.json of older deployments
      */
     async loadServerCache(market) {
         try {
             console.log(`[CacheManager] Loading server cache for ${market} market...`);
 
-            // Add cache-busting to prevent browser HTTP cache from serving stale files
-            // This ensures we always check for the latest version from the server
-            const timestamp = Date.now();
-            const response = await fetch(`./data/${market}_cache.json?v=${timestamp}`, {
-                cache: 'no-store',
-                headers: {
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            });
+            let response = await this.fetchFresh(`${this.getServerCacheBase(market)}manifest.json`);
+            if (!response.ok) {
+                console.warn(`[CacheManager] Cache manifest not found for ${market} (${response.status}), trying single-file cache`);
+                response = await this.fetchFresh(`./data/${market}_cache.json`);
+            }
 
             if (!response.ok) {
                 console.warn(`[CacheManager] Server cache not found for ${market} (${response.status})`);
@@ -154,6 +176,66 @@ class CacheManager {
         }
     }
 
+    /**
+     * Fetch a file of the sharded server cache (each URL is fetched once per version)
+     */
+    async loadCacheFile(market, path) {
+        const version = this.versions[market] || '';
+        const url = `${this.getServerCacheBase(market)}${path}?v=${encodeURIComponent(version)}`;
+        if (!this.lazyFiles[url]) {
+            this.lazyFiles[url] = fetch(url)
+                .then(response => {
+                    if (!response.ok) throw new Error(`${url} (${response.status})`);
+                    return response.json();
+                })
+                .catch(error => {
+                    delete this.lazyFiles[url];
+                    throw error;
+                });
+        }
+        return this.lazyFiles[url];
+    }
+
+    /**
+     * Full position ledger of an agent (the manifest only carries the latest positions)
+     */
+    async loadAgentPositions(market, agentData) {
+        if (Array.isArray(agentData.positions)) return agentData.positions;
+        if (!agentData.files) return [];
+        return this.loadCacheFile(market, agentData.files.positions);
+    }
+
+    /**
+     * Full asset history of an agent (all monthly shards; the manifest only carries a downsampled one)
+     */
+    async loadAgentHistory(market, agentData) {
+        const files = agentData.files;
+        if (!files || !agentData.startDate) return agentData.assetHistory;
+
+        const shards = await Promise.all(
+            this.monthRange(agentData.startDate, agentData.endDate)
+                .map(month => this.loadCacheFile(market, files.history.replace('{month}', month)))
+        );
+        return shards.flat();
+    }
+
+    /**
+     * 'YYYY-MM' keys of every month from startDate to endDate (the shard names)
+     */
+    monthRange(startDate, endDate) {
+        const months = [];
+        let [year, month] = startDate.slice(0, 7).split('-').map(Number);
+        const last = endDate.slice(0, 7);
+        while (`${year}-${String(month).padStart(2, '0')}` <= last) {
+            months.push(`${year}-${String(month).padStart(2, '0')}`);
+            if (++month > 12) {
+                month = 1;
+                year++;
+            }
+        }
+        return months;
+    }
+
     /**
      * Load cached data from localStorage
      */
@@ -259,7 +341,7 @@ class CacheManager {
      * Load cache with fallback strategy:
      * 1. Check if caching is enabled
      * 2. Try local cache (localStorage)
-     * 3. Try server cache (static JSON file)
+     * 3. Try server cache (manifest; positions and full histories load on demand)
      * 4. Return null (caller will do live calculation)
      */
     async loadCache(market) {
@@ -300,6 +382,7 @@ class CacheManager {
                     console.log(`[CacheManager] ⚡ Cache load time: ${loadTime.toFixed(2)}ms (localStorage)`);
                 }
                 console.log(`[CacheManager] Using local cache (no server cache available)`);
+                this.versions[market] = localCache.version;
                 console.log(`[CacheManager] 📊 Loaded ${Object.keys(localCache.agentsData).length} agents`);
                 return localCache.agentsData;
             }
@@ -325,6 +408,7 @@ class CacheManager {
                 console.log(`[CacheManager] ⚡ Cache load time: ${loadTime.toFixed(2)}ms (localStorage hit)`);
             }
             console.log(`[CacheManager] ✓ Cache hit! Using local cache (version ${localCache.version})`);
+            this.versions[market] = localCache.version;
             console.log(`[CacheManager] 📊 Loaded ${Object.keys(localCache.agentsData).length} agents`);
             return localCache.agentsData;
         }
@@ -337,6 +421,7 @@ class CacheManager {
         // Save server cache to localStorage for next time
         console.log(`[CacheManager] Updating local cache from server...`);
         this.saveLocalCache(market, serverCache.version, serverCache.agentsData);
+        this.versions[market] = serverCache.version;
 
         const loadTime = performance.now() - startTime;
         this.performanceMetrics = {
@@ -750,10 +750,28 @@ class DataLoader {
         return allData;
     }
 
+    // Load an agent's full position ledger if the cache only carries its latest positions
+    async ensureAgentPositions(agentName) {
+        const data = this.agentData[agentName];
+        if (!data) return [];
+        if (!Array.isArray(data.positions)) {
+            data.positions = await this.cacheManager.loadAgentPositions(this.currentMarket, data);
+        }
+        return data.positions;
+    }
+
+    // Get the full-resolution asset history for an agent (the cache holds a downsampled one)
+    async getFullAssetHistory(agentName) {
+        const data = this.agentData[agentName];
+        if (!data) return [];
+        return this.cacheManager.loadAgentHistory(this.currentMarket, data);
+    }
+
     // Get current holdings for an agent (latest position)
     getCurrentHoldings(agentName) {
         const data = this.agentData[agentName];
-        if (!data || !data.positions || data.positions.length === 0) return null;
+        if (!data) return null;
+        if (!data.positions || data.positions.length === 0) return data.latestPositions || null;
 
         const latestPosition = data.positions[data.positions.length - 1];
         return latestPosition && latestPosition.positions ? latestPosition.positions : null;
@@ -767,12 +785,14 @@ class DataLoader {
             return [];
         }
 
-        console.log(`[getTradeHistory] Agent: ${agentName}, Total positions: ${data.positions.length}`);
+        // Empty until ensureAgentPositions() has loaded a cached agent's ledger
+        const positions = data.positions || [];
+        console.log(`[getTradeHistory] Agent: ${agentName}, Total positions: ${positions.length}`);
 
-        const allActions = data.positions.filter(p => p.this_action);
+        const allActions = positions.filter(p => p.this_action);
         console.log(`[getTradeHistory] Positions with this_action: ${allActions.length}`);
 
-        const trades = data.positions
+        const trades = positions
             .filter(p => p.this_action && p.this_action.action !== 'no_trade')
             .map(p => ({
                 date: p.date,
@@ -68,6 +68,9 @@ async function loadAgentPortfolio(agentName) {
         currentAgent = agentName;
         const data = allAgentsData[agentName];
 
+        // Cached data carries only the latest positions; fetch the ledger for trade history
+        await dataLoader.ensureAgentPositions(agentName);
+
         // Update performance metrics
         updateMetrics(data);
 
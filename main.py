@@ -177,6 +177,9 @@ async def main(config_path=None):
     base_delay = agent_config.get("base_delay", 0.5)
     initial_cash = agent_config.get("initial_cash", 10000.0)
     verbose = agent_config.get("verbose", False)
+    rate_limit_config = agent_config.get("rate_limit", {})
+    streaming = agent_config.get("streaming", False)
+    tool_output_budget = agent_config.get("tool_output_budget")
 
     # Display enabled model information
     model_names = [m.get("name", m.get("signature")) for m in enabled_models]
@@ -196,6 +199,7 @@ async def main(config_path=None):
         signature = model_config.get("signature")
         openai_base_url = model_config.get("openai_base_url",None)
         openai_api_key = model_config.get("openai_api_key",None)
+        mock_llm = model_config.get("mock_llm")
         
         # Validate required fields
         if not basemodel:
@@ -209,6 +213,8 @@ async def main(config_path=None):
         print(f"🤖 Processing model: {model_name}")
         print(f"📝 Signature: {signature}")
         print(f"🔧 BaseModel: {basemodel}")
+        if mock_llm is not None:
+            print(f"🧪 Mock LLM: {mock_llm}")
             
         # Initialize runtime configuration
         # Use the shared config file from RUNTIME_ENV_PATH in .env
@@ -265,7 +271,12 @@ async def main(config_path=None):
                     initial_cash=initial_cash,
                     init_date=INIT_DATE,
                     openai_base_url=openai_base_url,
-                    openai_api_key=openai_api_key
+                    openai_api_key=openai_api_key,
+                    log_config=log_config,
+                    rate_limit_config=rate_limit_config,
+                    streaming=streaming,
+                    tool_output_budget=tool_output_budget,
+                    mock_llm=mock_llm
                 )
             else:
                 agent = AgentClass(
@@ -279,7 +290,12 @@ async def main(config_path=None):
                     initial_cash=initial_cash,
                     init_date=INIT_DATE,
                     openai_base_url=openai_base_url,
-                    openai_api_key=openai_api_key
+                    openai_api_key=openai_api_key,
+                    log_config=log_config,
+                    rate_limit_config=rate_limit_config,
+                    streaming=streaming,
+                    tool_output_budget=tool_output_budget,
+                    mock_llm=mock_llm
                 )
 
             print(f"✅ {agent_type} instance created successfully: {agent}")
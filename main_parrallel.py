@@ -144,7 +144,12 @@ async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END
             max_retries=max_retries,
             base_delay=base_delay,
             initial_cash=initial_cash,
-            init_date=INIT_DATE
+            init_date=INIT_DATE,
+            log_config=log_config,
+            rate_limit_config=agent_config.get("rate_limit", {}),
+            streaming=agent_config.get("streaming", False),
+            tool_output_budget=agent_config.get("tool_output_budget"),
+            mock_llm=model_config.get("mock_llm")
         )
 
         print(f"✅ {AgentClass.__name__} instance created successfully: {agent}")
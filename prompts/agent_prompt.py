@@ -14,6 +14,7 @@ from typing import Dict, List, Optional
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 from tools.price_tools import (all_nasdaq_100_symbols, all_sse_50_symbols,
                                format_price_dict_with_names, get_open_prices,
                                get_today_init_position, get_yesterday_date,
@@ -59,6 +60,7 @@ When you think your task is complete, output
 """
 
 
+@traced("get_agent_system_prompt")
 def get_agent_system_prompt(
     today_date: str, signature: str, market: str = "us", stock_symbols: Optional[List[str]] = None
 ) -> str:
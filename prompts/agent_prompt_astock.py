@@ -19,6 +19,7 @@ from typing import Dict, List, Optional
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 from tools.price_tools import (all_sse_50_symbols,
                                format_price_dict_with_names, get_open_prices,
                                get_today_init_position, get_yesterday_date,
@@ -96,6 +97,7 @@ agent_system_prompt_astock = """
 """
 
 
+@traced("get_agent_system_prompt_astock")
 def get_agent_system_prompt_astock(today_date: str, signature: str, stock_symbols: Optional[List[str]] = None) -> str:
     """
     生成A股专用系统提示词
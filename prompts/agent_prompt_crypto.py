@@ -14,6 +14,7 @@ from typing import Dict, List, Optional
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 from tools.price_tools import (format_price_dict_with_names, get_open_prices,
                                get_today_init_position, get_yesterday_date,
                                get_yesterday_open_and_close_price,
@@ -62,6 +63,7 @@ When you think your task is complete, output
 """
 
 
+@traced("get_agent_system_prompt_crypto")
 def get_agent_system_prompt_crypto(
     today_date: str, signature: str, market: str = "crypto", crypto_symbols: Optional[List[str]] = None
 ) -> str:
@@ -14,8 +14,8 @@ cd "$PROJECT_ROOT/data/crypto" || { echo "无法进入目录 $PROJECT_ROOT/data/
 
 # 在运行 python 前输出当前工作目录
 echo "当前运行目录: $(pwd)"
-echo "即将运行: python get_daily_price_crypto.py"
-python get_daily_price_crypto.py
+echo "即将运行: python get_daily_price_crypto.py --export-json"
+python get_daily_price_crypto.py --export-json
 
 echo "当前运行目录: $(pwd)"
 echo "即将运行: python merge_crypto_jsonl.py"
@@ -10,6 +10,6 @@ cd "$PROJECT_ROOT"
 
 cd data
 # python get_daily_price.py #run daily price data
-python get_interdaily_price.py #run interdaily price data
+python get_interdaily_price.py --export-json #run interdaily price data, then export the changed JSON files for merge_jsonl.py
 python merge_jsonl.py
 cd ..
@@ -1,24 +1,48 @@
 #!/usr/bin/env python3
 """
 Pre-compute Frontend Cache
-Generates a static JSON file with all calculated metrics for faster frontend loading.
+Generates static JSON files with all calculated metrics for faster frontend loading.
 Run this script after updating trading data to regenerate the cache.
 
+The page only fetches a small manifest per market: metrics, latest holdings and
+a Largest-Triangle-Three-Buckets downsampled asset history for every agent.
+Full histories (one shard per agent and month) and full position ledgers are
+separate files the frontend loads on demand, so the initial payload stays the same size as history grows.
+
 Usage:
     python scripts/precompute_frontend_cache.py
 
-Output:
-    docs/data/us_cache.json - Pre-computed data for US market
-    docs/data/cn_cache.json - Pre-computed data for A-share market
+Output (per market: us, cn, cn_hour):
+    docs/data/cache/{market}/manifest.json                        - Loaded on page load
+    docs/data/cache/{market}/agents/{agent}/history/{YYYY-MM}.json - Full asset history by month
+    docs/data/cache/{market}/agents/{agent}/positions.json        - Full position ledger
 """
 
 import os
+import re
+import sys
 import json
+import bisect
+import shutil
 import hashlib
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import yaml
 
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+from tools.benchmark_series import load_benchmark, normalize_closes
+from tools.metrics import compute_metrics, last_per_timestamp, periods_per_year, stack_series
+from tools.portfolio_series import ensure_portfolio_series
+
+# Sharded cache root, relative to docs/data
+CACHE_DIR = 'cache'
+# Points of the downsampled chart series inlined in the manifest
+CHART_POINTS = 250
+
 
 def get_data_version_hash(market_config):
     """
@@ -75,6 +99,23 @@ def load_position_data(agent_folder, market_config):
     return positions
 
 
+def load_series_history(agent_folder, market_config):
+    """
+    Per-record portfolio values from the agent's portfolio_series.csv (rebuilt if missing or stale)
+
+    This is the valuation calculate_metrics, plot_metrics and results_db score.
+
+    Returns:
+        [{'date', 'value'}] with one entry per ledger record, or None if the ledger cannot be valued
+    """
+    data_dir = market_config.get('data_dir', 'agent_data')
+    position_file = Path(__file__).parent.parent / 'docs' / 'data' / data_dir / agent_folder / 'position' / 'position.jsonl'
+    df = ensure_portfolio_series(position_file)
+    if df is None:
+        return None
+    return [{'date': str(date), 'value': value} for date, value in zip(df['date'], df['total_value'].tolist())]
+
+
 def load_price_data_us(symbol):
     """Load price data for a US stock."""
     # Try hourly data first
@@ -131,58 +172,86 @@ def load_price_data_cn(market_config=None):
     return price_cache
 
 
+class PriceIndex:
+    """
+    Closing prices of one market, shared by every agent of a cache generation
+
+    Series are loaded once (the merged A-share file up front, US files on first
+    use of a symbol) and each symbol's timestamps are sorted once, so a lookup
+    is a dict hit or a bisect rather than a scan over every timestamp.
+    """
+
+    def __init__(self, series=None, loader=None):
+        """
+        Args:
+            series: {symbol: {timestamp: bar}} loaded up front
+            loader: Called with a symbol not in `series`, returns its {timestamp: bar} or None
+        """
+        self._series = dict(series or {})
+        self._loader = loader
+        self._sorted_keys = {}
+
+    def __len__(self):
+        return len(self._series)
+
+    def series(self, symbol):
+        """{timestamp: bar} of a symbol, or None if it has no price data"""
+        if symbol not in self._series and self._loader is not None:
+            self._series[symbol] = self._loader(symbol)
+        return self._series.get(symbol)
+
+    def sorted_keys(self, symbol):
+        """Timestamps of a symbol in ascending order"""
+        keys = self._sorted_keys.get(symbol)
+        if keys is None:
+            keys = self._sorted_keys[symbol] = sorted(self.series(symbol) or ())
+        return keys
+
+
+def _bar_close(bar):
+    # Close of a bar, or None if missing / N/A
+    price_value = bar.get('4. close') or bar.get('4. sell price', 0)
+    if price_value and price_value != 'N/A':
+        return float(price_value)
+    return None
+
+
 def get_closing_price(symbol, date, price_data, market='us'):
-    """Get closing price for a symbol on a specific date."""
-    if market == 'us':
-        prices = price_data.get(symbol)
-        if not prices:
-            return None
+    """Get closing price for a symbol on a specific date (price_data: the market's PriceIndex)."""
+    prices = price_data.series(symbol)
+    if not prices:
+        return None
 
-        # Try exact match first
+    if market == 'us':
+        # Exact match only
         if date in prices:
             return float(prices[date].get('4. close') or prices[date].get('4. sell price', 0))
 
         return None
 
     else:  # cn market
-        prices = price_data.get(symbol)
-        if not prices:
-            return None
-
         # Try exact match first (for hourly data)
         if date in prices:
-            price_value = prices[date].get('4. close') or prices[date].get('4. sell price', 0)
-            if price_value and price_value != 'N/A':
-                return float(price_value)
+            price = _bar_close(prices[date])
+            if price is not None:
+                return price
 
         # Extract date only for daily data matching
         date_only = date.split(' ')[0]
 
         if date_only in prices:
-            price_value = prices[date_only].get('4. close') or prices[date_only].get('4. sell price', 0)
-            if price_value and price_value != 'N/A':
-                return float(price_value)
-
-        # Try to find the REQUESTED timestamp or closest earlier timestamp on same date
-        date_prefix = date_only
-        matching_keys = [k for k in prices.keys() if k.startswith(date_prefix)]
-
-        if matching_keys:
-            # For hourly timestamps, find the exact or closest earlier time
-            if ':' in date:  # Hourly timestamp requested
-                # Try to find exact or closest earlier match
-                matching_keys = [k for k in matching_keys if k <= date]
-                if matching_keys:
-                    closest_key = sorted(matching_keys)[-1]
-                    price_value = prices[closest_key].get('4. close') or prices[closest_key].get('4. sell price', 0)
-                    if price_value and price_value != 'N/A':
-                        return float(price_value)
-            else:  # Daily date requested
-                # Use last available time on that day
-                last_key = sorted(matching_keys)[-1]
-                price_value = prices[last_key].get('4. close') or prices[last_key].get('4. sell price', 0)
-                if price_value and price_value != 'N/A':
-                    return float(price_value)
+            price = _bar_close(prices[date_only])
+            if price is not None:
+                return price
+
+        # Latest timestamp on the same date: at or before the requested time for an
+        # hourly timestamp, the last one of the day for a daily date. Timestamps of
+        # one date are contiguous in sorted order, so bisect finds it directly.
+        keys = price_data.sorted_keys(symbol)
+        upper = date if ':' in date else date_only + '\uffff'
+        pos = bisect.bisect_right(keys, upper) - 1
+        if pos >= 0 and keys[pos].startswith(date_only):
+            return _bar_close(prices[keys[pos]])
 
         return None
 
@@ -211,8 +280,8 @@ def calculate_asset_value(position, date, price_data, market='us'):
     return total_value
 
 
-def process_agent_data_us(agent_config, market_config):
-    """Process agent data for US market."""
+def process_agent_data_us(agent_config, market_config, price_index):
+    """Process agent data for US market (price_index: US PriceIndex shared by all agents)."""
     agent_folder = agent_config['folder']
     print(f"  Processing {agent_folder}...")
 
@@ -222,14 +291,10 @@ def process_agent_data_us(agent_config, market_config):
         print(f"    No positions found for {agent_folder}")
         return None
 
-    # Load all required price data
-    price_data = {}
-    all_symbols = set()
-    for pos in positions:
-        all_symbols.update([s for s in pos['positions'].keys() if s != 'CASH'])
-
-    for symbol in all_symbols:
-        price_data[symbol] = load_price_data_us(symbol)
+    # Values marked to market at trade time, one per ledger record, when the series is up to date
+    series_history = load_series_history(agent_folder, market_config)
+    if series_history is not None:
+        value_of = {id(position): point['value'] for position, point in zip(positions, series_history)}
 
     # Group positions by timestamp and take only the last position for each timestamp
     positions_by_timestamp = {}
@@ -245,7 +310,10 @@ def process_agent_data_us(agent_config, market_config):
     asset_history = []
     for position in unique_positions:
         timestamp = position['date']
-        asset_value = calculate_asset_value(position, timestamp, price_data, 'us')
+        if series_history is not None:
+            asset_value = value_of[id(position)]
+        else:
+            asset_value = calculate_asset_value(position, timestamp, price_index, 'us')
         asset_history.append({
             'date': timestamp,
             'value': asset_value,
@@ -261,17 +329,18 @@ def process_agent_data_us(agent_config, market_config):
         'name': agent_folder,
         'positions': positions,
         'assetHistory': asset_history,
+        # Metrics score the ledger valuation shared with calculate_metrics (see attach_metrics)
+        'metricHistory': series_history,
         'initialValue': asset_history[0]['value'] if asset_history else 10000,
         'currentValue': asset_history[-1]['value'] if asset_history else 0,
-        'return': ((asset_history[-1]['value'] - asset_history[0]['value']) / asset_history[0]['value'] * 100) if asset_history else 0
     }
 
     print(f"    ✓ {len(positions)} positions, {len(asset_history)} data points")
     return result
 
 
-def process_agent_data_cn(agent_config, market_config, price_cache):
-    """Process agent data for A-share market."""
+def process_agent_data_cn(agent_config, market_config, price_index):
+    """Process agent data for A-share market (price_index: PriceIndex shared by all agents)."""
     agent_folder = agent_config['folder']
     print(f"  Processing {agent_folder}...")
 
@@ -327,7 +396,7 @@ def process_agent_data_cn(agent_config, market_config, price_cache):
     if preserve_hourly:
         asset_history = []
         for position in unique_positions:
-            asset_value = calculate_asset_value(position, position['dateKey'], price_cache, 'cn')
+            asset_value = calculate_asset_value(position, position['dateKey'], price_index, 'cn')
             if asset_value is not None:
                 asset_history.append({
                     'date': position['dateKey'],
@@ -344,9 +413,10 @@ def process_agent_data_cn(agent_config, market_config, price_cache):
             'name': agent_folder,
             'positions': [{'date': p['dateKey'], 'id': p['id'], 'positions': p['positions']} for p in unique_positions],
             'assetHistory': asset_history,
+            # Metrics score the ledger valuation shared with calculate_metrics (see attach_metrics)
+            'metricHistory': load_series_history(agent_folder, market_config),
             'initialValue': asset_history[0]['value'] if asset_history else 10000,
             'currentValue': asset_history[-1]['value'] if asset_history else 0,
-            'return': ((asset_history[-1]['value'] - asset_history[0]['value']) / asset_history[0]['value'] * 100) if asset_history else 0
         }
 
         print(f"    ✓ {len(result['positions'])} positions, {len(asset_history)} data points (hourly)")
@@ -376,7 +446,7 @@ def process_agent_data_cn(agent_config, market_config, price_cache):
 
             if current_position:
                 # Calculate asset value
-                asset_value = calculate_asset_value(current_position, date_str, price_cache, 'cn')
+                asset_value = calculate_asset_value(current_position, date_str, price_index, 'cn')
 
                 if asset_value is not None:
                     asset_history.append({
@@ -398,9 +468,11 @@ def process_agent_data_cn(agent_config, market_config, price_cache):
         'name': agent_folder,
         'positions': positions,
         'assetHistory': asset_history,
+        # Metrics score the ledger valuation shared with calculate_metrics, not the days filled in for the chart
+        'metricHistory': (load_series_history(agent_folder, market_config)
+                          or [point for point in asset_history if point['date'] in position_map]),
         'initialValue': asset_history[0]['value'] if asset_history else 10000,
         'currentValue': asset_history[-1]['value'] if asset_history else 0,
-        'return': ((asset_history[-1]['value'] - asset_history[0]['value']) / asset_history[0]['value'] * 100) if asset_history else 0
     }
 
     print(f"    ✓ {len(positions)} positions, {len(asset_history)} data points")
@@ -419,11 +491,9 @@ def process_benchmark_us(market_config, agents_data=None):
         return None
 
     try:
-        with open(benchmark_path, 'r') as f:
-            data = json.load(f)
-            time_series = data.get('Time Series (60min)') or data.get('Time Series (Daily)')
+        benchmark = load_benchmark(benchmark_path)
 
-        if not time_series:
+        if not benchmark:
             print("    No time series data in QQQ benchmark")
             return None
 
@@ -450,33 +520,12 @@ def process_benchmark_us(market_config, agents_data=None):
             print(f"    Date filter: {start_date_filter} to {end_date_filter}")
             print(f"    Using initial value from agents: {initial_value}")
 
-        # Convert to asset history format
-        asset_history = []
-        dates = sorted(time_series.keys())
-
-        benchmark_start_price = None
-
-        for date in dates:
-            # Apply date filtering to match agent date ranges
-            if start_date_filter and date < start_date_filter:
-                continue
-            if end_date_filter and date > end_date_filter:
-                continue
-
-            close_price = float(time_series[date].get('4. close') or time_series[date].get('4. sell price', 0))
-
-            if benchmark_start_price is None:
-                benchmark_start_price = close_price
-
-            benchmark_return = (close_price - benchmark_start_price) / benchmark_start_price
-            current_value = initial_value * (1 + benchmark_return)
-
-            asset_history.append({
-                'date': date,
-                'value': current_value,
-                'id': f'qqq-{date}',
-                'action': None
-            })
+        # Apply date filtering to match agent date ranges, then scale to the agents' initial value
+        window = benchmark.window(start_date_filter, end_date_filter)
+        asset_history = [
+            {'date': date, 'value': value, 'id': f'qqq-{date}', 'action': None}
+            for date, value in zip(window.timestamps.tolist(), window.normalized(initial_value).tolist())
+        ]
 
         result = {
             'name': 'QQQ Invesco',
@@ -484,7 +533,6 @@ def process_benchmark_us(market_config, agents_data=None):
             'assetHistory': asset_history,
             'initialValue': initial_value,
             'currentValue': asset_history[-1]['value'] if asset_history else initial_value,
-            'return': ((asset_history[-1]['value'] - asset_history[0]['value']) / asset_history[0]['value'] * 100) if asset_history else 0,
             'currency': 'USD'
         }
 
@@ -508,11 +556,9 @@ def process_benchmark_cn(market_config, agents_data=None):
         return None
 
     try:
-        with open(benchmark_path, 'r') as f:
-            data = json.load(f)
-            time_series = data.get('Time Series (Daily)')
+        benchmark = load_benchmark(benchmark_path)
 
-        if not time_series:
+        if not benchmark:
             print("    No time series data in SSE 50 benchmark")
             return None
 
@@ -555,47 +601,25 @@ def process_benchmark_cn(market_config, agents_data=None):
                         all_agent_timestamps.add(h['date'])
             print(f"    Market type: {'Hourly' if is_hourly_market else 'Daily'}")
 
-        # Convert to asset history format
-        asset_history = []
-        dates = sorted(time_series.keys())
-
-        benchmark_start_price = None
-
         # For hourly markets, use agent timestamps; for daily markets, use benchmark dates
-        timestamps_to_use = sorted(all_agent_timestamps) if is_hourly_market else dates
-
-        for timestamp in timestamps_to_use:
-            # Apply date filtering to match agent date ranges
-            if start_date_filter and timestamp < start_date_filter:
-                continue
-            if end_date_filter and timestamp > end_date_filter:
-                continue
-
-            # Find the benchmark price
-            if is_hourly_market:
-                # For hourly timestamps, extract date part and look up daily price
-                date_only = timestamp.split(' ')[0]
-                if date_only not in time_series:
-                    continue
-                close_price = float(time_series[date_only].get('4. close') or time_series[date_only].get('4. sell price', 0))
-            else:
-                # For daily timestamps, direct lookup
-                if timestamp not in time_series:
-                    continue
-                close_price = float(time_series[timestamp].get('4. close') or time_series[timestamp].get('4. sell price', 0))
-
-            if benchmark_start_price is None:
-                benchmark_start_price = close_price
-
-            benchmark_return = (close_price - benchmark_start_price) / benchmark_start_price
-            current_value = initial_value * (1 + benchmark_return)
+        if is_hourly_market:
+            # Agent timestamps within the date filter, priced at the daily close of their date
+            timestamps = [
+                ts for ts in sorted(all_agent_timestamps)
+                if (not start_date_filter or ts >= start_date_filter) and (not end_date_filter or ts <= end_date_filter)
+            ]
+            closes = benchmark.closes_at(ts.split(' ')[0] for ts in timestamps)
+            has_price = ~np.isnan(closes)
+            timestamps = [ts for ts, ok in zip(timestamps, has_price) if ok]
+            closes = closes[has_price]
+        else:
+            window = benchmark.window(start_date_filter, end_date_filter)
+            timestamps, closes = window.timestamps.tolist(), window.closes
 
-            asset_history.append({
-                'date': timestamp,
-                'value': current_value,
-                'id': f'sse50-{timestamp}',
-                'action': None
-            })
+        asset_history = [
+            {'date': timestamp, 'value': value, 'id': f'sse50-{timestamp}', 'action': None}
+            for timestamp, value in zip(timestamps, normalize_closes(closes, initial_value).tolist())
+        ]
 
         result = {
             'name': market_config.get('benchmark_display_name', 'SSE 50'),
@@ -603,7 +627,6 @@ def process_benchmark_cn(market_config, agents_data=None):
             'assetHistory': asset_history,
             'initialValue': initial_value,
             'currentValue': asset_history[-1]['value'] if asset_history else initial_value,
-            'return': ((asset_history[-1]['value'] - asset_history[0]['value']) / asset_history[0]['value'] * 100) if asset_history else 0,
             'currency': 'CNY'
         }
 
@@ -615,6 +638,164 @@ def process_benchmark_cn(market_config, agents_data=None):
         return None
 
 
+def attach_metrics(agents_data, market_config):
+    """
+    Score every agent and the benchmark in one vectorized call (tools/metrics.py)
+
+    Sets 'return' (cumulative return in percent) and 'metrics' (CR, SR, Sharpe,
+    Vol, MDD as fractions) on each entry of agents_data. Agents are scored on
+    their ledger valuation ('metricHistory', falling back to the chart series)
+    at one value per ledger timestamp, like calculate_metrics and results_db.
+    """
+    names = [name for name, data in agents_data.items() if data.get('assetHistory')]
+    if not names:
+        return
+    histories = [agents_data[name].get('metricHistory') or agents_data[name]['assetHistory'] for name in names]
+    values = stack_series([
+        last_per_timestamp([point['date'] for point in history], [point['value'] for point in history])[1]
+        for history in histories
+    ])
+    is_hourly = market_config.get('time_granularity') == 'hourly'
+    table = compute_metrics(values, periods_per_year(is_hourly=is_hourly))
+    for i, name in enumerate(names):
+        metrics = {
+            key: table[key][i].item()
+            for key in ('CR', 'SR', 'Sharpe Ratio', 'Vol', 'MDD')
+        }
+        # JSON has no infinity; a Sortino ratio without losing periods is reported as null
+        metrics = {key: (value if abs(value) != float('inf') else None) for key, value in metrics.items()}
+        agents_data[name]['return'] = metrics['CR'] * 100
+        agents_data[name]['metrics'] = metrics
+    for data in agents_data.values():
+        data.setdefault('return', 0)
+
+
+def lttb_indices(values, threshold):
+    """
+    Indices kept by Largest-Triangle-Three-Buckets downsampling
+
+    Points are spaced by position, like on the frontend's category axis. The
+    first and last points are always kept; every bucket in between keeps the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+
+    Args:
+        values: Series values
+        threshold: Number of points to keep
+
+    Returns:
+        Sorted list of indices (every index when the series is not longer than threshold)
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    y = np.asarray(values, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = [0]
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        a = kept[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        kept.append(int(start + area.argmax()))
+    kept.append(n - 1)
+    return kept
+
+
+def downsample_history(asset_history, threshold):
+    """LTTB-downsampled copy of an asset history (entries are kept whole)"""
+    indices = lttb_indices([point['value'] for point in asset_history], threshold)
+    return [asset_history[i] for i in indices]
+
+
+def month_range(first_date, last_date):
+    """'YYYY-MM' keys of every month from first_date to last_date inclusive"""
+    year, month = int(first_date[:4]), int(first_date[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= last_date[:7]:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def write_json(path, data):
+    """Write compact JSON, creating parent directories"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def write_sharded_cache(market_id, cache):
+    """
+    Write a market's cache as a manifest plus lazily-loaded shards
+
+    The market directory is built next to the old one and swapped in at the end,
+    so the frontend never sees a manifest pointing at missing shards.
+
+    Args:
+        market_id: Market ID (us, cn, cn_hour)
+        cache: {'version', 'generatedAt', 'market', 'agentsData'} with full agent data
+
+    Returns:
+        Path of the manifest
+    """
+    cache_root = Path(__file__).parent.parent / 'docs' / 'data' / CACHE_DIR
+    output_dir = cache_root / market_id
+    tmp_dir = cache_root / f'.{market_id}.tmp'
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+
+    manifest_agents = {}
+    for name, data in cache['agentsData'].items():
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', name)
+        agent_dir = f'agents/{slug}'
+        asset_history = data.get('assetHistory', [])
+        positions = data.get('positions', [])
+
+        # Full history, one shard per month; months without points get an empty shard
+        by_month = {}
+        for point in asset_history:
+            by_month.setdefault(point['date'][:7], []).append(point)
+        if asset_history:
+            for month in month_range(asset_history[0]['date'], asset_history[-1]['date']):
+                write_json(tmp_dir / agent_dir / 'history' / f'{month}.json', by_month.get(month, []))
+        write_json(tmp_dir / agent_dir / 'positions.json', positions)
+
+        entry = {key: value for key, value in data.items() if key not in ('positions', 'assetHistory', 'metricHistory')}
+        entry.update({
+            'assetHistory': downsample_history(asset_history, CHART_POINTS),
+            'startDate': asset_history[0]['date'] if asset_history else None,
+            'endDate': asset_history[-1]['date'] if asset_history else None,
+            'latestPositions': positions[-1].get('positions', {}) if positions else {},
+            'files': {
+                'positions': f'{agent_dir}/positions.json',
+                'history': f'{agent_dir}/history/{{month}}.json',
+            },
+        })
+        manifest_agents[name] = entry
+
+    manifest = {
+        'version': cache['version'],
+        'generatedAt': cache['generatedAt'],
+        'market': market_id,
+        'agentsData': manifest_agents,
+    }
+    write_json(tmp_dir / 'manifest.json', manifest)
+
+    old_dir = cache_root / f'.{market_id}.old'
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if output_dir.exists():
+        output_dir.rename(old_dir)
+    tmp_dir.rename(output_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return output_dir / 'manifest.json'
+
+
 def generate_cache_for_market(market_id, market_config, config):
     """Generate cache file for a specific market."""
     print(f"\n{'='*60}")
@@ -629,10 +810,13 @@ def generate_cache_for_market(market_id, market_config, config):
     agents_data = {}
 
     if market_id == 'us':
+        # Price files are opened once per symbol for all agents
+        price_index = PriceIndex(loader=load_price_data_us)
+
         # Process US market agents
         for agent_config in market_config.get('agents', []):
             if agent_config.get('enabled', True):
-                result = process_agent_data_us(agent_config, market_config)
+                result = process_agent_data_us(agent_config, market_config, price_index)
                 if result:
                     agents_data[agent_config['folder']] = result
 
@@ -644,13 +828,13 @@ def generate_cache_for_market(market_id, market_config, config):
     else:  # cn market
         # Load all A-share prices once
         print("  Loading A-share price data...")
-        price_cache = load_price_data_cn(market_config)
-        print(f"  Loaded prices for {len(price_cache)} symbols")
+        price_index = PriceIndex(load_price_data_cn(market_config))
+        print(f"  Loaded prices for {len(price_index)} symbols")
 
         # Process A-share market agents
         for agent_config in market_config.get('agents', []):
             if agent_config.get('enabled', True):
-                result = process_agent_data_cn(agent_config, market_config, price_cache)
+                result = process_agent_data_cn(agent_config, market_config, price_index)
                 if result:
                     agents_data[agent_config['folder']] = result
 
@@ -659,9 +843,11 @@ def generate_cache_for_market(market_id, market_config, config):
         if benchmark_data:
             agents_data[benchmark_data['name']] = benchmark_data
 
+    attach_metrics(agents_data, market_config)
+
     # Create cache object
     # Add a manual version prefix to force cache invalidation when data structure changes
-    CACHE_FORMAT_VERSION = 'v4'  # Increment this when changing data structure (v4: fixed hourly SSE-50 benchmark)
+    CACHE_FORMAT_VERSION = 'v7'  # Increment this when changing data structure (v7: sharded manifest with LTTB series)
     cache = {
         'version': f"{CACHE_FORMAT_VERSION}_{version}",
         'generatedAt': datetime.now().isoformat(),
@@ -669,17 +855,15 @@ def generate_cache_for_market(market_id, market_config, config):
         'agentsData': agents_data
     }
 
-    # Write cache file
-    output_path = Path(__file__).parent.parent / 'docs' / 'data' / f'{market_id}_cache.json'
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    with open(output_path, 'w') as f:
-        json.dump(cache, f, indent=2)
+    # Write manifest and shards
+    manifest_path = write_sharded_cache(market_id, cache)
+    total_size = sum(f.stat().st_size for f in manifest_path.parent.rglob('*.json'))
 
-    print(f"\n✓ Cache generated: {output_path}")
+    print(f"\n✓ Cache generated: {manifest_path}")
     print(f"  - Version: {cache['version']}")
     print(f"  - Agents: {len(agents_data)}")
-    print(f"  - File size: {output_path.stat().st_size / 1024:.1f} KB")
+    print(f"  - Manifest size: {manifest_path.stat().st_size / 1024:.1f} KB")
+    print(f"  - Total size: {total_size / 1024:.1f} KB")
 
     return cache
 
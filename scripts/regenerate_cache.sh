@@ -39,9 +39,10 @@ echo "========================================"
 echo "Cache regeneration complete!"
 echo "========================================"
 echo ""
-echo "Generated files:"
-echo "  - docs/data/us_cache.json"
-echo "  - docs/data/cn_cache.json"
+echo "Generated files (manifest plus lazily-loaded shards per market):"
+echo "  - docs/data/cache/us/"
+echo "  - docs/data/cache/cn/"
+echo "  - docs/data/cache/cn_hour/"
 echo ""
 echo "These files will be automatically used by the frontend for faster loading."
 echo "Commit these files to your repository for GitHub Pages deployment."
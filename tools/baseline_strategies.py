@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Vectorized rule-based baseline strategies traded under the agents' rules
+
+QQQ, SSE-50 and CD5 are passive benchmarks. This engine adds classic active
+baselines that trade the same universe, on the same calendar and under the
+same rules as the agents:
+    - Universe and calendar: the market's merged JSONL file (the one the agents
+      read their trading sessions from), restricted to the window of the
+      agents' ledgers in the tree
+    - Fills at the session's "1. buy price"; sells before buys, no fees
+    - US: whole shares; CN (.SH/.SZ): lots of 100 and T+1 (shares bought on a
+      calendar day cannot be sold that day); crypto: fractional amounts and
+      cash rounded to 4 decimals like tool_crypto_trade
+
+Strategies (every one is "hold the top-k symbols by a score, equal weighted,
+rebalanced every n sessions"; only the score differs):
+    buy-and-hold      all symbols, bought at the first session and never traded again
+    equal-weight      all symbols, reset to equal weights every n sessions
+    momentum          top-k by trailing return over `lookback` sessions
+    mean-reversion    bottom-k by trailing return over `lookback` sessions
+    random            k symbols drawn at random, reproducible per seed
+
+Signals only use closes of bars before the session being traded. The whole
+parameter grid is simulated at once: cash and holdings are (parameter sets ×
+symbols) arrays, and only the time axis is walked in Python, so thousands of
+parameter sets take seconds.
+
+The random trader is never reported by its luckiest seed: its parameter sets
+are summarized as the distribution across seeds (median and 5th/95th
+percentile), and --write best writes the median seed.
+
+Output: by default only the ranking is printed (--write none). With --write
+best/all, ledgers in the position.jsonl format (one trade per line and a
+no_trade line for sessions without trades) are written to
+{output-root}/{agent tree}/baseline-<strategy>-<params>/position/position.jsonl.
+Point --output-root at --data-dir to have calculate_metrics --all and
+bootstrap_leaderboard pick them up next to the agents; to show one on the
+frontend, add its folder to the market's agents in docs/config.yaml.
+
+Usage:
+    python tools/baseline_strategies.py --market us
+    python tools/baseline_strategies.py --market astock --lookbacks 3 5 10 20 --top-k 3 5 10 \\
+        --rebalance-every 1 2 5 --seeds 0-99 --write all --output-root /tmp/baselines
+    python tools/baseline_strategies.py --market crypto --write best --output-root data
+    python tools/baseline_strategies.py --market crypto --summary data/baselines_crypto.csv
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from data.crypto.index_engine import PriceMatrix, load_price_matrix
+from tools.calculate_metrics import AGENT_TREES, write_metrics_table
+from tools.metrics import compute_metrics, periods_per_year
+
+# Trading rules per market (AGENT_TREES holds the tree-level settings)
+MARKET_RULES = {
+    "us": {"merged_file": "merged.jsonl", "quantum": 1, "t_plus_one": False, "initial_cash": 10000.0,
+           "actions": ("buy", "sell")},
+    "astock": {"merged_file": "A_stock/merged.jsonl", "quantum": 100, "t_plus_one": True, "initial_cash": 100000.0,
+               "actions": ("buy", "sell")},
+    "astock_hour": {"merged_file": "A_stock/merged_hourly.jsonl", "quantum": 100, "t_plus_one": True,
+                    "initial_cash": 100000.0, "actions": ("buy", "sell")},
+    "crypto": {"merged_file": "crypto/crypto_merged.jsonl", "quantum": 1e-4, "t_plus_one": False,
+               "initial_cash": 50000.0, "actions": ("buy_crypto", "sell_crypto")},
+}
+
+STRATEGIES = ("buy-and-hold", "equal-weight", "momentum", "mean-reversion", "random")
+BASELINE_PREFIX = "baseline-"
+
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    # Forward-fill NaNs down the time axis of a (time × symbols) array
+    return pd.DataFrame(x).ffill().to_numpy()
+
+
+def _floor_to(x: np.ndarray, quantum: float) -> np.ndarray:
+    floored = np.floor(x / quantum + 1e-9) * quantum
+    return np.round(floored, 4) if quantum < 1 else floored
+
+
+class Market:
+    """
+    Prices of one market on its trading calendar
+
+    Attributes:
+        sessions: (T,) session timestamps
+        symbols: N symbol names
+        opens: (T, N) fill prices, NaN where a symbol cannot be traded
+        marks: (T, N) last known price at the open, for sizing
+        closes: (T, N) last known close after the session, for valuation
+        history: full PriceMatrix (including bars before the window) for signals
+        rows: (T,) row of each session in `history`
+    """
+
+    def __init__(self, history: PriceMatrix, rows: np.ndarray, start_date: str):
+        self.history = history
+        self.rows = rows
+        self.start_date = start_date
+        self.sessions = history.timestamps[rows]
+        self.symbols = history.symbols
+        opens, closes = history.opens, history.closes
+        self.opens = np.where(opens > 0, opens, np.nan)[rows]
+        last_price = _ffill(np.where(np.isfinite(closes), closes, opens))
+        previous = np.vstack([np.full((1, len(self.symbols)), np.nan), last_price[:-1]])
+        self.marks = np.where(np.isfinite(self.opens), self.opens, previous[rows])
+        self.closes = last_price[rows]
+        self.days = np.array([str(ts).split(" ")[0] for ts in self.sessions])
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def trailing_returns(self, lookback: int) -> np.ndarray:
+        """(T, N) return over `lookback` bars up to the close before each session (NaN without history)"""
+        closes = _ffill(self.history.closes)
+        prior = np.vstack([np.full((lookback + 1, closes.shape[1]), np.nan), closes[: -lookback - 1]])
+        latest = np.vstack([np.full((1, closes.shape[1]), np.nan), closes[:-1]])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (latest / prior - 1)[self.rows]
+
+
+def _ledger_window(tree_dir: Path) -> Tuple[Optional[str], Optional[str]]:
+    # First and last date of the agents' ledgers in a tree (baselines excluded)
+    dates = []
+    for position_file in tree_dir.glob("*/position/position.jsonl"):
+        if position_file.parent.parent.name.startswith(BASELINE_PREFIX):
+            continue
+        with open(position_file, "r", encoding="utf-8") as f:
+            dates.extend(json.loads(line)["date"] for line in f if line.strip())
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+def load_market(data_root: str, market: str, start: Optional[str] = None, end: Optional[str] = None) -> Market:
+    """
+    Load a market's merged price file and cut it to the trading window
+
+    Args:
+        data_root: Directory holding the merged files and agent_data* trees
+        market: Key of MARKET_RULES
+        start: First date/time (default: first date in the agents' ledgers, i.e. their init date)
+        end: Last date/time (default: last date in the agents' ledgers)
+
+    Returns:
+        Market whose sessions are the merged file's bars inside [start, end]
+    """
+    tree = next(name for name, settings in AGENT_TREES.items() if settings["market"] == market)
+    history = load_price_matrix(str(Path(data_root) / MARKET_RULES[market]["merged_file"]))
+    ledger_start, ledger_end = _ledger_window(Path(data_root) / tree)
+    start = start or ledger_start or str(history.timestamps[0])
+    end = end or ledger_end or str(history.timestamps[-1])
+    # A bare end date includes that day's intraday bars (" 99" sorts after any time)
+    end_key = end if " " in end else f"{end} 99"
+    tradable = np.isfinite(history.opens).any(axis=1)
+    rows = np.flatnonzero((history.timestamps >= start) & (history.timestamps <= end_key) & tradable)
+    if len(rows) == 0:
+        raise ValueError(f"No {market} sessions between {start} and {end}")
+    return Market(history, rows, start)
+
+
+def _parse_seeds(spec: Sequence[str]) -> List[int]:
+    seeds = []
+    for item in spec:
+        if "-" in item:
+            low, high = item.split("-", 1)
+            seeds.extend(range(int(low), int(high) + 1))
+        else:
+            seeds.append(int(item))
+    return seeds
+
+
+def expand_grid(
+    strategies: Sequence[str] = STRATEGIES,
+    lookbacks: Sequence[int] = (5, 10, 20),
+    top_ks: Sequence[int] = (5, 10),
+    rebalance_every: Sequence[int] = (1, 5),
+    seeds: Sequence[int] = (0,),
+) -> List[Dict[str, Any]]:
+    """
+    Parameter sets for every requested strategy
+
+    Returns:
+        List of {"strategy", "lookback", "top_k", "rebalance_every", "seed"}; keys a
+        strategy does not use are None (top_k None means all symbols)
+    """
+    grid = []
+    for strategy in strategies:
+        if strategy == "buy-and-hold":
+            grid.append({"strategy": strategy, "lookback": None, "top_k": None, "rebalance_every": None, "seed": None})
+        elif strategy == "equal-weight":
+            grid.extend({"strategy": strategy, "lookback": None, "top_k": None, "rebalance_every": n, "seed": None}
+                        for n in rebalance_every)
+        elif strategy in ("momentum", "mean-reversion"):
+            grid.extend({"strategy": strategy, "lookback": lb, "top_k": k, "rebalance_every": n, "seed": None}
+                        for lb in lookbacks for k in top_ks for n in rebalance_every)
+        elif strategy == "random":
+            grid.extend({"strategy": strategy, "lookback": None, "top_k": k, "rebalance_every": n, "seed": s}
+                        for k in top_ks for n in rebalance_every for s in seeds)
+        else:
+            raise ValueError(f"Unknown strategy {strategy!r}; choose from {STRATEGIES}")
+    return grid
+
+
+def run_name(params: Dict[str, Any]) -> str:
+    """Folder name of a parameter set, e.g. baseline-momentum-lb10-k5-rb1"""
+    parts = [BASELINE_PREFIX + params["strategy"]]
+    for key, tag in (("lookback", "lb"), ("top_k", "k"), ("rebalance_every", "rb"), ("seed", "s")):
+        if params.get(key) is not None:
+            parts.append(f"{tag}{params[key]}")
+    return "-".join(parts)
+
+
+def seed_distribution(df: pd.DataFrame, rank_by: str = "CR") -> pd.DataFrame:
+    """
+    Random-trader results across seeds, one row per (top_k, rebalance_every)
+
+    Args:
+        df: Grid results (run_baselines)
+        rank_by: Metric summarized and used for ordering
+
+    Returns:
+        DataFrame with name (run name without seed), seeds, the median, 5th and
+        95th percentile of `rank_by`, and median_seed (run name of the seed at the
+        median), best configuration first; empty without random sets
+    """
+    rows = []
+    random_sets = df[df["strategy"] == "random"]
+    for (top_k, rebalance), group in random_sets.groupby(["top_k", "rebalance_every"], sort=False):
+        ordered = group.sort_values(rank_by, kind="stable")
+        values = ordered[rank_by].to_numpy(dtype=float)
+        rows.append({
+            "name": run_name({"strategy": "random", "top_k": int(top_k), "rebalance_every": int(rebalance)}),
+            "seeds": len(values),
+            f"{rank_by} median": float(np.median(values)),
+            f"{rank_by} p05": float(np.percentile(values, 5)),
+            f"{rank_by} p95": float(np.percentile(values, 95)),
+            "median_seed": ordered["name"].iloc[(len(values) - 1) // 2],
+        })
+    result = pd.DataFrame(rows, columns=["name", "seeds", f"{rank_by} median", f"{rank_by} p05", f"{rank_by} p95",
+                                         "median_seed"])
+    ascending = rank_by in ("Vol",)
+    return result.sort_values(f"{rank_by} median", ascending=ascending, kind="stable").reset_index(drop=True)
+
+
+def _score_bank(market: Market, grid: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    # One (T, N) score matrix per distinct signal, and the signal of each parameter set
+    keys, index = {}, np.empty(len(grid), dtype=np.intp)
+    for i, params in enumerate(grid):
+        strategy = params["strategy"]
+        if strategy in ("momentum", "mean-reversion"):
+            key = (strategy, params["lookback"])
+        elif strategy == "random":
+            key = (strategy, params["seed"])
+        else:
+            key = ("flat",)
+        index[i] = keys.setdefault(key, len(keys))
+
+    bank = np.empty((len(keys), len(market), len(market.symbols)))
+    for key, g in keys.items():
+        if key[0] == "momentum":
+            bank[g] = market.trailing_returns(key[1])
+        elif key[0] == "mean-reversion":
+            bank[g] = -market.trailing_returns(key[1])
+        elif key[0] == "random":
+            bank[g] = np.random.default_rng(key[1]).random((len(market), len(market.symbols)))
+        else:
+            bank[g] = 0.0
+    return bank, index
+
+
+def simulate(market: Market, grid: List[Dict[str, Any]], rules: Dict[str, Any], initial_cash: float,
+             record: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Trade every parameter set over the market's sessions at once
+
+    Args:
+        market: Prices on the trading calendar (load_market)
+        grid: Parameter sets (expand_grid)
+        rules: MARKET_RULES entry of the market
+        initial_cash: Starting cash of every parameter set
+        record: Also return the holdings and cash after every session
+
+    Returns:
+        {"values": (P, T + 1) portfolio value at the start and after each session,
+         "trades": (P,) number of trades}; with record, also "holdings" (T, P, N)
+         and "cash" (T, P)
+    """
+    n_sets, n_symbols = len(grid), len(market.symbols)
+    quantum, t_plus_one = rules["quantum"], rules["t_plus_one"]
+    bank, score_index = _score_bank(market, grid)
+    top_k = np.array([p["top_k"] or n_symbols for p in grid])
+    # 0: rebalance at the first session only (buy and hold)
+    every = np.array([p["rebalance_every"] or 0 for p in grid])
+
+    cash = np.full(n_sets, float(initial_cash))
+    hold = np.zeros((n_sets, n_symbols))
+    bought_today = np.zeros((n_sets, n_symbols))
+    trades = np.zeros(n_sets, dtype=np.int64)
+    values = np.empty((n_sets, len(market) + 1))
+    values[:, 0] = initial_cash
+    if record:
+        holdings = np.empty((len(market), n_sets, n_symbols))
+        cash_history = np.empty((len(market), n_sets))
+
+    for t in range(len(market)):
+        if t > 0 and market.days[t] != market.days[t - 1]:
+            bought_today[:] = 0.0
+        opens, marks = market.opens[t], market.marks[t]
+        tradable = np.isfinite(opens)
+        due = (t == 0) | ((every > 0) & (t % np.maximum(every, 1) == 0))
+        sets = np.flatnonzero(due)
+
+        if len(sets):
+            scores = bank[score_index[sets], t]
+            eligible = tradable[None, :] & np.isfinite(scores)
+            ranked = np.argsort(-np.where(eligible, scores, -np.inf), axis=1, kind="stable")
+            rank = np.empty_like(ranked)
+            np.put_along_axis(rank, ranked, np.arange(n_symbols)[None, :], axis=1)
+            chosen = eligible & (rank < top_k[sets, None])
+            count = chosen.sum(axis=1)
+            # Without any signal yet (e.g. not enough history) the set keeps its holdings
+            sets, chosen, count = sets[count > 0], chosen[count > 0], count[count > 0]
+
+        if len(sets):
+            h, c = hold[sets], cash[sets]
+            value = c + np.nansum(h * marks, axis=1)
+            price = np.where(tradable, opens, 1.0)
+            weights = chosen / count[:, None]
+            target = np.where(tradable, _floor_to(weights * value[:, None] / price, quantum), h)
+            delta = target - h
+
+            sellable = h - bought_today[sets] if t_plus_one else h
+            sells = np.minimum(np.clip(-delta, 0, None), sellable)
+            c = c + (sells * price).sum(axis=1)
+            buys = np.clip(delta, 0, None)
+            cost = (buys * price).sum(axis=1)
+            # Scale the buys down to the cash available, then round to tradable quantities again
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scale = np.where(cost > c, c * (1 - 1e-9) / cost, 1.0)
+            buys = _floor_to(buys * scale[:, None], quantum)
+            c = c - (buys * price).sum(axis=1)
+            if quantum < 1:
+                c = np.round(c, 4)
+
+            hold[sets] = h - sells + buys
+            cash[sets] = c
+            bought_today[sets] += buys
+            trades[sets] += (sells > 0).sum(axis=1) + (buys > 0).sum(axis=1)
+
+        values[:, t + 1] = cash + np.nansum(hold * market.closes[t], axis=1)
+        if record:
+            holdings[t] = hold
+            cash_history[t] = cash
+
+    result = {"values": values, "trades": trades}
+    if record:
+        result.update(holdings=holdings, cash=cash_history)
+    return result
+
+
+def _quantity(x: float, quantum: float):
+    return round(float(x), 4) if quantum < 1 else int(round(x))
+
+
+def build_ledger(market: Market, holdings: np.ndarray, rules: Dict[str, Any], initial_cash: float) -> List[Dict[str, Any]]:
+    """
+    position.jsonl records for one parameter set
+
+    Args:
+        market: Market the set was simulated on
+        holdings: (T, N) holdings after each session (simulate(record=True))
+        rules: MARKET_RULES entry of the market
+        initial_cash: Starting cash
+
+    Returns:
+        Records with date, id, this_action and positions: an initial record, then one
+        record per trade (sells first, each with the running cash) or a no_trade record
+    """
+    quantum = rules["quantum"]
+    buy_action, sell_action = rules["actions"]
+    positions = {symbol: _quantity(0, quantum) for symbol in market.symbols}
+    positions["CASH"] = initial_cash
+    records = [{"date": market.start_date, "id": 0, "positions": dict(positions)}]
+    previous = np.zeros(len(market.symbols))
+
+    for t, session in enumerate(market.sessions):
+        delta = holdings[t] - previous
+        previous = holdings[t]
+        changed = np.flatnonzero(np.abs(delta) > quantum / 2)
+        order = sorted(changed, key=lambda col: delta[col] > 0)
+        for col in order:
+            symbol, amount = market.symbols[col], _quantity(abs(delta[col]), quantum)
+            price = float(market.opens[t, col])
+            if delta[col] > 0:
+                action, cash = buy_action, positions["CASH"] - price * amount
+            else:
+                action, cash = sell_action, positions["CASH"] + price * amount
+            positions[symbol] = _quantity(holdings[t, col], quantum)
+            positions["CASH"] = round(cash, 4) if quantum < 1 else cash
+            records.append({"date": str(session), "id": len(records),
+                            "this_action": {"action": action, "symbol": symbol, "amount": amount},
+                            "positions": dict(positions)})
+        if not order:
+            records.append({"date": str(session), "id": len(records),
+                            "this_action": {"action": "no_trade", "symbol": "", "amount": 0},
+                            "positions": dict(positions)})
+    return records
+
+
+def write_ledger(records: List[Dict[str, Any]], position_file: Path) -> Path:
+    """Write records as position.jsonl (replacing an earlier run of the same baseline)"""
+    position_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(position_file, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return position_file
+
+
+def run_baselines(
+    data_root: str,
+    market: str,
+    grid: List[Dict[str, Any]],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    initial_cash: Optional[float] = None,
+    write: str = "none",
+    rank_by: str = "CR",
+    output_root: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Simulate a parameter grid on one market and write the selected ledgers
+
+    Args:
+        data_root: Directory holding the merged files and agent_data* trees
+        market: Key of MARKET_RULES
+        grid: Parameter sets (expand_grid)
+        start, end: Trading window (default: the window of the agents' ledgers)
+        initial_cash: Starting cash (default: the market's agent configs)
+        write: "none", "best" (best set per deterministic strategy by `rank_by`;
+            for the random trader the median seed of its best configuration,
+            see seed_distribution) or "all"
+        rank_by: Metric used to pick the best set
+        output_root: Root for the ledgers (default: `data_root`)
+
+    Returns:
+        DataFrame with one row per parameter set, best first
+    """
+    tree = next(name for name, settings in AGENT_TREES.items() if settings["market"] == market)
+    settings, rules = AGENT_TREES[tree], MARKET_RULES[market]
+    initial_cash = rules["initial_cash"] if initial_cash is None else initial_cash
+
+    t0 = time.perf_counter()
+    prices = load_market(data_root, market, start, end)
+    print(f"Loaded {len(prices.symbols)} symbols, {len(prices)} sessions "
+          f"({prices.sessions[0]} to {prices.sessions[-1]}) in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    result = simulate(prices, grid, rules, initial_cash)
+    metrics = compute_metrics(result["values"], periods_per_year(settings["is_crypto"], settings["is_hourly"]))
+    print(f"Simulated {len(grid)} parameter sets in {time.perf_counter() - t0:.2f}s")
+
+    df = pd.DataFrame(grid)
+    df.insert(0, "name", [run_name(p) for p in grid])
+    for metric in ("CR", "SR", "Sharpe Ratio", "Vol", "MDD", "Final Value"):
+        df[metric] = metrics[metric]
+    df["Trades"] = result["trades"]
+    ascending = rank_by in ("Vol",)
+    df = df.sort_values(rank_by, ascending=ascending, kind="stable").reset_index(drop=True)
+
+    if write == "all":
+        selected = df
+    elif write == "best":
+        selected = df[df["strategy"] != "random"].drop_duplicates("strategy")
+        distribution = seed_distribution(df, rank_by)
+        if len(distribution):
+            selected = pd.concat([selected, df[df["name"] == distribution["median_seed"].iloc[0]]])
+    else:
+        selected = df.iloc[:0]
+    if len(selected):
+        by_name = {run_name(p): p for p in grid}
+        chosen = [by_name[name] for name in selected["name"]]
+        recorded = simulate(prices, chosen, rules, initial_cash, record=True)
+        root = Path(output_root or data_root) / tree
+        for j, params in enumerate(chosen):
+            records = build_ledger(prices, recorded["holdings"][:, j], rules, initial_cash)
+            write_ledger(records, root / run_name(params) / "position" / "position.jsonl")
+        print(f"📝 Wrote {len(chosen)} ledgers to {root}/{BASELINE_PREFIX}*")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run rule-based baseline strategies under the agents' trading rules")
+    parser.add_argument("--market", choices=list(MARKET_RULES), required=True, help="Market to trade")
+    parser.add_argument("--data-dir", default="data", help="Data root holding the merged files and agent_data* trees")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES), help="Strategies to run")
+    parser.add_argument("--lookbacks", nargs="+", type=int, default=[5, 10, 20], help="Momentum / mean-reversion lookbacks in sessions")
+    parser.add_argument("--top-k", nargs="+", type=int, default=[5, 10], help="Number of symbols held")
+    parser.add_argument("--rebalance-every", nargs="+", type=int, default=[1, 5], help="Sessions between rebalances")
+    parser.add_argument("--seeds", nargs="+", default=["0-9"], help="Random-trader seeds, e.g. 0 1 2 or 0-99")
+    parser.add_argument("--start", default=None, help="First date (default: the agents' init date)")
+    parser.add_argument("--end", default=None, help="Last date (default: the agents' last date)")
+    parser.add_argument("--initial-cash", type=float, default=None, help="Starting cash (default: as in the market's agent configs)")
+    parser.add_argument("--write", choices=["none", "best", "all"], default="none",
+                        help="Ledgers to write: none (default), best set per strategy (median seed for random), or every set")
+    parser.add_argument("--rank-by", choices=["CR", "SR", "Sharpe Ratio", "Vol", "MDD"], default="CR",
+                        help="Metric for the ranking and for picking the best sets")
+    parser.add_argument("--output-root", default=None,
+                        help="Root for the ledgers; required with --write (pass the data dir to write next to the agents)")
+    parser.add_argument("--summary", default=None, help="Write the grid results (.csv, .json or .parquet)")
+    parser.add_argument("--top", type=int, default=15, help="Rows of the ranking to print")
+    args = parser.parse_args()
+    if args.write != "none" and not args.output_root:
+        parser.error("--write best/all needs --output-root (ledgers are not written into the data trees implicitly)")
+
+    try:
+        grid = expand_grid(args.strategies, args.lookbacks, args.top_k, args.rebalance_every, _parse_seeds(args.seeds))
+        df = run_baselines(args.data_dir, args.market, grid, args.start, args.end, args.initial_cash,
+                           args.write, args.rank_by, args.output_root)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"\n{'=' * 60}\nBASELINES ({args.market}, by {args.rank_by})\n{'=' * 60}")
+    columns = ["name", "CR", "SR", "Vol", "MDD", "Final Value", "Trades"]
+    # Random seeds are reported as a distribution, never one seed at a time
+    ranking = df[df["strategy"] != "random"]
+    print(ranking[columns].head(args.top).to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    distribution = seed_distribution(df, args.rank_by)
+    if len(distribution):
+        print(f"\nRandom trader across seeds ({args.rank_by})")
+        print(distribution.head(args.top).to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    if args.summary:
+        print(f"Summary saved to {write_metrics_table(df, args.summary)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark index series (QQQ, SSE-50, CD5) shared by every report
+
+The frontend cache, plot_metrics, bootstrap_leaderboard and analyze_cd5 each
+json.load()ed a benchmark file, sorted all its timestamps, filtered them with
+list comprehensions and normalized the closes in a loop. load_benchmark()
+parses a file once per process into sorted arrays (read again only when the
+file changes); window() slices them with searchsorted and normalized() scales
+the closes to a starting portfolio value in one vectorized step.
+
+Timestamps stay strings and bounds compare as strings, like everywhere else in
+the repo: an end bound of "2025-11-10" excludes "2025-11-10 15:00:00".
+
+Usage:
+    qqq = load_benchmark("data/Adaily_prices_QQQ.json")
+    window = qqq.window("2025-10-01 10:00:00", "2025-11-07 15:00:00")
+    values = window.normalized(10000)     # value of 10000 invested at the first bar
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.price_table import SERIES_KEYS
+
+# Parsed files of this process: resolved path -> (mtime_ns, series)
+_BENCHMARKS: Dict[str, Tuple[int, Optional["BenchmarkSeries"]]] = {}
+
+
+def _close_value(bar: Dict[str, Any]) -> float:
+    price_str = bar.get("4. close") or bar.get("4. sell price")
+    try:
+        return float(price_str)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def normalize_closes(closes: np.ndarray, initial_value: float) -> np.ndarray:
+    """Closes scaled so that the first one is worth `initial_value`"""
+    closes = np.asarray(closes, dtype=np.float64)
+    if not len(closes):
+        return closes.copy()
+    return closes / closes[0] * initial_value
+
+
+class BenchmarkSeries:
+    """Closes of one benchmark, sorted by timestamp (arrays are shared between callers: read-only)"""
+
+    def __init__(self, name: str, timestamps: np.ndarray, closes: np.ndarray):
+        """
+        Args:
+            name: Benchmark symbol (e.g. QQQ, 000016.SH, CD5)
+            timestamps: Sorted timestamp strings
+            closes: Close price per timestamp
+        """
+        self.name = name
+        self.timestamps = timestamps
+        self.closes = closes
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def window(self, start: Optional[str] = None, end: Optional[str] = None) -> "BenchmarkSeries":
+        """Bars with start <= timestamp <= end (a bound of None is open)"""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamps, end, side="right"))
+        return BenchmarkSeries(self.name, self.timestamps[lo:hi], self.closes[lo:hi])
+
+    def closes_at(self, timestamps: Iterable[str]) -> np.ndarray:
+        """Close at each of `timestamps` (exact match); NaN where the benchmark has no bar"""
+        keys = np.asarray(list(timestamps), dtype=str)
+        out = np.full(len(keys), np.nan)
+        if not len(self) or not len(keys):
+            return out
+        pos = np.searchsorted(self.timestamps, keys).clip(max=len(self) - 1)
+        found = self.timestamps[pos] == keys
+        out[found] = self.closes[pos[found]]
+        return out
+
+    def normalized(self, initial_value: float) -> np.ndarray:
+        """Value of `initial_value` invested at the first bar, at every bar"""
+        return normalize_closes(self.closes, initial_value)
+
+    def to_series(self) -> pd.Series:
+        """Closes as a pandas Series indexed by datetime"""
+        return pd.Series(self.closes, index=pd.to_datetime(self.timestamps), name=self.name, dtype=float)
+
+
+def _parse_benchmark(path: Path) -> Optional[BenchmarkSeries]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    series_key = next((key for key in SERIES_KEYS if key in data), None)
+    if series_key is None:
+        return None
+    bars = data[series_key]
+    timestamps = np.array(sorted(bars), dtype=str)
+    closes = np.array([_close_value(bars[ts]) for ts in timestamps], dtype=np.float64)
+    valid = ~np.isnan(closes)
+    name = data.get("Meta Data", {}).get("2. Symbol", path.stem)
+    return BenchmarkSeries(name, timestamps[valid], closes[valid])
+
+
+def load_benchmark(benchmark_file) -> Optional[BenchmarkSeries]:
+    """
+    Benchmark series of a QQQ / SSE-50 / CD5 format file, parsed once per process
+
+    Args:
+        benchmark_file: Path of the benchmark JSON file
+
+    Returns:
+        BenchmarkSeries without bars lacking a valid close, or None if the file
+        is missing or has no time series
+    """
+    path = Path(benchmark_file)
+    if not path.exists():
+        return None
+    key = str(path.resolve())
+    mtime = path.stat().st_mtime_ns
+    cached = _BENCHMARKS.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, _parse_benchmark(path))
+        _BENCHMARKS[key] = cached
+    return cached[1]
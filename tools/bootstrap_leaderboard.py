@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Block-bootstrap confidence intervals and pairwise win probabilities for a leaderboard
+
+A single CR/SR/MDD number per backtest window says little about whether one
+model really beat another. This command values every agent of a market
+(calculate_portfolio_values on a shared PriceTable), adds the market benchmark
+(QQQ / SSE-50 / CD5), aligns all series on one time grid and resamples their
+returns with a circular block bootstrap. The same blocks are drawn for every
+series, so the comparison between two series is paired and keeps their
+correlation.
+
+All resamples of a chunk are evaluated at once as a (resamples × series × time)
+array with tools/metrics.py; chunks bound the memory and can be spread over
+worker processes. Each chunk has its own seed derived from --seed, so results
+do not depend on the number of workers.
+
+Output (JSON):
+    series:    point estimate and [low, high] interval per metric for every series
+    pairwise:  P(row beats column) per metric, over all resamples
+
+Usage:
+    python tools/bootstrap_leaderboard.py --market us
+    python tools/bootstrap_leaderboard.py --market crypto --resamples 20000 --workers 4 --output results/crypto_ci.json
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.benchmark_series import load_benchmark
+from tools.calculate_metrics import (
+    AGENT_TREES,
+    calculate_portfolio_values,
+    discover_agent_runs,
+    load_all_price_files,
+    load_position_data,
+    per_timestamp,
+)
+from tools.metrics import cumulative_return, max_drawdown, periods_per_year, sortino_ratio, volatility
+from tools.portfolio_series import load_portfolio_series
+from tools.price_table import PriceTable
+
+# Metric name -> True if a higher value is better
+METRICS = {"CR": True, "SR": True, "Vol": False, "MDD": True}
+
+
+def load_market_values(data_root: str, market: str, include_benchmark: bool = True) -> pd.DataFrame:
+    """
+    Portfolio values of every agent of `market` (plus its benchmark) on one time grid
+
+    The grid is the union of the agents' timestamps (last ledger entry per
+    timestamp); the benchmark is carried forward onto it. Rows before the last
+    series starts are dropped, so every column is complete.
+
+    Returns:
+        DataFrame (timestamps × series)
+    """
+    runs = [run for run in discover_agent_runs(data_root) if run["market"] == market]
+    if not runs:
+        raise ValueError(f"No agents found for market '{market}' under {data_root}")
+    settings = runs[0]
+    price_data = load_all_price_files(Path(data_root) / settings["data_dir"], settings["is_crypto"], settings["is_astock"])
+    table = PriceTable.from_price_data(price_data, settings["is_crypto"])
+
+    columns = {}
+    for run in runs:
+        df = load_portfolio_series(run["position_file"])
+        if df is None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                df = calculate_portfolio_values(load_position_data(run["position_file"]), table, run["is_crypto"], verbose=False)
+        columns[run["agent"]] = per_timestamp(df).set_index("date")["total_value"]
+    values = pd.DataFrame(columns).sort_index().ffill()
+
+    if include_benchmark:
+        benchmark = load_benchmark(Path(data_root) / settings["benchmark_file"])
+        if benchmark:
+            benchmark = benchmark.to_series()
+            aligned = benchmark.reindex(values.index.union(benchmark.index)).ffill().reindex(values.index)
+            values[settings["benchmark"]] = aligned
+        else:
+            print(f"Warning: Benchmark {settings['benchmark_file']} not available, scoring agents only")
+    return values.dropna()
+
+
+def _block_indices(rng: np.random.Generator, n_resamples: int, length: int, block_length: int) -> np.ndarray:
+    # Circular block bootstrap: consecutive blocks of `block_length` starting at random positions
+    n_blocks = -(-length // block_length)
+    starts = rng.integers(0, length, size=(n_resamples, n_blocks, 1))
+    idx = (starts + np.arange(block_length)) % length
+    return idx.reshape(n_resamples, -1)[:, :length]
+
+
+def _score_chunk(returns: np.ndarray, n_resamples: int, block_length: int, periods: float, seed) -> Dict[str, np.ndarray]:
+    """Metrics of `n_resamples` resamples of `returns` (time × series) -> {metric: (resamples, series)}"""
+    rng = np.random.default_rng(seed)
+    length, n_series = returns.shape
+    idx = _block_indices(rng, n_resamples, length, block_length)
+    # (resamples, series, time) values starting at 1
+    resampled = np.transpose(returns[idx], (0, 2, 1))
+    values = np.concatenate([np.ones((n_resamples, n_series, 1)), np.cumprod(1 + resampled, axis=2)], axis=2)
+    flat = values.reshape(n_resamples * n_series, length + 1)
+    scores = {
+        "CR": cumulative_return(flat),
+        "SR": sortino_ratio(flat, periods),
+        "Vol": volatility(flat, periods),
+        "MDD": max_drawdown(flat),
+    }
+    return {metric: score.reshape(n_resamples, n_series) for metric, score in scores.items()}
+
+
+def _chunk_summary(returns, n_resamples, block_length, periods, seed) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    # Per chunk: the (resamples, series) scores and the (series, series) counts of row beating column
+    scores = _score_chunk(returns, n_resamples, block_length, periods, seed)
+    out = {}
+    for metric, higher_is_better in METRICS.items():
+        s = scores[metric]
+        better = s[:, :, None] > s[:, None, :] if higher_is_better else s[:, :, None] < s[:, None, :]
+        out[metric] = (s, better.sum(axis=0))
+    return out
+
+
+def bootstrap_leaderboard(
+    values: pd.DataFrame,
+    periods: float,
+    n_resamples: int = 5000,
+    block_length: Optional[int] = None,
+    confidence: float = 0.95,
+    chunk_size: int = 500,
+    workers: int = 1,
+    seed: int = 0,
+) -> Dict:
+    """
+    Bootstrap CR / SR / Vol / MDD for every column of `values`
+
+    Args:
+        values: Portfolio values (timestamps × series), no missing values
+        periods: Periods per year for annualization
+        n_resamples: Bootstrap resamples
+        block_length: Block length in periods (default: cube root of the series length)
+        confidence: Two-sided interval level
+        chunk_size: Resamples evaluated per vectorized chunk (bounds memory)
+        workers: Processes evaluating chunks
+        seed: Base seed; chunk i uses SeedSequence(seed).spawn(...)[i]
+
+    Returns:
+        {"series": {...}, "pairwise": {...}, "settings": {...}}
+    """
+    names = list(values.columns)
+    array = values.to_numpy(dtype=float)
+    returns = array[1:] / array[:-1] - 1
+    length = len(returns)
+    if length < 2:
+        raise ValueError("Need at least three aligned observations to bootstrap")
+    block_length = block_length or max(1, int(round(length ** (1 / 3))))
+    block_length = min(block_length, length)
+
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(returns, size, block_length, periods, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            chunks = list(executor.map(_chunk_summary, *zip(*jobs)))
+    else:
+        chunks = [_chunk_summary(*job) for job in jobs]
+
+    alpha = (1 - confidence) / 2
+    point_values = array.T
+    point = {
+        "CR": cumulative_return(point_values),
+        "SR": sortino_ratio(point_values, periods),
+        "Vol": volatility(point_values, periods),
+        "MDD": max_drawdown(point_values),
+    }
+
+    series = {name: {} for name in names}
+    pairwise = {}
+    for metric in METRICS:
+        samples = np.concatenate([chunk[metric][0] for chunk in chunks], axis=0)
+        wins = sum(chunk[metric][1] for chunk in chunks)
+        low, median, high = np.nanquantile(samples, [alpha, 0.5, 1 - alpha], axis=0)
+        for i, name in enumerate(names):
+            series[name][metric] = {
+                "point": _json_number(point[metric][i]),
+                "median": _json_number(median[i]),
+                "low": _json_number(low[i]),
+                "high": _json_number(high[i]),
+            }
+        pairwise[metric] = {
+            a: {b: float(wins[i, j] / n_resamples) for j, b in enumerate(names) if j != i} for i, a in enumerate(names)
+        }
+
+    return {
+        "series": series,
+        "pairwise": pairwise,
+        "settings": {
+            "resamples": n_resamples,
+            "block_length": block_length,
+            "confidence": confidence,
+            "periods_per_year": periods,
+            "observations": len(array),
+            "start": str(values.index[0]),
+            "end": str(values.index[-1]),
+            "seed": seed,
+        },
+    }
+
+
+def _json_number(value) -> Optional[float]:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def print_leaderboard(result: Dict, metric: str = "CR") -> None:
+    """Print intervals sorted by the median of `metric` and the pairwise win probabilities"""
+    series = result["series"]
+    settings = result["settings"]
+    descending = METRICS[metric]
+
+    def rank_key(name):
+        # A missing median ranks last; 0.0 is a real value (e.g. no drawdown)
+        median = series[name][metric]["median"]
+        if median is not None and np.isfinite(median):
+            return median
+        return -np.inf if descending else np.inf
+
+    names = sorted(series, key=rank_key, reverse=descending)
+    level = settings["confidence"] * 100
+
+    print("\n" + "=" * 84)
+    print(f"BOOTSTRAP LEADERBOARD ({settings['resamples']} resamples, block {settings['block_length']}, {level:.0f}% intervals)")
+    print("=" * 84)
+    print(f"{'Series':<32} " + " ".join(f"{m:>11}" for m in METRICS) + f"   {metric} interval")
+    print("-" * 84)
+    for name in names:
+        cells = " ".join(
+            f"{(series[name][m]['point'] or 0) * (100 if m in ('CR', 'Vol', 'MDD') else 1):>11.2f}" for m in METRICS
+        )
+        low, high = series[name][metric]["low"], series[name][metric]["high"]
+        scale = 100 if metric in ("CR", "Vol", "MDD") else 1
+        print(f"{name:<32} {cells}   [{(low or 0) * scale:.2f}, {(high or 0) * scale:.2f}]")
+    print("-" * 84)
+    print(f"P(row beats column) on {metric}:")
+    short = [n[:10] for n in names]
+    print(f"{'':<32} " + " ".join(f"{s:>10}" for s in short))
+    for a in names:
+        row = " ".join(f"{'-':>10}" if a == b else f"{result['pairwise'][metric][a][b]:>10.2f}" for b in names)
+        print(f"{a:<32} {row}")
+    print("=" * 84)
+
+
+def main():
+    markets = sorted({settings["market"] for settings in AGENT_TREES.values()})
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals and pairwise win probabilities")
+    parser.add_argument("--market", choices=markets, required=True, help="Market to score")
+    parser.add_argument("--data-dir", default="data", help="Data root holding the agent_data* trees")
+    parser.add_argument("--resamples", type=int, default=5000, help="Bootstrap resamples (default: 5000)")
+    parser.add_argument("--block-length", type=int, default=None, help="Block length in periods (default: cube root of the length)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Interval level (default: 0.95)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Resamples per vectorized chunk (default: 500)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--no-benchmark", action="store_true", help="Score agents only")
+    parser.add_argument("--sort-by", choices=list(METRICS), default="CR", help="Metric for the printed ranking")
+    parser.add_argument("--output", default=None, help="JSON output (default: {data-dir}/bootstrap_{market}.json)")
+    args = parser.parse_args()
+
+    print(f"Loading {args.market} portfolio values...")
+    values = load_market_values(args.data_dir, args.market, include_benchmark=not args.no_benchmark)
+    print(f"Aligned {values.shape[1]} series on {len(values)} timestamps ({values.index[0]} to {values.index[-1]})")
+
+    settings = next(s for s in AGENT_TREES.values() if s["market"] == args.market)
+    result = bootstrap_leaderboard(
+        values,
+        periods_per_year(settings["is_crypto"], settings["is_hourly"]),
+        n_resamples=args.resamples,
+        block_length=args.block_length,
+        confidence=args.confidence,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    result["settings"]["market"] = args.market
+    print_leaderboard(result, args.sort_by)
+
+    output_file = Path(args.output or Path(args.data_dir) / f"bootstrap_{args.market}.json")
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,50 @@ Metrics:
 - SR (Sortino Ratio): Risk-adjusted return using downside deviation
 - Vol (Volatility): Annualized standard deviation of returns
 - MDD (Maximum Drawdown): Largest peak-to-trough decline
+
+Batch mode (--all) scores every agent under the data/agent_data* trees in one
+run: each market's prices are loaded once into a memory-mapped PriceTable
+(tools/price_table.py) shared by a process pool, and the results are written
+as one table with a per-agent timing breakdown.
+
+Agents whose position/portfolio_series.csv is up to date with their ledger and
+price files (tools/portfolio_series.py, appended at trade time) are scored from
+that series without looking up any prices; --revalue forces the ledger walk.
+The portfolio_values.csv this script writes is output only and never read back.
 """
 
 import json
+import os
+import sys
+import tempfile
+import time
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import argparse
 
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.metrics import compute_metrics, last_per_timestamp_index, periods_per_year
+from tools.price_table import PriceTable
+
+# Agent trees under the data root, how their markets are priced and their benchmark
+# (data_dir and benchmark_file are relative to the data root)
+AGENT_TREES = {
+    'agent_data': {'market': 'us', 'data_dir': '.', 'is_crypto': False, 'is_astock': False, 'is_hourly': True,
+                   'benchmark': 'QQQ', 'benchmark_file': 'Adaily_prices_QQQ.json'},
+    'agent_data_astock': {'market': 'astock', 'data_dir': 'A_stock', 'is_crypto': False, 'is_astock': True, 'is_hourly': False,
+                          'benchmark': 'SSE-50', 'benchmark_file': 'A_stock/index_daily_sse_50.json'},
+    'agent_data_astock_hour': {'market': 'astock_hour', 'data_dir': 'A_stock', 'is_crypto': False, 'is_astock': True, 'is_hourly': True,
+                               'benchmark': 'SSE-50', 'benchmark_file': 'A_stock/index_daily_sse_50.json'},
+    'agent_data_crypto': {'market': 'crypto', 'data_dir': 'crypto', 'is_crypto': True, 'is_astock': False, 'is_hourly': False,
+                          'benchmark': 'CD5', 'benchmark_file': 'crypto/CD5_crypto_index.json'},
+}
+
 
 def load_position_data(position_file):
     """Load position data from JSONL file."""
@@ -98,21 +133,25 @@ def get_price_at_date(price_data, symbol, date_str, is_crypto=False):
     return None
 
 
-def load_all_price_files(data_dir, is_crypto=False, is_astock=False):
-    """Load all price files from a directory."""
-    price_data = {}
-
+def price_directory(data_dir, is_crypto=False, is_astock=False):
+    """Directory holding a market's daily_prices_*.json files."""
     if is_crypto:
         # For crypto, data_dir should already point to the crypto folder
-        price_dir = Path(data_dir) / 'coin'
-    elif is_astock:
+        return Path(data_dir) / 'coin'
+    if is_astock:
         # A-stock data is in A_stock_data subdirectory
         price_dir = Path(data_dir) / 'A_stock_data'
         if not price_dir.exists():
             # Fallback to parent directory
             price_dir = Path(data_dir)
-    else:
-        price_dir = Path(data_dir)
+        return price_dir
+    return Path(data_dir)
+
+
+def load_all_price_files(data_dir, is_crypto=False, is_astock=False):
+    """Load all price files from a directory."""
+    price_data = {}
+    price_dir = price_directory(data_dir, is_crypto, is_astock)
 
     for price_file in price_dir.glob('daily_prices_*.json'):
         # Extract symbol and normalize it
@@ -147,11 +186,18 @@ def calculate_portfolio_values(positions, price_data, is_crypto=False, verbose=T
     """
     Calculate portfolio value at each timestamp.
 
+    Args:
+        price_data: Dict from load_all_price_files, or a PriceTable built from it
+
     Returns:
         DataFrame with columns: date, cash, stock_value, total_value
     """
     portfolio_values = []
     missing_prices = set()
+    if isinstance(price_data, PriceTable):
+        price_at = price_data.price_at
+    else:
+        price_at = lambda symbol, date: get_price_at_date(price_data, symbol, date, is_crypto)
 
     for entry in positions:
         date = entry['date']
@@ -165,7 +211,7 @@ def calculate_portfolio_values(positions, price_data, is_crypto=False, verbose=T
             if symbol == 'CASH' or amount == 0:
                 continue
 
-            price = get_price_at_date(price_data, symbol, date, is_crypto)
+            price = price_at(symbol, date)
             if price is not None:
                 stock_value += amount * price
             else:
@@ -191,84 +237,35 @@ def calculate_portfolio_values(positions, price_data, is_crypto=False, verbose=T
     return df
 
 
+def per_timestamp(portfolio_df):
+    """
+    Reduce a per-record portfolio series to one row per timestamp (the last record of each)
+
+    This is the series every report scores; see the conventions in tools/metrics.py.
+    """
+    index = last_per_timestamp_index(portfolio_df['date'].to_numpy())
+    return portfolio_df.iloc[index].reset_index(drop=True)
+
+
 def calculate_metrics(portfolio_df, periods_per_year=252, risk_free_rate=0.0):
     """
     Calculate performance metrics.
 
     Args:
-        portfolio_df: DataFrame with total_value column
+        portfolio_df: DataFrame with date and total_value columns, one row per ledger record
+            (scored at one value per timestamp, see per_timestamp)
         periods_per_year: Number of trading periods per year (252 for daily, ~252*6.5 for hourly)
         risk_free_rate: Annual risk-free rate (default 0.0)
 
     Returns:
-        Dict with metrics
+        Dict with metrics (see tools/metrics.py for the definitions)
     """
-    values = portfolio_df['total_value'].values
-
-    # Calculate returns
-    returns = np.diff(values) / values[:-1]
-
-    # Cumulative Return
-    cr = (values[-1] - values[0]) / values[0]
-
-    # Annualized Return
-    num_periods = len(returns)
-    years = num_periods / periods_per_year
-    annualized_return = (1 + cr) ** (1 / years) - 1 if years > 0 else 0
-
-    # Volatility (annualized)
-    vol = np.std(returns) * np.sqrt(periods_per_year) if len(returns) > 1 else 0
-
-    # Sharpe Ratio
-    excess_return = np.mean(returns) - (risk_free_rate / periods_per_year)
-    sharpe = (excess_return / np.std(returns) * np.sqrt(periods_per_year)) if np.std(returns) > 0 else 0
-
-    # Sortino Ratio
-    negative_returns = returns[returns < 0]
-    if len(negative_returns) > 0:
-        downside_std = np.std(negative_returns)
-        sortino = excess_return / downside_std * np.sqrt(periods_per_year) if downside_std > 0 else 0
-    else:
-        sortino = float('inf') if np.mean(returns) > 0 else 0
-
-    # Maximum Drawdown
-    cumulative = np.cumprod(1 + returns)
-    running_max = np.maximum.accumulate(cumulative)
-    drawdown = (cumulative - running_max) / running_max
-    mdd = np.min(drawdown)
-
-    # Calmar Ratio (Annualized Return / Abs(MDD))
-    calmar = annualized_return / abs(mdd) if mdd != 0 else 0
-
-    # Win Rate and Average Win/Loss
-    winning_periods = returns > 0
-    win_rate = np.mean(winning_periods) if len(returns) > 0 else 0
-    avg_win = np.mean(returns[winning_periods]) if np.any(winning_periods) else 0
-    avg_loss = np.mean(returns[~winning_periods]) if np.any(~winning_periods) else 0
-
-    # Calculate number of trades (excluding no_trade actions)
-    num_trades = 0
-    for i in range(1, len(portfolio_df)):
-        if portfolio_df.iloc[i]['total_value'] != portfolio_df.iloc[i-1]['total_value']:
-            num_trades += 1
-
-    return {
-        'CR': cr,
-        'Annualized Return': annualized_return,
-        'SR': sortino,
-        'Sharpe Ratio': sharpe,
-        'Vol': vol,
-        'MDD': mdd,
-        'Calmar Ratio': calmar,
-        'Win Rate': win_rate,
-        'Average Win': avg_win,
-        'Average Loss': avg_loss,
-        'Initial Value': values[0],
-        'Final Value': values[-1],
-        'Total Positions': len(portfolio_df),
-        'Number of Trades': num_trades,
-        'Date Range': f"{portfolio_df['date'].iloc[0]} to {portfolio_df['date'].iloc[-1]}"
-    }
+    values = per_timestamp(portfolio_df)['total_value'].to_numpy(dtype=float)
+    table = compute_metrics(values, periods_per_year, risk_free_rate)
+    metrics = {key: value[0].item() for key, value in table.items()}
+    metrics['Total Positions'] = len(portfolio_df)
+    metrics['Date Range'] = f"{portfolio_df['date'].iloc[0]} to {portfolio_df['date'].iloc[-1]}"
+    return metrics
 
 
 def detect_market_type(positions):
@@ -293,18 +290,198 @@ def detect_market_type(positions):
     return 'stock'
 
 
+def discover_agent_runs(data_root='data'):
+    """
+    Find every agent ledger under the agent_data* trees of `data_root`
+
+    Returns:
+        List of dicts with tree, market, agent, position_file and the tree's pricing settings
+    """
+    runs = []
+    for tree_dir in sorted(Path(data_root).glob('agent_data*')):
+        settings = AGENT_TREES.get(tree_dir.name)
+        if settings is None:
+            print(f"Warning: Skipping {tree_dir} (unknown agent tree, add it to AGENT_TREES)")
+            continue
+        for position_file in sorted(tree_dir.glob('*/position/position.jsonl')):
+            runs.append({
+                'tree': tree_dir.name,
+                'agent': position_file.parent.parent.name,
+                'position_file': str(position_file),
+                **settings,
+            })
+    return runs
+
+
+def _table_key(run):
+    return (run['data_dir'], run['is_crypto'], run['is_astock'])
+
+
+# PriceTables opened by this (worker) process, by table directory
+_OPEN_TABLES = {}
+
+
+def _score_agent(run, table_dir, risk_free_rate):
+    """Score one agent against a saved PriceTable; runs in a worker process"""
+    from tools.portfolio_series import load_portfolio_series
+
+    timings = {'open_prices_s': 0.0, 'load_positions_s': 0.0, 'portfolio_values_s': 0.0}
+    start = time.perf_counter()
+    # The series written at trade time, if it is up to date; otherwise re-value the ledger
+    portfolio_df = load_portfolio_series(run['position_file'])
+    timings['load_series_s'] = time.perf_counter() - start
+
+    if portfolio_df is None:
+        t = time.perf_counter()
+        if table_dir not in _OPEN_TABLES:
+            _OPEN_TABLES[table_dir] = PriceTable.open(table_dir)
+        table = _OPEN_TABLES[table_dir]
+        timings['open_prices_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        positions = load_position_data(run['position_file'])
+        timings['load_positions_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        portfolio_df = calculate_portfolio_values(positions, table, run['is_crypto'], verbose=False)
+        timings['portfolio_values_s'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    metrics = calculate_metrics(portfolio_df, periods_per_year(run['is_crypto'], run['is_hourly']), risk_free_rate)
+    timings['metrics_s'] = time.perf_counter() - t
+    timings['total_s'] = time.perf_counter() - start
+
+    row = {'market': run['market'], 'agent': run['agent'], 'position_file': run['position_file']}
+    row.update({k: float(v) if isinstance(v, (np.integer, np.floating)) else v for k, v in metrics.items()})
+    row.update(timings)
+    return row
+
+
+def write_metrics_table(df, output_file):
+    """Write the consolidated table; the format follows the extension (.csv, .json or .parquet)"""
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    suffix = output_file.suffix.lower()
+    if suffix == '.parquet':
+        try:
+            df.to_parquet(output_file, index=False)
+        except ImportError as e:
+            print(f"ERROR: Parquet output needs pyarrow or fastparquet ({e}); writing CSV instead")
+            output_file = output_file.with_suffix('.csv')
+            df.to_csv(output_file, index=False)
+    elif suffix == '.json':
+        with open(output_file, 'w') as f:
+            json.dump(df.replace([np.inf, -np.inf], None).to_dict(orient='records'), f, indent=2, default=str)
+    else:
+        df.to_csv(output_file, index=False)
+    return output_file
+
+
+def run_batch(data_root='data', output_file=None, workers=None, risk_free_rate=0.0, markets=None):
+    """
+    Score every agent under `data_root` in one run
+
+    Each market's prices are loaded once, saved as a memory-mapped PriceTable and
+    shared by a process pool that scores the agents in parallel.
+
+    Args:
+        data_root: Directory holding the agent_data* trees and the price data
+        output_file: Consolidated table (.csv, .json or .parquet; default: {data_root}/agent_metrics.csv)
+        workers: Worker processes (default: CPU count; 1 scores in this process)
+        risk_free_rate: Annual risk-free rate
+        markets: Only score these markets (e.g. ['us', 'crypto'])
+
+    Returns:
+        DataFrame with one row per agent: metrics plus timing columns (seconds)
+    """
+    runs = discover_agent_runs(data_root)
+    if markets:
+        runs = [run for run in runs if run['market'] in markets]
+    if not runs:
+        print(f"ERROR: No position.jsonl files found under {data_root}/agent_data*")
+        return pd.DataFrame()
+    print(f"Found {len(runs)} agent runs in {len({run['market'] for run in runs})} markets")
+
+    workers = workers or os.cpu_count() or 1
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='price_tables_') as tmp_dir:
+        # Load each market's prices once; trees sharing a price directory share the table
+        table_dirs = {}
+        price_load_s = {}
+        for run in runs:
+            key = _table_key(run)
+            if key in table_dirs:
+                continue
+            start = time.perf_counter()
+            price_data = load_all_price_files(Path(data_root) / run['data_dir'], run['is_crypto'], run['is_astock'])
+            table = PriceTable.from_price_data(price_data, run['is_crypto'])
+            table_dirs[key] = str(table.save(Path(tmp_dir) / f"table_{len(table_dirs)}"))
+            price_load_s[key] = time.perf_counter() - start
+            print(f"Loaded {len(table)} symbols for {run['market']} in {price_load_s[key]:.2f}s")
+
+        start = time.perf_counter()
+        if workers == 1:
+            scored = [(run, _score_agent(run, table_dirs[_table_key(run)], risk_free_rate)) for run in runs]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(runs))) as executor:
+                futures = [(run, executor.submit(_score_agent, run, table_dirs[_table_key(run)], risk_free_rate)) for run in runs]
+                scored = []
+                for run, future in futures:
+                    try:
+                        scored.append((run, future.result()))
+                    except Exception as e:
+                        print(f"Warning: Could not score {run['position_file']}: {e}")
+        wall_s = time.perf_counter() - start
+
+    for run, row in scored:
+        row['price_load_s'] = price_load_s[_table_key(run)]
+        rows.append(row)
+
+    df = pd.DataFrame(rows).sort_values(['market', 'CR'], ascending=[True, False]).reset_index(drop=True)
+
+    print("\n" + "="*84)
+    print("BATCH PERFORMANCE METRICS")
+    print("="*84)
+    print(f"{'Market':<12} {'Agent':<32} {'CR':>8} {'SR':>8} {'Vol':>8} {'MDD':>8} {'Time':>6}")
+    print("-"*84)
+    for _, row in df.iterrows():
+        print(f"{row['market']:<12} {row['agent']:<32} {row['CR']*100:>7.2f}% {row['SR']:>8.2f} "
+              f"{row['Vol']*100:>7.2f}% {row['MDD']*100:>7.2f}% {row['total_s']:>5.2f}s")
+    print("="*84)
+    print(f"Scored {len(df)} agents in {wall_s:.2f}s with {min(workers, len(runs))} worker(s) "
+          f"(price loading: {sum(price_load_s.values()):.2f}s)")
+
+    output_file = write_metrics_table(df, output_file or Path(data_root) / 'agent_metrics.csv')
+    print(f"Metrics table saved to {output_file}")
+    return df
+
+
 def main():
     parser = argparse.ArgumentParser(description='Calculate trading performance metrics')
-    parser.add_argument('position_file', help='Path to position.jsonl file')
+    parser.add_argument('position_file', nargs='?', help='Path to position.jsonl file')
+    parser.add_argument('--all', action='store_true', help='Score every agent under the agent_data* trees of --data-dir')
+    parser.add_argument('--output', help='Batch mode: consolidated table (.csv, .json or .parquet)')
+    parser.add_argument('--workers', type=int, default=None, help='Batch mode: worker processes (default: CPU count)')
+    parser.add_argument('--markets', nargs='+', help='Batch mode: only these markets (us, astock, astock_hour, crypto)')
     parser.add_argument('--data-dir', default='data', help='Directory containing price data')
     parser.add_argument('--is-crypto', action='store_true', help='Force crypto mode')
     parser.add_argument('--is-astock', action='store_true', help='Force A-stock mode')
     parser.add_argument('--is-hourly', action='store_true', help='Use hourly trading periods (affects annualization)')
     parser.add_argument('--verbose', action='store_true', help='Show all warning messages')
     parser.add_argument('--risk-free-rate', type=float, default=0.0, help='Annual risk-free rate (default: 0.0)')
+    parser.add_argument('--revalue', action='store_true',
+                        help='Re-value the ledger even if an up-to-date portfolio_series.csv exists')
 
     args = parser.parse_args()
 
+    if args.all:
+        run_batch(args.data_dir, args.output, args.workers, args.risk_free_rate, args.markets)
+        return
+    if not args.position_file:
+        parser.error('position_file is required unless --all is given')
+
+    from tools.portfolio_series import load_portfolio_series, series_path
+
     # Load position data
     print(f"Loading position data from {args.position_file}...")
     positions = load_position_data(args.position_file)
@@ -323,36 +500,35 @@ def main():
 
     print(f"Detected market type: {market_type}")
 
-    # Load price data
-    print(f"Loading price data from {args.data_dir}...")
-    price_data = load_all_price_files(args.data_dir, is_crypto, is_astock)
-    print(f"Loaded price data for {len(price_data)} symbols")
-
-    if len(price_data) == 0:
-        print("ERROR: No price data loaded! Check your --data-dir path.")
-        print(f"Looking in: {args.data_dir}")
-        if is_astock:
-            print("For A-stock, try: --data-dir data/A_stock")
-        return
-
-    # Calculate portfolio values
-    print("Calculating portfolio values...")
-    portfolio_df = calculate_portfolio_values(positions, price_data, is_crypto, args.verbose)
+    # Use the series written at trade time when it is up to date with the ledger and was valued
+    # with the price files of --data-dir
+    price_dir = price_directory(args.data_dir, is_crypto, is_astock)
+    portfolio_df = None if args.revalue else load_portfolio_series(args.position_file, price_dir)
+    if portfolio_df is not None:
+        print(f"Using portfolio values from {series_path(args.position_file)}")
+    else:
+        # Load price data
+        print(f"Loading price data from {args.data_dir}...")
+        price_data = load_all_price_files(args.data_dir, is_crypto, is_astock)
+        print(f"Loaded price data for {len(price_data)} symbols")
+
+        if len(price_data) == 0:
+            print("ERROR: No price data loaded! Check your --data-dir path.")
+            print(f"Looking in: {args.data_dir}")
+            if is_astock:
+                print("For A-stock, try: --data-dir data/A_stock")
+            return
+
+        # Calculate portfolio values
+        print("Calculating portfolio values...")
+        portfolio_df = calculate_portfolio_values(positions, price_data, is_crypto, args.verbose)
 
     # Determine periods per year based on data frequency and market type
-    if args.is_hourly:
-        # Approximately 252 trading days * 6.5 hours per day
-        periods_per_year = 252 * 6.5
-    elif is_crypto:
-        # Crypto markets trade 365 days a year
-        periods_per_year = 365
-    else:
-        # Traditional stock markets: 252 trading days per year
-        periods_per_year = 252
+    periods = periods_per_year(is_crypto, args.is_hourly)
 
     # Calculate metrics
     print("Calculating metrics...")
-    metrics = calculate_metrics(portfolio_df, periods_per_year, args.risk_free_rate)
+    metrics = calculate_metrics(portfolio_df, periods, args.risk_free_rate)
 
     # Print results
     print("\n" + "="*60)
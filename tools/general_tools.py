@@ -5,6 +5,8 @@ from typing import Any
 
 from dotenv import load_dotenv
 
+from tools.tracing import traced
+
 load_dotenv()
 
 def _resolve_runtime_env_path() -> str:
@@ -47,6 +49,7 @@ def _load_runtime_env() -> dict:
     return {}
 
 
+@traced("get_config_value")
 def get_config_value(key: str, default=None):
     _RUNTIME_ENV = _load_runtime_env()
 
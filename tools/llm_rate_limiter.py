@@ -0,0 +1,416 @@
+"""
+LLM rate limiter - provider-aware admission control for model calls
+
+main_parrallel.py runs every model in its own subprocess, often all behind one
+OpenRouter-style gateway, so limits have to hold across processes. State is
+kept in small JSON files under data/.rate_limit/ guarded by fcntl locks (the
+same mechanism the trade tools use for position.jsonl):
+
+- a token bucket per (base URL, model) caps the request rate,
+- a set of lock-file slots per base URL caps concurrent in-flight calls,
+- a circuit breaker per base URL parks every caller while the provider keeps
+  failing (429, 5xx and timeouts only; tool and parse errors do not count),
+  then lets a single probe through after the cooldown.
+
+The file locks block, so every state update runs in a worker thread
+(asyncio.to_thread) instead of on the event loop.
+
+Retries use exponential backoff with full jitter and honour Retry-After hints
+from 429/503 responses. Queue wait and call time are recorded per call and can
+be exported as a per-session summary.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_RATE_LIMIT_CONFIG = {
+    "requests_per_minute": 60,
+    "burst": 10,
+    "max_concurrency": 4,
+    "failure_threshold": 5,
+    "cooldown": 30.0,
+    "max_backoff": 60.0,
+}
+
+_state_dir = Path(__file__).resolve().parents[1] / "data" / ".rate_limit"
+
+
+def _key_hash(*parts: Optional[str]) -> str:
+    return hashlib.sha1("|".join(p or "default" for p in parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def parse_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Extract a Retry-After delay in seconds from an API error, if present
+
+    Understands openai/httpx style errors carrying a response with
+    "retry-after-ms" or "retry-after" headers (seconds or HTTP date).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_ms = headers.get("retry-after-ms")
+        if retry_ms is not None:
+            return max(0.0, float(retry_ms) / 1000.0)
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            retry_dt = parsedate_to_datetime(retry_after)
+            return max(0.0, retry_dt.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Return True for 429 responses and provider overload errors"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status in (429, 503):
+        return True
+    return type(error).__name__ in ("RateLimitError",)
+
+
+# Exception class names of timeouts and unreachable providers (openai, httpx, aiohttp)
+_PROVIDER_ERROR_NAMES = (
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "TimeoutException", "ReadTimeout", "ConnectTimeout", "ServerTimeoutError", "ServiceUnavailableError",
+)
+
+
+def is_provider_error(error: BaseException) -> bool:
+    """
+    Return True if the provider failed: 429, any 5xx, or a timeout / connection error
+
+    The error's cause chain is searched too, since agent frameworks often wrap
+    the client exception. Tool errors and unparsable model output return False.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+            return True
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or type(error).__name__ in _PROVIDER_ERROR_NAMES:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def full_jitter_backoff(attempt: int, base_delay: float, max_backoff: float) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(max_backoff, base_delay * (2 ** attempt)))
+
+
+class _LockedState:
+    """JSON state file updated under an exclusive fcntl lock"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def update(self, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        with open(self.path, "a+", encoding="utf-8") as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                fh.seek(0)
+                raw = fh.read()
+                try:
+                    state = json.loads(raw) if raw.strip() else {}
+                except json.JSONDecodeError:
+                    state = {}
+                result = fn(state)
+                fh.seek(0)
+                fh.truncate()
+                fh.write(json.dumps(state))
+                fh.flush()
+                return result
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    Rate limiter for one (base URL, model) pair
+
+    Use guard() around a single model call, and call() to run a coroutine
+    factory with retries, backoff and circuit breaking.
+    """
+
+    def __init__(self, base_url: Optional[str], model: str, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            base_url: OpenAI-compatible base URL; the concurrency cap and breaker are shared per URL
+            model: Model name; the token bucket is per (base URL, model)
+            config: Overrides for DEFAULT_RATE_LIMIT_CONFIG
+        """
+        self.base_url = base_url
+        self.model = model
+        self.config = {**DEFAULT_RATE_LIMIT_CONFIG, **(config or {})}
+        self.rate = max(1e-6, float(self.config["requests_per_minute"]) / 60.0)
+        self.burst = max(1.0, float(self.config["burst"]))
+        self.max_concurrency = max(1, int(self.config["max_concurrency"]))
+
+        url_key = _key_hash(base_url)
+        self._bucket = _LockedState(_state_dir / f"bucket-{_key_hash(base_url, model)}.json")
+        self._breaker = _LockedState(_state_dir / f"breaker-{url_key}.json")
+        self._slot_paths = [_state_dir / f"slot-{url_key}-{i}.lock" for i in range(self.max_concurrency)]
+        self._calls: List[Dict[str, Any]] = []
+
+    # ---- token bucket -------------------------------------------------
+
+    def _take_token(self) -> float:
+        """Take a token if available; otherwise return seconds until one is"""
+
+        def fn(state: Dict[str, Any]) -> float:
+            now = time.time()
+            tokens = float(state.get("tokens", self.burst))
+            last = float(state.get("ts", now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            state["ts"] = now
+            if tokens >= 1.0:
+                state["tokens"] = tokens - 1.0
+                return 0.0
+            state["tokens"] = tokens
+            return (1.0 - tokens) / self.rate
+
+        return self._bucket.update(fn)
+
+    def _penalize(self, delay: float) -> None:
+        """Drain the bucket so every process sharing it honours a Retry-After"""
+
+        def fn(state: Dict[str, Any]) -> None:
+            state["tokens"] = min(float(state.get("tokens", self.burst)), 1.0 - delay * self.rate)
+            state["ts"] = time.time()
+
+        self._bucket.update(fn)
+
+    # ---- circuit breaker ----------------------------------------------
+
+    def _breaker_wait(self) -> float:
+        """Return seconds to park while the breaker is open; claims the half-open probe"""
+
+        def fn(state: Dict[str, Any]) -> float:
+            open_until = float(state.get("open_until", 0.0))
+            now = time.time()
+            if now < open_until:
+                return open_until - now
+            if not state.get("open_until"):
+                return 0.0
+            probe_started = float(state.get("probe_started", 0.0))
+            if not state.get("probing") or now - probe_started > float(self.config["cooldown"]):
+                # Half-open: let exactly one caller through (re-armed if the probe never reports)
+                state["probing"] = True
+                state["probe_started"] = now
+                return 0.0
+            return min(1.0, float(self.config["cooldown"]))
+
+        return self._breaker.update(fn)
+
+    def _record_outcome(self, success: bool) -> None:
+        def fn(state: Dict[str, Any]) -> None:
+            if success:
+                state.clear()
+                return
+            failures = int(state.get("failures", 0)) + 1
+            state["failures"] = failures
+            if state.get("probing") or failures >= int(self.config["failure_threshold"]):
+                state["open_until"] = time.time() + float(self.config["cooldown"])
+                state["probing"] = False
+                print(f"🚧 Circuit open for {self.base_url or 'default provider'}, parking calls for {self.config['cooldown']}s")
+
+        self._breaker.update(fn)
+
+    # ---- concurrency slots --------------------------------------------
+
+    def _try_slot(self):
+        """Lock a free slot file without blocking; None if all are taken"""
+        for path in self._slot_paths:
+            fh = open(path, "a+")
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fh
+            except BlockingIOError:
+                fh.close()
+        return None
+
+    async def _acquire_slot(self):
+        while True:
+            fh = await asyncio.to_thread(self._try_slot)
+            if fh is not None:
+                return fh
+            await asyncio.sleep(0.05 + random.random() * 0.1)
+
+    @staticmethod
+    def _release_slot(fh) -> None:
+        # Unlocking never waits, so this stays synchronous and runs even when the call is cancelled
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            fh.close()
+
+    # ---- public API -----------------------------------------------------
+
+    @asynccontextmanager
+    async def guard(self):
+        """Admit one model call: wait for the breaker, a token and a concurrency slot"""
+        queued_at = time.monotonic()
+        while True:
+            wait = await asyncio.to_thread(self._breaker_wait)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        while True:
+            wait = await asyncio.to_thread(self._take_token)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        slot = await self._acquire_slot()
+        started_at = time.monotonic()
+        record = {"queue_wait": started_at - queued_at, "call_time": 0.0, "ok": False}
+        outcome = None
+        try:
+            yield
+            record["ok"] = True
+            outcome = True
+        except Exception as e:
+            record["rate_limited"] = is_rate_limit_error(e)
+            record["provider_error"] = is_provider_error(e)
+            # Only provider failures count towards the breaker; a tool or parse
+            # error means the provider answered
+            outcome = not record["provider_error"]
+            retry_after = parse_retry_after(e)
+            if retry_after:
+                await asyncio.to_thread(self._penalize, retry_after)
+            raise
+        finally:
+            record["call_time"] = time.monotonic() - started_at
+            self._release_slot(slot)
+            self._calls.append(record)
+            # Cancellation is neither a success nor a provider failure
+            if outcome is not None:
+                await asyncio.to_thread(self._record_outcome, outcome)
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        guarded: bool = True,
+    ) -> Any:
+        """
+        Run fn() with retries using exponential backoff with full jitter
+
+        Args:
+            fn: Coroutine factory performing the call
+            max_retries: Maximum attempts
+            base_delay: Base delay for the backoff
+            guarded: Wrap each attempt in guard(); pass False when model calls are
+                already guarded individually (e.g. by agent middleware)
+        """
+        for attempt in range(1, max_retries + 1):
+            try:
+                if guarded:
+                    async with self.guard():
+                        return await fn()
+                return await fn()
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = full_jitter_backoff(attempt, base_delay, float(self.config["max_backoff"]))
+                retry_after = parse_retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                print(f"⚠️ Attempt {attempt} failed, retrying after {delay:.2f} seconds...")
+                print(f"Error details: {e}")
+                await asyncio.sleep(delay)
+
+    def snapshot(self, reset: bool = True) -> Dict[str, Any]:
+        """Summarize queue wait versus call time for the calls recorded so far"""
+        waits = [c["queue_wait"] for c in self._calls]
+        times = [c["call_time"] for c in self._calls]
+        summary = {
+            "timestamp": datetime.now().isoformat(),
+            "model": self.model,
+            "base_url": self.base_url,
+            "calls": len(self._calls),
+            "failures": sum(1 for c in self._calls if not c["ok"]),
+            "provider_errors": sum(1 for c in self._calls if c.get("provider_error")),
+            "rate_limited": sum(1 for c in self._calls if c.get("rate_limited")),
+            "queue_wait_total": round(sum(waits), 4),
+            "queue_wait_p50": round(_percentile(waits, 0.5), 4),
+            "queue_wait_p95": round(_percentile(waits, 0.95), 4),
+            "call_time_total": round(sum(times), 4),
+            "call_time_p50": round(_percentile(times, 0.5), 4),
+            "call_time_p95": round(_percentile(times, 0.95), 4),
+        }
+        if reset:
+            self._calls = []
+        return summary
+
+    def export_metrics(self, metrics_file: str, session: Optional[str] = None) -> None:
+        """Append the current snapshot to a JSONL metrics file and reset counters"""
+        summary = self.snapshot(reset=True)
+        if not summary["calls"]:
+            return
+        if session is not None:
+            summary["session"] = session
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        with open(metrics_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(base_url: Optional[str], model: str, config: Optional[Dict[str, Any]] = None) -> RateLimiter:
+    """Return the process-wide RateLimiter for a (base URL, model) pair"""
+    key = f"{base_url}|{model}"
+    if key not in _limiters:
+        _limiters[key] = RateLimiter(base_url, model, config)
+    return _limiters[key]
+
+
+def build_rate_limit_middleware(limiter: RateLimiter) -> List[Any]:
+    """
+    Build LangChain agent middleware that guards every individual model call
+
+    Returns an empty list if the installed LangChain has no middleware support;
+    callers should then guard the whole agent invocation instead.
+    """
+    try:
+        from langchain.agents.middleware import AgentMiddleware
+    except ImportError:
+        return []
+
+    class RateLimitMiddleware(AgentMiddleware):
+        async def awrap_model_call(self, request, handler):
+            async with limiter.guard():
+                return await handler(request)
+
+    return [RateLimitMiddleware()]
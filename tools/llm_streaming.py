@@ -0,0 +1,162 @@
+"""
+LLM streaming - optional astream_events path for agent invocations
+
+run_trading_session normally waits for the complete ainvoke result before
+looking for STOP_SIGNAL. astream_agent streams the agent run instead: tokens
+are forwarded to an optional callback and the stop signal is detected as soon
+as it appears in the model's text. The generation that carries it is still
+completed, together with any tool calls it makes (e.g. a final trade), so the
+transcript never holds an AIMessage without its ToolMessages; the run is
+cancelled before the next model call.
+
+Per model call it measures time-to-first-token and output tokens/sec, which
+the agents write to the session log as metric events.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Return the text carried by an AIMessageChunk (string or content-block list)"""
+    content = getattr(chunk, "content", None)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        return "".join(parts)
+    return ""
+
+
+def _has_tool_call_chunks(chunk: Any) -> bool:
+    return bool(getattr(chunk, "tool_call_chunks", None))
+
+
+def _output_tokens(message: Any) -> Optional[int]:
+    usage = getattr(message, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("output_tokens"):
+        return int(usage["output_tokens"])
+    return None
+
+
+async def astream_agent(
+    agent: Any,
+    inputs: Dict[str, Any],
+    config: Dict[str, Any],
+    stop_signal: str,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Run an agent through astream_events, stopping early on the stop signal
+
+    Args:
+        agent: Compiled agent from create_agent
+        inputs: Agent input, e.g. {"messages": [...]}
+        config: Run config, e.g. {"recursion_limit": 100}
+        stop_signal: Text that ends the session; the run stops once the generation carrying it
+            and its tool calls are done
+        on_token: Optional callback receiving every streamed text token
+
+    Returns:
+        (response, stats):
+          - response: {"messages": [...]} compatible with extract_conversation / extract_tool_messages
+          - stats: one dict per model call with ttft, duration, output_tokens, tokens_per_sec, stopped_early
+    """
+    from langchain_core.messages import ToolMessage
+
+    messages: List[Any] = list(inputs.get("messages", []))
+    stats: List[Dict[str, Any]] = []
+    final_state: Optional[Dict[str, Any]] = None
+    stopped_early = False
+    # Run id of the model call whose text carried the stop signal
+    stop_run_id: Optional[str] = None
+
+    # Per model-call streaming state, keyed by run id
+    calls: Dict[str, Dict[str, Any]] = {}
+
+    def finish(run_id: str, message: Any = None, early: bool = False) -> None:
+        call = calls.pop(run_id, None)
+        if call is None:
+            return
+        end = time.monotonic()
+        tokens = _output_tokens(message) if message is not None else None
+        if tokens is None:
+            tokens = call["chunks"]
+        first = call["first_token_at"]
+        gen_time = end - first if first is not None else 0.0
+        stats.append(
+            {
+                "ttft": round(first - call["started_at"], 4) if first is not None else None,
+                "duration": round(end - call["started_at"], 4),
+                "output_tokens": tokens,
+                "tokens_per_sec": round(tokens / gen_time, 2) if gen_time > 0 else None,
+                "stopped_early": early,
+            }
+        )
+
+    stream = agent.astream_events(inputs, config, version="v2")
+    try:
+        async for event in stream:
+            kind = event.get("event")
+            run_id = str(event.get("run_id"))
+            data = event.get("data", {}) or {}
+
+            if kind == "on_chat_model_start":
+                if stop_run_id is not None:
+                    # The stopping generation and its tool calls are done; skip the next model call
+                    stopped_early = True
+                    break
+                calls[run_id] = {"started_at": time.monotonic(), "first_token_at": None, "chunks": 0, "text": ""}
+
+            elif kind == "on_chat_model_stream":
+                call = calls.get(run_id)
+                chunk = data.get("chunk")
+                text = _chunk_text(chunk)
+                if call is None or not (text or _has_tool_call_chunks(chunk)):
+                    continue
+                if call["first_token_at"] is None:
+                    call["first_token_at"] = time.monotonic()
+                call["chunks"] += 1
+                if not text:
+                    continue
+                call["text"] += text
+                if on_token is not None:
+                    on_token(text)
+                if stop_run_id is None and stop_signal in call["text"]:
+                    # Let the generation finish so its tool calls are not lost
+                    stop_run_id = run_id
+
+            elif kind == "on_chat_model_end":
+                output = data.get("output")
+                if output is not None:
+                    messages.append(output)
+                finish(run_id, message=output, early=run_id == stop_run_id)
+                if run_id == stop_run_id and not getattr(output, "tool_calls", None):
+                    stopped_early = True
+                    break
+
+            elif kind == "on_tool_end":
+                output = data.get("output")
+                if isinstance(output, ToolMessage):
+                    messages.append(output)
+                elif output is not None:
+                    messages.append(
+                        ToolMessage(content=str(getattr(output, "content", output)), name=event.get("name"), tool_call_id=run_id)
+                    )
+
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = data.get("output")
+                if isinstance(output, dict) and "messages" in output:
+                    final_state = output
+    finally:
+        # Closing the generator cancels the underlying run when we stop early
+        await stream.aclose()
+
+    if final_state is not None and not stopped_early:
+        return final_state, stats
+    return {"messages": messages}, stats
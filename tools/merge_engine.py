@@ -0,0 +1,162 @@
+"""
+Incremental merge engine for merged.jsonl-style files
+
+The merge scripts (data/merge_jsonl.py, data/crypto/merge_crypto_jsonl.py,
+data/A_stock/merge_jsonl_alphavantage.py) turn one daily_prices_*.json file per
+symbol into one JSONL line per symbol. IncrementalMerger remembers, per source
+file, its mtime/size/content hash and where its line sits in the previous
+output, so a rerun only re-parses and re-transforms the files that changed and
+copies every other line byte for byte.
+
+The output is written to a temp file and renamed into place, so agents reading
+merged.jsonl never see a half-written file.
+
+State is kept in {output}.state.json. Changing `transform_version` (do this
+when the transform logic changes) forces a full rebuild.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+STATE_VERSION = 1
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write_bytes(path: str, chunks: Iterable[bytes]) -> int:
+    tmp_path = f"{path}.tmp"
+    size = 0
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    os.replace(tmp_path, path)
+    return size
+
+
+def _output_signature(path: str) -> Optional[Dict[str, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class IncrementalMerger:
+    """Merge per-symbol JSON files into one JSONL file, re-processing only changed sources"""
+
+    def __init__(
+        self,
+        output_file: str,
+        transform: Callable[[Dict[str, Any], str], Optional[Dict[str, Any]]],
+        transform_version: str = "1",
+        state_file: Optional[str] = None,
+    ):
+        """
+        Args:
+            output_file: Merged JSONL path
+            transform: Called with (document, basename); returns the document to write or None to skip
+            transform_version: Bump to invalidate cached lines after changing `transform`
+            state_file: Where to keep per-source state (default: {output_file}.state.json)
+        """
+        self.output_file = str(output_file)
+        self.transform = transform
+        self.transform_version = transform_version
+        self.state_file = state_file or f"{self.output_file}.state.json"
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return {}
+        if state.get("version") != STATE_VERSION or state.get("transform_version") != self.transform_version:
+            return {}
+        # The previous output must be exactly the file the state describes
+        if _output_signature(self.output_file) != state.get("output"):
+            return {}
+        return state
+
+    def run(self, files: Iterable[str]) -> Dict[str, int]:
+        """
+        Merge `files` (in the given order) into the output file
+
+        Returns:
+            {"reused", "processed", "skipped", "removed"} counts
+        """
+        state = self._load_state()
+        previous: Dict[str, Dict[str, Any]] = state.get("sources", {})
+        old_output = b""
+        if previous:
+            with open(self.output_file, "rb") as f:
+                old_output = f.read()
+
+        stats = {"reused": 0, "processed": 0, "skipped": 0, "removed": 0}
+        sources: Dict[str, Dict[str, Any]] = {}
+        lines: List[bytes] = []
+        offset = 0
+        files = list(files)
+
+        for fp in files:
+            basename = os.path.basename(fp)
+            st = os.stat(fp)
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            prev = previous.get(basename)
+            line: Optional[bytes] = None
+
+            if prev is not None:
+                unchanged = prev["size"] == entry["size"] and prev["mtime_ns"] == entry["mtime_ns"]
+                if not unchanged and prev["size"] == entry["size"]:
+                    # Touched but possibly identical content
+                    entry["sha1"] = _file_sha1(fp)
+                    unchanged = entry["sha1"] == prev.get("sha1")
+                if unchanged:
+                    entry["sha1"] = prev.get("sha1")
+                    if prev.get("length") is None:
+                        stats["reused"] += 1
+                        sources[basename] = {**entry, "length": None}
+                        continue
+                    line = old_output[prev["offset"] : prev["offset"] + prev["length"]]
+                    stats["reused"] += 1
+
+            if line is None:
+                entry.setdefault("sha1", _file_sha1(fp))
+                with open(fp, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                document = self.transform(data, basename)
+                stats["processed"] += 1
+                if document is None:
+                    stats["skipped"] += 1
+                    sources[basename] = {**entry, "length": None}
+                    continue
+                line = (json.dumps(document, ensure_ascii=False) + "\n").encode("utf-8")
+
+            sources[basename] = {**entry, "offset": offset, "length": len(line)}
+            lines.append(line)
+            offset += len(line)
+
+        stats["removed"] = len(set(previous) - set(sources))
+
+        if state and stats["processed"] == 0 and stats["removed"] == 0:
+            # Nothing changed: leave the output (and the mtime readers may cache on) untouched
+            return stats
+
+        _atomic_write_bytes(self.output_file, lines)
+        output = _output_signature(self.output_file)
+        with open(f"{self.state_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": STATE_VERSION, "transform_version": self.transform_version, "output": output, "sources": sources},
+                f,
+            )
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+        return stats
@@ -0,0 +1,312 @@
+"""
+Vectorized performance metrics shared by every report in the repo
+
+All functions take portfolio values as a 2-D array (series × time): one row per
+agent or benchmark, so a whole leaderboard is scored in one call. Rows of
+different length are right-padded with NaN; a 1-D array is treated as a single
+row. Point-in-time functions return one value per row; the expanding_* variants
+return a (series × time) array whose column t only uses data up to t, and whose
+last valid column equals the point-in-time value.
+
+Conventions (used by calculate_metrics, plot_metrics, results_db,
+bootstrap_leaderboard, analyze_cd5 and the frontend cache alike):
+    - Agents are scored on one portfolio value per ledger timestamp, the value
+      of the last record at that timestamp (last_per_timestamp). A session that
+      trades several times writes several records with the same timestamp;
+      scoring each of them would add zero returns and understate volatility
+    - Returns are simple period returns v[t] / v[t-1] - 1
+    - Standard deviations are population standard deviations (ddof=0)
+    - Annualization multiplies by sqrt(periods_per_year); see periods_per_year()
+    - Sortino divides the mean excess return by the standard deviation of the
+      negative returns; with no negative return it is +inf for a positive mean
+      and 0 otherwise
+    - Drawdown is measured from the running peak including the initial value
+
+Usage:
+    values = stack_series([agent_a_values, agent_b_values, qqq_values])
+    table = compute_metrics(values, periods_per_year(is_hourly=True))
+    table["CR"], table["SR"], table["MDD"]   # arrays, one entry per series
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+CRYPTO_DAYS_PER_YEAR = 365
+TRADING_HOURS_PER_DAY = 6.5
+
+
+def periods_per_year(is_crypto: bool = False, is_hourly: bool = False) -> float:
+    """Trading periods per year used for annualization"""
+    if is_hourly:
+        # Approximately 252 trading days * 6.5 hours per day
+        return TRADING_DAYS_PER_YEAR * TRADING_HOURS_PER_DAY
+    if is_crypto:
+        # Crypto markets trade 365 days a year
+        return CRYPTO_DAYS_PER_YEAR
+    return TRADING_DAYS_PER_YEAR
+
+
+def as_matrix(values) -> np.ndarray:
+    """Float (series × time) view of `values`; 1-D input becomes one row"""
+    values = np.asarray(values, dtype=np.float64)
+    return values[None, :] if values.ndim == 1 else values
+
+
+def stack_series(series: Iterable[Iterable[float]]) -> np.ndarray:
+    """Stack value series of different lengths into one NaN right-padded matrix"""
+    rows = [np.asarray(s, dtype=np.float64) for s in series]
+    out = np.full((len(rows), max((len(r) for r in rows), default=0)), np.nan)
+    for i, row in enumerate(rows):
+        out[i, : len(row)] = row
+    return out
+
+
+def last_per_timestamp_index(timestamps: Iterable) -> np.ndarray:
+    """
+    Positions of the last entry of each timestamp, in timestamp order (like groupby(date).last())
+
+    Entries with equal timestamps keep their input order, so the last one is the
+    latest ledger record of that timestamp.
+    """
+    keys = np.asarray(list(timestamps), dtype=str)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype=bool)
+    return order[last]
+
+
+def last_per_timestamp(timestamps: Iterable[str], values: Iterable[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One value per timestamp: the last entry of each (the series every report scores)
+
+    Returns:
+        (sorted unique timestamps, their last values)
+    """
+    keys = np.asarray(list(timestamps), dtype=str)
+    values = np.asarray(list(values), dtype=np.float64)
+    index = last_per_timestamp_index(keys)
+    return keys[index], values[index]
+
+
+def period_returns(values) -> np.ndarray:
+    """Simple returns (series × time-1); NaN where either neighbouring value is missing"""
+    values = as_matrix(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values[:, 1:] / values[:, :-1] - 1
+
+
+def _first_last(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=1)
+    last = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    rows = np.arange(values.shape[0])
+    return values[rows, first], values[rows, last]
+
+
+def _count(returns: np.ndarray) -> np.ndarray:
+    return (~np.isnan(returns)).sum(axis=1)
+
+
+def _nanmean(x: np.ndarray) -> np.ndarray:
+    n = _count(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, np.nansum(x, axis=1) / n, np.nan)
+
+
+def _nanstd(x: np.ndarray) -> np.ndarray:
+    n = _count(x)
+    mean = _nanmean(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.nansum((x - mean[:, None]) ** 2, axis=1) / n
+    return np.where(n > 0, np.sqrt(var), np.nan)
+
+
+def cumulative_return(values) -> np.ndarray:
+    """Last value over first value, minus one"""
+    first, last = _first_last(as_matrix(values))
+    return (last - first) / first
+
+
+def annualized_return(values, periods: float) -> np.ndarray:
+    """Cumulative return compounded to one year of `periods` periods (0 for a single value)"""
+    cr = cumulative_return(values)
+    years = _count(period_returns(values)) / periods
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(years > 0, (1 + cr) ** (1 / np.where(years > 0, years, 1)) - 1, 0.0)
+
+
+def volatility(values, periods: float) -> np.ndarray:
+    """Annualized standard deviation of returns (0 with fewer than two returns)"""
+    returns = period_returns(values)
+    vol = _nanstd(returns) * np.sqrt(periods)
+    return np.where(_count(returns) > 1, vol, 0.0)
+
+
+def sharpe_ratio(values, periods: float, risk_free_rate: float = 0.0) -> np.ndarray:
+    """Annualized mean excess return over its standard deviation (0 when returns do not vary)"""
+    returns = period_returns(values)
+    excess = _nanmean(returns) - risk_free_rate / periods
+    std = _nanstd(returns)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(std > 0, excess / std * np.sqrt(periods), 0.0)
+
+
+def sortino_ratio(values, periods: float, risk_free_rate: float = 0.0) -> np.ndarray:
+    """Annualized mean excess return over the standard deviation of negative returns"""
+    returns = period_returns(values)
+    mean = _nanmean(returns)
+    excess = mean - risk_free_rate / periods
+    negative = np.where(returns < 0, returns, np.nan)
+    has_negative = _count(negative) > 0
+    downside = _nanstd(negative)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(downside > 0, excess / downside * np.sqrt(periods), 0.0)
+    return np.where(has_negative, ratio, np.where(mean > 0, np.inf, 0.0))
+
+
+def drawdown(values) -> np.ndarray:
+    """Drawdown from the running peak at every point (series × time, <= 0)"""
+    values = as_matrix(values)
+    peak = np.fmax.accumulate(values, axis=1)
+    return values / peak - 1
+
+
+def max_drawdown(values) -> np.ndarray:
+    """Largest peak-to-trough decline (a negative fraction, 0 if values never fall)"""
+    return np.nan_to_num(np.nanmin(drawdown(values), axis=1))
+
+
+def max_drawdown_period(values) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Maximum drawdown with the positions of its peak and trough
+
+    Returns:
+        (max_drawdown, peak_index, trough_index), one entry per series
+    """
+    values = as_matrix(values)
+    dd = np.nan_to_num(drawdown(values), nan=0.0)
+    trough = dd.argmin(axis=1)
+    # Peak: position of the highest value at or before the trough
+    before = np.where(np.arange(values.shape[1])[None, :] <= trough[:, None], np.nan_to_num(values, nan=-np.inf), -np.inf)
+    peak = before.argmax(axis=1)
+    return dd[np.arange(values.shape[0]), trough], peak, trough
+
+
+def win_stats(values) -> Dict[str, np.ndarray]:
+    """Share of positive returns and the average positive / non-positive return"""
+    returns = period_returns(values)
+    valid = ~np.isnan(returns)
+    wins = np.where(valid & (returns > 0), returns, np.nan)
+    losses = np.where(valid & (returns <= 0), returns, np.nan)
+    n = _count(returns)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        win_rate = np.where(n > 0, _count(wins) / n, 0.0)
+    return {
+        "Win Rate": win_rate,
+        "Average Win": np.nan_to_num(_nanmean(wins)),
+        "Average Loss": np.nan_to_num(_nanmean(losses)),
+    }
+
+
+def value_changes(values) -> np.ndarray:
+    """Number of periods in which the value changed (a proxy for trades)"""
+    values = as_matrix(values)
+    diff = np.diff(values, axis=1)
+    return ((diff != 0) & ~np.isnan(diff)).sum(axis=1)
+
+
+def compute_metrics(values, periods: float, risk_free_rate: float = 0.0) -> Dict[str, np.ndarray]:
+    """
+    Every point-in-time metric for each series
+
+    Args:
+        values: Portfolio values (series × time), NaN right-padded
+        periods: Periods per year (see periods_per_year)
+        risk_free_rate: Annual risk-free rate
+
+    Returns:
+        {"CR", "Annualized Return", "SR" (Sortino), "Sharpe Ratio", "Vol", "MDD",
+         "Calmar Ratio", "Win Rate", "Average Win", "Average Loss",
+         "Initial Value", "Final Value", "Number of Trades"} -> array per series
+    """
+    values = as_matrix(values)
+    first, last = _first_last(values)
+    ann = annualized_return(values, periods)
+    mdd = max_drawdown(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        calmar = np.where(mdd != 0, ann / np.abs(mdd), 0.0)
+    return {
+        "CR": (last - first) / first,
+        "Annualized Return": ann,
+        "SR": sortino_ratio(values, periods, risk_free_rate),
+        "Sharpe Ratio": sharpe_ratio(values, periods, risk_free_rate),
+        "Vol": volatility(values, periods),
+        "MDD": mdd,
+        "Calmar Ratio": calmar,
+        **win_stats(values),
+        "Initial Value": first,
+        "Final Value": last,
+        "Number of Trades": value_changes(values),
+    }
+
+
+def _expanding_moments(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Running count, mean and population std of the non-NaN returns
+    valid = ~np.isnan(returns)
+    r = np.where(valid, returns, 0.0)
+    n = np.cumsum(valid, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.cumsum(r, axis=1) / n
+        var = np.cumsum(r * r, axis=1) / n - mean * mean
+    return n, mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def _pad_front(x: np.ndarray) -> np.ndarray:
+    # Align a (series × time-1) returns-based array with the values' time axis
+    return np.concatenate([np.full((x.shape[0], 1), np.nan), x], axis=1)
+
+
+def expanding_cumulative_return(values) -> np.ndarray:
+    """Cumulative return since the first value at every point"""
+    values = as_matrix(values)
+    first, _ = _first_last(values)
+    return values / first[:, None] - 1
+
+
+def expanding_volatility(values, periods: float, min_periods: int = 2) -> np.ndarray:
+    """Annualized volatility of the returns so far; NaN until `min_periods` returns exist"""
+    n, _, std = _expanding_moments(period_returns(values))
+    return _pad_front(np.where(n >= min_periods, std * np.sqrt(periods), np.nan))
+
+
+def expanding_sortino(
+    values,
+    periods: float,
+    risk_free_rate: float = 0.0,
+    min_periods: int = 1,
+    min_downside: float = 0.0,
+    cap: float = np.inf,
+) -> np.ndarray:
+    """
+    Sortino ratio of the returns so far
+
+    Args:
+        values: Portfolio values (series × time)
+        periods: Periods per year
+        risk_free_rate: Annual risk-free rate
+        min_periods: NaN until this many returns exist
+        min_downside: Floor for the downside deviation (keeps early values from spiking)
+        cap: Clip the ratio to [-cap, cap]; with no negative return yet a positive mean gives +cap
+    """
+    returns = period_returns(values)
+    n, mean, _ = _expanding_moments(returns)
+    neg_n, _, downside = _expanding_moments(np.where(returns < 0, returns, np.nan))
+    excess = mean - risk_free_rate / periods
+    downside = np.maximum(downside, min_downside)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(downside > 0, excess / downside * np.sqrt(periods), 0.0)
+    ratio = np.where(neg_n > 0, ratio, np.where(mean > 0, np.inf, 0.0))
+    ratio = np.clip(ratio, -cap, cap)
+    return _pad_front(np.where(n >= min_periods, ratio, np.nan))
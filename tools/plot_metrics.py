@@ -1,16 +1,50 @@
 #!/usr/bin/env python3
 """
 Visualize trading metrics over time for all agents in both markets.
-Creates two figures (US and A-Stock), each with 4 horizontal subplots for CR, SR, Vol, MDD.
+Creates one figure per market (US, A-Stock, Crypto), each with 4 horizontal subplots for CR, SR, Vol, MDD.
+
+Figures are rendered by a process pool (Agg backend). Before anything is
+loaded, each market's inputs (ledger sizes and mtimes, price file signature,
+benchmark file, plot style) are hashed; a market whose inputs and figures are
+unchanged is skipped without reading a ledger or computing a metric. Markets
+that do get loaded are still keyed per figure by a hash of the series it plots,
+so a figure whose data did not change is not redrawn. Both kinds of keys are
+kept in .plot_cache.json in the output directory. With --format json the
+plotted series are written as JSON for the web frontend.
+
+Usage:
+    python tools/plot_metrics.py                              # PDFs, unchanged figures skipped
+    python tools/plot_metrics.py --format svg --workers 4
+    python tools/plot_metrics.py --format json --output-dir docs/data/plots
 """
 
-import pandas as pd
-import numpy as np
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
 import matplotlib.pyplot as plt
+import pandas as pd
 import seaborn as sns
-from pathlib import Path
-import json
-import argparse
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+from tools.benchmark_series import load_benchmark
+from tools.calculate_metrics import per_timestamp
+from tools.metrics import (
+    drawdown,
+    expanding_cumulative_return,
+    expanding_sortino,
+    expanding_volatility,
+    periods_per_year,
+)
+from tools.portfolio_series import ensure_portfolio_series, ledger_price_dir, price_signature
 
 # Set seaborn style for beautiful plots
 sns.set_theme(style="whitegrid", palette="husl")
@@ -36,144 +70,99 @@ AGENT_COLORS = {
     'Gemini-2.5-Flash': '#DFE6E9'    # Gray
 }
 
+# (metric column, y label, title) of the combined figure and of the separate plots
+COMBINED_METRICS = [
+    ('CR', 'Cumulative Return (%)', 'CR ↑'),
+    ('SR', 'Sortino Ratio', 'SR ↑'),
+    ('Vol', 'Volatility (%)', 'Vol ↓'),
+    ('MDD', 'Maximum Drawdown (%)', 'MDD ↓')
+]
+SEPARATE_METRICS = [
+    ('CR', 'Cumulative Return (%)', 'Cumulative Return (CR)'),
+    ('SR', 'Sortino Ratio', 'Sortino Ratio (SR)'),
+    ('Vol', 'Volatility (%)', 'Volatility (Vol)'),
+    ('MDD', 'Maximum Drawdown (%)', 'Maximum Drawdown (MDD)')
+]
+
+# Markets in plotting order: agent tree, annualization, benchmark and output names
+MARKET_PLOTS = [
+    {'key': 'us', 'heading': 'U.S. MARKET', 'data_dir': 'data/agent_data', 'is_hourly': True, 'is_crypto': False,
+     'baseline_label': 'QQQ', 'baseline_file': 'data/daily_prices_QQQ.json', 'baseline_start': None,
+     'market_name': 'U.S. Market (NASDAQ-100)', 'file_stem': 'us_market_metrics'},
+    # The SSE-50 baseline starts on Sep 30 for A-Stock
+    {'key': 'astock', 'heading': 'A-SHARE MARKET', 'data_dir': 'data/agent_data_astock', 'is_hourly': False, 'is_crypto': False,
+     'baseline_label': 'SSE-50', 'baseline_file': 'data/A_stock/index_daily_sse_50.json', 'baseline_start': '2025-09-30',
+     'market_name': 'A-Share Market (SSE-50)', 'file_stem': 'astock_market_metrics'},
+    # Daily trading for crypto; the crypto index is the baseline
+    {'key': 'crypto', 'heading': 'CRYPTO MARKET', 'data_dir': 'data/agent_data_crypto', 'is_hourly': False, 'is_crypto': True,
+     'baseline_label': 'Crypto Index', 'baseline_file': 'data/crypto/CD5_crypto_index.json', 'baseline_start': None,
+     'market_name': 'Crypto Market', 'file_stem': 'crypto_market_metrics'},
+]
+
+FIGURE_FORMATS = ['pdf', 'png', 'svg', 'json']
+PLOT_CACHE_FILE = '.plot_cache.json'
+# Increment when the drawing code changes so that cached figures are redrawn
+PLOT_STYLE_VERSION = 2
 
-def load_portfolio_data(agent_dir):
-    """Load portfolio values for an agent."""
-    portfolio_file = agent_dir / 'position' / 'portfolio_values.csv'
 
-    if not portfolio_file.exists():
-        return None
+def load_portfolio_data(agent_dir):
+    """Load portfolio values for an agent (the series written at trade time, rebuilt if stale)."""
+    return ensure_portfolio_series(agent_dir / 'position' / 'position.jsonl')
 
-    df = pd.read_csv(portfolio_file)
-    df['date'] = pd.to_datetime(df['date'])
-    return df
 
+def calculate_rolling_metrics(df, is_hourly=True, is_crypto=False):
+    """Calculate expanding metrics from portfolio values, one point per timestamp (see tools/metrics.py)."""
+    df = per_timestamp(df)
+    values = df['total_value'].to_numpy(dtype=float)
+    periods = periods_per_year(is_crypto, is_hourly)
 
-def calculate_rolling_metrics(df, is_hourly=True):
-    """Calculate rolling metrics from portfolio values."""
-    # Calculate returns
     df['returns'] = df['total_value'].pct_change()
 
     # CR: Cumulative Return
-    initial_value = df['total_value'].iloc[0]
-    df['CR'] = (df['total_value'] - initial_value) / initial_value * 100
+    df['CR'] = expanding_cumulative_return(values)[0] * 100
 
     # SR: Sortino Ratio (expanding window)
-    periods_per_year = 252 * 6.5 if is_hourly else 252
-    sortino_ratios = []
-
     # Use minimum periods to avoid unstable early calculations
     # For daily: 3 days is enough, for hourly: 10 hours
-    min_periods = 10 if is_hourly else 3
-
-    for i in range(len(df)):
-        if i < min_periods:
-            sortino_ratios.append(np.nan)
-            continue
-
-        returns_so_far = df['returns'].iloc[1:i+1].dropna()
-
-        if len(returns_so_far) < min_periods:
-            sortino_ratios.append(np.nan)
-            continue
-
-        # Calculate downside deviation
-        negative_returns = returns_so_far[returns_so_far < 0]
-
-        if len(negative_returns) > 0:
-            downside_std = negative_returns.std()
-            # Use a minimum threshold for downside std to avoid extreme spikes
-            min_downside_std = 0.0001
-            downside_std = max(downside_std, min_downside_std)
-
-            sortino = (returns_so_far.mean() / downside_std) * np.sqrt(periods_per_year)
-            # Cap to reasonable range
-            sortino = np.clip(sortino, -20, 20)
-        else:
-            # No negative returns yet
-            mean_return = returns_so_far.mean()
-            if mean_return > 0:
-                sortino = 20  # Cap at upper limit
-            else:
-                sortino = 0
-
-        sortino_ratios.append(sortino)
-
-    df['SR'] = sortino_ratios
+    # A floor on the downside deviation and a ±20 cap keep early values from spiking
+    df['SR'] = expanding_sortino(
+        values, periods, min_periods=10 if is_hourly else 3, min_downside=0.0001, cap=20
+    )[0]
 
     # Vol: Expanding Volatility
-    volatilities = []
-    for i in range(len(df)):
-        if i < 2:
-            volatilities.append(np.nan)
-            continue
-
-        returns_so_far = df['returns'].iloc[1:i+1].dropna()
-
-        if len(returns_so_far) < 2:
-            volatilities.append(np.nan)
-            continue
+    df['Vol'] = expanding_volatility(values, periods)[0] * 100
 
-        vol = returns_so_far.std() * np.sqrt(periods_per_year) * 100
-        volatilities.append(vol)
-
-    df['Vol'] = volatilities
-
-    # MDD: Maximum Drawdown
-    cumulative = (1 + df['returns'].fillna(0)).cumprod()
-    running_max = cumulative.expanding().max()
-    drawdown = (cumulative - running_max) / running_max * 100
-    df['MDD'] = drawdown
+    # MDD: Drawdown from the running peak
+    df['MDD'] = drawdown(values)[0] * 100
 
     return df
 
 
-def load_baseline_data(baseline_file, is_hourly=True, date_range=None):
-    """Load and calculate baseline metrics."""
-    with open(baseline_file, 'r') as f:
-        data = json.load(f)
-
-    # Find time series key
-    time_series_key = None
-    for key in ['Time Series (60min)', 'Time Series (Daily)', 'Time Series (Hourly)']:
-        if key in data:
-            time_series_key = key
-            break
-
-    if not time_series_key:
+def load_baseline_data(baseline_file, is_hourly=True, date_range=None, is_crypto=False):
+    """Load and calculate baseline metrics (benchmark file read through tools/benchmark_series.py)."""
+    benchmark = load_benchmark(baseline_file)
+    if benchmark is None:
         return None
 
-    time_series = data[time_series_key]
-
-    # Extract dates and prices
-    all_dates = sorted(time_series.keys())
-
     # Filter by date range
     if date_range:
-        start_date, end_date = date_range
-        if is_hourly:
-            dates = [d for d in all_dates if start_date <= d <= end_date]
-        else:
-            dates = [d for d in all_dates if start_date <= d <= end_date]
-    else:
-        dates = all_dates
+        benchmark = benchmark.window(*date_range)
 
-    if len(dates) < 2:
+    if len(benchmark) < 2:
         return None
 
     # Create DataFrame
-    prices = [float(time_series[d].get('4. close', time_series[d].get('4. sell price', 0))) for d in dates]
     df = pd.DataFrame({
-        'date': pd.to_datetime(dates),
-        'price': prices
+        'date': pd.to_datetime(benchmark.timestamps),
+        'price': benchmark.closes
     })
 
     # Normalize to portfolio value starting at 10000 (US) or 100000 (A-Stock)
     initial_value = 10000 if is_hourly else 100000
-    df['total_value'] = df['price'] / df['price'].iloc[0] * initial_value
+    df['total_value'] = benchmark.normalized(initial_value)
 
     # Calculate metrics
-    df = calculate_rolling_metrics(df, is_hourly=is_hourly)
+    df = calculate_rolling_metrics(df, is_hourly=is_hourly, is_crypto=is_crypto)
 
     return df
 
@@ -184,126 +173,318 @@ def get_agent_date_range(agent_data_dir):
         if not agent_dir.is_dir():
             continue
 
-        portfolio_file = agent_dir / 'position' / 'portfolio_values.csv'
-        if portfolio_file.exists():
-            df = pd.read_csv(portfolio_file)
-            if len(df) > 0:
+        position_file = agent_dir / 'position' / 'position.jsonl'
+        if position_file.exists():
+            with open(position_file, 'r', encoding='utf-8') as f:
+                records = [line for line in f if line.strip()]
+            if records:
                 # Extract date part
-                start_date = df['date'].iloc[0].split(' ')[0]
-                end_date = df['date'].iloc[-1].split(' ')[0]
+                start_date = json.loads(records[0])['date'].split(' ')[0]
+                end_date = json.loads(records[-1])['date'].split(' ')[0]
                 return (start_date, end_date)
 
     return None
 
 
-def plot_single_metric(agent_data, baseline_data, market_name, metric_key, ylabel, title, output_file):
-    """Create a single plot for one metric with larger fonts for better readability."""
-    fig, ax = plt.subplots(figsize=(14, 8))
-
-    # Plot each agent
-    for agent_name, df in agent_data.items():
-        display_name = AGENT_MAPPING.get(agent_name, agent_name)
-        color = AGENT_COLORS.get(display_name, None)
+def metric_series(agent_data, baseline_data, metric_key):
+    """
+    Lines of one metric panel: each agent, then the baseline
 
+    Returns:
+        List of {'label', 'color', 'baseline', 'dates', 'values'} (NaN points
+        dropped, dates as strings), plain data that hashes and pickles cheaply
+    """
+    series = []
+    frames = [(AGENT_MAPPING.get(name, name), df, False) for name, df in agent_data.items()]
+    if baseline_data is not None:
+        frames.append(('Baseline', baseline_data, True))
+    for label, df, is_baseline in frames:
         # Skip NaN values for cleaner plots
         plot_df = df[['date', metric_key]].dropna()
+        series.append({
+            'label': label,
+            'color': 'black' if is_baseline else AGENT_COLORS.get(label),
+            'baseline': is_baseline,
+            'dates': plot_df['date'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            'values': plot_df[metric_key].astype(float).tolist(),
+        })
+    return series
+
+
+def figure_job(kind, agent_data, baseline_data, market_name, metrics, output_file):
+    """
+    Everything needed to draw one figure, independent of the DataFrames
+
+    Args:
+        kind: 'combined' (1×4 subplots) or 'single' (one large plot)
+        metrics: [(metric column, y label, title)]
+        output_file: Target path; its suffix selects the format (pdf/png/svg/json)
+    """
+    return {
+        'kind': kind,
+        'market_name': market_name,
+        'output_file': str(output_file),
+        'panels': [
+            {'metric': key, 'ylabel': ylabel, 'title': title, 'series': metric_series(agent_data, baseline_data, key)}
+            for key, ylabel, title in metrics
+        ],
+    }
+
+
+def figure_key(job):
+    """Hash of a figure's data, styling and output format"""
+    payload = json.dumps(
+        {'style': PLOT_STYLE_VERSION, 'format': Path(job['output_file']).suffix, **{k: v for k, v in job.items() if k != 'output_file'}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _draw_panel(ax, panel, single):
+    # single: the larger line widths and fonts of the separate plots
+    for line in panel['series']:
+        dates = pd.to_datetime(line['dates'])
+        if line['baseline']:
+            ax.plot(dates, line['values'], label=line['label'], linewidth=3.5 if single else 2.5,
+                    linestyle='--', color=line['color'], alpha=0.7)
+        else:
+            ax.plot(dates, line['values'], label=line['label'], linewidth=3.0 if single else 2,
+                    alpha=0.8, color=line['color'])
+
+    if single:
+        # Styling with larger fonts for separate plots
+        ax.set_xlabel('Time', fontsize=20, fontweight='bold')
+        ax.set_ylabel(panel['ylabel'], fontsize=20, fontweight='bold')
+        ax.set_title(panel['title'], fontsize=22, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=14, framealpha=0.7)
 
-        ax.plot(plot_df['date'], plot_df[metric_key],
-               label=display_name, linewidth=3.0, alpha=0.8, color=color)
+        # Increase tick label sizes
+        ax.tick_params(axis='x', rotation=45, labelsize=18)
+        ax.tick_params(axis='y', labelsize=18)
+    else:
+        ax.set_xlabel('Time', fontsize=11, fontweight='bold')
+        ax.set_ylabel(panel['ylabel'], fontsize=11, fontweight='bold')
+        ax.set_title(panel['title'], fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=8, framealpha=0.9)
 
-    # Plot baseline if available
-    if baseline_data is not None:
-        plot_df = baseline_data[['date', metric_key]].dropna()
-        ax.plot(plot_df['date'], plot_df[metric_key],
-               label='Baseline', linewidth=3.5, linestyle='--',
-               color='black', alpha=0.7)
-
-    # Styling with larger fonts for separate plots
-    ax.set_xlabel('Time', fontsize=20, fontweight='bold')
-    ax.set_ylabel(ylabel, fontsize=20, fontweight='bold')
-    ax.set_title(f'{market_name} - {title}', fontsize=22, fontweight='bold')
-    ax.grid(True, alpha=0.3)
-    ax.legend(loc='best', fontsize=14, framealpha=0.7)
-
-    # Increase tick label sizes
-    ax.tick_params(axis='x', rotation=45, labelsize=18)
-    ax.tick_params(axis='y', labelsize=18)
+        # Rotate x-axis labels for better readability
+        ax.tick_params(axis='x', rotation=45)
 
     # Add horizontal line at y=0 for reference
-    ax.axhline(y=0, color='gray', linestyle='-', linewidth=1.0, alpha=0.5)
+    ax.axhline(y=0, color='gray', linestyle='-', linewidth=1.0 if single else 0.5, alpha=0.5)
 
-    plt.tight_layout()
-    plt.savefig(output_file, format='pdf', bbox_inches='tight')
-    print(f"✅ Saved: {output_file}")
-    plt.close()
 
+def render_figure(job):
+    """Draw one figure job (see figure_job) and write it; returns the output path"""
+    output_file = Path(job['output_file'])
+    fmt = output_file.suffix.lstrip('.')
 
-def plot_separate_metrics(agent_data, baseline_data, market_name, output_dir, is_hourly=True):
-    """Create 4 separate plots for each metric."""
-    metrics = [
-        ('CR', 'Cumulative Return (%)', 'Cumulative Return (CR)'),
-        ('SR', 'Sortino Ratio', 'Sortino Ratio (SR)'),
-        ('Vol', 'Volatility (%)', 'Volatility (Vol)'),
-        ('MDD', 'Maximum Drawdown (%)', 'Maximum Drawdown (MDD)')
-    ]
+    if fmt == 'json':
+        # Lightweight series for the web frontend instead of an image
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({k: v for k, v in job.items() if k != 'output_file'}, f, separators=(',', ':'))
+        return str(output_file)
+
+    if job['kind'] == 'single':
+        fig, ax = plt.subplots(figsize=(14, 8))
+        panel = job['panels'][0]
+        _draw_panel(ax, {**panel, 'title': f"{job['market_name']} - {panel['title']}"}, single=True)
+    else:
+        fig, axes = plt.subplots(1, len(job['panels']), figsize=(24, 5))
+        for ax, panel in zip(axes if len(job['panels']) > 1 else [axes], job['panels']):
+            _draw_panel(ax, panel, single=False)
+
+    fig.tight_layout()
+    fig.savefig(output_file, format=fmt, bbox_inches='tight')
+    plt.close(fig)
+    return str(output_file)
+
+
+def plot_single_metric(agent_data, baseline_data, market_name, metric_key, ylabel, title, output_file):
+    """Create a single plot for one metric with larger fonts for better readability."""
+    job = figure_job('single', agent_data, baseline_data, market_name, [(metric_key, ylabel, title)], output_file)
+    print(f"✅ Saved: {render_figure(job)}")
+
+
+def market_figure_specs(market_name, output_dir, file_stem, separate=False, fmt='pdf'):
+    """
+    (kind, metrics, output file) of every figure of one market
+
+    Args:
+        file_stem: Name of the combined figure without extension (e.g. us_market_metrics)
+        separate: One figure per metric instead of the combined 1×4 figure
+        fmt: Output format (see FIGURE_FORMATS)
+    """
+    if not separate:
+        return [('combined', COMBINED_METRICS, Path(output_dir) / f"{file_stem}.{fmt}")]
 
     market_suffix = market_name.lower().replace(' ', '_').replace('-', '_').replace('(', '').replace(')', '')
+    return [
+        ('single', [metric], Path(output_dir) / f"{market_suffix}_{metric[0].lower()}_metrics.{fmt}")
+        for metric in SEPARATE_METRICS
+    ]
 
-    for metric_key, ylabel, title in metrics:
-        filename = f"{market_suffix}_{metric_key.lower()}_metrics.pdf"
-        output_file = output_dir / filename
-        plot_single_metric(agent_data, baseline_data, market_name, metric_key, ylabel, title, output_file)
+
+def market_figure_jobs(agent_data, baseline_data, market_name, output_dir, file_stem, separate=False, fmt='pdf'):
+    """Figure jobs of one market (see market_figure_specs for the arguments)"""
+    return [
+        figure_job(kind, agent_data, baseline_data, market_name, metrics, output_file)
+        for kind, metrics, output_file in market_figure_specs(market_name, output_dir, file_stem, separate, fmt)
+    ]
+
+
+def plot_separate_metrics(agent_data, baseline_data, market_name, output_dir, is_hourly=True):
+    """Create 4 separate plots for each metric."""
+    for job in market_figure_jobs(agent_data, baseline_data, market_name, output_dir, None, separate=True):
+        print(f"✅ Saved: {render_figure(job)}")
 
 
 def plot_market_metrics(agent_data, baseline_data, market_name, output_file, is_hourly=True):
     """Create 4 horizontal subplots for a market."""
-    fig, axes = plt.subplots(1, 4, figsize=(24, 5))
+    job = figure_job('combined', agent_data, baseline_data, market_name, COMBINED_METRICS, output_file)
+    print(f"✅ Saved: {render_figure(job)}")
 
-    metrics = [
-        ('CR', 'Cumulative Return (%)', 'CR ↑'),
-        ('SR', 'Sortino Ratio', 'SR ↑'),
-        ('Vol', 'Volatility (%)', 'Vol ↓'),
-        ('MDD', 'Maximum Drawdown (%)', 'MDD ↓')
+
+def _file_state(path):
+    # (size, mtime) of a file, None if it does not exist
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def market_inputs_key(agent_dirs, baseline_file, options):
+    """
+    Hash of everything a market's figures are computed from, without reading it
+
+    Args:
+        agent_dirs: Agent directories that would be plotted
+        baseline_file: Benchmark file
+        options: Output options that change the figures (format, separate plots)
+    """
+    agents = []
+    for agent_dir in agent_dirs:
+        position_file = Path(agent_dir) / 'position' / 'position.jsonl'
+        state = _file_state(position_file)
+        # Revaluing a ledger depends on the price files it is valued with
+        prices = price_signature(ledger_price_dir(position_file)) if state else None
+        agents.append([Path(agent_dir).name, state, prices])
+    payload = json.dumps(
+        {'style': PLOT_STYLE_VERSION, 'options': options, 'agents': agents, 'baseline': _file_state(baseline_file)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_plot_cache(output_dir):
+    """Figure keys ('figures': file name -> data hash) and market input keys ('inputs')"""
+    try:
+        with open(Path(output_dir) / PLOT_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if 'figures' not in cache:
+        # Cache written before market input keys existed: only figure keys
+        cache = {'figures': {k: v for k, v in cache.items() if isinstance(v, str)}, 'inputs': {}}
+    cache.setdefault('inputs', {})
+    return cache
+
+
+def _init_render_worker():
+    """Render to files only: the Agg backend, set in each rendering process"""
+    matplotlib.use('Agg')
+
+
+def render_figures(jobs, output_dir, workers=None, force=False, inputs=None):
+    """
+    Render figure jobs in a process pool, skipping figures whose data did not change
+
+    Args:
+        jobs: Figure jobs (see figure_job)
+        output_dir: Directory holding the figures and PLOT_CACHE_FILE
+        workers: Worker processes (default: CPU count; 1 renders in this process)
+        force: Redraw every figure
+        inputs: Market input keys to record once the figures are written ({name: key})
+
+    Returns:
+        (rendered, skipped) counts
+    """
+    cache = load_plot_cache(output_dir)
+    figures = cache['figures']
+
+    keys = {job['output_file']: figure_key(job) for job in jobs}
+    pending = [
+        job for job in jobs
+        if force or figures.get(Path(job['output_file']).name) != keys[job['output_file']]
+        or not Path(job['output_file']).exists()
     ]
+    pending_files = {job['output_file'] for job in pending}
+    for job in jobs:
+        if job['output_file'] not in pending_files:
+            print(f"⏭️  Unchanged: {job['output_file']}")
+
+    workers = min(workers or os.cpu_count() or 1, len(pending)) or 1
+    if workers == 1:
+        _init_render_worker()
+        outputs = [render_figure(job) for job in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+            outputs = list(executor.map(render_figure, pending))
 
-    for idx, (metric_key, ylabel, title) in enumerate(metrics):
-        ax = axes[idx]
+    for output in outputs:
+        figures[Path(output).name] = keys[output]
+        print(f"✅ Saved: {output}")
+    cache['inputs'].update(inputs or {})
+    with open(Path(output_dir) / PLOT_CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    return len(outputs), len(jobs) - len(outputs)
 
-        # Plot each agent
-        for agent_name, df in agent_data.items():
-            display_name = AGENT_MAPPING.get(agent_name, agent_name)
-            color = AGENT_COLORS.get(display_name, None)
 
-            # Skip NaN values for cleaner plots
-            plot_df = df[['date', metric_key]].dropna()
+def load_market_data(market):
+    """
+    Agent portfolio values and the benchmark of one MARKET_PLOTS entry, with rolling metrics
 
-            ax.plot(plot_df['date'], plot_df[metric_key],
-                   label=display_name, linewidth=2, alpha=0.8, color=color)
+    Returns:
+        (agent_data {agent: DataFrame}, baseline_data DataFrame or None)
+    """
+    data_dir = Path(market['data_dir'])
+    agent_data = {}
 
-        # Plot baseline if available
-        if baseline_data is not None:
-            plot_df = baseline_data[['date', metric_key]].dropna()
-            ax.plot(plot_df['date'], plot_df[metric_key],
-                   label='Baseline', linewidth=2.5, linestyle='--',
-                   color='black', alpha=0.7)
+    for agent_dir in sorted(data_dir.iterdir()):
+        if not agent_dir.is_dir():
+            continue
 
-        # Styling
-        ax.set_xlabel('Time', fontsize=11, fontweight='bold')
-        ax.set_ylabel(ylabel, fontsize=11, fontweight='bold')
-        ax.set_title(title, fontsize=12, fontweight='bold')
-        ax.grid(True, alpha=0.3)
-        ax.legend(loc='best', fontsize=8, framealpha=0.9)
+        agent_name = agent_dir.name
 
-        # Rotate x-axis labels for better readability
-        ax.tick_params(axis='x', rotation=45)
+        if agent_name not in AGENT_MAPPING:
+            continue
 
-        # Add horizontal line at y=0 for reference
-        ax.axhline(y=0, color='gray', linestyle='-', linewidth=0.5, alpha=0.5)
+        print(f"📊 Loading {agent_name}...")
+        df = load_portfolio_data(agent_dir)
+
+        if df is not None:
+            df = calculate_rolling_metrics(df, is_hourly=market['is_hourly'], is_crypto=market['is_crypto'])
+            agent_data[agent_name] = df
+            print(f"✅ {agent_name}: {len(df)} time points")
+
+    # Load baseline
+    print(f"📊 Loading {market['baseline_label']} baseline...")
+    baseline_file = Path(market['baseline_file'])
+    baseline_data = None
+
+    if baseline_file.exists():
+        date_range = get_agent_date_range(data_dir)
+        if date_range and market['baseline_start']:
+            date_range = (market['baseline_start'], date_range[1])
+        baseline_data = load_baseline_data(baseline_file, is_hourly=market['is_hourly'], date_range=date_range,
+                                           is_crypto=market['is_crypto'])
+        if baseline_data is not None:
+            print(f"✅ {market['baseline_label']} Baseline: {len(baseline_data)} time points")
 
-    plt.tight_layout()
-    plt.savefig(output_file, format='pdf', bbox_inches='tight')
-    print(f"✅ Saved: {output_file}")
-    plt.close()
+    return agent_data, baseline_data
 
 
 def main():
@@ -313,159 +494,59 @@ def main():
     parser.add_argument('--skip-crypto', action='store_true', help='Skip Crypto market plots')
     parser.add_argument('--separate-plots', action='store_true', help='Save each metric as a separate plot instead of combined 4-subplot figure')
     parser.add_argument('--output-dir', default='plots', help='Output directory for plots')
+    parser.add_argument('--format', choices=FIGURE_FORMATS, default='pdf',
+                        help='Figure format; json writes the plotted series for the web frontend (default: pdf)')
+    parser.add_argument('--workers', type=int, default=None, help='Rendering processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Redraw figures even if their inputs did not change')
 
     args = parser.parse_args()
 
     # Create output directory
     output_dir = Path(args.output_dir)
-    output_dir.mkdir(exist_ok=True)
-
-    # Process US Market
-    if not args.skip_us:
-        print("=" * 70)
-        print("PROCESSING U.S. MARKET VISUALIZATIONS")
-        print("=" * 70)
-
-        us_data_dir = Path('data/agent_data')
-        agent_data = {}
-
-        for agent_dir in sorted(us_data_dir.iterdir()):
-            if not agent_dir.is_dir():
-                continue
-
-            agent_name = agent_dir.name
-
-            if agent_name not in AGENT_MAPPING:
-                continue
-
-            print(f"📊 Loading {agent_name}...")
-            df = load_portfolio_data(agent_dir)
-
-            if df is not None:
-                df = calculate_rolling_metrics(df, is_hourly=True)
-                agent_data[agent_name] = df
-                print(f"✅ {agent_name}: {len(df)} time points")
-
-        # Load baseline
-        print("📊 Loading QQQ baseline...")
-        qqq_file = Path('data/daily_prices_QQQ.json')
-        baseline_data = None
-
-        if qqq_file.exists():
-            date_range = get_agent_date_range(us_data_dir)
-            baseline_data = load_baseline_data(qqq_file, is_hourly=True, date_range=date_range)
-            if baseline_data is not None:
-                print(f"✅ QQQ Baseline: {len(baseline_data)} time points")
-
-        # Create plot
-        if agent_data:
-            if args.separate_plots:
-                plot_separate_metrics(agent_data, baseline_data, 'U.S. Market (NASDAQ-100)',
-                                    output_dir, is_hourly=True)
-            else:
-                output_file = output_dir / 'us_market_metrics.pdf'
-                plot_market_metrics(agent_data, baseline_data, 'U.S. Market (NASDAQ-100)',
-                                  output_file, is_hourly=True)
-
-    # Process A-Stock Market
-    if not args.skip_astock:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    skipped_markets = {'us': args.skip_us, 'astock': args.skip_astock, 'crypto': args.skip_crypto}
+    cache = load_plot_cache(output_dir)
+    jobs = []
+    inputs = {}
+    unchanged = 0
+
+    for market in MARKET_PLOTS:
+        if skipped_markets[market['key']]:
+            continue
         print("\n" + "=" * 70)
-        print("PROCESSING A-SHARE MARKET VISUALIZATIONS")
+        print(f"PROCESSING {market['heading']} VISUALIZATIONS")
         print("=" * 70)
 
-        astock_data_dir = Path('data/agent_data_astock')
-        agent_data = {}
-
-        for agent_dir in sorted(astock_data_dir.iterdir()):
-            if not agent_dir.is_dir():
-                continue
-
-            agent_name = agent_dir.name
-
-            if agent_name not in AGENT_MAPPING:
-                continue
-
-            print(f"📊 Loading {agent_name}...")
-            df = load_portfolio_data(agent_dir)
-
-            if df is not None:
-                df = calculate_rolling_metrics(df, is_hourly=False)
-                agent_data[agent_name] = df
-                print(f"✅ {agent_name}: {len(df)} time points")
-
-        # Load baseline
-        print("📊 Loading SSE-50 baseline...")
-        sse_file = Path('data/A_stock/index_daily_sse_50.json')
-        baseline_data = None
+        # Skip the market before loading anything if none of its inputs changed
+        data_dir = Path(market['data_dir'])
+        agent_dirs = sorted(d for d in data_dir.iterdir() if d.is_dir() and d.name in AGENT_MAPPING) if data_dir.exists() else []
+        specs = market_figure_specs(market['market_name'], output_dir, market['file_stem'],
+                                    separate=args.separate_plots, fmt=args.format)
+        input_name = f"{market['key']}.{args.format}{'.separate' if args.separate_plots else ''}"
+        input_key = market_inputs_key(agent_dirs, market['baseline_file'],
+                                      {'format': args.format, 'separate': args.separate_plots})
+        if (not args.force and cache['inputs'].get(input_name) == input_key
+                and all(output_file.exists() for _, _, output_file in specs)):
+            for _, _, output_file in specs:
+                print(f"⏭️  Unchanged inputs: {output_file}")
+            unchanged += len(specs)
+            continue
 
-        if sse_file.exists():
-            date_range = get_agent_date_range(astock_data_dir)
-            # Override start date to Sep 30 for A-Stock
-            if date_range:
-                date_range = ('2025-09-30', date_range[1])
-            baseline_data = load_baseline_data(sse_file, is_hourly=False, date_range=date_range)
-            if baseline_data is not None:
-                print(f"✅ SSE-50 Baseline: {len(baseline_data)} time points")
+        agent_data, baseline_data = load_market_data(market)
 
-        # Create plot
+        # Queue plots
         if agent_data:
-            if args.separate_plots:
-                plot_separate_metrics(agent_data, baseline_data, 'A-Share Market (SSE-50)',
-                                    output_dir, is_hourly=False)
-            else:
-                output_file = output_dir / 'astock_market_metrics.pdf'
-                plot_market_metrics(agent_data, baseline_data, 'A-Share Market (SSE-50)',
-                                  output_file, is_hourly=False)
-
-    # Process Crypto Market
-    if not args.skip_crypto:
-        print("\n" + "=" * 70)
-        print("PROCESSING CRYPTO MARKET VISUALIZATIONS")
-        print("=" * 70)
-
-        crypto_data_dir = Path('data/agent_data_crypto')
-        agent_data = {}
-
-        for agent_dir in sorted(crypto_data_dir.iterdir()):
-            if not agent_dir.is_dir():
-                continue
-
-            agent_name = agent_dir.name
-
-            if agent_name not in AGENT_MAPPING:
-                continue
+            jobs += market_figure_jobs(agent_data, baseline_data, market['market_name'], output_dir,
+                                       market['file_stem'], separate=args.separate_plots, fmt=args.format)
+            inputs[input_name] = input_key
 
-            print(f"📊 Loading {agent_name}...")
-            df = load_portfolio_data(agent_dir)
-
-            if df is not None:
-                df = calculate_rolling_metrics(df, is_hourly=False)  # Daily trading for crypto
-                agent_data[agent_name] = df
-                print(f"✅ {agent_name}: {len(df)} time points")
-
-        # Load baseline (using crypto index if available)
-        print("📊 Loading Crypto baseline...")
-        crypto_index_file = Path('data/crypto/CD5_crypto_index.json')
-        baseline_data = None
-
-        if crypto_index_file.exists():
-            date_range = get_agent_date_range(crypto_data_dir)
-            baseline_data = load_baseline_data(crypto_index_file, is_hourly=False, date_range=date_range)
-            if baseline_data is not None:
-                print(f"✅ Crypto Index Baseline: {len(baseline_data)} time points")
-
-        # Create plot
-        if agent_data:
-            if args.separate_plots:
-                plot_separate_metrics(agent_data, baseline_data, 'Crypto Market',
-                                    output_dir, is_hourly=False)
-            else:
-                output_file = output_dir / 'crypto_market_metrics.pdf'
-                plot_market_metrics(agent_data, baseline_data, 'Crypto Market',
-                                  output_file, is_hourly=False)
+    print("\n" + "=" * 70)
+    print("RENDERING PLOTS")
+    print("=" * 70)
+    rendered, skipped = render_figures(jobs, output_dir, args.workers, args.force, inputs)
 
     print("\n" + "=" * 70)
-    print(f"✅ All plots saved to: {output_dir}/")
+    print(f"✅ All plots saved to: {output_dir}/ ({rendered} rendered, {skipped + unchanged} unchanged)")
     print("=" * 70)
 
 
@@ -0,0 +1,334 @@
+"""
+Mark-to-market portfolio-value series kept next to each ledger
+
+position/portfolio_series.csv holds one row per position.jsonl record: date,
+cash, stock_value, total_value. calculate_metrics used to be the only source of
+portfolio values, re-walking the whole ledger and looking every holding's price
+up again, and plot_metrics and the frontend cache depended on that offline step.
+The trade tools, add_no_trade_record and register_agent now append the row for
+the record they just wrote. Rows are valued like calculate_portfolio_values
+(close at or before the record's time, same price files), through a PriceTable
+that each process keeps in memory and reloads only when the price files change.
+
+The first line of the file records the price source the rows were valued with
+("# prices: {...}": price directory relative to the ledger, plus the number,
+latest mtime and total size of its daily_prices_*.json files). A series is
+trusted only while that source is unchanged and it lines up with its ledger
+(same number of records, same last date). Otherwise load_portfolio_series
+returns None so readers re-value the ledger, and the next append rebuilds the
+series from the ledger first. calculate_metrics' own portfolio_values.csv
+output is never read back.
+
+Usage:
+    append_portfolio_value(position_file, record, market="us")    # after writing `record`
+    df = load_portfolio_series(position_file)                     # None if missing or stale
+    df = ensure_portfolio_series(position_file)                   # rebuilt first if missing or stale
+    python tools/portfolio_series.py --all                        # backfill every agent
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.calculate_metrics import AGENT_TREES, discover_agent_runs, load_all_price_files, price_directory
+from tools.price_table import PriceTable
+
+SERIES_FILE = "portfolio_series.csv"
+COLUMNS = ["date", "cash", "stock_value", "total_value"]
+SIGNATURE_PREFIX = "# prices: "
+
+# Market names used by the trade tools (get_market_type) -> agent tree whose prices value them
+MARKET_TREES = {"us": "agent_data", "cn": "agent_data_astock", "crypto": "agent_data_crypto"}
+
+# Price files are re-stat'ed at most this often (seconds): a session appends many rows in a row
+PRICE_CHECK_INTERVAL = 30.0
+
+# Price file stats of this process: price directory -> (checked at, signature)
+_PRICE_SIGNATURES: Dict[str, Tuple[float, Dict[str, int]]] = {}
+# PriceTables of this process: price directory -> (price files signature, table)
+_PRICE_STORES: Dict[str, Tuple[Dict[str, int], PriceTable]] = {}
+
+
+def series_path(position_file) -> Path:
+    """portfolio_series.csv belonging to a position.jsonl"""
+    return Path(position_file).parent / SERIES_FILE
+
+
+def price_market(tree: str) -> str:
+    """Market whose PriceTable values the ledgers of an agent tree"""
+    market_of_tree = {t: market for market, t in MARKET_TREES.items()}
+    # agent_data_astock_hour is valued with the A-share daily prices, like the other A-share trees
+    return market_of_tree.get(tree, "cn" if "astock" in tree else "us")
+
+
+def market_price_dir(market: str, data_root: Optional[str] = None) -> Path:
+    """Directory of the daily_prices_*.json files that value a market's ledgers"""
+    settings = AGENT_TREES[MARKET_TREES.get(market, "agent_data")]
+    data_dir = Path(data_root or Path(project_root) / "data") / settings["data_dir"]
+    return price_directory(data_dir, settings["is_crypto"], settings["is_astock"])
+
+
+def ledger_price_dir(position_file) -> Path:
+    """Price directory for a {data_root}/{tree}/{agent}/position/position.jsonl ledger"""
+    position_file = Path(position_file)
+    return market_price_dir(price_market(position_file.parents[2].name), position_file.parents[3])
+
+
+def price_signature(price_dir) -> Dict[str, int]:
+    """
+    Number, latest mtime and total size of the daily_prices_*.json files of a directory
+
+    The files are stat'ed again at most every PRICE_CHECK_INTERVAL seconds.
+    """
+    key = os.path.abspath(price_dir)
+    now = time.monotonic()
+    cached = _PRICE_SIGNATURES.get(key)
+    if cached is None or now - cached[0] >= PRICE_CHECK_INTERVAL:
+        stats = [f.stat() for f in Path(price_dir).glob("daily_prices_*.json")]
+        signature = {
+            "files": len(stats),
+            "mtime_ns": max((st.st_mtime_ns for st in stats), default=0),
+            "size": sum(st.st_size for st in stats),
+        }
+        cached = (now, signature)
+        _PRICE_SIGNATURES[key] = cached
+    return cached[1]
+
+
+def _series_header(position_file, price_dir, signature: Optional[Dict[str, int]] = None) -> str:
+    # The directory is stored relative to the ledger so that the header survives moving the repo
+    source = {"dir": Path(os.path.relpath(price_dir, Path(position_file).parent)).as_posix()}
+    source.update(signature or price_signature(price_dir))
+    return SIGNATURE_PREFIX + json.dumps(source, sort_keys=True)
+
+
+def _read_header(series_file: Path) -> Optional[str]:
+    with open(series_file, "r", encoding="utf-8") as f:
+        line = f.readline().rstrip("\n")
+    return line if line.startswith(SIGNATURE_PREFIX) else None
+
+
+def _price_store(market: str, data_root: Optional[str] = None) -> Tuple[Path, Dict[str, int], PriceTable]:
+    price_dir = market_price_dir(market, data_root)
+    signature = price_signature(price_dir)
+    key = os.path.abspath(price_dir)
+    cached = _PRICE_STORES.get(key)
+    if cached is None or cached[0] != signature:
+        settings = AGENT_TREES[MARKET_TREES.get(market, "agent_data")]
+        data_dir = Path(data_root or Path(project_root) / "data") / settings["data_dir"]
+        price_data = load_all_price_files(data_dir, settings["is_crypto"], settings["is_astock"])
+        cached = (signature, PriceTable.from_price_data(price_data, settings["is_crypto"]))
+        _PRICE_STORES[key] = cached
+    return price_dir, cached[0], cached[1]
+
+
+def get_price_store(market: str, data_root: Optional[str] = None) -> PriceTable:
+    """
+    In-memory PriceTable for a market, built once per process
+
+    Args:
+        market: "us", "cn" or "crypto" (see MARKET_TREES)
+        data_root: Data root (default: {project_root}/data)
+
+    Returns:
+        PriceTable, rebuilt when a price file was added or modified since it was
+        built (checked at most every PRICE_CHECK_INTERVAL seconds)
+    """
+    return _price_store(market, data_root)[2]
+
+
+def value_positions(positions: Dict[str, float], date: str, table: PriceTable) -> List[Any]:
+    """
+    Mark one positions dict to market (same rules as calculate_portfolio_values)
+
+    Returns:
+        [date, cash, stock_value, total_value]; holdings without a price count as 0
+    """
+    cash = positions.get("CASH", 0)
+    stock_value = 0
+    for symbol, amount in positions.items():
+        if symbol == "CASH" or amount == 0:
+            continue
+        price = table.price_at(symbol, date)
+        if price is not None:
+            stock_value += amount * price
+    return [date, cash, stock_value, cash + stock_value]
+
+
+def _count_records(path: Path) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _read_ledger(position_file: Path) -> List[Dict[str, Any]]:
+    with open(position_file, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rebuild_portfolio_series(position_file, market: str, data_root: Optional[str] = None) -> Path:
+    """Write the whole series of a ledger (atomically replacing any existing one)"""
+    position_file = Path(position_file)
+    price_dir, signature, table = _price_store(market, data_root)
+    output = series_path(position_file)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        f.write(_series_header(position_file, price_dir, signature) + "\n")
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for record in _read_ledger(position_file):
+            writer.writerow(value_positions(record.get("positions", {}), record["date"], table))
+    os.replace(tmp, output)
+    return output
+
+
+def start_portfolio_series(position_file, record: Dict[str, Any]) -> Path:
+    """Create the series of a new ledger from its initial all-cash record (no prices needed)"""
+    output = series_path(position_file)
+    cash = record.get("positions", {}).get("CASH", 0)
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        f.write(_series_header(position_file, ledger_price_dir(position_file)) + "\n")
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerow([record["date"], cash, 0, cash])
+    return output
+
+
+def append_portfolio_value(position_file, record: Dict[str, Any], market: str, data_root: Optional[str] = None) -> Path:
+    """
+    Add the row for a record that was just appended to position.jsonl
+
+    If the series is missing, was valued with other price files, or does not
+    line up with the ledger (e.g. an agent that predates the series, or an
+    interrupted write) it is rebuilt from the ledger instead, which also covers
+    `record`.
+
+    Args:
+        position_file: position.jsonl the record was written to
+        record: The record ({"date", "positions", ...})
+        market: "us", "cn" or "crypto"
+        data_root: Data root (default: {project_root}/data)
+
+    Returns:
+        Path of the series file
+    """
+    position_file = Path(position_file)
+    output = series_path(position_file)
+    price_dir, signature, table = _price_store(market, data_root)
+    # Header lines plus one row per ledger record, the new record already in the ledger
+    if (
+        not output.exists()
+        or _read_header(output) != _series_header(position_file, price_dir, signature)
+        or _count_records(output) - 1 != _count_records(position_file)
+    ):
+        return rebuild_portfolio_series(position_file, market, data_root)
+    with open(output, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(value_positions(record.get("positions", {}), record["date"], table))
+    return output
+
+
+def safe_append_portfolio_value(position_file, record: Dict[str, Any], market: str) -> None:
+    """append_portfolio_value for the trade path: a failure is reported and never fails the trade"""
+    try:
+        append_portfolio_value(position_file, record, market)
+    except Exception as e:
+        print(f"⚠️  Could not update {SERIES_FILE} for {position_file}: {e}")
+
+
+def load_portfolio_series(position_file, price_dir=None) -> Optional[pd.DataFrame]:
+    """
+    The ready-made series of a ledger, if it is up to date
+
+    Args:
+        position_file: position.jsonl of the agent
+        price_dir: Price directory the values must come from (default: the
+            ledger's own market prices, see ledger_price_dir)
+
+    Returns:
+        DataFrame with columns date (datetime), cash, stock_value, total_value,
+        one row per ledger record; None if the series is missing, stale or was
+        valued with other price files
+    """
+    position_file = Path(position_file)
+    series_file = series_path(position_file)
+    if not series_file.exists() or not position_file.exists():
+        return None
+    try:
+        expected = _series_header(position_file, price_dir or ledger_price_dir(position_file))
+    except (IndexError, KeyError):
+        # Not inside a {data_root}/{tree}/{agent}/position/ layout: the price source cannot be checked
+        return None
+    try:
+        if _read_header(series_file) != expected:
+            return None
+        df = pd.read_csv(series_file, skiprows=1, float_precision="round_trip")
+        # Only the record count and the last record are needed to check the series
+        with open(position_file, "rb") as f:
+            records = [line for line in f if line.strip()]
+        last_date = json.loads(records[-1])["date"] if records else None
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        print(f"Warning: Ignoring {series_file}: {e}")
+        return None
+    if list(df.columns) != COLUMNS or len(df) != len(records) or not len(df):
+        return None
+    df["date"] = pd.to_datetime(df["date"])
+    if df["date"].iloc[-1] != pd.to_datetime(last_date):
+        return None
+    return df
+
+
+def ensure_portfolio_series(position_file) -> Optional[pd.DataFrame]:
+    """
+    The series of a {data_root}/{tree}/{agent}/position/position.jsonl ledger,
+    rebuilt from the ledger first if it is missing or stale
+
+    Returns:
+        DataFrame as load_portfolio_series, or None if the ledger cannot be valued
+    """
+    position_file = Path(position_file)
+    df = load_portfolio_series(position_file)
+    if df is None and position_file.exists():
+        try:
+            rebuild_portfolio_series(position_file, price_market(position_file.parents[2].name), position_file.parents[3])
+        except (IndexError, OSError, ValueError) as e:
+            print(f"Warning: Could not rebuild {series_path(position_file)}: {e}")
+            return None
+        df = load_portfolio_series(position_file)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild portfolio_series.csv series from position.jsonl ledgers")
+    parser.add_argument("position_file", nargs="?", help="Path to position.jsonl")
+    parser.add_argument("--all", action="store_true", help="Rebuild the series of every agent under --data-dir")
+    parser.add_argument("--data-dir", default="data", help="Data root holding the agent_data* trees")
+    parser.add_argument("--market", choices=list(MARKET_TREES), default=None,
+                        help="Market of position_file (default: from its path)")
+    args = parser.parse_args()
+
+    if args.all:
+        runs = discover_agent_runs(args.data_dir)
+    elif args.position_file:
+        path = args.position_file.lower()
+        market = args.market or ("cn" if "astock" in path else "crypto" if "crypto" in path else "us")
+        runs = [{"position_file": args.position_file, "tree": MARKET_TREES[market]}]
+    else:
+        parser.error("position_file is required unless --all is given")
+
+    for run in runs:
+        output = rebuild_portfolio_series(run["position_file"], price_market(run["tree"]), args.data_dir)
+        print(f"✅ {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Compact, memory-mappable close-price table for portfolio valuation
+
+load_all_price_files() returns the raw daily_prices_*.json documents, and
+get_price_at_date() scans a symbol's whole time series for every lookup.
+PriceTable flattens the same data once into sorted arrays: per symbol a
+slice of timestamps and close prices, located through an offsets array.
+A lookup is a binary search inside that slice and gives exactly what
+get_price_at_date() returns: the close of the bar at, or else the bar
+before, the requested time. Daily series are matched on the date part.
+
+A table can be saved as .npy files and reopened with np.load(mmap_mode="r"),
+so worker processes share one copy of a market's prices through the page
+cache instead of each parsing every JSON file again.
+
+Usage:
+    table = PriceTable.from_price_data(load_all_price_files("data"), is_crypto=False)
+    table.save("/tmp/prices_us")
+    table = PriceTable.open("/tmp/prices_us")
+    table.price_at("AAPL", "2025-10-01 10:00:00")
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Same priority as get_price_at_date
+SERIES_KEYS = ["Time Series (60min)", "Time Series (Daily)", "Time Series (Hourly)"]
+INDEX_FILE = "index.json"
+
+
+def _close_value(bar: Dict[str, Any], is_crypto: bool) -> float:
+    price_str = bar.get("4. sell price" if is_crypto else "4. close", bar.get("4. close"))
+    if not price_str:
+        return np.nan
+    try:
+        return float(price_str)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class PriceTable:
+    """Close prices of many symbols in flat arrays, keyed by sorted timestamp strings"""
+
+    def __init__(
+        self,
+        aliases: Dict[str, int],
+        offsets: np.ndarray,
+        hourly: np.ndarray,
+        keys: np.ndarray,
+        values: np.ndarray,
+    ):
+        """
+        Args:
+            aliases: Symbol name -> column (several names may share a column)
+            offsets: (columns + 1,) start of each column's slice in keys/values
+            hourly: (columns,) True where the column is an intraday series
+            keys: Timestamps, sorted within each column
+            values: Close prices (NaN where the bar has no close)
+        """
+        self.aliases = aliases
+        self.offsets = offsets
+        self.hourly = hourly
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_price_data(cls, price_data: Dict[str, Dict[str, Any]], is_crypto: bool = False) -> "PriceTable":
+        """Build a table from the {symbol: document} dict of load_all_price_files"""
+        aliases: Dict[str, int] = {}
+        columns: Dict[int, int] = {}
+        offsets = [0]
+        hourly: List[bool] = []
+        keys: List[str] = []
+        values: List[float] = []
+
+        for symbol, doc in price_data.items():
+            # Aliases (e.g. 600028.SHH / 600028.SH, BTC / BTC-USDT) point at the same document
+            if id(doc) in columns:
+                aliases[symbol] = columns[id(doc)]
+                continue
+            series_key = next((key for key in SERIES_KEYS if key in doc), None)
+            if series_key is None:
+                continue
+            series = doc[series_key]
+            stamps = sorted(series)
+            columns[id(doc)] = aliases[symbol] = len(hourly)
+            hourly.append("min" in series_key or "Hourly" in series_key)
+            keys.extend(stamps)
+            values.extend(_close_value(series[ts], is_crypto) for ts in stamps)
+            offsets.append(len(keys))
+
+        width = max((len(k) for k in keys), default=1)
+        return cls(
+            aliases,
+            np.array(offsets, dtype=np.int64),
+            np.array(hourly, dtype=bool),
+            np.array(keys, dtype=f"<U{width}"),
+            np.array(values, dtype=np.float64),
+        )
+
+    def save(self, directory: str) -> Path:
+        """Write the table as .npy files (plus index.json) into `directory`"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ("offsets", "hourly", "keys", "values"):
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / INDEX_FILE, "w", encoding="utf-8") as f:
+            json.dump({"aliases": self.aliases}, f)
+        return directory
+
+    @classmethod
+    def open(cls, directory: str, mmap: bool = True) -> "PriceTable":
+        """Open a saved table; with mmap the arrays are paged in on demand and shared between processes"""
+        directory = Path(directory)
+        mode = "r" if mmap else None
+        with open(directory / INDEX_FILE, "r", encoding="utf-8") as f:
+            aliases = json.load(f)["aliases"]
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in ("offsets", "hourly", "keys", "values")}
+        return cls(aliases, **arrays)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.aliases
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+    def price_at(self, symbol: str, date_str: str) -> Optional[float]:
+        """
+        Close price of `symbol` at `date_str`, or at the latest earlier bar
+
+        Returns:
+            Price as float, or None if the symbol is unknown, there is no earlier
+            bar, or that bar has no close (same rules as get_price_at_date)
+        """
+        column = self.aliases.get(symbol)
+        if column is None:
+            return None
+        start, end = int(self.offsets[column]), int(self.offsets[column + 1])
+        key = date_str if self.hourly[column] else date_str.split(" ")[0]
+        pos = int(np.searchsorted(self.keys[start:end], key, side="right")) - 1
+        if pos < 0:
+            return None
+        value = float(self.values[start + pos])
+        return None if np.isnan(value) else value
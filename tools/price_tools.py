@@ -14,6 +14,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 from tools.general_tools import get_config_value
+from tools.tracing import traced
 
 def _normalize_timestamp_str(ts: str) -> str:
     """
@@ -530,6 +531,7 @@ def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, marke
 
 
 
+@traced("get_open_prices")
 def get_open_prices(
     today_date: str, symbols: List[str], merged_path: Optional[str] = None, market: str = "us"
 ) -> Dict[str, Optional[float]]:
@@ -737,6 +739,24 @@ def get_yesterday_profit(
 
     return profit_dict
 
+def get_position_file_path(signature: str) -> Path:
+    """
+    持仓文件路径：{LOG_PATH}/{signature}/position/position.jsonl（交易工具共用）
+
+    Args:
+        signature: 模型名称。
+
+    Returns:
+        LOG_PATH 为绝对路径时直接使用；"./data/xxx" 或其他相对路径解析到 {project_root}/data/xxx 下。
+    """
+    log_path = get_config_value("LOG_PATH", "./data/agent_data")
+    if os.path.isabs(log_path):
+        return Path(log_path) / signature / "position" / "position.jsonl"
+    if log_path.startswith("./data/"):
+        log_path = log_path[7:]  # Remove "./data/" prefix
+    return Path(project_root) / "data" / log_path / signature / "position" / "position.jsonl"
+
+
 def get_today_init_position(today_date: str, signature: str) -> Dict[str, float]:
     """
     获取今日开盘时的初始持仓（即文件中上一个交易日代表的持仓）。从../data/agent_data/{signature}/position/position.jsonl中读取。
@@ -803,6 +823,7 @@ def get_today_init_position(today_date: str, signature: str) -> Dict[str, float]
     return all_records[0].get("positions", {})
 
 
+@traced("get_latest_position")
 def get_latest_position(today_date: str, signature: str) -> Tuple[Dict[str, float], int]:
     """
     获取最新持仓。从 ../data/agent_data/{signature}/position/position.jsonl 中读取。
@@ -966,6 +987,10 @@ def add_no_trade_record(today_date: str, signature: str):
 
     with position_file.open("a", encoding="utf-8") as f:
         f.write(json.dumps(save_item) + "\n")
+
+    # Mark the session close to market in the agent's portfolio-value series
+    from tools.portfolio_series import safe_append_portfolio_value
+    safe_append_portfolio_value(position_file, save_item, get_market_type())
     return
 
 
@@ -0,0 +1,492 @@
+"""
+Consolidated results database
+
+Ledgers, session logs, LLM call timings, trace spans and metrics are spread over
+thousands of small JSONL files under data/agent_data*, and every analysis used
+to re-parse them. ingest() loads them into one SQLite file that can be queried
+with plain SQL.
+
+Loading is incremental and idempotent: each source file's byte offset is kept in
+the `files` table and only complete lines after it are read, in the same
+transaction that records the new offset. Rows are keyed by (source, offset), so
+a second run adds nothing. A file that shrank or whose first line changed (e.g.
+a rebuilt ledger) is reloaded from the start.
+
+Tables:
+    ledger        one row per position.jsonl record: action, trade price and the
+                  mark-to-market cash / stock_value / total_value
+    attribution   per record and symbol held before it: amount * price change
+    log_entries   one row per logged message or event of log/{session}/log.jsonl
+    llm_calls     rate limiter snapshots of metrics/llm_calls.jsonl (one per session)
+    spans         trace spans of $TRACE_DIR/trace-*.jsonl (JSONL or OTLP/JSON)
+    metrics       tools/metrics.py metrics per agent (last record per timestamp),
+                  recomputed when its ledger grows
+
+Views: trade_counts, turnover, pnl_attribution, tool_usage, session_timings.
+
+Usage:
+    python tools/results_db.py                          # ingest data/ into data/results.sqlite
+    python tools/results_db.py --trace-dir data/traces  # also ingest trace spans
+    python tools/results_db.py -q "SELECT * FROM trade_counts ORDER BY trades DESC"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.calculate_metrics import AGENT_TREES
+from tools.metrics import compute_metrics, last_per_timestamp, periods_per_year
+from tools.portfolio_series import get_price_store, price_market, value_positions
+from tools.trace_report import from_otlp
+
+load_dotenv()
+
+DEFAULT_DB_FILE = "results.sqlite"
+
+# Bump when the metrics definition changes: stored metrics of another version are recomputed
+METRICS_VERSION = 2
+
+# Tables holding the rows of each kind of source file (cleared when a file is reloaded)
+SOURCE_TABLES = {
+    "ledger": ["ledger", "attribution"],
+    "log": ["log_entries"],
+    "llm_calls": ["llm_calls"],
+    "trace": ["spans"],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    head TEXT
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    tree TEXT NOT NULL,
+    market TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    record_id INTEGER,
+    date TEXT NOT NULL,
+    action TEXT,
+    symbol TEXT,
+    amount REAL,
+    price REAL,
+    cash REAL,
+    stock_value REAL,
+    total_value REAL,
+    positions TEXT,
+    PRIMARY KEY (source, offset)
+);
+CREATE TABLE IF NOT EXISTS attribution (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    tree TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    date TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    amount REAL,
+    price_before REAL,
+    price REAL,
+    pnl REAL,
+    PRIMARY KEY (source, offset, symbol)
+);
+CREATE TABLE IF NOT EXISTS log_entries (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    tree TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    session TEXT NOT NULL,
+    timestamp TEXT,
+    role TEXT,
+    event TEXT,
+    chars INTEGER,
+    tool_result INTEGER,
+    PRIMARY KEY (source, offset, idx)
+);
+CREATE TABLE IF NOT EXISTS llm_calls (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    tree TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    session TEXT,
+    timestamp TEXT,
+    model TEXT,
+    calls INTEGER,
+    failures INTEGER,
+    rate_limited INTEGER,
+    queue_wait_total REAL,
+    call_time_total REAL,
+    call_time_p50 REAL,
+    call_time_p95 REAL,
+    PRIMARY KEY (source, offset)
+);
+CREATE TABLE IF NOT EXISTS spans (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    trace_id TEXT,
+    span_id TEXT,
+    parent_id TEXT,
+    name TEXT,
+    start REAL,
+    duration_ms REAL,
+    model TEXT,
+    market TEXT,
+    signature TEXT,
+    session TEXT,
+    tool TEXT,
+    error TEXT,
+    PRIMARY KEY (source, offset, idx)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    tree TEXT NOT NULL,
+    market TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (tree, agent, metric)
+);
+CREATE INDEX IF NOT EXISTS ledger_agent ON ledger (tree, agent, date);
+CREATE INDEX IF NOT EXISTS log_entries_session ON log_entries (tree, agent, session);
+
+CREATE VIEW IF NOT EXISTS trade_counts AS
+SELECT tree, market, agent,
+       SUM(action IN ('buy', 'buy_crypto')) AS buys,
+       SUM(action IN ('sell', 'sell_crypto')) AS sells,
+       SUM(action IN ('buy', 'buy_crypto', 'sell', 'sell_crypto')) AS trades,
+       SUM(action = 'no_trade') AS no_trades,
+       COUNT(*) AS records
+FROM ledger GROUP BY tree, market, agent;
+
+CREATE VIEW IF NOT EXISTS turnover AS
+SELECT tree, market, agent,
+       SUM(CASE WHEN action IN ('buy', 'buy_crypto') THEN amount * price ELSE 0 END) AS bought,
+       SUM(CASE WHEN action IN ('sell', 'sell_crypto') THEN amount * price ELSE 0 END) AS sold,
+       SUM(CASE WHEN action IN ('buy', 'buy_crypto', 'sell', 'sell_crypto') THEN amount * price ELSE 0 END) AS traded,
+       AVG(total_value) AS avg_value,
+       SUM(CASE WHEN action IN ('buy', 'buy_crypto', 'sell', 'sell_crypto') THEN amount * price ELSE 0 END)
+           / AVG(total_value) AS turnover
+FROM ledger GROUP BY tree, market, agent;
+
+CREATE VIEW IF NOT EXISTS pnl_attribution AS
+SELECT tree, agent, symbol, SUM(pnl) AS pnl, COUNT(*) AS periods_held
+FROM attribution GROUP BY tree, agent, symbol;
+
+CREATE VIEW IF NOT EXISTS tool_usage AS
+SELECT COALESCE(model, signature) AS model, market, COALESCE(tool, name) AS tool,
+       COUNT(*) AS calls, SUM(error IS NOT NULL) AS errors,
+       AVG(duration_ms) AS avg_ms, SUM(duration_ms) AS total_ms
+FROM spans WHERE name LIKE 'mcp.client.%'
+GROUP BY COALESCE(model, signature), market, COALESCE(tool, name);
+
+CREATE VIEW IF NOT EXISTS session_timings AS
+SELECT s.tree, s.agent, s.session, s.first_entry, s.last_entry,
+       (julianday(s.last_entry) - julianday(s.first_entry)) * 86400.0 AS elapsed_s,
+       s.messages, s.tool_results, s.chars,
+       c.calls AS llm_calls, c.call_time_total, c.queue_wait_total
+FROM (
+    SELECT tree, agent, session, MIN(timestamp) AS first_entry, MAX(timestamp) AS last_entry,
+           SUM(role IS NOT NULL) AS messages, SUM(tool_result) AS tool_results, SUM(chars) AS chars
+    FROM log_entries GROUP BY tree, agent, session
+) s
+LEFT JOIN (
+    SELECT tree, agent, session, SUM(calls) AS calls, SUM(call_time_total) AS call_time_total,
+           SUM(queue_wait_total) AS queue_wait_total
+    FROM llm_calls GROUP BY tree, agent, session
+) c ON c.tree = s.tree AND c.agent = s.agent AND c.session = s.session;
+"""
+
+
+def connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open (and create) the results database
+
+    Args:
+        db_path: SQLite file (default: $RESULTS_DB_PATH or data/results.sqlite)
+
+    Returns:
+        Connection with the schema and views in place
+    """
+    db_path = db_path or os.getenv("RESULTS_DB_PATH") or os.path.join(project_root, "data", DEFAULT_DB_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != METRICS_VERSION:
+        with conn:
+            conn.execute("DELETE FROM metrics")
+            conn.execute(f"PRAGMA user_version = {METRICS_VERSION}")
+    return conn
+
+
+def _source_key(path: Path, root: Path) -> str:
+    try:
+        return path.resolve().relative_to(root.resolve()).as_posix()
+    except ValueError:
+        return str(path.resolve())
+
+
+def _head_digest(path: Path) -> str:
+    # Digest of the first line: unchanged by appends, changed when the file is rewritten
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.readline(4096)).hexdigest()
+
+
+def _new_lines(conn: sqlite3.Connection, path: Path, source: str, kind: str) -> Tuple[int, List[Tuple[int, dict]], Optional[str]]:
+    """
+    Complete lines of `path` after its stored offset
+
+    Returns:
+        (offset after the last complete line, [(line offset, parsed JSON)], head digest);
+        an empty list if nothing new was appended
+    """
+    row = conn.execute("SELECT offset, head FROM files WHERE source = ?", (source,)).fetchone()
+    offset, head = row if row else (0, None)
+    size = path.stat().st_size
+    current_head = _head_digest(path) if size else None
+    if offset and (size < offset or current_head != head):
+        # Rewritten (or truncated) since the last run: reload it from the start
+        for table in SOURCE_TABLES[kind]:
+            conn.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+        offset = 0
+    if size <= offset:
+        return offset, [], current_head
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b"\n") + 1
+    lines = []
+    pos = 0
+    # A trailing partial line is left for the next run
+    for raw in data[:end].split(b"\n")[:-1]:
+        line_offset = offset + pos
+        pos += len(raw) + 1
+        if not raw.strip():
+            continue
+        try:
+            lines.append((line_offset, json.loads(raw)))
+        except json.JSONDecodeError:
+            print(f"⚠️  Skipping malformed line at {source}:{line_offset}")
+    return offset + end, lines, current_head
+
+
+def _mark_read(conn: sqlite3.Connection, source: str, kind: str, offset: int, head: Optional[str]) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO files (source, kind, offset, head) VALUES (?, ?, ?, ?)",
+        (source, kind, offset, head),
+    )
+
+
+def _ingest_ledger(conn: sqlite3.Connection, path: Path, source: str, tree: str, agent: str, data_root: str) -> int:
+    offset, lines, head = _new_lines(conn, path, source, "ledger")
+    if not lines:
+        _mark_read(conn, source, "ledger", offset, head)
+        return 0
+
+    market = AGENT_TREES[tree]["market"]
+    table = get_price_store(price_market(tree), data_root)
+    last = conn.execute(
+        "SELECT date, positions FROM ledger WHERE source = ? ORDER BY offset DESC LIMIT 1", (source,)
+    ).fetchone()
+    prev_date, prev_positions = (last[0], json.loads(last[1])) if last else (None, {})
+
+    ledger_rows, attribution_rows = [], []
+    for line_offset, record in lines:
+        date = record["date"]
+        positions = record.get("positions", {})
+        action = record.get("this_action", {})
+        symbol = action.get("symbol") or None
+        _, cash, stock_value, total_value = value_positions(positions, date, table)
+        ledger_rows.append((
+            source, line_offset, tree, market, agent, record.get("id"), date,
+            action.get("action"), symbol, action.get("amount"),
+            table.price_at(symbol, date) if symbol else None,
+            cash, stock_value, total_value, json.dumps(positions),
+        ))
+        # Holdings carried into this record earn its price change
+        for held, amount in prev_positions.items():
+            if held == "CASH" or not amount:
+                continue
+            before, price = table.price_at(held, prev_date), table.price_at(held, date)
+            if before is not None and price is not None:
+                attribution_rows.append((source, line_offset, tree, agent, date, held, amount, before, price, amount * (price - before)))
+        prev_date, prev_positions = date, positions
+
+    conn.executemany("INSERT OR IGNORE INTO ledger VALUES (" + ", ".join("?" * 15) + ")", ledger_rows)
+    conn.executemany("INSERT OR IGNORE INTO attribution VALUES (" + ", ".join("?" * 10) + ")", attribution_rows)
+    _mark_read(conn, source, "ledger", offset, head)
+    return len(ledger_rows)
+
+
+def _message_rows(entry: Dict[str, Any]) -> Iterator[Tuple[Optional[str], Optional[str], int, int]]:
+    # (role, event, chars, tool_result) for each message or event of a log entry
+    if "event" in entry:
+        yield None, entry["event"], len(json.dumps(entry.get("data"), ensure_ascii=False)), 0
+        return
+    messages = entry.get("new_messages") or []
+    for message in [messages] if isinstance(messages, dict) else messages:
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        role = message.get("role")
+        yield role, None, len(content), int(role == "user" and content.startswith("Tool results:"))
+
+
+def _ingest_log(conn: sqlite3.Connection, path: Path, source: str, tree: str, agent: str) -> int:
+    offset, lines, head = _new_lines(conn, path, source, "log")
+    session = path.parent.name
+    rows = [
+        (source, line_offset, idx, tree, agent, session, entry.get("timestamp"), role, event, chars, tool_result)
+        for line_offset, entry in lines
+        for idx, (role, event, chars, tool_result) in enumerate(_message_rows(entry))
+    ]
+    conn.executemany("INSERT OR IGNORE INTO log_entries VALUES (" + ", ".join("?" * 11) + ")", rows)
+    _mark_read(conn, source, "log", offset, head)
+    return len(rows)
+
+
+def _ingest_llm_calls(conn: sqlite3.Connection, path: Path, source: str, tree: str, agent: str) -> int:
+    offset, lines, head = _new_lines(conn, path, source, "llm_calls")
+    rows = [
+        (
+            source, line_offset, tree, agent, s.get("session"), s.get("timestamp"), s.get("model"),
+            s.get("calls"), s.get("failures"), s.get("rate_limited"), s.get("queue_wait_total"),
+            s.get("call_time_total"), s.get("call_time_p50"), s.get("call_time_p95"),
+        )
+        for line_offset, s in lines
+    ]
+    conn.executemany("INSERT OR IGNORE INTO llm_calls VALUES (" + ", ".join("?" * 14) + ")", rows)
+    _mark_read(conn, source, "llm_calls", offset, head)
+    return len(rows)
+
+
+def _ingest_trace(conn: sqlite3.Connection, path: Path, source: str) -> int:
+    offset, lines, head = _new_lines(conn, path, source, "trace")
+    rows = []
+    for line_offset, doc in lines:
+        spans = list(from_otlp(doc)) if "resourceSpans" in doc else [doc]
+        for idx, s in enumerate(spans):
+            attrs = s.get("attrs", {})
+            error = s.get("error") or attrs.get("error")
+            rows.append((
+                source, line_offset, idx, s.get("trace_id"), s.get("span_id"), s.get("parent_id"), s.get("name"),
+                s.get("start"), s.get("duration_ms"), attrs.get("model"), attrs.get("market"),
+                attrs.get("signature"), attrs.get("session"), attrs.get("tool"),
+                None if error is None else str(error),
+            ))
+    conn.executemany("INSERT OR IGNORE INTO spans VALUES (" + ", ".join("?" * 15) + ")", rows)
+    _mark_read(conn, source, "trace", offset, head)
+    return len(rows)
+
+
+def _update_metrics(conn: sqlite3.Connection, tree: str, agent: str) -> None:
+    """Recompute the metrics of one agent from its ledger valuations (last record per timestamp)"""
+    settings = AGENT_TREES[tree]
+    rows = conn.execute("SELECT date, total_value FROM ledger WHERE tree = ? AND agent = ? ORDER BY offset", (tree, agent)).fetchall()
+    if not rows:
+        return
+    _, values = last_per_timestamp([r[0] for r in rows], [r[1] for r in rows])
+    table = compute_metrics(values, periods_per_year(settings["is_crypto"], settings["is_hourly"]))
+    conn.executemany(
+        "INSERT OR REPLACE INTO metrics (tree, market, agent, metric, value) VALUES (?, ?, ?, ?, ?)",
+        [(tree, settings["market"], agent, metric, float(value[0])) for metric, value in table.items()],
+    )
+
+
+def ingest(conn: sqlite3.Connection, data_root: str = "data", trace_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Load everything appended since the last run
+
+    Args:
+        conn: Connection from connect()
+        data_root: Data root holding the agent_data* trees
+        trace_dir: Directory of trace-*.jsonl files (None: skip spans)
+
+    Returns:
+        Number of new rows per kind of source
+    """
+    root = Path(data_root)
+    counts = {kind: 0 for kind in SOURCE_TABLES}
+    for tree_dir in sorted(root.glob("agent_data*")):
+        tree = tree_dir.name
+        if tree not in AGENT_TREES:
+            print(f"⚠️  Skipping {tree_dir} (unknown agent tree, add it to AGENT_TREES)")
+            continue
+        for agent_dir in sorted(p for p in tree_dir.iterdir() if p.is_dir()):
+            agent = agent_dir.name
+            position_file = agent_dir / "position" / "position.jsonl"
+            if position_file.exists():
+                with conn:
+                    added = _ingest_ledger(conn, position_file, _source_key(position_file, root), tree, agent, data_root)
+                    if added or not conn.execute(
+                        "SELECT 1 FROM metrics WHERE tree = ? AND agent = ? LIMIT 1", (tree, agent)
+                    ).fetchone():
+                        _update_metrics(conn, tree, agent)
+                counts["ledger"] += added
+            for log_file in sorted(agent_dir.glob("log/*/log.jsonl")):
+                with conn:
+                    counts["log"] += _ingest_log(conn, log_file, _source_key(log_file, root), tree, agent)
+            calls_file = agent_dir / "metrics" / "llm_calls.jsonl"
+            if calls_file.exists():
+                with conn:
+                    counts["llm_calls"] += _ingest_llm_calls(conn, calls_file, _source_key(calls_file, root), tree, agent)
+
+    if trace_dir:
+        for trace_file in sorted(Path(trace_dir).glob("trace-*.jsonl")):
+            with conn:
+                counts["trace"] += _ingest_trace(conn, trace_file, _source_key(trace_file, root))
+    return counts
+
+
+def print_rows(cursor: sqlite3.Cursor) -> None:
+    columns = [d[0] for d in cursor.description]
+    rows = [["" if v is None else f"{v:.4f}" if isinstance(v, float) else str(v) for v in row] for row in cursor]
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally load ledgers, logs, timings and metrics into a SQLite results database")
+    parser.add_argument("--db", default=None, help="SQLite file (default: $RESULTS_DB_PATH or data/results.sqlite)")
+    parser.add_argument("--data-dir", default="data", help="Data root holding the agent_data* trees")
+    parser.add_argument("--trace-dir", default=os.getenv("TRACE_DIR") or None,
+                        help="Directory of trace-*.jsonl files (default: $TRACE_DIR)")
+    parser.add_argument("-q", "--query", action="append", default=[], help="SQL to run after ingesting (repeatable)")
+    parser.add_argument("--no-ingest", action="store_true", help="Only run --query against the existing database")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if not args.no_ingest:
+            start = time.perf_counter()
+            counts = ingest(conn, args.data_dir, args.trace_dir)
+            summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+            print(f"✅ Ingested {summary} rows in {time.perf_counter() - start:.2f}s")
+        for sql in args.query:
+            print_rows(conn.execute(sql))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Scripted chat model - deterministic stand-in for the LLM
+
+ScriptedChatModel plugs into the agents' model slot and emits tool calls from
+a fixed script or a simple trading rule, then answers with STOP_SIGNAL. No
+network access is needed, so a backtest measures only the pipeline around the
+model: prompt building, MCP round trips, ledger locking and logging.
+
+Each agent invocation runs in phases (one model turn each):
+    1. optional get_price_local lookups
+    2. sells
+    3. buys (sized from the cash reported by the sell results)
+    4. final answer containing STOP_SIGNAL
+
+Policies:
+    buy_and_hold      buy `max_positions` symbols once, then hold
+    random_rebalance  sell a random subset of holdings, buy random symbols
+    momentum          hold the top `max_positions` symbols by today's open / last close
+    scripted          replay `script`: a list of turns, each a list of {"name", "args"}
+"""
+
+import ast
+import hashlib
+import json
+import random
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from prompts.agent_prompt import STOP_SIGNAL
+
+POLICIES = ("buy_and_hold", "random_rebalance", "momentum", "scripted")
+
+_DICT_PATTERN = re.compile(r"\{[^{}]*\}")
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?")
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in content)
+
+
+def _parse_prompt(system_prompt: str) -> Tuple[str, Dict[str, float], List[Dict[str, Optional[float]]]]:
+    """
+    Extract (date, positions, [price dicts in prompt order]) from a system prompt
+
+    All agent prompts render positions and prices as Python dict reprs; price keys
+    look like "AAPL_price" or "600519.SH (贵州茅台)_price".
+    """
+    date_match = _DATE_PATTERN.search(system_prompt)
+    positions: Dict[str, float] = {}
+    prices: List[Dict[str, Optional[float]]] = []
+    for block in _DICT_PATTERN.findall(system_prompt):
+        try:
+            value = ast.literal_eval(block)
+        except Exception:
+            continue
+        if not isinstance(value, dict) or not value:
+            continue
+        if "CASH" in value and not positions:
+            positions = {k: float(v) for k, v in value.items() if isinstance(v, (int, float))}
+        elif all(isinstance(k, str) and k.endswith("_price") for k in value):
+            prices.append({k[: -len("_price")].split(" (")[0]: v for k, v in value.items()})
+    return (date_match.group(0) if date_match else ""), positions, prices
+
+
+def _latest_positions(messages: Sequence[BaseMessage], positions: Dict[str, float]) -> Dict[str, float]:
+    """Return the positions from the most recent successful trade result, falling back to the prompt"""
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            continue
+        try:
+            value = json.loads(_text(message))
+        except Exception:
+            continue
+        if isinstance(value, dict) and "CASH" in value and "error" not in value:
+            return {k: float(v) for k, v in value.items() if isinstance(v, (int, float))}
+    return positions
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model emitting rule-driven trade tool calls"""
+
+    policy: str = "random_rebalance"
+    seed: int = 0
+    max_positions: int = 5
+    cash_fraction: float = 0.95
+    price_lookups: int = 0
+    script: Optional[List[List[Dict[str, Any]]]] = None
+    tool_names: List[str] = Field(default_factory=list)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "ScriptedChatModel":
+        """Build the model from a model entry's "mock_llm" section"""
+        config = dict(config or {})
+        policy = config.get("policy", "random_rebalance")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown mock_llm policy {policy!r}, expected one of {POLICIES}")
+        return cls(**config)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        names = []
+        for tool in tools:
+            name = getattr(tool, "name", None) or (tool.get("name") if isinstance(tool, dict) else None)
+            if name:
+                names.append(name)
+        return self.model_copy(update={"tool_names": names})
+
+    # ---- helpers --------------------------------------------------------
+
+    def _market(self) -> str:
+        if "buy_crypto" in self.tool_names:
+            return "crypto"
+        return "us"
+
+    def _trade_tool(self, side: str) -> str:
+        return f"{side}_crypto" if self._market() == "crypto" else side
+
+    @staticmethod
+    def _lot(symbol: str) -> int:
+        return 100 if symbol.endswith((".SH", ".SZ")) else 1
+
+    def _amount(self, symbol: str, budget: float, price: float) -> float:
+        if price <= 0:
+            return 0
+        if self._market() == "crypto":
+            return round(budget / price, 4)
+        lot = self._lot(symbol)
+        return int(budget // (price * lot)) * lot
+
+    def _targets(self, rng: random.Random, held: List[str], open_prices: Dict[str, float], closes: Dict[str, float]) -> List[str]:
+        candidates = sorted(open_prices)
+        k = min(self.max_positions, len(candidates))
+        if self.policy == "buy_and_hold":
+            return held if held else rng.sample(candidates, k)
+        if self.policy == "momentum":
+            def score(symbol: str) -> float:
+                close = closes.get(symbol)
+                return open_prices[symbol] / close if close else 1.0
+            return sorted(candidates, key=score, reverse=True)[:k]
+        # random_rebalance: keep a random half of the holdings, fill up with random symbols
+        keep = [s for s in held if rng.random() < 0.5]
+        fresh = [s for s in candidates if s not in keep]
+        return keep + rng.sample(fresh, min(len(fresh), max(0, k - len(keep))))
+
+    def _plan(self, date: str, positions: Dict[str, float], prices: List[Dict[str, Optional[float]]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Return (sell calls, symbols to buy) for a session"""
+        rng = random.Random(int(hashlib.md5(f"{self.seed}|{self.policy}|{date}".encode()).hexdigest()[:8], 16))
+        open_prices = {s: float(p) for s, p in (prices[-1] if prices else {}).items() if p}
+        closes = {s: float(p) for s, p in (prices[0] if len(prices) > 1 else {}).items() if p}
+        held = sorted(s for s, v in positions.items() if s != "CASH" and v > 0)
+        targets = self._targets(rng, held, open_prices, closes)
+        sells = [
+            {"name": self._trade_tool("sell"), "args": {"symbol": s, "amount": positions[s]}}
+            for s in held
+            if s not in targets and s in open_prices
+        ]
+        if self._market() != "crypto":
+            for call in sells:
+                symbol = call["args"]["symbol"]
+                lot = self._lot(symbol)
+                call["args"]["amount"] = int(positions[symbol] // lot) * lot
+            sells = [c for c in sells if c["args"]["amount"] > 0]
+        buys = [s for s in targets if s not in held and s in open_prices]
+        return sells, buys
+
+    def _turns(self, messages: List[BaseMessage]) -> List[List[Dict[str, Any]]]:
+        """Compute the tool-call turns of the current invocation"""
+        if self.policy == "scripted":
+            return [turn for turn in (self.script or []) if turn]
+
+        system = next((m for m in messages if isinstance(m, SystemMessage)), None)
+        date, positions, prices = _parse_prompt(_text(system) if system else "")
+        sells, buys = self._plan(date, positions, prices)
+        turns: List[List[Dict[str, Any]]] = []
+        if self.price_lookups and "get_price_local" in self.tool_names:
+            lookup_symbols = sorted((prices[-1] if prices else {}).keys())[: self.price_lookups]
+            turns.append([{"name": "get_price_local", "args": {"symbol": s, "date": date}} for s in lookup_symbols])
+        if sells:
+            turns.append(sells)
+        if buys:
+            # Sized on demand from the cash left after the sells
+            turns.append([{"name": self._trade_tool("buy"), "args": {"symbol": s}} for s in buys])
+        return turns
+
+    def _size_buys(self, calls: List[Dict[str, Any]], messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+        system = next((m for m in messages if isinstance(m, SystemMessage)), None)
+        _, positions, prices = _parse_prompt(_text(system) if system else "")
+        cash = _latest_positions(messages, positions).get("CASH", 0.0) * self.cash_fraction
+        open_prices = prices[-1] if prices else {}
+        budget = cash / len(calls) if calls else 0.0
+        sized = []
+        for call in calls:
+            symbol = call["args"]["symbol"]
+            amount = self._amount(symbol, budget, float(open_prices.get(symbol) or 0))
+            if amount > 0:
+                sized.append({"name": call["name"], "args": {"symbol": symbol, "amount": amount}})
+        return sized
+
+    # ---- BaseChatModel --------------------------------------------------
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # Turns already taken since the last user message of this invocation
+        last_user = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        taken = sum(1 for m in messages[last_user + 1 :] if isinstance(m, AIMessage) and m.tool_calls)
+
+        turns = self._turns(messages)
+        calls: List[Dict[str, Any]] = []
+        while taken < len(turns) and not calls:
+            calls = turns[taken]
+            if calls and calls[0]["name"] in ("buy", "buy_crypto") and "amount" not in calls[0]["args"]:
+                calls = self._size_buys(calls, messages)
+            if not calls:
+                taken += 1
+
+        if calls:
+            tool_calls = [
+                {"name": c["name"], "args": c["args"], "id": f"call_{taken}_{i}", "type": "tool_call"}
+                for i, c in enumerate(calls)
+            ]
+            message = AIMessage(content="", tool_calls=tool_calls)
+        else:
+            message = AIMessage(content=f"Session complete ({self.policy} policy).\n{STOP_SIGNAL}")
+        message.usage_metadata = {"input_tokens": 0, "output_tokens": max(1, len(calls)), "total_tokens": max(1, len(calls))}
+        return ChatResult(generations=[ChatGeneration(message=message)])
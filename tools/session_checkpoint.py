@@ -0,0 +1,215 @@
+"""
+Session checkpoint - step-level persistence and resume for trading sessions
+
+run_with_retry used to replay a failed run_trading_session from step 1 even
+though ledger appends from earlier steps were already committed. After every
+successful step the agent now persists a checkpoint holding the message
+history, the next step index and the ledger state (last id and byte length of
+position.jsonl) at the start of that step. A retry resumes from the checkpoint
+and first truncates the ledger back to the recorded length, discarding trades
+committed by the step that failed half-way. Checkpoints carry the id of the
+process run that wrote them: one left behind by a run that crashed is discarded
+by a later run instead of being resumed (and truncating the ledger).
+
+Trade tools derive an idempotency key from (signature, session, step) and the
+normalized order (side, symbol, amount); the agent publishes the current step
+through the runtime config (TRADE_STEP), so the key never appears in the tool
+schema. A repeated order with the same key returns the recorded result instead
+of appending a second trade, which also means identical orders within one step
+are executed once.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from tools.general_tools import get_config_value, write_config_value
+
+# Identifies this process run; checkpoints written by another run are stale
+RUN_ID = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+
+def make_idempotency_key(signature: str, session: str, step: int, side: str, symbol: str, amount: float) -> str:
+    """Build the (session, step, side, symbol, amount) idempotency key for a trade"""
+    return f"{signature}|{session}|{step}|{side}|{symbol.strip().upper()}|{float(amount):.10g}"
+
+
+def trade_idempotency_key(side: str, symbol: str, amount: float) -> str:
+    """
+    Idempotency key of an order placed in the current agent step
+
+    Signature, session (TODAY_DATE) and step (TRADE_STEP) come from the runtime
+    config written by the agent. Returns "" outside an agent step (no idempotency).
+    """
+    step = get_config_value("TRADE_STEP")
+    if step is None:
+        return ""
+    return make_idempotency_key(
+        get_config_value("SIGNATURE"), get_config_value("TODAY_DATE"), int(step), side, symbol, amount
+    )
+
+
+def get_ledger_state(position_file: str) -> Dict[str, int]:
+    """
+    Return the current ledger state of a position.jsonl file
+
+    Returns:
+        {"ledger_id": id of the last record (-1 if empty), "ledger_offset": file size in bytes}
+    """
+    if not os.path.exists(position_file):
+        return {"ledger_id": -1, "ledger_offset": 0}
+    last_id = -1
+    with open(position_file, "rb") as f:
+        offset = f.seek(0, os.SEEK_END)
+        # Only the tail is needed to find the last record
+        f.seek(max(0, offset - 65536))
+        tail = f.read().decode("utf-8", errors="ignore").strip().splitlines()
+    for line in reversed(tail):
+        try:
+            last_id = int(json.loads(line).get("id", -1))
+            break
+        except Exception:
+            continue
+    return {"ledger_id": last_id, "ledger_offset": offset}
+
+
+def rollback_ledger(position_file: str, ledger_offset: int) -> int:
+    """
+    Truncate position.jsonl back to a previously recorded length
+
+    Returns:
+        Number of records removed
+    """
+    if not os.path.exists(position_file):
+        return 0
+    size = os.path.getsize(position_file)
+    if size <= ledger_offset:
+        return 0
+    with open(position_file, "rb") as f:
+        f.seek(ledger_offset)
+        removed = sum(1 for line in f.read().splitlines() if line.strip())
+    os.truncate(position_file, ledger_offset)
+    return removed
+
+
+def find_trade_by_key(position_file: str, idempotency_key: str) -> Optional[Dict[str, Any]]:
+    """Return the ledger record written with the given idempotency key, if any"""
+    if not idempotency_key or not os.path.exists(position_file):
+        return None
+    with open(position_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if idempotency_key not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except Exception:
+                continue
+            if record.get("idempotency_key") == idempotency_key:
+                return record
+    return None
+
+
+class SessionCheckpoint:
+    """
+    Per-session checkpoint stored at {base_log_path}/{signature}/checkpoint/{session}.json
+
+    The file is replaced atomically (temp + rename) so a crash never leaves a
+    half-written checkpoint behind.
+    """
+
+    def __init__(self, base_log_path: str, signature: str, session: str, run_id: Optional[str] = None):
+        """
+        Args:
+            base_log_path: Agent data root
+            signature: Agent signature
+            session: Session identifier, i.e. the trading date or timestamp
+            run_id: Run the checkpoint belongs to (default: this process, RUN_ID)
+        """
+        self.session = session
+        self.run_id = run_id or RUN_ID
+        checkpoint_dir = os.path.join(base_log_path, signature, "checkpoint")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        safe_name = session.replace(" ", "_").replace(":", "-")
+        self.path = os.path.join(checkpoint_dir, f"{safe_name}.json")
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the saved checkpoint, or None if there is none for this session and run"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+        if not isinstance(data, dict) or data.get("session") != self.session:
+            return None
+        if data.get("run_id") != self.run_id:
+            # Left behind by a run that crashed: its trades stay in the ledger, start over
+            print(f"🗑️  Discarding stale checkpoint {self.path} from run {data.get('run_id')}")
+            self.clear()
+            return None
+        return data
+
+    def save(self, step: int, messages: List[Dict[str, str]], ledger_state: Dict[str, int], if_trade: bool) -> None:
+        """
+        Persist the session state after a completed step
+
+        Args:
+            step: Number of completed steps; the resumed session continues at step + 1
+            messages: Conversation history sent to the model
+            ledger_state: Ledger state from get_ledger_state at the start of the next step
+            if_trade: Current IF_TRADE flag, restored on resume
+        """
+        data = {
+            "session": self.session,
+            "run_id": self.run_id,
+            "step": step,
+            "messages": messages,
+            "ledger_id": ledger_state["ledger_id"],
+            "ledger_offset": ledger_state["ledger_offset"],
+            "if_trade": bool(if_trade),
+            "updated_at": datetime.now().isoformat(),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def commit(self, step: int, messages: List[Dict[str, str]], position_file: str) -> None:
+        """Save a checkpoint after `step` using the current ledger state and IF_TRADE flag"""
+        self.save(step, messages, get_ledger_state(position_file), bool(get_config_value("IF_TRADE")))
+
+    def begin_step(self, step: int) -> None:
+        """Publish the running step to the trade tools (part of their idempotency key)"""
+        write_config_value("TRADE_STEP", step)
+
+    def restore(self, position_file: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the checkpoint and roll the session back to it
+
+        Ledger records appended after the checkpoint (by the step that failed)
+        are truncated away and the IF_TRADE flag is restored.
+
+        Returns:
+            The checkpoint dict, or None if the session has to start from scratch
+        """
+        state = self.load()
+        if state is None:
+            return None
+        removed = rollback_ledger(position_file, int(state.get("ledger_offset", 0)))
+        if removed:
+            print(f"↩️  Rolled back {removed} ledger record(s) from the interrupted step")
+        write_config_value("IF_TRADE", bool(state.get("if_trade", False)))
+        print(f"♻️  Resuming session {self.session} after step {state['step']}")
+        return state
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the session has finished"""
+        write_config_value("TRADE_STEP", None)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
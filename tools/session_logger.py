@@ -0,0 +1,349 @@
+"""
+Session logger - buffered, structured writer for agent conversation logs
+
+The agents used to open the day's log.jsonl, json.dumps one entry and close the
+file again for every message. SessionLogger moves that work off the agent loop:
+entries go into a bounded queue and a background writer thread serializes them,
+writes them in batches through a cached file handle and flushes (optionally
+fsync'ing) at a fixed interval.
+
+Optionally every finished session is also appended to a consolidated per-agent
+LogStore: compressed segment files plus an index of date -> (segment, offset,
+length), so scanning an agent's history does not have to walk thousands of
+per-day directories.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:  # zstd is optional; fall back to zlib from the standard library
+    import zstandard as _zstd  # type: ignore
+except ImportError:
+    _zstd = None
+
+
+# Queue item kinds handled by the writer thread
+_ENTRY = "entry"
+_END_SESSION = "end_session"
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class LogStore:
+    """
+    Consolidated per-agent log store
+
+    Layout under store_dir:
+        segment-00000.<codec>   concatenated compressed frames, one frame per session
+        index.json              {"segments": [...], "dates": {date: [frame, ...]}}
+
+    Each frame entry records segment, offset, length, codec and number of entries,
+    so reading a date is a single seek + read + decompress.
+    """
+
+    SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, store_dir: str, codec: Optional[str] = None):
+        """
+        Args:
+            store_dir: Directory holding segments and index.json
+            codec: "zstd" or "zlib"; defaults to zstd when the zstandard package is installed
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.index_path = os.path.join(store_dir, "index.json")
+        if codec is None:
+            codec = "zstd" if _zstd is not None else "zlib"
+        if codec == "zstd" and _zstd is None:
+            print("⚠️  zstandard not installed, log store falls back to zlib")
+            codec = "zlib"
+        self.codec = codec
+        self.index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if isinstance(index, dict):
+                    index.setdefault("segments", [])
+                    index.setdefault("dates", {})
+                    return index
+            except Exception as e:
+                print(f"⚠️  Failed to read log store index {self.index_path}: {e}")
+        return {"segments": [], "dates": {}}
+
+    def _save_index(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _compress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            return _zstd.ZstdCompressor(level=3).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if _zstd is None:
+                raise RuntimeError("zstandard package is required to read zstd log segments")
+            return _zstd.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _segment_for(self, frame_size: int) -> str:
+        segments = self.index["segments"]
+        if segments:
+            name = segments[-1]
+            path = os.path.join(self.store_dir, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if name.endswith("." + self.codec) and size + frame_size <= self.SEGMENT_MAX_BYTES:
+                return name
+        name = f"segment-{len(segments):05d}.{self.codec}"
+        segments.append(name)
+        return name
+
+    def append(self, date: str, lines: List[str]) -> None:
+        """Append one session's serialized log lines as a compressed frame"""
+        if not lines:
+            return
+        frame = self._compress("".join(lines).encode("utf-8"), self.codec)
+        segment = self._segment_for(len(frame))
+        path = os.path.join(self.store_dir, segment)
+        with open(path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        self.index["dates"].setdefault(date, []).append(
+            {"segment": segment, "offset": offset, "length": len(frame), "codec": self.codec, "entries": len(lines)}
+        )
+        self._save_index()
+
+    def dates(self) -> List[str]:
+        """Return all dates present in the store, sorted"""
+        return sorted(self.index["dates"].keys())
+
+    def read(self, date: str) -> List[Dict[str, Any]]:
+        """Return all log entries recorded for a date, in write order"""
+        entries: List[Dict[str, Any]] = []
+        for frame in self.index["dates"].get(date, []):
+            with open(os.path.join(self.store_dir, frame["segment"]), "rb") as f:
+                f.seek(frame["offset"])
+                data = self._decompress(f.read(frame["length"]), frame["codec"])
+            for line in data.decode("utf-8").splitlines():
+                if line.strip():
+                    entries.append(json.loads(line))
+        return entries
+
+
+class SessionLogger:
+    """
+    Buffered session logger shared by the trading agents
+
+    Usage (mirrors the old _setup_logging/_log_message pair):
+        log_file = logger.setup(today_date)
+        logger.log(log_file, new_messages)
+        ...
+        logger.end_session(log_file)
+    """
+
+    def __init__(
+        self,
+        signature: str,
+        base_log_path: str,
+        queue_size: int = 1000,
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+        fsync: bool = False,
+        per_day_files: bool = True,
+        consolidated_store: bool = False,
+        store_codec: Optional[str] = None,
+    ):
+        """
+        Initialize SessionLogger
+
+        Args:
+            signature: Agent signature written into every entry
+            base_log_path: Agent data root, logs go to {base_log_path}/{signature}/log
+            queue_size: Maximum queued entries; log() blocks when the writer falls behind
+            batch_size: Entries written per batch before an early flush
+            flush_interval: Seconds between periodic flushes
+            fsync: fsync log files on every flush
+            per_day_files: Keep writing log/{date}/log.jsonl (read by the frontend)
+            consolidated_store: Also append finished sessions to log/store (compressed segments + index)
+            store_codec: Codec for the consolidated store, "zstd" or "zlib"
+        """
+        self.signature = signature
+        self.log_dir = os.path.join(base_log_path, signature, "log")
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.fsync = fsync
+        self.per_day_files = per_day_files
+        self.store = LogStore(os.path.join(self.log_dir, "store"), codec=store_codec) if consolidated_store else None
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, signature: str, base_log_path: str, log_config: Optional[Dict[str, Any]] = None) -> "SessionLogger":
+        """Build a logger from the "log_config" section of a run configuration"""
+        log_config = log_config or {}
+        return cls(
+            signature=signature,
+            base_log_path=base_log_path,
+            queue_size=log_config.get("queue_size", 1000),
+            batch_size=log_config.get("batch_size", 64),
+            flush_interval=log_config.get("flush_interval", 1.0),
+            fsync=log_config.get("fsync", False),
+            per_day_files=log_config.get("per_day_files", True),
+            consolidated_store=log_config.get("consolidated_store", False),
+            store_codec=log_config.get("store_codec"),
+        )
+
+    def setup(self, today_date: str) -> str:
+        """Return the log file path for a session, creating its directory if needed"""
+        log_path = os.path.join(self.log_dir, today_date)
+        if self.per_day_files and not os.path.exists(log_path):
+            os.makedirs(log_path, exist_ok=True)
+        return os.path.join(log_path, "log.jsonl")
+
+    def log(self, log_file: str, new_messages: Any) -> None:
+        """Queue one log entry; serialization and I/O happen on the writer thread"""
+        entry = {"timestamp": datetime.now().isoformat(), "signature": self.signature, "new_messages": new_messages}
+        self._put((_ENTRY, log_file, entry))
+
+    def log_event(self, log_file: str, event: str, data: Dict[str, Any]) -> None:
+        """Queue a structured non-message entry (e.g. metrics); the web UI ignores these"""
+        entry = {"timestamp": datetime.now().isoformat(), "signature": self.signature, "event": event, "data": data}
+        self._put((_ENTRY, log_file, entry))
+
+    def end_session(self, log_file: str, wait: bool = True) -> None:
+        """Flush a session's entries, close its file and append it to the consolidated store"""
+        self._put((_END_SESSION, log_file, None), wait=wait)
+
+    def flush(self) -> None:
+        """Block until every queued entry has been written"""
+        self._put((_FLUSH, None, None), wait=True)
+
+    def close(self) -> None:
+        """Flush everything and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            done = threading.Event()
+            self._queue.put((_STOP, None, done))
+            done.wait()
+            thread.join()
+
+    def _put(self, item: tuple, wait: bool = False) -> None:
+        if self._closed:
+            raise RuntimeError("SessionLogger is closed")
+        self._ensure_writer()
+        if wait:
+            done = threading.Event()
+            self._queue.put((item[0], item[1], done))
+            done.wait()
+        else:
+            self._queue.put(item)
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._writer_loop, name=f"session-logger-{self.signature}", daemon=True
+                )
+                self._thread.start()
+
+    def _writer_loop(self) -> None:
+        handles: Dict[str, Any] = {}
+        pending: Dict[str, List[str]] = {}
+        session_lines: Dict[str, List[str]] = {}
+        pending_count = 0
+        last_flush = time.monotonic()
+
+        def write_pending() -> None:
+            nonlocal pending_count, last_flush
+            for log_file, lines in pending.items():
+                if not lines or not self.per_day_files:
+                    continue
+                fh = handles.get(log_file)
+                if fh is None:
+                    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+                    fh = open(log_file, "a", encoding="utf-8")
+                    handles[log_file] = fh
+                fh.write("".join(lines))
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+            pending.clear()
+            pending_count = 0
+            last_flush = time.monotonic()
+
+        def finish_session(log_file: str) -> None:
+            fh = handles.pop(log_file, None)
+            if fh is not None:
+                fh.close()
+            lines = session_lines.pop(log_file, [])
+            if self.store is not None and lines:
+                date = os.path.basename(os.path.dirname(log_file))
+                try:
+                    self.store.append(date, lines)
+                except Exception as e:
+                    print(f"❌ Failed to append session {date} to log store: {e}")
+
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                kind, log_file, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, log_file, payload = None, None, None
+
+            try:
+                if kind == _ENTRY:
+                    line = json.dumps(payload, ensure_ascii=False) + "\n"
+                    pending.setdefault(log_file, []).append(line)
+                    if self.store is not None:
+                        session_lines.setdefault(log_file, []).append(line)
+                    pending_count += 1
+                    if pending_count >= self.batch_size:
+                        write_pending()
+                elif kind == _END_SESSION:
+                    write_pending()
+                    finish_session(log_file)
+                elif kind in (_FLUSH, _STOP):
+                    write_pending()
+                    if kind == _STOP:
+                        for open_file in list(set(handles) | set(session_lines)):
+                            finish_session(open_file)
+                if pending_count and time.monotonic() - last_flush >= self.flush_interval:
+                    write_pending()
+            except Exception as e:
+                print(f"❌ Session logger write error: {e}")
+                pending.clear()
+                pending_count = 0
+            finally:
+                if isinstance(payload, threading.Event):
+                    payload.set()
+
+            if kind == _STOP:
+                return
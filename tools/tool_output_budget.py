@@ -0,0 +1,208 @@
+"""
+Tool output budget - compaction of tool results before they enter the conversation
+
+Everything the tools return is concatenated into "Tool results: ..." and
+re-sent to the model on every later step of the session. ToolOutputBudget
+applies a per-tool budget to each tool message:
+
+- max_chars: hard character cap (truncated with a marker)
+- fields: projection of "Key: value" records (news / search results)
+- dedupe: drop articles already returned earlier in the same session
+- tabular: encode price results as one compact CSV table per step
+- drop_zero_positions: hide zero holdings in trade results
+
+Example configuration (agent_config.tool_output_budget):
+    {
+        "get_market_news": {"max_chars": 4000, "fields": ["Title", "Summary"], "dedupe": true},
+        "get_information": {"max_chars": 3000, "fields": ["URL", "Title", "Content"], "dedupe": true},
+        "get_price_local": {"tabular": true},
+        "buy": {"drop_zero_positions": true},
+        "sell": {"drop_zero_positions": true},
+        "*": {"max_chars": 8000}
+    }
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_SEPARATOR = re.compile(r"^-{8,}\s*$")
+_FIELD = re.compile(r"^([A-Z][A-Za-z ]{0,30}):\s?(.*)$")
+_PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def message_text(msg: Any) -> str:
+    """Return a tool message's content as text (string or list of content blocks)"""
+    content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and "text" in block:
+                parts.append(str(block["text"]))
+        return "\n".join(parts)
+    return str(content)
+
+
+def _message_name(msg: Any) -> str:
+    name = msg.get("name") if isinstance(msg, dict) else getattr(msg, "name", None)
+    return name or ""
+
+
+def _parse_records(text: str) -> Optional[List[Dict[str, str]]]:
+    """
+    Parse "Key: value" records separated by dashed lines or by a repeated first key
+
+    Returns None if the text does not look like a list of records.
+    """
+    records: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    last_key: Optional[str] = None
+    first_key: Optional[str] = None
+    for line in text.splitlines():
+        if _SEPARATOR.match(line):
+            if current:
+                records.append(current)
+            current, last_key = {}, None
+            continue
+        match = _FIELD.match(line)
+        if match:
+            key, value = match.group(1), match.group(2)
+            if first_key is None:
+                first_key = key
+            if key == first_key and current:
+                records.append(current)
+                current = {}
+            current[key] = value
+            last_key = key
+        elif last_key is not None and line.strip():
+            current[last_key] += "\n" + line
+    if current:
+        records.append(current)
+    if not records:
+        return None
+    return records
+
+
+def _record_key(record: Dict[str, str]) -> str:
+    basis = record.get("URL") or record.get("Title") or json.dumps(record, sort_keys=True)
+    return hashlib.sha1(re.sub(r"\s+", " ", basis.strip().lower()).encode("utf-8")).hexdigest()
+
+
+def _parse_json(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def _price_cell(value: Any) -> str:
+    # Current-bar placeholders ("You can not get the current high price") become n/a
+    if value is None or (isinstance(value, str) and value.startswith("You can not")):
+        return "n/a"
+    return str(value)
+
+
+def _truncate(text: str, max_chars: Optional[int]) -> str:
+    if not max_chars or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n…[truncated {len(text) - max_chars} chars]"
+
+
+class ToolOutputBudget:
+    """Per-agent tool output compactor; call reset() at the start of every session"""
+
+    def __init__(self, config: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Args:
+            config: Per-tool budgets keyed by tool name; "*" applies to tools without an entry.
+                    None or {} disables compaction (tool outputs pass through unchanged).
+        """
+        self.config = config or {}
+        self.enabled = bool(self.config)
+        self._seen: set = set()
+
+    def reset(self) -> None:
+        """Forget articles seen in the previous session"""
+        self._seen = set()
+
+    def _budget(self, tool_name: str) -> Dict[str, Any]:
+        return self.config.get(tool_name, self.config.get("*", {}))
+
+    def _compact_records(self, text: str, budget: Dict[str, Any]) -> str:
+        records = _parse_records(text)
+        if records is None:
+            return text
+        fields = budget.get("fields")
+        kept: List[str] = []
+        dropped = 0
+        for record in records:
+            if budget.get("dedupe"):
+                key = _record_key(record)
+                if key in self._seen:
+                    dropped += 1
+                    continue
+                self._seen.add(key)
+            items = [(k, v) for k, v in record.items() if not fields or k in fields]
+            kept.append("\n".join(f"{k}: {v.strip()}" for k, v in items))
+        if dropped:
+            kept.append(f"({dropped} article(s) already shown earlier this session omitted)")
+        return "\n---\n".join(kept)
+
+    @staticmethod
+    def _drop_zero_positions(text: str) -> str:
+        data = _parse_json(text)
+        if not isinstance(data, dict) or "error" in data:
+            return text
+        compact = {k: v for k, v in data.items() if k == "CASH" or v not in (0, 0.0)}
+        return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+    def compact_messages(self, tool_msgs: List[Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Compact a step's tool messages into the "Tool results" text
+
+        Returns:
+            (text, stats) where stats holds raw/compact character counts and the ratio
+        """
+        raw_texts = [message_text(msg) for msg in tool_msgs]
+        raw_chars = sum(len(t) for t in raw_texts)
+        if not self.enabled:
+            text = "\n".join(raw_texts)
+            return text, {"raw_chars": raw_chars, "compact_chars": len(text), "ratio": 1.0}
+
+        parts: List[str] = []
+        price_rows: List[List[str]] = []
+        for msg, text in zip(tool_msgs, raw_texts):
+            name = _message_name(msg)
+            budget = self._budget(name)
+            if budget.get("tabular"):
+                data = _parse_json(text)
+                if isinstance(data, dict) and isinstance(data.get("ohlcv"), dict):
+                    ohlcv = data["ohlcv"]
+                    price_rows.append(
+                        [str(data.get("symbol", "")), str(data.get("date", ""))]
+                        + [_price_cell(ohlcv.get(col)) for col in _PRICE_COLUMNS]
+                    )
+                    continue
+            if budget.get("drop_zero_positions"):
+                text = self._drop_zero_positions(text)
+            if budget.get("fields") or budget.get("dedupe"):
+                text = self._compact_records(text, budget)
+            parts.append(_truncate(text, budget.get("max_chars")))
+
+        if price_rows:
+            header = "symbol,date," + ",".join(_PRICE_COLUMNS)
+            parts.insert(0, "\n".join([header] + [",".join(row) for row in price_rows]))
+
+        text = "\n".join(parts)
+        return text, {
+            "raw_chars": raw_chars,
+            "compact_chars": len(text),
+            "ratio": round(len(text) / raw_chars, 4) if raw_chars else 1.0,
+        }
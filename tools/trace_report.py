@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Aggregate trace spans written by tools/tracing.py.
+
+Reports count, p50, p95 and total time per span, grouped by model and market,
+and optionally a per-session breakdown of where a session's time went.
+
+Usage:
+    python tools/trace_report.py                      # reads $TRACE_DIR
+    python tools/trace_report.py --dir data/traces --by span
+    python tools/trace_report.py --sessions           # per-session breakdown
+    python tools/trace_report.py --json report.json
+"""
+
+import argparse
+import json
+import math
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+def _otlp_attr(value: Dict[str, Any]) -> Any:
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def from_otlp(doc: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Spans of one OTLP/JSON line in the JSONL span format"""
+    for resource_spans in doc.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for s in scope_spans.get("spans", []):
+                start_ns = int(s["startTimeUnixNano"])
+                yield {
+                    "trace_id": s.get("traceId"),
+                    "span_id": s.get("spanId"),
+                    "parent_id": s.get("parentSpanId"),
+                    "name": s["name"],
+                    "start": start_ns / 1e9,
+                    "duration_ms": (int(s["endTimeUnixNano"]) - start_ns) / 1e6,
+                    "attrs": {a["key"]: _otlp_attr(a["value"]) for a in s.get("attributes", [])},
+                }
+
+
+def load_spans(trace_dir: str) -> List[Dict[str, Any]]:
+    """Load every span from trace-*.jsonl files (JSONL or OTLP/JSON lines)"""
+    spans: List[Dict[str, Any]] = []
+    for path in sorted(Path(trace_dir).glob("trace-*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    doc = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "resourceSpans" in doc:
+                    spans.extend(from_otlp(doc))
+                else:
+                    spans.append(doc)
+    return spans
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def aggregate(spans: List[Dict[str, Any]], by: str = "all") -> List[Dict[str, Any]]:
+    """
+    Aggregate span durations
+
+    Args:
+        spans: Span records
+        by: "all" groups by (span, model, market); "span" groups by span name only
+
+    Returns:
+        Rows with span, model, market, count, p50_ms, p95_ms, total_ms, sorted by total time
+    """
+    groups: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+    for s in spans:
+        attrs = s.get("attrs", {})
+        if by == "span":
+            key = (s["name"], "*", "*")
+        else:
+            key = (s["name"], str(attrs.get("model") or attrs.get("signature") or "-"), str(attrs.get("market") or "-"))
+        groups[key].append(float(s["duration_ms"]))
+
+    rows = []
+    for (name, model, market), durations in groups.items():
+        rows.append(
+            {
+                "span": name,
+                "model": model,
+                "market": market,
+                "count": len(durations),
+                "p50_ms": round(percentile(durations, 50), 3),
+                "p95_ms": round(percentile(durations, 95), 3),
+                "total_ms": round(sum(durations), 3),
+            }
+        )
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+def session_breakdown(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Total time per span name for every traced session (agent-side spans only)"""
+    sessions: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        attrs = s.get("attrs", {})
+        if "session" not in attrs:
+            continue
+        entry = sessions.setdefault(
+            s["trace_id"],
+            {"session": attrs["session"], "model": attrs.get("model", "-"), "market": attrs.get("market", "-"), "spans": defaultdict(float)},
+        )
+        entry["spans"][s["name"]] += float(s["duration_ms"])
+    result = []
+    for entry in sessions.values():
+        entry["spans"] = {k: round(v, 3) for k, v in sorted(entry["spans"].items(), key=lambda kv: kv[1], reverse=True)}
+        result.append(entry)
+    result.sort(key=lambda e: (e["model"], e["session"]))
+    return result
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'span':<40} {'model':<24} {'market':<8} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'total ms':>12}")
+    print("-" * 117)
+    for r in rows:
+        print(
+            f"{r['span']:<40} {r['model'][:24]:<24} {r['market']:<8} {r['count']:>7} "
+            f"{r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['total_ms']:>12.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate trace spans into p50/p95 latency tables")
+    parser.add_argument("--dir", default=os.getenv("TRACE_DIR"), help="Trace directory (default: $TRACE_DIR)")
+    parser.add_argument("--by", choices=["all", "span"], default="all", help="Group by span+model+market or span only")
+    parser.add_argument("--sessions", action="store_true", help="Print the per-session breakdown")
+    parser.add_argument("--json", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.dir:
+        parser.error("no trace directory: pass --dir or set TRACE_DIR")
+
+    spans = load_spans(args.dir)
+    if not spans:
+        print(f"⚠️  No spans found in {args.dir}")
+        return
+
+    rows = aggregate(spans, by=args.by)
+    print(f"📊 {len(spans)} spans from {args.dir}\n")
+    print_table(rows)
+
+    sessions = session_breakdown(spans) if args.sessions or args.json else []
+    if args.sessions:
+        print("\n🧭 Per-session breakdown (ms)")
+        for entry in sessions:
+            parts = ", ".join(f"{name}={ms:.1f}" for name, ms in entry["spans"].items())
+            print(f"  {entry['model']} [{entry['market']}] {entry['session']}: {parts}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"spans": len(spans), "rows": rows, "sessions": sessions}, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
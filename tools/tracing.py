@@ -0,0 +1,262 @@
+"""
+Tracing - lightweight spans for the trading hot path
+
+Spans are recorded around prompt building, model invocations, MCP tool calls
+(client and server side), ledger/price reads, runtime-config reads and session
+logging, and exported to local files that tools/trace_report.py aggregates.
+
+Tracing is controlled by environment variables (read once at import, so MCP
+servers started from the same .env pick them up too):
+
+    TRACE_DIR     Directory for trace files; tracing is disabled when unset
+    TRACE_FORMAT  "jsonl" (default, one span per line) or "otlp" (OTLP/JSON
+                  ExportTraceServiceRequest per line, loadable by OTel tooling)
+
+When disabled, traced() returns the undecorated function and span() returns a
+shared no-op context manager, so the instrumentation costs nothing.
+
+Usage:
+    @traced("get_open_prices")
+    def get_open_prices(...): ...
+
+    with span("mcp.client.buy", tool="buy"):
+        ...
+
+    set_trace_context(model="gpt-5", market="us", signature="gpt-5", session="2025-10-01")
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_DIR = os.getenv("TRACE_DIR") or None
+TRACE_FORMAT = (os.getenv("TRACE_FORMAT") or "jsonl").lower()
+TRACING_ENABLED = TRACE_DIR is not None
+
+# Attributes attached to every span (model, market, signature, session) and the active span id
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("trace_context", default={})
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_span", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class SpanExporter:
+    """Buffered exporter writing finished spans to {TRACE_DIR}/trace-{pid}.jsonl"""
+
+    def __init__(self, trace_dir: str, fmt: str = "jsonl", batch_size: int = 256):
+        self.trace_dir = trace_dir
+        self.format = fmt
+        self.batch_size = batch_size
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+        atexit.register(self.flush)
+
+    @property
+    def path(self) -> str:
+        # Resolved per call so forked worker processes write their own file
+        return os.path.join(self.trace_dir, f"trace-{os.getpid()}.jsonl")
+
+    def export(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            if self.format == "otlp":
+                lines = [json.dumps(_to_otlp(batch), ensure_ascii=False)]
+            else:
+                lines = [json.dumps(record, ensure_ascii=False) for record in batch]
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except Exception as e:
+            print(f"⚠️  Failed to write trace spans: {e}")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _to_otlp(batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert span records to an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for record in batch:
+        start_ns = int(record["start"] * 1e9)
+        otlp_span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(record["duration_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in record.get("attrs", {}).items()],
+            "status": {"code": 2 if record.get("error") else 1},
+        }
+        if record.get("parent_id"):
+            otlp_span["parentSpanId"] = record["parent_id"]
+        spans.append(otlp_span)
+    resource = [
+        {"key": "service.name", "value": {"stringValue": "ai-trader"}},
+        {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+    ]
+    return {"resourceSpans": [{"resource": {"attributes": resource}, "scopeSpans": [{"scope": {"name": "ai-trader"}, "spans": spans}]}]}
+
+
+_exporter: Optional[SpanExporter] = SpanExporter(TRACE_DIR, TRACE_FORMAT) if TRACING_ENABLED else None
+
+
+def _default_context() -> Dict[str, Any]:
+    # MCP servers have no agent context; fall back to what their environment knows
+    attrs = {}
+    for key, env in (("signature", "SIGNATURE"), ("market", "MARKET")):
+        value = os.getenv(env)
+        if value:
+            attrs[key] = value
+    return attrs
+
+
+def set_trace_context(**attrs: Any) -> None:
+    """Set attributes (model, market, signature, session, ...) attached to subsequent spans"""
+    if not TRACING_ENABLED:
+        return
+    context = dict(_context.get())
+    context.update({k: v for k, v in attrs.items() if v is not None})
+    # A new session starts a new trace
+    if "session" in attrs:
+        context["trace_id"] = uuid.uuid4().hex
+    _context.set(context)
+
+
+@contextlib.contextmanager
+def _record_span(name: str, attrs: Dict[str, Any]):
+    context = _context.get() or _default_context()
+    trace_id = context.get("trace_id") or uuid.uuid4().hex
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - t0) * 1000.0
+        _current_span.reset(token)
+        record = {
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "start": start,
+            "duration_ms": round(duration_ms, 3),
+            "pid": os.getpid(),
+            "attrs": {**{k: v for k, v in context.items() if k != "trace_id"}, **attrs},
+        }
+        if error:
+            record["error"] = error
+        _exporter.export(record)
+
+
+def span(name: str, **attrs: Any):
+    """Context manager recording one span; a shared no-op when tracing is disabled"""
+    if not TRACING_ENABLED:
+        return _NOOP
+    return _record_span(name, attrs)
+
+
+def traced(name: Optional[str] = None, **attrs: Any) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording a span around every call of a sync or async function
+
+    Returns the function unchanged when tracing is disabled.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        if not TRACING_ENABLED:
+            return fn
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _record_span(span_name, attrs):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _record_span(span_name, attrs):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def flush() -> None:
+    """Write buffered spans now (also done at interpreter exit)"""
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def build_tracing_middleware() -> List[Any]:
+    """
+    Build LangChain agent middleware recording client-side spans for MCP tool calls
+
+    Returns an empty list when tracing is disabled or middleware is unavailable.
+    """
+    if not TRACING_ENABLED:
+        return []
+    try:
+        from langchain.agents.middleware import AgentMiddleware
+    except ImportError:
+        return []
+
+    def _tool_name(request: Any) -> str:
+        tool_call = getattr(request, "tool_call", None)
+        return (tool_call or {}).get("name", "unknown") if isinstance(tool_call, dict) else "unknown"
+
+    class TracingMiddleware(AgentMiddleware):
+        async def awrap_tool_call(self, request, handler):
+            tool = _tool_name(request)
+            with _record_span(f"mcp.client.{tool}", {"tool": tool}):
+                return await handler(request)
+
+        def wrap_tool_call(self, request, handler):
+            tool = _tool_name(request)
+            with _record_span(f"mcp.client.{tool}", {"tool": tool}):
+                return handler(request)
+
+    return [TracingMiddleware()]